@@ -83,6 +83,18 @@ class ArgumentParser:
             default=False,
             help="do not load from ground truth",
         )
+        nsp_parser.add_argument(
+            "--nsp_parse_cache_size",
+            type=int,
+            default=1000,
+            help="number of semantic parser outputs kept for repeated chats, 0 to disable",
+        )
+        nsp_parser.add_argument(
+            "--nsp_quantize",
+            action="store_true",
+            default=False,
+            help="run the semantic parser on CPU with int8 weights, faster but less accurate",
+        )
         nsp_parser.add_argument(
             "--dev",
             action="store_true",
@@ -107,6 +119,12 @@ class ArgumentParser:
             default=False,
             help="run thenearby_airtouching_blocks heuristic?",
         )
+        mc_parser.add_argument(
+            "--incremental_perception",
+            action="store_true",
+            default=False,
+            help="update heuristic perception from changed blocks instead of recomputing it",
+        )
         mc_parser.add_argument(
             "--map_update_ticks", 
             default=20, 
@@ -11,6 +11,7 @@ import time
 import json
 from multiprocessing import set_start_method
 from collections import namedtuple
+from contextlib import nullcontext
 from datetime import datetime, timedelta
 from copy import deepcopy
 
@@ -99,6 +100,7 @@ class CraftAssistAgent(DroidletAgent):
         }
         self.backend = opts.backend
         self.mark_airtouching_blocks = opts.mark_airtouching_blocks
+        self.incremental_perception = getattr(opts, "incremental_perception", False)
         super(CraftAssistAgent, self).__init__(opts)
         self.no_default_behavior = opts.no_default_behavior
         self.agent_type = "craftassist"
@@ -229,6 +231,7 @@ class CraftAssistAgent(DroidletAgent):
             self,
             low_level_data=self.low_level_data,
             mark_airtouching_blocks=self.mark_airtouching_blocks,
+            incremental=self.incremental_perception,
         )
         # set up the SubComponentClassifier model
         if os.path.isfile(self.opts.semseg_model_path):
@@ -268,10 +271,16 @@ class CraftAssistAgent(DroidletAgent):
         The agent sends all perception updates to memory in order for them to
         update the memory state.
         """
-        # 1. perceive from NLU parser
-        super().perceive()
-        # 2. perceive from low_level perception module
-        low_level_perception_output = self.perception_modules["low_level"].perceive()
+        # the pyworld mover gets the chats, players, mobs and changed blocks read by
+        # steps 1 and 2 in one request to the world server
+        with self.mover.observation() if self.backend == "pyworld" else nullcontext():
+            # 1. perceive from NLU parser
+            super().perceive()
+            # 2. perceive from low_level perception module
+            low_level_perception_output = self.perception_modules["low_level"].perceive()
+        self.perception_modules["heuristic"].on_blocks_changed(
+            {xyz: idm for xyz, idm in low_level_perception_output.changed_block_attributes}
+        )
         self.areas_to_perceive = cluster_areas(self.areas_to_perceive)
         self.areas_to_perceive = self.memory.update(
             low_level_perception_output, self.areas_to_perceive
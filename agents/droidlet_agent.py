@@ -311,16 +311,17 @@ class DroidletAgent(BaseAgent):
         self.maybe_dump_memory_to_dashboard()
 
     def task_step(self, sleep_time=0.25):
-        query = "SELECT MEMORY FROM Task WHERE prio={}".format(TaskNode.CHECK_PRIO)
-        _, task_mems = self.memory.basic_search(query)
-        for mem in task_mems:
+        # the task index follows the Tasks table, so finding tasks by prio doesn't need SQL
+        task_index = self.memory.task_index
+        for memid in task_index.get_memids(prio=TaskNode.CHECK_PRIO):
+            mem = TaskNode(self.memory, memid)
             if mem.task.init_condition.check():
                 mem.get_update_status({"prio": TaskNode.CHECK_PRIO + 1})
 
-        query = "SELECT MEMORY FROM Task WHERE ((prio>{}) AND (paused <= 0))".format(
-            TaskNode.CHECK_PRIO
-        )
-        _, task_mems = self.memory.basic_search(query)
+        task_mems = [
+            TaskNode(self.memory, memid)
+            for memid in task_index.get_memids(above_prio=TaskNode.CHECK_PRIO, unpaused=True)
+        ]
         if not task_mems:
             time.sleep(sleep_time)
             return
@@ -422,8 +423,10 @@ class DroidletAgent(BaseAgent):
 
         # check to see if some Tasks were put in memory that need to be
         # hatched using agent object (self):
-        query = "SELECT MEMORY FROM Task WHERE prio={}".format(TaskNode.EGG_PRIO)
-        _, task_mems = self.memory.basic_search(query)
+        task_mems = [
+            TaskNode(self.memory, memid)
+            for memid in self.memory.task_index.get_memids(prio=TaskNode.EGG_PRIO)
+        ]
         for task_mem in task_mems:
             task_mem.task["class"](
                 self, task_data=task_mem.task["task_data"], memid=task_mem.memid
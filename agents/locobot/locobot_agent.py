@@ -80,6 +80,8 @@ class LocobotAgent(DroidletAgent):
         self.last_chat_time = -1000000000000
         self.name = name
         self.dash_enable_map = False # dash has map disabled by default
+        # version of the slam obstacle map memory was last synced to, -1 for never
+        self.obstacle_map_version = -1
 
         # FIXME these should only be stored in memory, not here
         self.pitch = 0.0
@@ -245,7 +247,8 @@ class LocobotAgent(DroidletAgent):
         # 1. perceive from NLU parser
         super().perceive(force=force)
         # 2. perceive from robot perception modules
-        previous_objects = DetectedObjectNode.get_all(self.memory)
+        # features, locations and eids of all the detected objects, kept up to date by memory
+        previous_objects = self.memory.detected_object_index
         # perception_output is a namedtuple of:
         # new_detections, updated_detections, humans, self_pose, obstacle_map
 
@@ -258,10 +261,12 @@ class LocobotAgent(DroidletAgent):
         perception_output = self.perception_modules["vision"].perceive(
             rgb_depth, (x, z, yaw), previous_objects, force=force
         )
-        # 3. update the occupancy map
-        # TODO just the diff? otherwise speed up?
-        obstacles = self.mover.get_obstacles_in_canonical_coords()
-        perception_output = perception_output._replace(obstacle_map=obstacles)
+        # 3. update the occupancy map with the cells that changed since the last step
+        obstacle_changes = self.mover.get_obstacle_changes_in_canonical_coords(
+            self.obstacle_map_version
+        )
+        self.obstacle_map_version = obstacle_changes.version
+        perception_output = perception_output._replace(obstacle_map=obstacle_changes)
 
         # 4. self location
         # FIXME better pose object
@@ -274,6 +279,7 @@ class LocobotAgent(DroidletAgent):
             if self.opts.map_data == "memory":          # draw the map from memory
                 self.draw_map_to_dashboard()
             elif self.opts.map_data == "observations":  # else draw directly from current obs
+                obstacles = self.mover.get_obstacles_in_canonical_coords()
                 self.draw_map_to_dashboard(obstacles=obstacles, xyyaw=(x, z, yaw))
             else:
                 pass
@@ -393,7 +399,7 @@ class LocobotAgent(DroidletAgent):
     def shutdown(self):
         self._shutdown = True
         time.sleep(5)  # let current step to finish
-        self.perception_modules["vision"].vprocess.stop()
+        self.perception_modules["vision"].pipeline.stop()
         time.sleep(5)  # let the other threads die
         os._exit(0)  # TODO: remove and figure out why multiprocess sometimes hangs on exit
 
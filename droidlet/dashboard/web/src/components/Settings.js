@@ -23,6 +23,7 @@ class Settings extends React.Component {
       agent_enable_map: false,
       image_quality: -1,
       image_resolution: -1,
+      perception_stats: {},
       use_old_annotation: stateManager.useDesktopComponentOnMobile,
     };
 
@@ -34,6 +35,7 @@ class Settings extends React.Component {
     this.handleChange = this.handleChange.bind(this);
     this.handleSubmit = this.handleSubmit.bind(this);
     this.setImageSettings = this.setImageSettings.bind(this);
+    this.setPerceptionStats = this.setPerceptionStats.bind(this);
     this.onImageQualityChange = this.onImageQualityChange.bind(this);
     this.onImageResolutionChange = this.onImageResolutionChange.bind(this);
   }
@@ -42,6 +44,10 @@ class Settings extends React.Component {
     this.setState(newSettings);
   }
 
+  setPerceptionStats(stats) {
+    this.setState({ perception_stats: stats });
+  }
+
   handleChange(event) {
     this.setState({ url: event.target.value });
   }
@@ -63,6 +69,10 @@ class Settings extends React.Component {
         "image_settings",
         this.setImageSettings
       );
+      this.props.stateManager.socket.on(
+        "perception_stats",
+        this.setPerceptionStats
+      );
     }
   }
 
@@ -74,6 +84,10 @@ class Settings extends React.Component {
         "image_settings",
         this.setImageSettings
       );
+      this.props.stateManager.socket.off(
+        "perception_stats",
+        this.setPerceptionStats
+      );
     }
   }
 
@@ -161,6 +175,14 @@ class Settings extends React.Component {
 
         <p> FPS: {this.state.fps} </p>
         <p> Connection Status: {status_indicator} </p>
+        {Object.entries(this.state.perception_stats).map(([name, stats]) => (
+          <p key={name}>
+            {" "}
+            {name}: {stats.fps.toFixed(1)} fps,{" "}
+            {stats.latency_ms === null ? "-" : stats.latency_ms.toFixed(0)} ms,{" "}
+            {stats.dropped} dropped{" "}
+          </p>
+        ))}
         <p>
           <div style={{ position: "absolute", left: "-15px" }}>
             {map_switch}
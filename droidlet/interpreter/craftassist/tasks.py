@@ -14,7 +14,11 @@ from droidlet.lowlevel.minecraft.craftassist_cuberite_utils.block_data import (
     BUILD_INTERCHANGEABLE_PAIRS,
 )
 from droidlet.base_util import npy_to_blocks_list, blocks_list_to_npy, to_block_pos
-from droidlet.shared_data_struct.craftassist_shared_utils import astar, MOBS_BY_ID
+from droidlet.shared_data_struct.craftassist_shared_utils import (
+    astar,
+    VoxelPathPlanner,
+    MOBS_BY_ID,
+)
 from droidlet.perception.craftassist.heuristic_perception import ground_height
 from droidlet.lowlevel.minecraft.mc_util import manhat_dist, strip_idmeta
 
@@ -197,6 +201,9 @@ class Move(BaseMovementTask):
         self.target = to_block_pos(np.array(task_data["target"]))
         self.approx = task_data.get("approx", 1)
         self.path = None
+        # keeps the blocks and search state between replans, see VoxelPathPlanner.
+        # it is not pickled with the task (see NONPICKLE_ATTRS), and rebuilt if missing
+        self.planner = None
         self.replace = set()
         self.last_stepped_time = agent.memory.get_time()
         TaskNode(agent.memory, self.memid).update_task(task=self)
@@ -229,11 +236,19 @@ class Move(BaseMovementTask):
             if len(self.replace) > 0:
                 logging.error("Move finished with non-empty replace set: {}".format(self.replace))
             self.finished = True
+            self.planner = None
             return
 
         # get path
         if self.path is None or tuple(agent.pos) != self.path[-1]:
-            self.path = astar(agent, self.target, self.approx)
+            if self.planner is None or not self.planner.contains(agent.pos):
+                self.planner = VoxelPathPlanner(agent, self.target, self.approx)
+                changed = None
+            else:
+                # the agent left the path (blocked, or dug through): the blocks
+                # around it may have changed since they were fetched
+                changed = self.planner.refresh(agent, agent.pos)
+            self.path = self.planner.plan(agent.pos, changed)
             if self.path is None:
                 self.handle_no_path(agent)
                 return
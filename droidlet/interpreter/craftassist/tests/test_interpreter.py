@@ -10,6 +10,8 @@ import droidlet.lowlevel.minecraft.shape_util
 import droidlet.lowlevel.minecraft.shapes
 import droidlet.lowlevel.minecraft.shapes as shapes
 from droidlet.shared_data_structs import NextDialogueStep, ErrorWithResponse
+from droidlet.memory.memory_nodes import TaskNode
+from droidlet.interpreter.craftassist.tasks import Move
 from droidlet.lowlevel.minecraft.mc_util import Block, strip_idmeta, euclid_dist
 from droidlet.interpreter.tests.all_test_commands import *
 from agents.craftassist.tests.base_craftassist_test_case import BaseCraftassistTestCase
@@ -307,6 +309,26 @@ class MoveBetweenTest(BaseCraftassistTestCase):
         )
 
 
+class MovePickleTest(BaseCraftassistTestCase):
+    def test_pickle_running_move(self):
+        target = (6, 63, 4)
+        task = Move(self.agent, {"target": target, "approx": 0})
+        # the task is pickled to memory after each step, with its path planner
+        for _ in range(3):
+            task.step()
+        self.assertIsNotNone(task.planner)
+        self.assertFalse(task.finished)
+        task = TaskNode(self.agent.memory, task.memid).task
+        self.assertIsNotNone(task.planner)
+        for _ in range(100):
+            if task.finished:
+                break
+            task.step()
+            task = TaskNode(self.agent.memory, task.memid).task
+        self.assertTrue(task.finished)
+        self.assertEqual(tuple(self.agent.pos), target)
+
+
 # TODO class BuildInsideTest(BaseCraftassistTestCase):
 
 
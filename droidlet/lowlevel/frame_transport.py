@@ -0,0 +1,319 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+Encoding of rgb and depth frames sent by the remote robot services to the movers.
+
+The remote service encodes each frame with a FrameEncoder and returns the resulting
+dict through Pyro; the mover decodes it with a FrameDecoder.  Each array is either
+compressed with one of the codecs below, or, when the mover runs on the same host as
+the service, written to a ring of shared memory slots so only a few offsets go
+through Pyro.
+
+codecs:
+    "raw": the array bytes
+    "jpeg", "webp", "png": images, with opencv.  jpeg and webp are lossy
+    "zlib": the array bytes compressed with zlib
+    "lz4", "zstd": the array bytes compressed with blosc
+"""
+import socket
+import threading
+import zlib
+
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+IMAGE_CODECS = {"jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+BLOSC_CODECS = ["lz4", "zstd"]
+CODECS = ["raw", "zlib"] + list(IMAGE_CODECS) + BLOSC_CODECS
+# names of the shared memory segments created by this process
+_created_shm = set()
+
+
+class StaleFrameError(RuntimeError):
+    """the shared memory slot of a frame was overwritten by a newer frame before it was read"""
+
+
+def is_local_address(ip):
+    """True if ip (an address or host name) is this host"""
+    try:
+        addr = socket.gethostbyname(ip)
+    except (OSError, TypeError):
+        return False
+    if addr.startswith("127."):
+        return True
+    try:
+        return addr in socket.gethostbyname_ex(socket.gethostname())[2]
+    except OSError:
+        return False
+
+
+def encode_array(arr, codec="raw", quality=80, scale=None):
+    """
+    Args:
+        arr (np.array): the array to encode; jpeg and webp take (H, W, 3) uint8 images
+        codec (str): one of CODECS
+        quality (int): jpeg/webp quality, from 0 to 100
+        scale (float): if not None, arr is stored as uint16 round(arr * scale),
+            e.g. depth in metres with scale=1000 is stored in millimetres (up to 65m)
+
+    Returns:
+        a dict to pass to decode_array
+    """
+    if codec not in CODECS:
+        raise ValueError("unknown codec {}, expected one of {}".format(codec, CODECS))
+    arr = np.asarray(arr)
+    if scale is not None:
+        arr = np.clip(np.rint(arr * scale), 0, np.iinfo(np.uint16).max).astype(np.uint16)
+    arr = np.ascontiguousarray(arr)
+    if codec == "raw":
+        data = arr.tobytes()
+    elif codec == "zlib":
+        data = zlib.compress(arr, 1)
+    elif codec in IMAGE_CODECS:
+        import cv2
+
+        # opencv takes images as bgr, rgb images are encoded with their channels
+        # swapped and come back the same after decoding
+        if codec == "jpeg":
+            params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        elif codec == "webp":
+            params = [int(cv2.IMWRITE_WEBP_QUALITY), quality]
+        else:
+            params = [int(cv2.IMWRITE_PNG_COMPRESSION), 1]
+        ok, data = cv2.imencode(IMAGE_CODECS[codec], arr, params)
+        if not ok:
+            raise ValueError(
+                "could not encode a {} {} array as {}".format(arr.shape, arr.dtype, codec)
+            )
+        data = data.tobytes()
+    else:
+        import blosc
+
+        data = blosc.compress(arr, typesize=arr.itemsize, cname=codec, clevel=1)
+    return {
+        "codec": codec,
+        "data": data,
+        "shape": arr.shape,
+        "dtype": arr.dtype.str,
+        "scale": scale,
+    }
+
+
+def decode_array(encoded):
+    """the inverse of encode_array; arrays that were scaled come back as float32"""
+    codec = encoded["codec"]
+    data = encoded["data"]
+    if codec == "raw":
+        arr = np.frombuffer(data, dtype=encoded["dtype"])
+    elif codec == "zlib":
+        arr = np.frombuffer(zlib.decompress(data), dtype=encoded["dtype"])
+    elif codec in IMAGE_CODECS:
+        import cv2
+
+        arr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    elif codec in BLOSC_CODECS:
+        import blosc
+
+        arr = np.frombuffer(blosc.decompress(data), dtype=encoded["dtype"])
+    else:
+        raise ValueError("unknown codec {}, expected one of {}".format(codec, CODECS))
+    arr = arr.reshape(encoded["shape"])
+    if encoded.get("scale") is not None:
+        arr = np.divide(arr, encoded["scale"], dtype=np.float32)
+    elif not arr.flags.writeable:
+        # np.frombuffer of bytes is read only
+        arr = arr.copy()
+    return arr
+
+
+def _attach(name):
+    """attach to an existing shared memory segment without tracking it, so it is not
+    unlinked when this process exits; it belongs to the process that created it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13 always tracks
+        shm = shared_memory.SharedMemory(name=name)
+        if name not in _created_shm:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedFrameRing:
+    """
+    A shared memory segment with `slots` slots, each holding one frame.  Frames are
+    written to the slots in turn, so a frame can be read until `slots` newer frames
+    have been written.  each slot starts with the int64 sequence number of the frame
+    in it (-1 while it is being written), then the arrays, each aligned to 64 bytes.
+
+    Args:
+        shapes: the shapes of the arrays of each frame
+        dtypes: the dtypes of the arrays of each frame
+        slots (int): number of frames kept
+    """
+
+    HEADER = 64
+
+    def __init__(self, shapes, dtypes, slots=4):
+        self.shapes = [tuple(s) for s in shapes]
+        self.dtypes = [np.dtype(d) for d in dtypes]
+        self.offsets = []
+        size = self.HEADER
+        for shape, dtype in zip(self.shapes, self.dtypes):
+            self.offsets.append(size)
+            size += -(-int(np.prod(shape)) * dtype.itemsize // 64) * 64
+        self.slot_size = size
+        self.slots = slots
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * size)
+        _created_shm.add(self.shm.name)
+        self.seq = 0
+        self.lock = threading.Lock()
+        for slot in range(slots):
+            self._header(self.shm, slot)[0] = -1
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def fits(self, arrays):
+        shapes = [a.shape for a in arrays]
+        dtypes = [a.dtype for a in arrays]
+        return shapes == self.shapes and dtypes == self.dtypes
+
+    def _header(self, shm, slot):
+        return np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=slot * self.slot_size)
+
+    def write(self, arrays):
+        """copies arrays into the next slot and returns the encoded dicts of each, to be
+        passed to FrameDecoder.decode_array"""
+        with self.lock:
+            seq = self.seq
+            self.seq += 1
+            slot = seq % self.slots
+            header = self._header(self.shm, slot)
+            header[0] = -1
+            out = []
+            for arr, offset in zip(arrays, self.offsets):
+                offset += slot * self.slot_size
+                dst = np.ndarray(arr.shape, dtype=arr.dtype, buffer=self.shm.buf, offset=offset)
+                dst[...] = arr
+                out.append(
+                    {
+                        "codec": "shm",
+                        "name": self.shm.name,
+                        "seq": seq,
+                        "header": slot * self.slot_size,
+                        "offset": offset,
+                        "shape": arr.shape,
+                        "dtype": arr.dtype.str,
+                    }
+                )
+            header[0] = seq
+        return out
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+        _created_shm.discard(self.shm.name)
+
+
+class FrameEncoder:
+    """Encodes (rgb, depth) frames on the remote service side, see encode"""
+
+    def __init__(self, shm_slots=4):
+        self.shm_slots = shm_slots
+        self.ring = None
+
+    def encode(
+        self,
+        rgb,
+        depth,
+        rgb_codec="raw",
+        depth_codec="raw",
+        depth_scale=None,
+        quality=80,
+        use_shm=False,
+    ):
+        """
+        Args:
+            rgb, depth (np.array): the frame
+            rgb_codec, depth_codec (str): the codecs to use, see encode_array
+            depth_scale (float): if not None, depth is sent as uint16 depth * depth_scale
+            quality (int): jpeg/webp quality
+            use_shm (bool): if True, the frame is written to shared memory as is and
+                the codecs are ignored.  only for clients on the same host
+
+        Returns:
+            a dict with the encoded "rgb" and "depth", to pass to FrameDecoder.decode
+        """
+        if use_shm:
+            arrays = [np.asarray(rgb), np.asarray(depth)]
+            if self.ring is None or not self.ring.fits(arrays):
+                if self.ring is not None:
+                    self.ring.close()
+                self.ring = SharedFrameRing(
+                    [a.shape for a in arrays], [a.dtype for a in arrays], slots=self.shm_slots
+                )
+            encoded_rgb, encoded_depth = self.ring.write(arrays)
+        else:
+            encoded_rgb = encode_array(rgb, rgb_codec, quality=quality)
+            encoded_depth = encode_array(depth, depth_codec, quality=quality, scale=depth_scale)
+        return {"rgb": encoded_rgb, "depth": encoded_depth}
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+class FrameDecoder:
+    """Decodes the frames made by a FrameEncoder, on the mover side.
+
+    Args:
+        copy (bool): if False, arrays in shared memory are returned as views of the
+            slot they are in, without copying them.  they are only valid until the
+            encoder has written as many newer frames as the ring has slots
+    """
+
+    def __init__(self, copy=True):
+        self.copy = copy
+        # shared memory segments attached to, by name
+        self.attached = {}
+
+    def decode_array(self, encoded):
+        if encoded["codec"] != "shm":
+            return decode_array(encoded)
+        name = encoded["name"]
+        shm = self.attached.get(name)
+        if shm is None:
+            # the encoder replaced its ring, drop the old ones
+            self.close()
+            shm = _attach(name)
+            self.attached[name] = shm
+        header = np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=encoded["header"])
+        arr = np.ndarray(
+            encoded["shape"], dtype=encoded["dtype"], buffer=shm.buf, offset=encoded["offset"]
+        )
+        if header[0] != encoded["seq"]:
+            raise StaleFrameError("frame {} was overwritten".format(encoded["seq"]))
+        if self.copy:
+            arr = arr.copy()
+            if header[0] != encoded["seq"]:
+                raise StaleFrameError("frame {} was overwritten".format(encoded["seq"]))
+        return arr
+
+    def decode(self, frame):
+        """returns the (rgb, depth) of a frame from FrameEncoder.encode.  raises
+        StaleFrameError if it was in shared memory and has been overwritten, and
+        FileNotFoundError if the shared memory is not on this host"""
+        return self.decode_array(frame["rgb"]), self.decode_array(frame["depth"])
+
+    def close(self):
+        for shm in self.attached.values():
+            try:
+                shm.close()
+            except BufferError:
+                # views returned with copy=False are still around; the segment is
+                # unmapped when they are garbage collected
+                pass
+        self.attached = {}
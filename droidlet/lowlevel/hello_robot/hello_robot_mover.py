@@ -23,7 +23,12 @@ from droidlet.lowlevel.robot_coordinate_utils import (
 )
 
 from droidlet.lowlevel.robot_mover import MoverInterface
-from droidlet.lowlevel.robot_mover_utils import get_camera_angles, angle_diff, transform_pose
+from droidlet.lowlevel.robot_mover_utils import (
+    get_camera_angles,
+    angle_diff,
+    transform_pose,
+    slam_map_changes_to_canonical,
+)
 
 from droidlet.shared_data_struct.rotation import (
     rotation_matrix_x,
@@ -439,6 +444,19 @@ class HelloRobotMover(MoverInterface):
         cordinates_in_standard_frame = [(c[0], c[2]) for c in cordinates_in_standard_frame]
         return cordinates_in_standard_frame
 
+    def get_obstacle_changes_in_canonical_coords(self, since_version=-1):
+        """
+        get the obstacle cells that changed since the slam map was at since_version,
+        as packed arrays instead of a list of every obstacle like
+        get_obstacles_in_canonical_coords
+
+        return:
+         ObstacleMapChanges(version, full, added, removed); pass version as since_version
+         on the next call.  added and removed are (N, 2) arrays of (x, z) in standard
+         coordinates.  if full is True (e.g. since_version=-1), added is every obstacle
+        """
+        return slam_map_changes_to_canonical(self.slam.get_map_changes(since_version))
+
 
 if __name__ == "__main__":
     import argparse
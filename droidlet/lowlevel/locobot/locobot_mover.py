@@ -4,9 +4,9 @@ Copyright (c) Facebook, Inc. and its affiliates.
 import os
 import sys
 import math
-import copy
 import time
 import logging
+import functools
 from collections.abc import Iterable
 from prettytable import PrettyTable
 import Pyro4
@@ -17,6 +17,7 @@ from agents.argument_parser import ArgumentParser
 from droidlet.shared_data_structs import RGBDepth
 from droidlet.dashboard.o3dviz import deserialize as o3d_unpickle
 from droidlet.lowlevel.pyro_utils import safe_call
+from droidlet.lowlevel.frame_transport import FrameDecoder, StaleFrameError, is_local_address
 
 
 from ..robot_mover_utils import (
@@ -25,7 +26,8 @@ from ..robot_mover_utils import (
     MAX_PAN_RAD,
     CAMERA_HEIGHT,
     ARM_HEIGHT,
-    transform_pose,
+    compute_pts_in_world,
+    slam_map_changes_to_canonical,
 )
 
 from droidlet.lowlevel.robot_coordinate_utils import (
@@ -45,9 +47,26 @@ class LoCoBotMover:
     Arguments:
         ip (string): IP of the Locobot.
         backend (string): backend where the Locobot lives, either "habitat" or "locobot"
+        rgb_codec (string): how rgb frames are compressed by the robot, see
+            droidlet.lowlevel.frame_transport.  lossy codecs like "jpeg" send much
+            smaller frames
+        depth_codec (string): how depth frames are compressed by the robot
+        depth_scale (float): if not None, depth frames are sent as uint16
+            depth * depth_scale, e.g. 1000.0 for millimetres.  the default sends the
+            float depth
+        use_shm (bool): get frames through shared memory, for a robot on the same host.
+            if None, it is used when ip is this host
     """
 
-    def __init__(self, ip=None, backend="habitat"):
+    def __init__(
+        self,
+        ip=None,
+        backend="habitat",
+        rgb_codec="zlib",
+        depth_codec="zlib",
+        depth_scale=None,
+        use_shm=None,
+    ):
         self.bot = Pyro4.Proxy("PYRONAME:remotelocobot@" + ip)
         self.slam = Pyro4.Proxy("PYRONAME:slam@" + ip)
         self.nav = Pyro4.Proxy("PYRONAME:navigation@" + ip)
@@ -58,15 +77,13 @@ class LoCoBotMover:
         self.nav_result = self.nav.is_busy()
         self.curr_look_dir = np.array([0, 0, 1])  # initial look dir is along the z-axis
 
-        intrinsic_mat = safe_call(self.bot.get_intrinsics)
-        intrinsic_mat_inv = np.linalg.inv(intrinsic_mat)
-        img_resolution = safe_call(self.bot.get_img_resolution)
-        img_pixs = np.mgrid[0 : img_resolution[0] : 1, 0 : img_resolution[1] : 1]
-        img_pixs = img_pixs.reshape(2, -1)
-        img_pixs[[0, 1], :] = img_pixs[[1, 0], :]
-        uv_one = np.concatenate((img_pixs, np.ones((1, img_pixs.shape[1]))))
-        self.uv_one_in_cam = np.dot(intrinsic_mat_inv, uv_one)
+        self.intrinsic_mat = np.asarray(safe_call(self.bot.get_intrinsics))
         self.backend = backend
+        self.rgb_codec = rgb_codec
+        self.depth_codec = depth_codec
+        self.depth_scale = depth_scale
+        self.use_shm = is_local_address(ip) if use_shm is None else use_shm
+        self.frame_decoder = FrameDecoder()
 
     def is_obstacle_in_front(self, return_viz=False):
         ret = safe_call(self.bot.is_obstacle_in_front, return_viz)
@@ -253,25 +270,33 @@ class LoCoBotMover:
     def get_rgb_depth(self):
         """
         Fetches rgb, depth and pointcloud in pyrobot world coordinates.
+        The pointcloud is only computed when the ptcloud of the RGBDepth is first used.
 
         Returns:
             an RGBDepth object
         """
-        rgb, depth, rot, trans, base_state = self.bot.get_pcd_data()
-        depth = depth.astype(np.float32)
-        d = copy.deepcopy(depth)
-        depth = depth.reshape(-1)
-        pts_in_cam = np.multiply(self.uv_one_in_cam, depth)
-        pts_in_cam = np.concatenate((pts_in_cam, np.ones((1, pts_in_cam.shape[1]))), axis=0)
-        pts = pts_in_cam[:3, :].T
-        pts = np.dot(pts, rot.T)
-        pts = pts + trans.reshape(-1)
-        if self.backend == "habitat":
-            ros_to_habitat_frame = np.array([[0.0, -1.0, 0.0], [0.0, 0.0, -1.0], [1.0, 0.0, 0.0]])
-            pts = ros_to_habitat_frame.T @ pts.T
-            pts = pts.T
-        pts = transform_pose(pts, base_state)
-        return RGBDepth(rgb, d, pts)
+        rgb = None
+        if self.use_shm:
+            frame, rot, trans, base_state = self.bot.get_encoded_pcd_data(use_shm=True)
+            try:
+                rgb, depth = self.frame_decoder.decode(frame)
+            except FileNotFoundError:
+                logging.warning("robot frames are not in shared memory on this host, not using it")
+                self.use_shm = False
+            except StaleFrameError:
+                pass
+        if rgb is None:
+            frame, rot, trans, base_state = self.bot.get_encoded_pcd_data(
+                rgb_codec=self.rgb_codec,
+                depth_codec=self.depth_codec,
+                depth_scale=self.depth_scale,
+            )
+            rgb, depth = self.frame_decoder.decode(frame)
+        depth = depth.astype(np.float32, copy=False)
+        pts = functools.partial(
+            compute_pts_in_world, depth, rot, trans, base_state, self.intrinsic_mat, self.backend
+        )
+        return RGBDepth(rgb, depth, pts)
 
     def get_rgb_depth_segm(self):
         if self.backend != "habitat":
@@ -346,6 +371,19 @@ class LoCoBotMover:
         cordinates_in_standard_frame = [(c[0], c[2]) for c in cordinates_in_standard_frame]
         return cordinates_in_standard_frame
 
+    def get_obstacle_changes_in_canonical_coords(self, since_version=-1):
+        """
+        get the obstacle cells that changed since the slam map was at since_version,
+        as packed arrays instead of a list of every obstacle like
+        get_obstacles_in_canonical_coords
+
+        return:
+         ObstacleMapChanges(version, full, added, removed); pass version as since_version
+         on the next call.  added and removed are (N, 2) arrays of (x, z) in standard
+         coordinates.  if full is True (e.g. since_version=-1), added is every obstacle
+        """
+        return slam_map_changes_to_canonical(self.slam.get_map_changes(since_version))
+
 
 if __name__ == "__main__":
     base_path = os.path.dirname(__file__)
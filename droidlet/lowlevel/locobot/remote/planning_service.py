@@ -1,5 +1,6 @@
 import os
 import math
+import threading
 import numpy as np
 import Pyro4
 from slam_pkg.utils.fmm_planner import FMMPlanner
@@ -19,6 +20,12 @@ class Planner(object):
     def __init__(self, slam):
         self.slam = slam
         self.map_resolution = self.slam.get_map_resolution()
+        # the planner caches the distance fields of recent goals, and is updated when
+        # the traversable map of slam changes
+        self.planner = None
+        self.map_version = None
+        self.traversable_map = None
+        self.lock = threading.Lock()
 
     def get_short_term_goal(
         self, robot_location, goal, step_size=25, distance_threshold=None, angle_threshold=None
@@ -34,19 +41,28 @@ class Planner(object):
         # if initial state wasn't (0,0,0)
         robot_map_location = self.slam.robot2map(robot_location)
 
-        # get occupancy map
-        traversable_map = self.slam.get_traversable_map()
-
-        # if the goal is an obstacle, you can't go there. Return
-        if not is_traversable(goal_map_location, traversable_map):
-            return False
-
-        # construct a planner
-        self.planner = FMMPlanner(traversable_map, step_size=int(step_size / self.map_resolution))
-
-        # set the goal and location in planner, get short-term-goal
-        self.planner.set_goal(goal_map_location)
-        stg = self.planner.get_short_term_goal(robot_map_location)
+        with self.lock:
+            # get occupancy map, if it changed
+            version, traversable_map = self.slam.get_versioned_traversable_map(self.map_version)
+            if traversable_map is not None:
+                self.map_version, self.traversable_map = version, traversable_map
+            traversable_map = self.traversable_map
+
+            # if the goal is an obstacle, you can't go there. Return
+            if not is_traversable(goal_map_location, traversable_map):
+                return False
+
+            # construct a planner, or update it
+            step_size = int(step_size / self.map_resolution)
+            if self.planner is None:
+                self.planner = FMMPlanner(traversable_map, step_size=step_size, version=version)
+            else:
+                self.planner.step_size = step_size
+                self.planner.set_traversable(traversable_map, version=version)
+
+            # set the goal and location in planner, get short-term-goal
+            self.planner.set_goal(goal_map_location, robot_map_location)
+            stg = self.planner.get_short_term_goal(robot_map_location)
 
         # if the goal is an obstacle, you can't go there. Return
         if not is_traversable(stg, traversable_map):
@@ -17,6 +17,7 @@ from droidlet.lowlevel.robot_mover_utils import (
     transform_pose,
 )
 from droidlet.dashboard.o3dviz import serialize as o3d_pickle
+from droidlet.lowlevel.frame_transport import FrameEncoder
 
 Pyro4.config.SERIALIZERS_ACCEPTED.add("pickle")
 Pyro4.config.ITER_STREAMING = True
@@ -60,6 +61,7 @@ class RemoteLocobot(object):
         img_pixs[[0, 1], :] = img_pixs[[1, 0], :]
         uv_one = np.concatenate((img_pixs, np.ones((1, img_pixs.shape[1]))))
         self.uv_one_in_cam = np.dot(intrinsic_mat_inv, uv_one)
+        self.frame_encoder = FrameEncoder()
 
     def restart_habitat(self):
         if hasattr(self, "_robot"):
@@ -115,6 +117,23 @@ class RemoteLocobot(object):
         cur_rotation = rot_init_rotation.T @ cur_rotation
         return rgb, depth, cur_rotation, -relative_position, base_state
 
+    def get_encoded_pcd_data(
+        self, rgb_codec="raw", depth_codec="raw", depth_scale=None, quality=80, use_shm=False
+    ):
+        """Same as get_pcd_data, with the rgb and depth encoded by a FrameEncoder (see
+        droidlet.lowlevel.frame_transport), for the client to decode with a FrameDecoder."""
+        rgb, depth, rot, trans, base_state = self.get_pcd_data()
+        frame = self.frame_encoder.encode(
+            rgb,
+            depth,
+            rgb_codec=rgb_codec,
+            depth_codec=depth_codec,
+            depth_scale=depth_scale,
+            quality=quality,
+            use_shm=use_shm,
+        )
+        return frame, rot, trans, base_state
+
     def get_current_pcd(self):
         rgb, depth, rot, trans, base_state = self.get_pcd_data()
         depth = depth.astype(np.float32)
@@ -1,39 +1,178 @@
+from collections import OrderedDict
+
 import numpy as np
 import skfmm
 from numpy import ma
+from scipy.ndimage import binary_dilation
+
+# distance of obstacles and of the cells that can't reach the goal
+UNREACHABLE = 10000
 
 
 class FMMPlanner(object):
-    def __init__(self, traversable, step_size=5):
+    def __init__(self, traversable, step_size=5, max_goals=8, version=None):
         """
 
         :param traversable: 2D np.ndarray boolean map , False for obstacle and True for free, unknow space
         :param step_size: number of stapes agent suppose to travel in every short steps it takes towards goal
+        :param max_goals: number of goals whose distance fields are cached
+        :param version: version of traversable, see set_traversable
 
         :type traversable: np.ndarray
         :type step_size: int
+        :type max_goals: int
         """
         self.step_size = step_size
         self.traversable = traversable
+        self.version = version
         self.last_goal = None
+        self.max_goals = max_goals
+        # (goal_x, goal_y) -> [traversable the distance field was computed on, distance
+        # field, horizon], least recently used first.  distances are only computed up to
+        # horizon: farther cells are UNREACHABLE like obstacles, until the field is extended
+        self.fields = OrderedDict()
+        # margin, in cells, kept between the changed cells and the part of a distance
+        # field that is kept as is when it is updated
+        self.update_margin = 2
+        # distance, in cells, computed beyond what the robot needs, so the field does not
+        # have to be extended as soon as the robot moves away from the goal
+        self.horizon_margin = 8 * step_size
+
+    def set_traversable(self, traversable, version=None):
+        """
+        Replaces the traversable map.  The distance fields of the cached goals are updated
+        the next time their goal is set.  traversable is not copied, so pass a new array
+        rather than modifying the previous one in place
+        :param traversable: new 2D np.ndarray boolean map
+        :param version: if not None and equal to the version of the current map, the map
+            is assumed unchanged and nothing is done
+        """
+        if version is not None and version == self.version:
+            return
+        if traversable.shape != self.traversable.shape:
+            # the map grew, the fields don't line up anymore
+            self.fields.clear()
+        self.traversable = traversable
+        self.version = version
 
-    def set_goal(self, goal):
+    def set_goal(self, goal, state=None):
         """
         Helps to set the goal and calculate distance from goal, try to visualize dd to get more intuition
+        The distance field of a goal that was set before is reused, and only updated where
+        the traversable map changed since
         :param goal: goal points in map space [x_goal_co-ordinate, y_goal_co-ordinate]
+        :param state: if not None, the state of the robot in map space.  the distance is then
+            only calculated as far from the goal as get_short_term_goal needs, and extended
+            there when the robot gets farther
         :type goal: list
         """
-        traversable_ma = ma.masked_values(self.traversable * 1, 0)
-        # print(f'traversable_ma zeros {np.count_nonzero(traversable_ma == 0)}')
-        goal_x, goal_y = round(goal[0]), round(goal[1])
-        traversable_ma[goal_y, goal_x] = 0
-        dd = skfmm.distance(traversable_ma, dx=1)
-        dd_mask = np.invert(np.isnan(ma.filled(dd, np.nan)))
-        # dd = ma.filled(dd, np.max(dd) + 1)
-        dd = ma.filled(dd, 10000)
-        self.fmm_dist = dd
+        goal = round(goal[0]), round(goal[1])
+        field = self.fields.pop(goal, None)
+        if state is None:
+            horizon = np.inf
+        else:
+            # the distance of the robot is at least the straight line, or what it was
+            x, y = round(state[0]), round(state[1])
+            horizon = np.hypot(goal[0] - x, goal[1] - y)
+            in_map = 0 <= y < self.traversable.shape[0] and 0 <= x < self.traversable.shape[1]
+            if field is not None and in_map and field[1][y, x] < field[2] - self.update_margin:
+                horizon = max(horizon, field[1][y, x])
+            horizon += self.horizon_margin
+        if field is None:
+            field = [self.traversable] + self.compute_distance(goal, horizon)
+        elif field[0] is not self.traversable or field[2] < horizon:
+            field = [self.traversable] + self.update_distance(goal, *field, horizon)
+        self.fields[goal] = field
+        while len(self.fields) > self.max_goals:
+            self.fields.popitem(last=False)
+        self.fmm_dist = field[1]
+        self.last_goal = goal
 
-        # print(f'fmm_dist.shape {self.fmm_dist.shape}')
+    def compute_distance(self, goal, horizon=np.inf):
+        """returns [the distance field from goal over the traversable map, horizon]"""
+        goal_x, goal_y = goal
+        if np.isinf(horizon):
+            r0, r1, c0, c1 = 0, self.traversable.shape[0], 0, self.traversable.shape[1]
+        else:
+            # cells within horizon of the goal
+            h = int(np.ceil(horizon)) + 1
+            r0, r1 = max(goal_y - h, 0), goal_y + h + 1
+            c0, c1 = max(goal_x - h, 0), goal_x + h + 1
+        traversable_ma = ma.masked_values(self.traversable[r0:r1, c0:c1] * 1, 0)
+        traversable_ma[goal_y - r0, goal_x - c0] = 0
+        dist = np.full(self.traversable.shape, UNREACHABLE, dtype=np.float64)
+        dd = skfmm.distance(traversable_ma, dx=1, narrow=0 if np.isinf(horizon) else horizon)
+        dist[r0:r1, c0:c1] = ma.filled(dd, UNREACHABLE)
+        return [dist, horizon]
+
+    def update_distance(self, goal, old_traversable, old_dist, old_horizon, horizon=None):
+        """
+        Updates the distance field old_dist, computed from goal up to old_horizon on
+        old_traversable, to the current traversable map and up to horizon (by default
+        old_horizon).  Only the cells at least as far from the goal as the changed cells,
+        or as the horizons, can change: fast marching is restarted from the level set of
+        old_dist just below them, over the cells within horizon.  returns
+        [the distance field, horizon]
+        """
+        if horizon is None:
+            horizon = old_horizon
+        margin = self.update_margin
+        level = min(old_horizon, horizon) - margin
+        if old_traversable is not self.traversable:
+            changed = old_traversable != self.traversable
+            rows = np.flatnonzero(changed.any(axis=1))
+        else:
+            rows = []
+        if len(rows) > 0:
+            cols = np.flatnonzero(changed.any(axis=0))
+            # the distance of the cells next to the changed ones bounds what can change
+            r0, r1 = max(rows[0] - margin, 0), rows[-1] + margin + 1
+            c0, c1 = max(cols[0] - margin, 0), cols[-1] + margin + 1
+            near = binary_dilation(changed[r0:r1, c0:c1], iterations=margin)
+            level = min(level, old_dist[r0:r1, c0:c1][near].min() - margin)
+        elif level >= horizon - margin:
+            return [old_dist, old_horizon]
+        goal_x, goal_y = goal
+        if level <= margin or not self.traversable[goal_y, goal_x]:
+            return self.compute_distance(goal, horizon)
+        # cells closer than level keep their distance
+        keep = old_dist < level
+        dist = np.where(keep, old_dist, UNREACHABLE)
+        if level >= UNREACHABLE - margin:
+            # the changes are out of reach of the goal
+            return [dist, horizon]
+
+        # fast marching runs from the contour old_dist == level, over the cells beyond it
+        # and a band of cells before it, for the contour to be interpolated from.  cells
+        # within horizon of the goal are within horizon - level of that band
+        band = keep & (old_dist >= level - margin - 1)
+        if not band.any():
+            # nothing beyond the contour can reach the goal anymore
+            return [dist, horizon]
+        if np.isinf(horizon):
+            h = 0
+            active = band | (~keep & self.traversable)
+        else:
+            h = int(np.ceil(horizon - level)) + 1
+            active = band
+        rows = np.flatnonzero(active.any(axis=1))
+        cols = np.flatnonzero(active.any(axis=0))
+        r0, r1 = max(rows[0] - h, 0), rows[-1] + h + 1
+        c0, c1 = max(cols[0] - h, 0), cols[-1] + h + 1
+        phi = old_dist[r0:r1, c0:c1] - level
+        update = ~keep[r0:r1, c0:c1]
+        phi[update] = np.maximum(phi[update], 1e-3)
+        mask = ~self.traversable[r0:r1, c0:c1] | (keep[r0:r1, c0:c1] & ~band[r0:r1, c0:c1])
+        # skfmm reads the buffers of its inputs as if they were contiguous
+        phi = ma.masked_array(phi, np.ascontiguousarray(mask))
+        narrow = 0 if np.isinf(horizon) else horizon - level
+        try:
+            dd = ma.filled(skfmm.distance(phi, dx=1, narrow=narrow) + level, UNREACHABLE)
+        except ValueError:
+            # no contour: nothing beyond it can reach the goal anymore
+            return [dist, horizon]
+        dist[r0:r1, c0:c1][update] = dd[update]
+        return [dist, horizon]
 
     def get_short_term_goal(self, state):
         """
@@ -44,27 +183,31 @@ class FMMPlanner(object):
         :rtype: list
         """
         state = [round(x) for x in state]
-        # print(f'get stg for state {state[1], state[0]}')
-        # pad the map with
-        # to handle corners pad the dist with step size and values equal to max
-        dist = np.pad(
-            self.fmm_dist, self.step_size, "constant", constant_values=self.fmm_dist.shape[0] ** 2
+        # take subset of distance around the start, cropped to the map
+        row_min = max(state[1] - self.step_size, 0)
+        col_min = max(state[0] - self.step_size, 0)
+        window = (
+            slice(row_min, max(state[1] + self.step_size + 1, 0)),
+            slice(col_min, max(state[0] + self.step_size + 1, 0)),
         )
-        # take subset of distance around the start
-        subset = dist[
-            state[1] + self.step_size - self.step_size : state[1] + 2 * self.step_size + 1,
-            state[0] + self.step_size - self.step_size : state[0] + 2 * self.step_size + 1,
-        ]
-
-        # print(f'subset.shape {subset.shape}')
+        field = self.fields.get(self.last_goal)
+        # extend the distance field until it covers the traversable cells around the start
+        while field is not None and field[1] is self.fmm_dist and not np.isinf(field[2]):
+            subset = self.fmm_dist[window]
+            if subset[self.traversable[window]].max(initial=0) < field[2] - self.update_margin:
+                break
+            horizon = field[2] + max(self.horizon_margin, field[2] / 2)
+            if horizon > np.hypot(*self.fmm_dist.shape):
+                # the rest of the window can't reach the goal
+                horizon = np.inf
+            field[1:] = self.update_distance(self.last_goal, *field, horizon)
+            self.fmm_dist = field[1]
+        subset = self.fmm_dist[window]
 
         # find the index which has minimum distance
-        np.set_printoptions(precision=3)
         (stg_y, stg_x) = np.unravel_index(np.argmin(subset), subset.shape)
-        # print(stg_y, stg_x, subset[stg_y][stg_x], self.step_size)
 
         # convert index from subset frame (return x,y)
-        sx = stg_x - self.step_size + state[0]
-        sy = stg_y - self.step_size + state[1]
-        # print(f'self.fmm_dist {self.fmm_dist[sy][sx], self.fmm_dist[state[1]][state[0]]}')
+        sx = stg_x + col_min
+        sy = stg_y + row_min
         return sx, sy
@@ -3,38 +3,92 @@ import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
-from slam_pkg.utils.depth_util import transform_pose, bin_points
+from slam_pkg.utils.depth_util import transform_pose
 from slam_pkg.utils import depth_util as du
+from slam_pkg.utils.tiled_map import TiledMap
 
 
 class MapBuilder(object):
-    def __init__(self, map_size_cm=4000, resolution=5, obs_thr=1, agent_min_z=5, agent_max_z=70):
+    def __init__(
+        self,
+        map_size_cm=4000,
+        resolution=5,
+        obs_thr=1,
+        agent_min_z=5,
+        agent_max_z=70,
+        tile_size=64,
+        log_odds_hit=1.0,
+        log_odds_miss=0.0,
+        log_odds_min=None,
+        log_odds_max=None,
+    ):
         """
+        the map is stored in tiles (see TiledMap) that are allocated as points fall in
+        them, so it grows with the explored area instead of being pre-sized.  map
+        locations (e.g. from real2map) index the dense view of the map, which covers
+        at least map_size_cm around the origin and all the allocated tiles; it only
+        grows past map_size_cm when points are seen outside of it.
+
+        the obstacle channel accumulates evidence for each cell: log_odds_hit for each
+        point in it, and log_odds_miss for each update where points below agent_min_z
+        (the floor) were seen in the cell and none in between agent_min_z and agent_max_z.
+        it is then clipped to [log_odds_min, log_odds_max].  the defaults count points,
+        with no decay.
+
         :param map_size_cm: size of map in cm, assumes square map
         :param resolution: resolution of map, 1 pix = resolution distance(in cm) in real world
         :param obs_thr: number of depth points to be in bin to considered it as obstacle
         :param agent_min_z: robot min z (in cm), depth points below this will be considered as free space
         :param agent_max_z: robot max z (in cm), depth points above this will be considered as free space
+        :param tile_size: number of cells on a side of a tile
+        :param log_odds_hit: obstacle evidence added per point
+        :param log_odds_miss: obstacle evidence added when the floor is seen in a cell
+        :param log_odds_min: lower bound on the obstacle evidence, None for no bound
+        :param log_odds_max: upper bound on the obstacle evidence, None for no bound
 
         :type map_size_cm: int
         :type resolution: int
         :type obs_thr: int
         :type agent_min_z: int
         :type agent_max_z: int
+        :type tile_size: int
+        :type log_odds_hit: float
+        :type log_odds_miss: float
+        :type log_odds_min: float
+        :type log_odds_max: float
         """
         self.map_size_cm = map_size_cm
         self.resolution = resolution
         self.obs_threshold = obs_thr
         self.z_bins = [agent_min_z, agent_max_z]
-
-        self.map = np.zeros(
-            (
-                int(self.map_size_cm // self.resolution),
-                int(self.map_size_cm // self.resolution),
-                len(self.z_bins) + 1,
-            ),
-            dtype=np.float32,
-        )
+        self.tile_size = tile_size
+        self.log_odds_hit = log_odds_hit
+        self.log_odds_miss = log_odds_miss
+        self.log_odds_min = log_odds_min
+        self.log_odds_max = log_odds_max
+        self.reset_map(map_size_cm)
+
+    @property
+    def map(self):
+        """the dense view of the map, see get_map"""
+        return self.tiles.dense(self.map_bounds())
+
+    def map_bounds(self):
+        """
+        returns the bounds (row_min, row_max, col_min, col_max) of the dense view, in
+        the cells of the tiles.  map location (x, y) is tile cell (y + row_min, x + col_min)
+        """
+        size = int(self.map_size_cm // self.resolution)
+        bounds = self.tiles.bounds()
+        if bounds is None:
+            return 0, size, 0, size
+        return min(bounds[0], 0), max(bounds[1], size), min(bounds[2], 0), max(bounds[3], size)
+
+    def pop_dirty(self):
+        """returns the keys of the tiles changed since the last call"""
+        dirty = self.dirty
+        self.dirty = set()
+        return dirty
 
     def update_map(self, pcd, pose=None):
         """
@@ -42,8 +96,8 @@ class MapBuilder(object):
         :param pcd: point cloud in global frame, in meter
 
         :type pcd: np.ndarray [num_points, 3]
-        :return: map of the environment, values [1-> obstacle, 0->free, unknown space]
-        :rtype: np.ndarray
+        :return: the keys of the tiles that were updated
+        :rtype: set
         """
 
         # convert point from m to cm
@@ -53,20 +107,37 @@ class MapBuilder(object):
         geocentric_pc_for_map = transform_pose(
             pcd, (self.map_size_cm / 2.0, self.map_size_cm / 2.0, np.pi / 2.0)
         )
-        geocentric_flat = bin_points(
-            geocentric_pc_for_map, self.map.shape[0], self.z_bins, self.resolution
-        )
-
-        self.map = self.map + geocentric_flat
-
-        map_gt = self.map[:, :, 1] / self.obs_threshold
-        map_gt[map_gt >= 0.5] = 1.0
-        map_gt[map_gt < 0.5] = 0.0
-
-        return map_gt
+        geocentric_pc_for_map = geocentric_pc_for_map[~np.isnan(geocentric_pc_for_map[:, 0])]
+        X_bin = np.round(geocentric_pc_for_map[:, 0] / self.resolution).astype(np.int64)
+        Y_bin = np.round(geocentric_pc_for_map[:, 1] / self.resolution).astype(np.int64)
+        Z_bin = np.digitize(geocentric_pc_for_map[:, 2], bins=self.z_bins)
+
+        T = self.tile_size
+        n_z_bins = len(self.z_bins) + 1
+        updated = set()
+        for key, idx, rows, cols in self.tiles.group_by_tile(Y_bin, X_bin):
+            tile = self.tiles.tile(key)
+            counts = np.bincount(
+                (rows * T + cols) * n_z_bins + Z_bin[idx], minlength=T * T * n_z_bins
+            ).reshape(T, T, n_z_bins)
+            tile[:, :, 0] += counts[:, :, 0]
+            tile[:, :, 2:] += counts[:, :, 2:]
+            evidence = tile[:, :, 1]
+            evidence += self.log_odds_hit * counts[:, :, 1]
+            if self.log_odds_miss != 0:
+                evidence[(counts[:, :, 1] == 0) & (counts[:, :, 0] > 0)] += self.log_odds_miss
+            if self.log_odds_min is not None or self.log_odds_max is not None:
+                np.clip(evidence, self.log_odds_min, self.log_odds_max, out=evidence)
+            updated.add(key)
+        self.dirty |= updated
+        return updated
 
     def add_obstacle(self, location):
-        self.map[round(location[1]), round(location[0]), 1] = 1
+        row_min, _, col_min, _ = self.map_bounds()
+        row, col = round(location[1]) + row_min, round(location[0]) + col_min
+        key = (row // self.tile_size, col // self.tile_size)
+        self.tiles.tile(key)[row % self.tile_size, col % self.tile_size, 1] = 1
+        self.dirty.add(key)
 
     def reset_map(self, map_size, z_bins=None, obs_thr=None):
         """
@@ -80,21 +151,17 @@ class MapBuilder(object):
         if obs_thr is not None:
             self.obs_threshold = obs_thr
 
-        self.map = np.zeros(
-            (
-                self.map_size_cm // self.resolution,
-                self.map_size_cm // self.resolution,
-                len(self.z_bins) + 1,
-            ),
-            dtype=np.float32,
-        )
+        self.tiles = TiledMap(self.tile_size, channels=(len(self.z_bins) + 1,), dtype=np.float32)
+        # keys of the tiles changed since the last pop_dirty
+        self.dirty = set()
 
     def get_map(self):
         """
         returns the map of the environment
         :return: 3 channel map of the environment, value [channel 1: points below agent_min_z,
         channel 2: points in between agent_min_z & agent_max_z, channel 3: points above agent_max_z ]
-        :rtype: np.ndarray dim:[map_size, map_size, 3]
+        :rtype: np.ndarray dim:[map_size, map_size, 3], larger if points were seen outside
+        of map_size (see map_bounds)
         """
         return self.map
 
@@ -117,7 +184,9 @@ class MapBuilder(object):
         )
         map_loc /= self.resolution
         map_loc = map_loc.reshape(3)
-        return tuple(map_loc[:2])
+        # to the dense view
+        row_min, _, col_min, _ = self.map_bounds()
+        return (map_loc[0] - col_min, map_loc[1] - row_min)
 
     def map2real(self, loc):
         """
@@ -130,12 +199,14 @@ class MapBuilder(object):
         :rtype: list [x_real_world, y_real_world]
         """
         # converts map location to real location
-        loc = np.array([loc[0], loc[1], 0])
+        row_min, _, col_min, _ = self.map_bounds()
+        loc = np.array([loc[0] + col_min, loc[1] + row_min, 0])
+        size = self.map_size_cm / self.resolution
         real_loc = du.transform_pose(
             loc,
             (
-                -self.map.shape[0] / 2.0,
-                self.map.shape[1] / 2.0,
+                -size / 2.0,
+                size / 2.0,
                 -np.pi / 2.0,
             ),
         )
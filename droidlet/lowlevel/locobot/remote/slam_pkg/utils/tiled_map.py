@@ -0,0 +1,138 @@
+import numpy as np
+
+
+class TiledMap(object):
+    def __init__(self, tile_size=64, channels=(), dtype=np.float32, fill=0):
+        """
+        2D grid of cells stored as square tiles that are allocated the first time they
+        are written to, so only the explored part of an unbounded map takes memory.
+        cells are indexed by (row, column), which can be negative; tile (ti, tj) holds
+        the cells tile_size * ti <= row < tile_size * (ti + 1), and the same for columns.
+        cells of tiles that were never written read as fill.
+
+        :param tile_size: number of cells on a side of a tile
+        :param channels: shape of each cell, e.g. (3,) for 3 values per cell
+        :param dtype: dtype of the cells
+        :param fill: value of the cells that were never written
+
+        :type tile_size: int
+        :type channels: tuple
+        """
+        self.tile_size = tile_size
+        self.channels = tuple(channels)
+        self.dtype = np.dtype(dtype)
+        self.fill = fill
+        # (ti, tj) -> (tile_size, tile_size) + channels array
+        self.tiles = {}
+
+    def __contains__(self, key):
+        return key in self.tiles
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def keys(self):
+        return self.tiles.keys()
+
+    def tile(self, key, create=True):
+        """
+        returns the array of tile key, allocating it if create is True, else None if
+        it was never written
+        """
+        tile = self.tiles.get(key)
+        if tile is None and create:
+            tile = np.full(
+                (self.tile_size, self.tile_size) + self.channels, self.fill, dtype=self.dtype
+            )
+            self.tiles[key] = tile
+        return tile
+
+    def tile_keys(self, rows, cols):
+        """returns the tile (ti, tj) of each cell, as two int arrays"""
+        return np.floor_divide(rows, self.tile_size), np.floor_divide(cols, self.tile_size)
+
+    def group_by_tile(self, rows, cols):
+        """
+        splits cells by tile
+        :return: a list of ((ti, tj), index of the cells in that tile, their rows in
+        the tile, their columns in the tile)
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        if rows.size == 0:
+            return []
+        ti, tj = self.tile_keys(rows, cols)
+        # one int per tile, to group with a 1d unique
+        ti_min, tj_min = ti.min(), tj.min()
+        width = tj.max() - tj_min + 1
+        flat = (ti - ti_min) * width + (tj - tj_min)
+        out = []
+        for k in np.flatnonzero(np.bincount(flat)):
+            idx = np.flatnonzero(flat == k)
+            key_i, key_j = divmod(int(k), int(width))
+            key_i, key_j = key_i + int(ti_min), key_j + int(tj_min)
+            out.append(
+                (
+                    (key_i, key_j),
+                    idx,
+                    rows[idx] - key_i * self.tile_size,
+                    cols[idx] - key_j * self.tile_size,
+                )
+            )
+        return out
+
+    def bounds(self):
+        """
+        returns (row_min, row_max, col_min, col_max) of the allocated tiles, max excluded,
+        or None if no tile was allocated
+        """
+        if not self.tiles:
+            return None
+        keys = np.array(list(self.tiles.keys()))
+        lo = keys.min(axis=0) * self.tile_size
+        hi = (keys.max(axis=0) + 1) * self.tile_size
+        return int(lo[0]), int(hi[0]), int(lo[1]), int(hi[1])
+
+    def window(self, row_min, row_max, col_min, col_max):
+        """returns a copy of the cells row_min <= row < row_max, col_min <= col < col_max"""
+        out = np.full(
+            (row_max - row_min, col_max - col_min) + self.channels, self.fill, dtype=self.dtype
+        )
+        T = self.tile_size
+        for ti in range(row_min // T, -(-row_max // T)):
+            for tj in range(col_min // T, -(-col_max // T)):
+                tile = self.tiles.get((ti, tj))
+                if tile is None:
+                    continue
+                r0, r1 = max(row_min, ti * T), min(row_max, (ti + 1) * T)
+                c0, c1 = max(col_min, tj * T), min(col_max, (tj + 1) * T)
+                out[r0 - row_min : r1 - row_min, c0 - col_min : c1 - col_min] = tile[
+                    r0 - ti * T : r1 - ti * T, c0 - tj * T : c1 - tj * T
+                ]
+        return out
+
+    def set_window(self, row_min, col_min, values):
+        """
+        writes values to the cells starting at (row_min, col_min).  tiles that were
+        never written are only allocated if some of their new cells are not fill
+        """
+        T = self.tile_size
+        row_max, col_max = row_min + values.shape[0], col_min + values.shape[1]
+        for ti in range(row_min // T, -(-row_max // T)):
+            for tj in range(col_min // T, -(-col_max // T)):
+                r0, r1 = max(row_min, ti * T), min(row_max, (ti + 1) * T)
+                c0, c1 = max(col_min, tj * T), min(col_max, (tj + 1) * T)
+                src = values[r0 - row_min : r1 - row_min, c0 - col_min : c1 - col_min]
+                tile = self.tile((ti, tj), create=not (src == self.fill).all())
+                if tile is not None:
+                    tile[r0 - ti * T : r1 - ti * T, c0 - tj * T : c1 - tj * T] = src
+
+    def dense(self, bounds=None):
+        """
+        returns the cells within bounds (row_min, row_max, col_min, col_max) as one
+        array, by default the bounds of the allocated tiles
+        """
+        bounds = bounds or self.bounds()
+        if bounds is None:
+            return np.zeros((0, 0) + self.channels, dtype=self.dtype)
+        return self.window(*bounds)
@@ -4,7 +4,9 @@ import time
 import numpy as np
 import Pyro4
 import select
+from collections import deque
 from slam_pkg.utils.map_builder import MapBuilder as mb
+from slam_pkg.utils.tiled_map import TiledMap
 from slam_pkg.utils import depth_util as du
 from skimage.morphology import disk, binary_dilation
 from rich import print
@@ -26,6 +28,12 @@ class SLAM(object):
         agent_min_z=5,
         agent_max_z=70,
         obstacle_threshold=1,
+        max_map_changes=200,
+        tile_size=64,
+        log_odds_hit=1.0,
+        log_odds_miss=0.0,
+        log_odds_min=None,
+        log_odds_max=None,
     ):
         self.robot = robot
         self.robot_rad = robot_rad
@@ -36,6 +44,11 @@ class SLAM(object):
             agent_min_z=agent_min_z,
             agent_max_z=agent_max_z,
             obs_thr=obstacle_threshold,
+            tile_size=tile_size,
+            log_odds_hit=log_odds_hit,
+            log_odds_miss=log_odds_miss,
+            log_odds_min=log_odds_min,
+            log_odds_max=log_odds_max,
         )
         self.map_size = map_size
         # if the map is a previous map loaded from disk, and
@@ -50,11 +63,33 @@ class SLAM(object):
         self.init_state = (0.0, 0.0, 0.0)
         self.prev_bot_state = (0.0, 0.0, 0.0)
 
+        # the obstacle map is versioned so clients can fetch only what changed,
+        # see get_map_changes.  each entry of map_changes is
+        # (version, (N, 2) TiledMap cells of new obstacles, (M, 2) cells of removed obstacles).
+        # versions start at the start time in ms, so that the versions of a restarted
+        # service are not confused with the ones clients got before the restart
+        self.map_version = int(time.time() * 1000)
+        self.map_changes = deque(maxlen=max_map_changes)
+        self.selem = disk(self.robot_rad / self.map_builder.resolution)
+        self.reset_tiles()
+
         self.update_map()
         assert self.traversable is not None
 
+    @property
+    def traversable(self):
+        return self.get_traversable_map()
+
     def get_traversable_map(self):
-        return self.traversable
+        return self.traversable_tiles.dense(self.map_builder.map_bounds())
+
+    def get_versioned_traversable_map(self, since_version=None):
+        """returns (version, traversable map), with None instead of the map if it is the
+        same as at since_version, a version returned before"""
+        version = (self.map_version, self.map_builder.map_bounds())
+        if version == since_version:
+            return version, None
+        return version, self.get_traversable_map()
 
     def real2map(self, real):
         return self.map_builder.real2map(real)
@@ -90,78 +125,192 @@ class SLAM(object):
         if not in_map:
             location = self.real2map(location)
         self.map_builder.add_obstacle(location)
+        self.update_traversable(self.update_obstacles(self.map_builder.pop_dirty()))
 
     def update_map(self):
         pcd = safe_call(self.robot.get_current_pcd)[0]
         self.map_builder.update_map(pcd)
+        self.update_traversable(self.update_obstacles(self.map_builder.pop_dirty()))
 
-        # explore the map by robot shape
-        obstacle = self.map_builder.map[:, :, 1] >= 1.0
-        selem = disk(self.robot_rad / self.map_builder.resolution)
-        traversable = binary_dilation(obstacle, selem) != True
-        self.traversable = traversable
+    def update_traversable(self, changed):
+        """recomputes the traversable cells near the tiles where obstacles changed"""
+        # explore the map by robot shape, only where obstacles changed: the cells
+        # within pad of a changed tile depend on the obstacles within 2 * pad of it
+        pad = self.selem.shape[0] // 2
+        T = self.map_builder.tile_size
+        for ti, tj in changed:
+            obstacle = self.obstacle_tiles.window(
+                ti * T - 2 * pad, (ti + 1) * T + 2 * pad, tj * T - 2 * pad, (tj + 1) * T + 2 * pad
+            )
+            traversable = binary_dilation(obstacle, self.selem) != True
+            traversable = traversable[pad : pad + T + 2 * pad, pad : pad + T + 2 * pad]
+            self.traversable_tiles.set_window(ti * T - pad, tj * T - pad, traversable)
 
     def get_map_resolution(self):
         return self.map_resolution
 
     def get_map(self):
         """returns the location of obstacles created by slam only for the obstacles,"""
-        # get the index correspnding to obstacles
-        indices = np.where(self.map_builder.map[:, :, 1] >= 1.0)
+        cells = self.get_obstacle_cells()
+        if len(cells) == 0:
+            return []
         # convert them into robot frame
-        real_world_locations = [
-            self.map2real([indice[0], indice[1]]).tolist()
-            for indice in zip(indices[0], indices[1])
+        map2real = self.get_map2real()
+        return (cells @ map2real[:, :2].T + map2real[:, 2]).tolist()
+
+    def get_map2real(self):
+        """returns the (2, 3) affine transform taking a (row, column) of the map to its
+        location in the robot frame: loc = map2real[:, :2] @ idx + map2real[:, 2]
+        """
+        # map2real takes (column, row), see MapBuilder.real2map
+        origin = self.map2real([0, 0])
+        return np.stack(
+            [self.map2real([0, 1]) - origin, self.map2real([1, 0]) - origin, origin], axis=1
+        )
+
+    def get_obstacle_cells(self):
+        """returns the (row, column) in the map of every obstacle, as an (N, 2) int32 array"""
+        cells = [
+            np.argwhere(tile) + np.array(key) * self.obstacle_tiles.tile_size
+            for key, tile in self.obstacle_tiles.tiles.items()
         ]
-        return real_world_locations
+        if not cells:
+            return np.zeros((0, 2), dtype=np.int32)
+        row_min, _, col_min, _ = self.map_builder.map_bounds()
+        return (np.concatenate(cells) - [row_min, col_min]).astype(np.int32)
+
+    def update_obstacles(self, keys):
+        """
+        recomputes which cells of the tiles keys are obstacles, and bumps the map version
+        if any changed.  returns the keys of the tiles where obstacles changed
+        """
+        changed = []
+        added = []
+        removed = []
+        T = self.obstacle_tiles.tile_size
+        for key in keys:
+            obstacles = self.map_builder.tiles.tile(key)[:, :, 1] >= 1.0
+            old = self.obstacle_tiles.tile(key, create=False)
+            if old is None:
+                if not obstacles.any():
+                    continue
+                old = self.obstacle_tiles.tile(key)
+            diff = obstacles != old
+            if not diff.any():
+                continue
+            cells = np.argwhere(diff)
+            is_obstacle = obstacles[diff]
+            cells += np.array(key) * T
+            added.append(cells[is_obstacle])
+            removed.append(cells[~is_obstacle])
+            old[:] = obstacles
+            changed.append(key)
+        if changed:
+            self.map_version += 1
+            self.map_changes.append(
+                (
+                    self.map_version,
+                    np.concatenate(added).astype(np.int32),
+                    np.concatenate(removed).astype(np.int32),
+                )
+            )
+        return changed
+
+    def get_map_changes(self, since_version=-1):
+        """returns the obstacle cells that changed after since_version, as a dict with
+        "version": the current map version, to pass as since_version next time
+        "full": if True, "added" are all the current obstacles and the client should
+            clear its copy first.  this happens when since_version is -1, older than
+            the changes kept, or newer than the current version (the service was
+            restarted since the client's last call)
+        "added": (N, 2) int32 array with the (row, column) map index of each new obstacle
+        "removed": (M, 2) int32 array of the cells that are not obstacles anymore
+        "map2real": (2, 3) affine transform from a (row, column) to its location in
+            the robot frame, as returned by get_map, see get_map2real
+        """
+        oldest = self.map_changes[0][0] if self.map_changes else self.map_version + 1
+        full = since_version < 0 or since_version + 1 < oldest or since_version > self.map_version
+        if full:
+            added = self.get_obstacle_cells()
+            removed = np.zeros((0, 2), dtype=np.int32)
+        else:
+            # net change over the versions after since_version
+            state = {}
+            for version, new, gone in self.map_changes:
+                if version > since_version:
+                    state.update(dict.fromkeys(map(tuple, gone.tolist()), False))
+                    state.update(dict.fromkeys(map(tuple, new.tolist()), True))
+            cells = np.array(list(state.keys()), dtype=np.int32).reshape(-1, 2)
+            is_obstacle = np.fromiter(state.values(), dtype=bool, count=len(state))
+            # from tile cells to the map
+            row_min, _, col_min, _ = self.map_builder.map_bounds()
+            cells -= np.array([row_min, col_min], dtype=np.int32)
+            added, removed = cells[is_obstacle], cells[~is_obstacle]
+        return {
+            "version": self.map_version,
+            "full": full,
+            "added": added,
+            "removed": removed,
+            "map2real": self.get_map2real(),
+        }
+
+    def reset_tiles(self):
+        T = self.map_builder.tile_size
+        self.obstacle_tiles = TiledMap(T, dtype=bool, fill=False)
+        self.traversable_tiles = TiledMap(T, dtype=bool, fill=True)
 
     def reset_map(self, z_bins=None, obs_thr=None):
         self.map_builder.reset_map(self.map_size, z_bins=z_bins, obs_thr=obs_thr)
+        # clients get the full (empty) map on their next get_map_changes
+        self.map_version += 1
+        self.map_changes.clear()
+        self.reset_tiles()
 
 
-robot_ip = os.getenv("LOCOBOT_IP")
-ip = os.getenv("LOCAL_IP")
-robot_name = "remotelocobot"
-if len(sys.argv) > 1:
-    robot_name = sys.argv[1]
-with Pyro4.Daemon(ip) as daemon:
-    robot = Pyro4.Proxy("PYRONAME:" + robot_name + "@" + robot_ip)
-
-    if robot_name == "hello_realsense":
-        robot_height = 141  # cm
-        min_z = 20  # because of the huge spatial variance in realsense readings
-        max_z = robot_height + 5  # cm
-        obj = SLAM(
-            robot,
-            obstacle_threshold=10,
-            agent_min_z=min_z,
-            agent_max_z=max_z,
-        )
-    else:
-        obj = SLAM(robot)
-    obj_uri = daemon.register(obj)
-    with Pyro4.locateNS(host=robot_ip) as ns:
-        ns.register("slam", obj_uri)
-
-    print("SLAM Server is started...")
-
-    def refresh():
-        obj.update_map()
-        # print("In refresh: ", time.asctime())
-        return True
-
-    daemon.requestLoop(refresh)
-
-    # visit this later
-    # try:
-    #     while True:
-    #         print(time.asctime(), "Waiting for requests...")
-
-    #         sockets = daemon.sockets
-    #         ready_socks = select.select(sockets, [], [], 0)
-    #         events = []
-    #         for s in ready_socks:
-    #             events.append(s)
-    #         daemon.events(events)
-    # except KeyboardInterrupt:
-    #     pass
+if __name__ == "__main__":
+    robot_ip = os.getenv("LOCOBOT_IP")
+    ip = os.getenv("LOCAL_IP")
+    robot_name = "remotelocobot"
+    if len(sys.argv) > 1:
+        robot_name = sys.argv[1]
+    with Pyro4.Daemon(ip) as daemon:
+        robot = Pyro4.Proxy("PYRONAME:" + robot_name + "@" + robot_ip)
+
+        if robot_name == "hello_realsense":
+            robot_height = 141  # cm
+            min_z = 20  # because of the huge spatial variance in realsense readings
+            max_z = robot_height + 5  # cm
+            obj = SLAM(
+                robot,
+                obstacle_threshold=10,
+                agent_min_z=min_z,
+                agent_max_z=max_z,
+            )
+        else:
+            obj = SLAM(robot)
+        obj_uri = daemon.register(obj)
+        with Pyro4.locateNS(host=robot_ip) as ns:
+            ns.register("slam", obj_uri)
+
+        print("SLAM Server is started...")
+
+        def refresh():
+            obj.update_map()
+            # print("In refresh: ", time.asctime())
+            return True
+
+        daemon.requestLoop(refresh)
+
+        # visit this later
+        # try:
+        #     while True:
+        #         print(time.asctime(), "Waiting for requests...")
+
+        #         sockets = daemon.sockets
+        #         ready_socks = select.select(sockets, [], [], 0)
+        #         events = []
+        #         for s in ready_socks:
+        #             events.append(s)
+        #         daemon.events(events)
+        # except KeyboardInterrupt:
+        #     pass
@@ -0,0 +1,150 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+Measures the planner calls per second of the navigation loop of Planner.get_short_term_goal
+(update the traversable map, set the goal, get the short term goal, then move the robot
+there) on a cluttered map, for the previous FMMPlanner (a new planner and a full distance
+field every call, kept here as the reference) and for the FMMPlanner with cached and
+incrementally updated distance fields.  Scenarios:
+    static: the map does not change
+    local: a few obstacles appear in front of the robot at every call, as it sees them
+    goals: the map does not change and the calls cycle through a few goals, like the
+        Trackback of the navigation service
+
+    python -m droidlet.lowlevel.locobot.tests.benchmarks.benchmark_fmm_planner
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import skfmm
+from numpy import ma
+
+# like the remote services, which run from the remote directory; the remote package
+# itself needs pyrobot
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../remote"))
+from slam_pkg.utils.fmm_planner import FMMPlanner
+
+SCENARIOS = ["static", "local", "goals"]
+
+
+class ReferenceFMMPlanner(object):
+    """FMMPlanner before the distance fields were cached"""
+
+    def __init__(self, traversable, step_size=5):
+        self.step_size = step_size
+        self.traversable = traversable
+
+    def set_goal(self, goal):
+        traversable_ma = ma.masked_values(self.traversable * 1, 0)
+        goal_x, goal_y = round(goal[0]), round(goal[1])
+        traversable_ma[goal_y, goal_x] = 0
+        dd = skfmm.distance(traversable_ma, dx=1)
+        self.fmm_dist = ma.filled(dd, 10000)
+
+    def get_short_term_goal(self, state):
+        state = [round(x) for x in state]
+        dist = np.pad(
+            self.fmm_dist, self.step_size, "constant", constant_values=self.fmm_dist.shape[0] ** 2
+        )
+        subset = dist[
+            state[1] : state[1] + 2 * self.step_size + 1,
+            state[0] : state[0] + 2 * self.step_size + 1,
+        ]
+        (stg_y, stg_x) = np.unravel_index(np.argmin(subset), subset.shape)
+        return stg_x - self.step_size + state[0], stg_y - self.step_size + state[1]
+
+
+def cluttered_map(rng, size, num_boxes):
+    traversable = np.ones((size, size), dtype=bool)
+    for _ in range(num_boxes):
+        r, c = rng.randint(0, size - size // 20, size=2)
+        h, w = rng.randint(size // 160, size // 20, size=2)
+        traversable[r : r + h, c : c + w] = False
+    return traversable
+
+
+def free_cell(rng, traversable):
+    while True:
+        x, y = rng.randint(0, traversable.shape[0], size=2)
+        if traversable[y, x]:
+            return x, y
+
+
+class Planners:
+    """calls a planner the way Planner.get_short_term_goal does"""
+
+    def __init__(self, reference, traversable, step_size):
+        self.reference = reference
+        self.step_size = step_size
+        self.planner = None
+        self.version = 0
+        self.traversable = traversable
+
+    def update_map(self, traversable):
+        self.version += 1
+        self.traversable = traversable
+
+    def get_short_term_goal(self, state, goal):
+        if self.reference:
+            planner = ReferenceFMMPlanner(self.traversable, step_size=self.step_size)
+        else:
+            if self.planner is None:
+                self.planner = FMMPlanner(self.traversable, step_size=self.step_size)
+            self.planner.set_traversable(self.traversable, version=self.version)
+            self.planner.set_goal(goal, state)
+            return self.planner.get_short_term_goal(state)
+        planner.set_goal(goal)
+        return planner.get_short_term_goal(state)
+
+
+def run(size, num_calls, step_size, scenario, reference, seed=0):
+    rng = np.random.RandomState(seed)
+    traversable = cluttered_map(rng, size, num_boxes=size // 10)
+    goals = [free_cell(rng, traversable) for _ in range(4 if scenario == "goals" else 1)]
+    state = free_cell(rng, traversable)
+    planners = Planners(reference, traversable, step_size)
+    times = []
+    for i in range(num_calls + 1):
+        goal = goals[i % len(goals)]
+        if scenario == "local":
+            # a small obstacle a few steps ahead of the robot, towards the goal
+            traversable = traversable.copy()
+            heading = np.subtract(goal, state) / max(np.hypot(*np.subtract(goal, state)), 1)
+            x, y = np.round(state + 4 * step_size * heading + rng.randint(-8, 8, size=2))
+            x, y = int(np.clip(x, 0, size - 4)), int(np.clip(y, 0, size - 4))
+            if (x, y) != goal:
+                traversable[y : y + 3, x : x + 3] = False
+            planners.update_map(traversable)
+        start = time.perf_counter()
+        stg = planners.get_short_term_goal(state, goal)
+        if i > 0:
+            # the first call computes the distance field of the goal in both cases
+            times.append(time.perf_counter() - start)
+        if scenario != "goals":
+            state = stg
+    return np.array(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=800, help="map size in cells")
+    parser.add_argument("--num_calls", type=int, default=50)
+    parser.add_argument("--step_size", type=int, default=5)
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS)
+    args = parser.parse_args()
+
+    for scenario in args.scenarios:
+        for reference in [True, False]:
+            t = run(args.size, args.num_calls, args.step_size, scenario, reference)
+            print(
+                "{:>7} {:>9}: {:8.1f} calls/s (mean {:.2f} ms, p90 {:.2f} ms)".format(
+                    scenario,
+                    "reference" if reference else "cached",
+                    1 / t.mean(),
+                    1000 * t.mean(),
+                    1000 * np.percentile(t, 90),
+                )
+            )
@@ -0,0 +1,205 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+Measures the frames per second LoCoBotMover.get_rgb_depth can fetch from a fake
+robot Pyro server running in another process, for the previous transport (pickled
+raw arrays, with the point cloud computed eagerly, kept here as the reference) and
+for each frame transport setting: codecs, or shared memory.  Each setting is timed
+with the point cloud left lazy and with it materialized.  Loopback is much faster
+than a real link, so the fps at --bandwidth_mbps is also estimated from the bytes
+sent per frame.
+
+    python -m droidlet.lowlevel.locobot.tests.benchmarks.benchmark_frame_transport
+"""
+import argparse
+import copy
+import functools
+import multiprocessing as mp
+import pickle
+import time
+
+import numpy as np
+import Pyro4
+
+from droidlet.lowlevel.frame_transport import FrameDecoder, FrameEncoder
+from droidlet.lowlevel.robot_mover_utils import compute_pts_in_world, transform_pose
+from droidlet.shared_data_structs import RGBDepth
+
+Pyro4.config.SERIALIZER = "pickle"
+Pyro4.config.SERIALIZERS_ACCEPTED.add("pickle")
+Pyro4.config.PICKLE_PROTOCOL_VERSION = 4
+
+# (name, get_encoded_pcd_data kwargs)
+SETTINGS = [
+    ("raw", dict(rgb_codec="raw", depth_codec="raw")),
+    ("jpeg+zlib", dict(rgb_codec="jpeg", depth_codec="zlib", depth_scale=1000.0)),
+    ("webp+png", dict(rgb_codec="webp", depth_codec="png", depth_scale=1000.0)),
+    ("jpeg+zstd", dict(rgb_codec="jpeg", depth_codec="zstd", depth_scale=1000.0)),
+    ("shm", dict(use_shm=True)),
+]
+
+
+def fake_frame(rng, height, width):
+    """a habitat-like frame: flat colored walls and boxes with a little noise, and
+    depth that is smooth within each surface"""
+    rows, cols = np.mgrid[0:height, 0:width]
+    rgb = np.empty((height, width, 3), dtype=np.float32)
+    rgb[:] = rng.randint(60, 200, size=3)
+    depth = 2.0 + 3.0 * rows / height
+    for _ in range(6):
+        y0, x0 = rng.randint(0, height - height // 4), rng.randint(0, width - width // 4)
+        h, w = rng.randint(height // 10, height // 4, size=2)
+        rgb[y0 : y0 + h, x0 : x0 + w] = rng.randint(0, 256, size=3)
+        depth[y0 : y0 + h, x0 : x0 + w] = (
+            rng.uniform(0.5, 2.0) + 0.1 * cols[0, x0 : x0 + w] / width
+        )
+    rgb += rng.normal(0, 3, size=rgb.shape)
+    return np.clip(rgb, 0, 255).astype(np.uint8), depth.astype(np.float32)
+
+
+@Pyro4.expose
+class FakeRobot:
+    """serves the same few frames over and over, like RemoteLocobot"""
+
+    def __init__(self, height, width, num_frames=4):
+        rng = np.random.RandomState(0)
+        self.frames = [fake_frame(rng, height, width) for _ in range(num_frames)]
+        self.count = 0
+        self.frame_encoder = FrameEncoder()
+        f = width / 2
+        self.intrinsics = np.array([[f, 0, width / 2], [0, f, height / 2], [0, 0, 1]])
+        self.rot = np.eye(3)
+        self.trans = np.array([0.0, 0.0, 0.6])
+        self.running = True
+
+    def shutdown(self):
+        self.running = False
+
+    def get_intrinsics(self):
+        return self.intrinsics
+
+    def get_pcd_data(self):
+        rgb, depth = self.frames[self.count % len(self.frames)]
+        self.count += 1
+        # the habitat camera returns new arrays each time
+        return rgb.copy(), depth.copy(), self.rot, self.trans, (0.5, 0.2, 0.3)
+
+    def get_encoded_pcd_data(
+        self, rgb_codec="raw", depth_codec="raw", depth_scale=None, quality=80, use_shm=False
+    ):
+        rgb, depth, rot, trans, base_state = self.get_pcd_data()
+        frame = self.frame_encoder.encode(
+            rgb,
+            depth,
+            rgb_codec=rgb_codec,
+            depth_codec=depth_codec,
+            depth_scale=depth_scale,
+            quality=quality,
+            use_shm=use_shm,
+        )
+        return frame, rot, trans, base_state
+
+
+def serve(height, width, uri_queue):
+    robot = FakeRobot(height, width)
+    with Pyro4.Daemon("127.0.0.1") as daemon:
+        uri_queue.put(str(daemon.register(robot)))
+        daemon.requestLoop(lambda: robot.running)
+    robot.frame_encoder.close()
+
+
+def reference_get_rgb_depth(bot, uv_one_in_cam):
+    """LoCoBotMover.get_rgb_depth before frame transport.  also returns what was sent"""
+    rgb, depth, rot, trans, base_state = bot.get_pcd_data()
+    depth = depth.astype(np.float32)
+    d = copy.deepcopy(depth)
+    depth = depth.reshape(-1)
+    pts_in_cam = np.multiply(uv_one_in_cam, depth)
+    pts_in_cam = np.concatenate((pts_in_cam, np.ones((1, pts_in_cam.shape[1]))), axis=0)
+    pts = pts_in_cam[:3, :].T
+    pts = np.dot(pts, rot.T)
+    pts = pts + trans.reshape(-1)
+    ros_to_habitat_frame = np.array([[0.0, -1.0, 0.0], [0.0, 0.0, -1.0], [1.0, 0.0, 0.0]])
+    pts = ros_to_habitat_frame.T @ pts.T
+    pts = pts.T
+    pts = transform_pose(pts, base_state)
+    return RGBDepth(rgb, d, pts), (rgb, depth, rot, trans, base_state)
+
+
+def get_rgb_depth(bot, decoder, intrinsic_mat, **kwargs):
+    """LoCoBotMover.get_rgb_depth.  also returns what was sent, to measure its size"""
+    frame, rot, trans, base_state = bot.get_encoded_pcd_data(**kwargs)
+    rgb, depth = decoder.decode(frame)
+    depth = depth.astype(np.float32, copy=False)
+    pts = functools.partial(
+        compute_pts_in_world, depth, rot, trans, base_state, intrinsic_mat, "habitat"
+    )
+    return RGBDepth(rgb, depth, pts), (frame, rot, trans, base_state)
+
+
+def run(height, width, num_frames, settings):
+    uri_queue = mp.Queue()
+    server = mp.Process(target=serve, args=(height, width, uri_queue), daemon=True)
+    server.start()
+    bot = Pyro4.Proxy(uri_queue.get())
+    decoder = FrameDecoder()
+    try:
+        intrinsic_mat = np.asarray(bot.get_intrinsics())
+        uv_one_in_cam = np.linalg.inv(intrinsic_mat) @ np.concatenate(
+            (np.mgrid[0:height, 0:width][::-1].reshape(2, -1), np.ones((1, height * width)))
+        )
+        fetchers = [("reference", functools.partial(reference_get_rgb_depth, bot, uv_one_in_cam))]
+        for name, kwargs in SETTINGS:
+            if name in settings:
+                fetchers.append(
+                    (name, functools.partial(get_rgb_depth, bot, decoder, intrinsic_mat, **kwargs))
+                )
+        results = []
+        for name, fetch in fetchers:
+            for materialize in [False, True]:
+                fetch()  # warm up
+                times = []
+                for _ in range(num_frames):
+                    start = time.perf_counter()
+                    rgb_depth, sent = fetch()
+                    if materialize:
+                        rgb_depth.ptcloud
+                    times.append(time.perf_counter() - start)
+                results.append((name, materialize, np.array(times), len(pickle.dumps(sent))))
+    finally:
+        decoder.close()
+        bot.shutdown()
+        server.join()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--num_frames", type=int, default=50)
+    parser.add_argument(
+        "--settings",
+        nargs="+",
+        default=[name for name, _ in SETTINGS],
+        help="zstd needs blosc installed",
+    )
+    parser.add_argument("--bandwidth_mbps", type=float, default=100.0)
+    args = parser.parse_args()
+
+    results = run(args.height, args.width, args.num_frames, args.settings)
+    for name, materialize, t, num_bytes in results:
+        transfer = num_bytes * 8 / (args.bandwidth_mbps * 1e6)
+        print(
+            "{:>10} {:>9}: {:6.1f} fps (mean {:.2f} ms, p90 {:.2f} ms), {:5.0f} KB/frame, "
+            "~{:.1f} fps at {:.0f} Mbit/s".format(
+                name,
+                "ptcloud" if materialize else "lazy",
+                1 / t.mean(),
+                1000 * t.mean(),
+                1000 * np.percentile(t, 90),
+                num_bytes / 1024,
+                1 / (t.mean() + transfer),
+                args.bandwidth_mbps,
+            )
+        )
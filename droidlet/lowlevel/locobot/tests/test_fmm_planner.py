@@ -0,0 +1,100 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# like the remote services, which run from the remote directory
+sys.path.append(os.path.join(os.path.dirname(__file__), "../remote"))
+from slam_pkg.utils.fmm_planner import FMMPlanner
+
+
+def cluttered_map(rng, size, num_boxes):
+    traversable = np.ones((size, size), dtype=bool)
+    for _ in range(num_boxes):
+        r, c = rng.randint(0, size - size // 10, size=2)
+        h, w = rng.randint(2, size // 10, size=2)
+        traversable[r : r + h, c : c + w] = False
+    return traversable
+
+
+def free_cell(rng, traversable):
+    while True:
+        x, y = rng.randint(0, traversable.shape[0], size=2)
+        if traversable[y, x]:
+            return x, y
+
+
+def short_term_goal_from_scratch(traversable, goal, state, step_size):
+    planner = FMMPlanner(traversable, step_size=step_size)
+    planner.set_goal(goal)
+    return planner.get_short_term_goal(state)
+
+
+class FMMPlannerTest(unittest.TestCase):
+    def check_same_as_from_scratch(self, horizon_margin=None, seeds=range(8)):
+        """moves the robot around while obstacles appear and disappear, and compares the
+        short term goals of one planner, which updates its distance fields, with the ones
+        of a new planner for each call"""
+        step_size = 5
+        for seed in seeds:
+            rng = np.random.RandomState(seed)
+            traversable = cluttered_map(rng, 120, 12)
+            goals = [free_cell(rng, traversable) for _ in range(2)]
+            state = free_cell(rng, traversable)
+            planner = FMMPlanner(traversable, step_size=step_size)
+            if horizon_margin is not None:
+                planner.horizon_margin = horizon_margin
+            for version in range(12):
+                traversable = traversable.copy()
+                x, y = rng.randint(0, traversable.shape[0] - 6, size=2)
+                if rng.rand() < 0.7:
+                    traversable[y : y + 3, x : x + 3] = False
+                else:
+                    traversable[y : y + 6, x : x + 6] = True
+                goal = goals[version % 2]
+                traversable[goal[1], goal[0]] = True
+                if rng.rand() < 0.5 or not traversable[state[1], state[0]]:
+                    state = free_cell(rng, traversable)
+                planner.set_traversable(traversable, version=version)
+                planner.set_goal(goal, state)
+                self.assertEqual(
+                    planner.get_short_term_goal(state),
+                    short_term_goal_from_scratch(traversable, goal, state, step_size),
+                )
+
+    def test_incremental_updates(self):
+        self.check_same_as_from_scratch()
+
+    def test_near_horizon(self):
+        # the distance fields barely cover the robot, and are extended by most calls
+        self.check_same_as_from_scratch(horizon_margin=1)
+
+    def test_horizon_behind_wall(self):
+        # the path around the wall is much longer than the straight line the horizon
+        # starts from
+        traversable = np.ones((100, 100), dtype=bool)
+        traversable[20:80, 50] = False
+        goal, state = (55, 50), (45, 50)
+        planner = FMMPlanner(traversable, step_size=5)
+        planner.set_goal(goal, state)
+        horizon = planner.fields[goal][2]
+        stg = planner.get_short_term_goal(state)
+        self.assertGreater(planner.fields[goal][2], horizon)
+        self.assertEqual(stg, short_term_goal_from_scratch(traversable, goal, state, 5))
+        # the wall opens next to the robot
+        traversable = traversable.copy()
+        traversable[45:55, 50] = True
+        planner.set_traversable(traversable, version=1)
+        planner.set_goal(goal, state)
+        self.assertEqual(
+            planner.get_short_term_goal(state),
+            short_term_goal_from_scratch(traversable, goal, state, 5),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import os
+import sys
+import time
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from skimage.morphology import binary_dilation
+
+# like the remote services, which run from the remote directory
+sys.path.append(os.path.join(os.path.dirname(__file__), "../remote"))
+from slam_pkg.utils.depth_util import bin_points, transform_pose
+from slam_pkg.utils.map_builder import MapBuilder
+from slam_service import SLAM
+
+
+class FakeRobot:
+    """serves get_current_pcd from pcd, a point cloud in metres"""
+
+    def __init__(self):
+        self.pcd = np.zeros((0, 3))
+
+    def get_current_pcd(self):
+        return self.pcd, None
+
+
+def random_pcd(rng, n, lo=(-4.9, -4.9, 0.0), hi=(4.9, 4.9, 1.0)):
+    return rng.uniform(lo, hi, size=(n, 3))
+
+
+class MapBuilderTest(unittest.TestCase):
+    def test_same_as_dense_map(self):
+        rng = np.random.RandomState(0)
+        mb = MapBuilder(map_size_cm=1000, resolution=5, tile_size=64)
+        size = 200
+        # the map before it was tiled
+        dense = np.zeros((size, size, 3), dtype=np.float32)
+        for _ in range(5):
+            pcd = random_pcd(rng, 2000)
+            mb.update_map(pcd)
+            pc_for_map = transform_pose(pcd * 100, (500.0, 500.0, np.pi / 2.0))
+            dense += bin_points(pc_for_map, size, mb.z_bins, mb.resolution)
+        assert mb.map_bounds()[::2] == (0, 0)
+        out = mb.get_map()
+        assert_array_equal(out[:size, :size], dense)
+        assert out[size:].sum() == 0 and out[:, size:].sum() == 0
+
+        # a point outside of map_size grows the map to negative indices
+        outside = (-7.0, 0.0)
+        mb.update_map(np.array([[outside[0], outside[1], 0.3]]))
+        row_min, _, col_min, _ = mb.map_bounds()
+        assert (row_min, col_min) == (-64, 0)
+        out = mb.get_map()
+        assert_array_equal(out[-row_min : size - row_min, :size], dense)
+        col, row = mb.real2map(outside)
+        assert out[int(round(row)), int(round(col)), 1] == 1
+        assert_allclose(mb.map2real((col, row)), outside, atol=1e-6)
+
+
+def to_real(changes, cells):
+    map2real = changes["map2real"]
+    return cells @ map2real[:, :2].T + map2real[:, 2]
+
+
+class SLAMTest(unittest.TestCase):
+    def setUp(self):
+        self.robot = FakeRobot()
+        self.slam = self.make_slam()
+
+    def make_slam(self):
+        # floor points clear the obstacles, so that they are removed too
+        return SLAM(
+            self.robot,
+            map_size=1000,
+            resolution=5,
+            robot_rad=15,
+            tile_size=32,
+            log_odds_miss=-1.0,
+            log_odds_min=0.0,
+        )
+
+    def test_traversable_same_as_full_dilation(self):
+        rng = np.random.RandomState(0)
+        for i in range(8):
+            obstacles = random_pcd(rng, 30, hi=(4.9, 4.9, 0.5))
+            obstacles[:, 2] = np.maximum(obstacles[:, 2], 0.1)
+            floor = random_pcd(rng, 3000, hi=(4.9, 4.9, 0.0))
+            self.robot.pcd = np.concatenate([obstacles, floor])
+            self.slam.update_map()
+            if i % 3 == 0:
+                self.slam.add_obstacle(tuple(rng.uniform(-4.9, 4.9, 2)))
+            obstacle = self.slam.map_builder.get_map()[:, :, 1] >= 1.0
+            expected = ~binary_dilation(obstacle, self.slam.selem)
+            assert_array_equal(self.slam.get_traversable_map(), expected)
+
+    def test_get_map(self):
+        self.slam.add_obstacle((1.0, 2.0))
+        self.slam.add_obstacle((-0.5, 3.0))
+        locs = sorted(map(tuple, self.slam.get_map()))
+        assert_allclose(locs, [(-0.5, 3.0), (1.0, 2.0)], atol=0.05)
+
+    def test_map_changes(self):
+        self.slam.add_obstacle((-0.5, 3.0))
+        changes = self.slam.get_map_changes()
+        assert changes["full"]
+        assert_allclose(to_real(changes, changes["added"]), [(-0.5, 3.0)], atol=0.05)
+        version = changes["version"]
+
+        # unchanged
+        changes = self.slam.get_map_changes(version)
+        assert not changes["full"] and changes["version"] == version
+        assert len(changes["added"]) == 0 and len(changes["removed"]) == 0
+
+        # incremental
+        self.slam.add_obstacle((1.0, 2.0))
+        changes = self.slam.get_map_changes(version)
+        assert not changes["full"] and changes["version"] > version
+        assert len(changes["removed"]) == 0
+        assert_allclose(to_real(changes, changes["added"]), [(1.0, 2.0)], atol=0.05)
+        version = changes["version"]
+        # the floor is seen where the obstacle was
+        self.robot.pcd = np.array([[1.0, 2.0, 0.0]])
+        self.slam.update_map()
+        changes = self.slam.get_map_changes(version)
+        assert not changes["full"] and len(changes["added"]) == 0
+        assert_allclose(to_real(changes, changes["removed"]), [(1.0, 2.0)], atol=0.05)
+        version = changes["version"]
+
+        # after a restart, the client gets the full map of the new service, whether
+        # it has made more changes than the old one or less
+        time.sleep(0.01)
+        restarted = self.make_slam()
+        restarted.add_obstacle((2.0, -1.0))
+        changes = restarted.get_map_changes(version)
+        assert changes["full"]
+        assert_allclose(to_real(changes, changes["added"]), [(2.0, -1.0)], atol=0.05)
+        # e.g. if the clock went back between the runs
+        restarted.map_version = version - 1
+        assert restarted.get_map_changes(version)["full"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,11 +4,16 @@ Copyright (c) Facebook, Inc. and its affiliates.
 from numpy.testing import assert_allclose
 from numpy.linalg import norm
 from numpy import array
+import numpy as np
 import math
 import unittest
 import logging
 
-from droidlet.lowlevel.robot_mover_utils import get_move_target_for_point
+from droidlet.lowlevel.robot_mover_utils import (
+    get_move_target_for_point,
+    compute_pts_in_world,
+    transform_pose,
+)
 
 
 from droidlet.lowlevel.robot_coordinate_utils import (
@@ -38,6 +43,24 @@ def assert_turn_degree(initial_yaw, final_yaw, turn_degree):
     assert_allclose(final_loc, expect_loc, atol=2e-7)
 
 
+def pts_in_world_per_pixel(depth, rot, trans, base_state, intrinsic_mat, backend):
+    """the point cloud as LoCoBotMover.get_rgb_depth computed it before compute_pts_in_world:
+    each pixel's ray scaled by its depth, then moved by the camera pose, the ros to
+    habitat frame change and the base pose one after the other"""
+    img_pixs = np.mgrid[0 : depth.shape[0] : 1, 0 : depth.shape[1] : 1]
+    img_pixs = img_pixs.reshape(2, -1)
+    img_pixs[[0, 1], :] = img_pixs[[1, 0], :]
+    uv_one = np.concatenate((img_pixs, np.ones((1, img_pixs.shape[1]))))
+    uv_one_in_cam = np.dot(np.linalg.inv(intrinsic_mat), uv_one)
+    pts_in_cam = np.multiply(uv_one_in_cam, depth.reshape(-1))
+    pts = np.dot(pts_in_cam.T, rot.T)
+    pts = pts + trans.reshape(-1)
+    if backend == "habitat":
+        ros_to_habitat_frame = np.array([[0.0, -1.0, 0.0], [0.0, 0.0, -1.0], [1.0, 0.0, 0.0]])
+        pts = (ros_to_habitat_frame.T @ pts.T).T
+    return transform_pose(pts, base_state)
+
+
 class UtilsTest(unittest.TestCase):
     def test_assert_turn_degree(self):
         self.assertRaises(AssertionError, assert_turn_degree, 0, math.radians(10), 90)
@@ -69,6 +92,23 @@ class LocoboMoverUtilsTest(unittest.TestCase):
         assert_allclose(pt_r, (3, -1, 2))
         assert_allclose(xyz_pyrobot_to_canonical_coords(pt_r), pt_c)
 
+    def test_compute_pts_in_world(self):
+        rng = np.random.RandomState(0)
+        intrinsic_mat = np.array([[256.0, 0.0, 32.0], [0.0, 256.0, 24.0], [0.0, 0.0, 1.0]])
+        for backend in ["habitat", "locobot"]:
+            for _ in range(3):
+                depth = (rng.rand(48, 64) * 5).astype(np.float32)
+                # a random camera pose, a rotation with a positive determinant
+                rot, _ = np.linalg.qr(rng.randn(3, 3))
+                rot *= np.linalg.det(rot)
+                trans = rng.randn(3, 1)
+                base_state = rng.randn(3)
+                pts = compute_pts_in_world(depth, rot, trans, base_state, intrinsic_mat, backend)
+                expected = pts_in_world_per_pixel(
+                    depth, rot, trans, base_state, intrinsic_mat, backend
+                )
+                assert_allclose(pts, expected, rtol=1e-10, atol=1e-10)
+
     def test_get_move_target_for_point(self):
         base_pos = (0, 0, 0)
         # test each quadrant
@@ -0,0 +1,225 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import itertools
+import operator
+
+import numpy as np
+
+CHUNK_SIZE = 16
+
+
+class ChunkedBlocks:
+    """
+    sparse replacement for the dense (sl, sl, sl, 2) (id, meta) array of a pyworld World.
+    the world is split into cubical chunks of side chunk_size, allocated on demand the
+    first time a non-air block is written in them and freed when they are all air again,
+    so memory scales with the number of non-empty chunks rather than sl**3.
+
+    supports the subset of numpy indexing the world uses: integers (negative integers wrap,
+    as in numpy) and unit-step slices along each axis, e.g.
+        blocks[x, y, z] -> (id, meta) array
+        blocks[:, 0:r, :, 0] = 7
+    reads return a fresh array (never a view), so all writes must go through __setitem__.
+    np.asarray(blocks) or blocks.copy() give the full dense array.
+
+    in addition to the blocks, this maintains
+        top:  (sl, sl) int array, top[x, z] is the largest y with a non-air block
+              in the column, or -1 if the column is empty
+        dirty:  boolean per-chunk bitmap, set when any block in the chunk is written;
+                see pop_dirty_chunks()
+    """
+
+    def __init__(self, sl, chunk_size=CHUNK_SIZE, dtype="uint16"):
+        self.sl = sl
+        self.shape = (sl, sl, sl, 2)
+        self.ndim = 4
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        num_chunks = (sl + chunk_size - 1) // chunk_size
+        # (cx, cy, cz) --> (chunk_size, chunk_size, chunk_size, 2) array
+        self.chunks = {}
+        self.dirty = np.zeros((num_chunks, num_chunks, num_chunks), dtype=bool)
+        self.top = -np.ones((sl, sl), dtype="int64")
+
+    def __len__(self):
+        return self.sl
+
+    def __array__(self, dtype=None):
+        out = self._read(((0, self.sl), (0, self.sl), (0, self.sl)))
+        return out if dtype is None else out.astype(dtype)
+
+    def copy(self):
+        return self.__array__()
+
+    def nbytes(self):
+        """bytes used by the allocated chunks"""
+        return sum(c.nbytes for c in self.chunks.values())
+
+    def height_map(self):
+        """
+        the largest y with a non-air block at each (x, z), or 0 if the column is empty
+        """
+        return np.maximum(self.top, 0)
+
+    def nonzero(self):
+        """
+        returns an (N, 3) array with the locations of the non-air blocks
+        and the (N, 2) array of their (id, meta), without building the dense array
+        """
+        C = self.chunk_size
+        locs = [np.zeros((0, 3), dtype="int64")]
+        idms = [np.zeros((0, 2), dtype=self.dtype)]
+        for coord, chunk in self.chunks.items():
+            nz = np.argwhere(chunk[:, :, :, 0] > 0)
+            locs.append(nz + np.array(coord) * C)
+            idms.append(chunk[nz[:, 0], nz[:, 1], nz[:, 2]])
+        return np.concatenate(locs), np.concatenate(idms)
+
+    def pop_dirty_chunks(self):
+        """
+        returns an (N, 3) array with the chunk coordinates of each chunk written to since
+        the last call, and clears the dirty bitmap.  chunk (cx, cy, cz) covers the blocks
+        [cx * chunk_size, (cx + 1) * chunk_size) in x, etc.
+        """
+        dirty = np.argwhere(self.dirty)
+        self.dirty[:] = False
+        return dirty
+
+    ##########################
+    ### indexing
+    ##########################
+
+    def _normalize_index(self, key):
+        """returns a (start, stop) range and whether the axis was indexed by an integer, for each axis"""
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 4:
+            raise IndexError("too many indices for ChunkedBlocks: {}".format(key))
+        key = key + (slice(None),) * (4 - len(key))
+        ranges = []
+        squeeze = []
+        for k, n in zip(key, self.shape):
+            if isinstance(k, slice):
+                start, stop, step = k.indices(n)
+                if step != 1:
+                    raise IndexError("ChunkedBlocks only supports unit step slices")
+                ranges.append((start, max(start, stop)))
+                squeeze.append(False)
+            else:
+                k = operator.index(k)
+                if k < 0:
+                    k += n
+                if k < 0 or k >= n:
+                    raise IndexError("index {} is out of bounds for size {}".format(k, n))
+                ranges.append((k, k + 1))
+                squeeze.append(True)
+        return ranges, squeeze
+
+    def _chunk_overlaps(self, ranges, allocated_only=False):
+        """
+        yields (chunk coordinate, slices into the chunk, slices into the region)
+        for each chunk overlapping the region given by the (start, stop) ranges in x, y, z
+        """
+        C = self.chunk_size
+        chunk_ranges = [range(a // C, (b - 1) // C + 1) if b > a else range(0) for a, b in ranges]
+        num_overlapping = np.prod([len(r) for r in chunk_ranges])
+        if allocated_only and num_overlapping > len(self.chunks):
+            coords = [c for c in self.chunks if all(c[i] in chunk_ranges[i] for i in range(3))]
+        else:
+            coords = itertools.product(*chunk_ranges)
+        for coord in coords:
+            chunk_slices = []
+            region_slices = []
+            for c, (a, b) in zip(coord, ranges):
+                lo = max(a, c * C)
+                hi = min(b, (c + 1) * C)
+                chunk_slices.append(slice(lo - c * C, hi - c * C))
+                region_slices.append(slice(lo - a, hi - a))
+            yield coord, tuple(chunk_slices), tuple(region_slices)
+
+    def _read(self, ranges):
+        """dense (x, y, z, 2) array of the region given by (start, stop) ranges in x, y, z"""
+        out = np.zeros(tuple(b - a for a, b in ranges) + (2,), dtype=self.dtype)
+        for coord, chunk_slices, region_slices in self._chunk_overlaps(
+            ranges, allocated_only=True
+        ):
+            chunk = self.chunks.get(coord)
+            if chunk is not None:
+                out[region_slices] = chunk[chunk_slices]
+        return out
+
+    def __getitem__(self, key):
+        if type(key) is tuple and len(key) in (3, 4):
+            # fast path for reading a single location
+            try:
+                x, y, z = (operator.index(k) for k in key[:3])
+            except TypeError:
+                pass
+            else:
+                if 0 <= x < self.sl and 0 <= y < self.sl and 0 <= z < self.sl:
+                    C = self.chunk_size
+                    chunk = self.chunks.get((x // C, y // C, z // C))
+                    if chunk is None:
+                        idm = np.zeros(2, dtype=self.dtype)
+                    else:
+                        idm = chunk[x % C, y % C, z % C].copy()
+                    return idm if len(key) == 3 else idm[key[3]]
+        ranges, squeeze = self._normalize_index(key)
+        out = self._read(ranges[:3])
+        idx = tuple(0 if sq else slice(None) for sq in squeeze[:3])
+        c0, c1 = ranges[3]
+        idx += (c0,) if squeeze[3] else (slice(c0, c1),)
+        return out[idx]
+
+    def __setitem__(self, key, value):
+        ranges, squeeze = self._normalize_index(key)
+        region_shape = tuple(b - a for a, b in ranges)
+        value = np.asarray(value)
+        value = np.broadcast_to(
+            value, tuple(n for n, sq in zip(region_shape, squeeze) if not sq)
+        ).reshape(region_shape)
+        if value.dtype != self.dtype:
+            value = value.astype(self.dtype)
+        c0, c1 = ranges[3]
+        nonzero = value.any()
+        for coord, chunk_slices, region_slices in self._chunk_overlaps(
+            ranges[:3], allocated_only=not nonzero
+        ):
+            part = value[region_slices]
+            chunk = self.chunks.get(coord)
+            if chunk is None:
+                if not part.any():
+                    continue
+                C = self.chunk_size
+                chunk = np.zeros((C, C, C, 2), dtype=self.dtype)
+                self.chunks[coord] = chunk
+            chunk[chunk_slices + (slice(c0, c1),)] = part
+            self.dirty[coord] = True
+            if not part.any() and not chunk.any():
+                del self.chunks[coord]
+        if c0 == 0:
+            self._update_top(ranges[:3], value[:, :, :, 0])
+
+    def _update_top(self, ranges, ids):
+        """update the height map after the ids in the region were overwritten"""
+        (x0, x1), (y0, y1), (z0, z1) = ranges
+        if ids.size == 0:
+            return
+        nz = ids > 0
+        has = nz.any(axis=1)
+        slab_top = np.where(has, y1 - 1 - np.argmax(nz[:, ::-1, :], axis=1), -1)
+        old = self.top[x0:x1, z0:z1]
+        above = old >= y1
+        new = np.where(~above & has, slab_top, old)
+        # columns whose top block was cleared need to look below the region
+        rescan = ~above & ~has & (old >= y0)
+        if rescan.any():
+            if y0 > 0:
+                below = self._read(((x0, x1), (0, y0), (z0, z1)))[:, :, :, 0] > 0
+                below_has = below.any(axis=1)
+                below_top = np.where(below_has, y0 - 1 - np.argmax(below[:, ::-1, :], axis=1), -1)
+            else:
+                below_top = -1
+            new = np.where(rescan, below_top, new)
+        self.top[x0:x1, z0:z1] = new
@@ -22,8 +22,7 @@ def instantiate_world_from_spec(opts):
             x, y, z = world.to_npy_coords((b["x"], b["y"], b["z"]))
             # TODO maybe don't just eat every error, do this more carefully
             try:
-                world.blocks[x, y, z][0] = b["id"]
-                world.blocks[x, y, z][1] = b["meta"]
+                world.blocks[x, y, z] = (b["id"], b["meta"])
             except:
                 pass
 
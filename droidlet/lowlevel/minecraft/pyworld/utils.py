@@ -2,6 +2,7 @@
 Copyright (c) Facebook, Inc. and its affiliates.
 """
 
+import zlib
 from collections import namedtuple
 from unittest.mock import Mock
 
@@ -114,11 +115,10 @@ def build_ground(world):
         + p[5] * np.cos(g[1]) * np.sin(g[1])
     )
     ground_height = ground_height - ground_height.mean() + avg_ground_height
-    for i in range(world.sl):
-        for j in range(world.sl):
-            height = min(31, max(0, int(ground_height[i, j])))
-            for k in range(int(height)):
-                world.blocks[i, k, j] = DIRT
+    height = np.clip(ground_height.astype("int64"), 0, 31)
+    for k in range(int(height.max())):
+        # fill each column with dirt up to its height, one y-slice at a time
+        world.blocks[:, k, :] = np.where((height > k)[:, :, None], DIRT, world.blocks[:, k, :])
 
     # FIXME this is broken
     if hasattr(world.opts, "ground_block_probs"):
@@ -168,3 +168,59 @@ def make_pose(SL, H, loc=None, pitchyaw=None, height_map=None):
         z = int(okh[1, minidx])
         y = int(height_map[x, z] + 1)
     return x, y, z, pitch, yaw
+
+
+# encodings for sending an array of blocks as bytes instead of a list of tuples
+BLOCK_ENCODINGS = ["raw", "zlib", "rle"]
+
+
+def encode_blocks(blocks, encoding="rle"):
+    """
+    pack a numpy array of blocks (any shape, last axis (id, meta)) into a dict
+    with a shape/dtype header and a bytes payload that socketio sends as a binary attachment.
+
+    encoding is one of
+        "raw":  the array bytes
+        "zlib": zlib compressed array bytes
+        "rle":  run-length encoding of the flattened (id, meta) pairs, good for mostly-air
+                regions: the uint32 values (id << 16 | meta) of each run followed by the
+                uint32 run lengths
+    """
+    blocks = np.ascontiguousarray(blocks)
+    msg = {"shape": list(blocks.shape), "dtype": blocks.dtype.str, "encoding": encoding}
+    if encoding == "raw":
+        msg["data"] = blocks.tobytes()
+    elif encoding == "zlib":
+        msg["data"] = zlib.compress(blocks.tobytes(), 1)
+    elif encoding == "rle":
+        flat = blocks.reshape(-1, 2).astype("uint32")
+        values = (flat[:, 0] << 16) | flat[:, 1]
+        if len(values) > 0:
+            starts = np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1))
+            lengths = np.diff(np.append(starts, len(values)))
+        else:
+            starts = lengths = np.zeros(0, dtype="int64")
+        msg["num_runs"] = len(starts)
+        msg["data"] = values[starts].tobytes() + lengths.astype("uint32").tobytes()
+    else:
+        raise Exception("unknown block encoding {}".format(encoding))
+    return msg
+
+
+def decode_blocks(msg):
+    """inverse of encode_blocks.  the output of "raw" is a read-only view of the payload"""
+    shape = tuple(msg["shape"])
+    dtype = np.dtype(msg["dtype"])
+    encoding = msg["encoding"]
+    if encoding == "raw":
+        return np.frombuffer(msg["data"], dtype=dtype).reshape(shape)
+    elif encoding == "zlib":
+        return np.frombuffer(zlib.decompress(msg["data"]), dtype=dtype).reshape(shape)
+    elif encoding == "rle":
+        n = msg["num_runs"]
+        runs = np.frombuffer(msg["data"], dtype="uint32")
+        values = np.repeat(runs[:n], runs[n:])
+        blocks = np.stack((values >> 16, values & 0xFFFF), axis=1).astype(dtype)
+        return blocks.reshape(shape)
+    else:
+        raise Exception("unknown block encoding {}".format(encoding))
@@ -10,11 +10,13 @@ from droidlet.lowlevel.minecraft.mc_util import XYZ, IDM
 from droidlet.shared_data_struct.craftassist_shared_utils import Player, Slot, Item, ItemStack
 from droidlet.shared_data_struct.rotation import look_vec
 from droidlet.lowlevel.minecraft.pyworld.fake_mobs import make_mob_opts, MOB_META, SimpleMob
+from droidlet.lowlevel.minecraft.pyworld.chunked_blocks import ChunkedBlocks, CHUNK_SIZE
 from droidlet.lowlevel.minecraft.pyworld.utils import (
     build_ground,
     make_pose,
     build_coord_shifts,
     shift_coords,
+    encode_blocks,
     BEDROCK,
     AIR,
 )
@@ -38,7 +40,8 @@ class World:
         # TODO point to the actual object?  for now this just stores the eid to avoid collisions
         self.all_eids = {}
 
-        self.blocks = np.zeros((opts.sl, opts.sl, opts.sl, 2), dtype="int32")
+        # sparse (sl, sl, sl, 2) array of (id, meta), with a maintained height map
+        self.blocks = ChunkedBlocks(opts.sl, chunk_size=getattr(opts, "chunk_size", CHUNK_SIZE))
         if spec.get("ground_generator"):
             ground_args = spec.get("ground_args", None)
             if ground_args is None:
@@ -47,13 +50,6 @@ class World:
                 spec["ground_generator"](self, **ground_args)
         else:
             build_ground(self)
-        # TODO make some machinery to never allow these to go out of sync- adding blocks
-        # and removing them should go through interface
-        nz_blocks = [
-            (int(l[0]), int(l[1]), int(l[2]))
-            for l in zip(*np.nonzero(self.blocks[:, :, :, 0] > 0))
-        ]
-        self.blocks_dict = {l: tuple(int(i) for i in self.blocks[l].tolist()) for l in nz_blocks}
 
         self.mobs = []
         for m in spec["mobs"]:
@@ -170,11 +166,7 @@ class World:
         """
         get the ground height at each location, to maybe place items, mobs, and players
         """
-        height_map = np.zeros((self.sl, self.sl))
-        for l, idm in self.blocks_dict.items():
-            if l[1] > height_map[l[0], l[2]] and idm[0] > 0:
-                height_map[l[0], l[2]] = l[1]
-        return height_map
+        return self.blocks.height_map().astype("float64")
 
     def place_block(self, block, force=False):
         loc, idm = block
@@ -198,10 +190,6 @@ class World:
                     self.broadcast_block_update(loc, idm)
                 for sid, store in self.changed_blocks_store.items():
                     store[tuple(loc)] = idm
-                if idm != AIR:
-                    self.blocks_dict[loc] = idm
-                else:
-                    self.blocks_dict.pop(loc, None)
                 return True
             else:
                 return False
@@ -214,10 +202,9 @@ class World:
 
     def blocks_to_dict(self):
         d = {}
-        nz = np.transpose(self.blocks[:, :, :, 0].nonzero())
-        for loc in nz:
-            l = tuple(loc.tolist())
-            d[self.from_npy_coords(l)] = tuple(self.blocks[l[0], l[1], l[2], :])
+        locs, idms = self.blocks.nonzero()
+        for l, idm in zip(locs.tolist(), idms.tolist()):
+            d[self.from_npy_coords(tuple(l))] = tuple(idm)
         return d
 
     def get_idm_at_locs(self, xyzs: Sequence[XYZ]) -> Dict[XYZ, IDM]:
@@ -305,6 +292,24 @@ class World:
         else:
             return pre_B
 
+    def get_flattened_blocks(self, bounds):
+        """
+        returns a list of (x, y, z, id, meta) for the non-air blocks in the rectanguloid
+        with the given (x, X, y, Y, z, Z) bounds, with x, y, z relative to (x, y, z)
+        """
+        x, X, y, Y, z, Z = bounds
+        npy = self.get_blocks(x, X, y, Y, z, Z, transpose=False)
+        nz_locs = np.argwhere(npy[:, :, :, 0])
+        nz_idms = npy[nz_locs[:, 0], nz_locs[:, 1], nz_locs[:, 2]]
+        return [tuple(l) + tuple(idm) for l, idm in zip(nz_locs.tolist(), nz_idms.tolist())]
+
+    def get_encoded_blocks(self, bounds, encoding="rle"):
+        """
+        returns the yzxb array of get_blocks for the (x, X, y, Y, z, Z) bounds,
+        packed into bytes by encode_blocks
+        """
+        return encode_blocks(self.get_blocks(*bounds), encoding=encoding)
+
     def get_line_of_sight(self, pos, yaw, pitch):
         # it is assumed lv is unit normalized
         pos = tuple(self.to_npy_coords(pos))
@@ -583,15 +588,24 @@ class World:
             self.changed_blocks_store[sid] = {}
             return blocks
 
+        @server.on("observe")
+        def observe(sid):
+            """everything an agent perceives each step, in one round trip"""
+            return {
+                "player": get_player_by_sid(sid)["player"],
+                "players": get_all_players(sid),
+                "changed_blocks": changed_blocks(sid),
+                "chats": get_chats(sid)["chats"],
+                "mobs": send_mobs(sid),
+            }
+
         @server.on("get_blocks")
         def get_blocks_dict(sid, data):
-            x, X, y, Y, z, Z = data["bounds"]
-            npy = self.get_blocks(x, X, y, Y, z, Z, transpose=False)
-            nz_locs = list(zip(*np.nonzero(npy[:, :, :, 0])))
-            nz_idms = [tuple(int(i) for i in self.blocks[l]) for l in nz_locs]
-            nz_locs = [(int(x), int(y), int(z)) for x, y, z in nz_locs]
-            flattened_blocks = [nz_locs[i] + nz_idms[i] for i in range(len(nz_locs))]
-            return flattened_blocks
+            return self.get_flattened_blocks(data["bounds"])
+
+        @server.on("get_blocks_npy")
+        def get_blocks_npy(sid, data):
+            return self.get_encoded_blocks(data["bounds"], encoding=data.get("encoding", "rle"))
 
         @server.on("start_world")
         def start_world(sid):
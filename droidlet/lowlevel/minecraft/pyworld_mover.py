@@ -2,31 +2,88 @@
 Copyright (c) Facebook, Inc. and its affiliates.
 """
 import numpy as np
+import threading
 import time
 import socketio
+from contextlib import contextmanager
 from droidlet.base_util import XYZ, Pos, Look
 from droidlet.shared_data_struct.craftassist_shared_utils import Player, Slot, Item, ItemStack, Mob
-from droidlet.lowlevel.minecraft.pyworld.utils import build_coord_shifts, BEDROCK
+from droidlet.lowlevel.minecraft.pyworld.utils import build_coord_shifts, decode_blocks, BEDROCK
 
 
-class DataCallback:
-    def __call__(self, data):
+class PyWorldTimeout(Exception):
+    """raised when the world server does not answer a request in time"""
+
+
+class PendingResponse:
+    """
+    a future for the response to one request to the world server.
+    it is passed to sio.emit as the ack callback, which socketio runs on
+    its own thread when the response arrives
+    """
+
+    def __init__(self, event_name):
+        self.event_name = event_name
+        self.data = None
+        self._done = threading.Event()
+
+    def __call__(self, data=None):
         self.data = data
+        self._done.set()
 
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """block until the response arrives and return it; raise PyWorldTimeout after timeout seconds"""
+        if not self._done.wait(timeout):
+            raise PyWorldTimeout(
+                "no response from world server to {} in {} seconds".format(
+                    self.event_name, timeout
+                )
+            )
+        return self.data
 
-def wait_for_data(data_callback, step=0.001, max_steps=100):
-    data = None
-    count = 0
-    while not data:
-        data = getattr(data_callback, "data", None)
-        if data is not None or count > max_steps:
-            return data
-        count += 1
-        time.sleep(step)
+
+def player_from_data(p):
+    entityId, name, pos, look, mainhand, _ = p
+    if mainhand is not None:
+        mainhand = Item(*mainhand)
+        return Player(entityId, name, Pos(*pos), Look(*look), mainhand)
+    else:
+        return Player(entityId, name, Pos(*pos), Look(*look))
+
+
+def decode_str_loc(x):
+    return tuple(int(z) for z in x.strip("(").strip(")").split(","))
+
+
+def decode_changed_blocks(blocks):
+    # can't send dicts with tuples for keys :(
+    return [(decode_str_loc(loc), tuple(idm)) for loc, idm in blocks.items()]
 
 
 class PyWorldMover:
-    def __init__(self, port=25565, ip="localhost"):
+    """
+    requests to the world server are socketio events with an ack callback; call() blocks
+    until the ack arrives, and raises PyWorldTimeout if it doesn't within timeout seconds.
+    request() returns the PendingResponse without waiting, so several requests can be in
+    flight at once.
+
+    inside an observation() block, the perception getters are answered from a single
+    observe() request instead of one request each.
+
+    block_encoding is the encoding (see pyworld.utils.encode_blocks) the world server uses
+    to send get_blocks arrays as bytes, or None to get them as a list of tuples
+    """
+
+    def __init__(self, port=25565, ip="localhost", block_encoding="rle", timeout=5.0):
+        self.block_encoding = block_encoding
+        self.timeout = timeout
+        # see observation()
+        self._observation = None
+        self._pending_chats = []
+        self._pending_blocks = []
         sio = socketio.Client()
         try:
             sio.connect("http://{}:{}".format(ip, port))
@@ -38,9 +95,7 @@ class PyWorldMover:
         print("connected to server on port {} at ip {}".format(port, ip))
 
         self.sio = sio
-        D = DataCallback()
-        self.sio.emit("get_world_info", callback=D)
-        info = wait_for_data(D)
+        info = self.call("get_world_info")
         self.sl = info["sl"]
         self.world_coord_shift = info["coord_shift"]
         to_npy_coords, from_npy_coords = build_coord_shifts(self.world_coord_shift)
@@ -49,6 +104,62 @@ class PyWorldMover:
         player_struct = self.get_player()
         self.entityId = player_struct.entityId
 
+    def request(self, event_name, data=None):
+        """send a request to the world server, returns a PendingResponse"""
+        response = PendingResponse(event_name)
+        if data is None:
+            self.sio.emit(event_name, callback=response)
+        else:
+            self.sio.emit(event_name, data, callback=response)
+        return response
+
+    def call(self, event_name, data=None, timeout=None):
+        """send a request to the world server and wait for the response"""
+        timeout = self.timeout if timeout is None else timeout
+        return self.request(event_name, data).result(timeout)
+
+    def observe(self):
+        """
+        get everything the agent perceives from the world each step in one round trip.
+        returns a dict with
+            "player": the agent's Player struct
+            "other_players": list of the other Players
+            "changed_blocks": list of ((x, y, z), (id, meta)) changed since the last call
+                (shared with get_changed_blocks)
+            "chats": list of incoming chats since the last call (shared with get_incoming_chats)
+            "mobs": list of Mobs
+        """
+        data = self.call("observe")
+        return {
+            "player": player_from_data(data["player"]),
+            "other_players": [
+                player_from_data(p) for p in data["players"] if p[0] != self.entityId
+            ],
+            "changed_blocks": decode_changed_blocks(data["changed_blocks"]),
+            "chats": data["chats"],
+            "mobs": [
+                Mob(m[0], m[1], Pos(m[2], m[3], m[4]), Look(m[5], m[6])) for m in data["mobs"]
+            ],
+        }
+
+    @contextmanager
+    def observation(self):
+        """
+        get what the agent perceives with one observe() request.  inside the with block,
+        get_player, get_other_players and get_mobs are answered from it, and the next
+        get_incoming_chats and get_changed_blocks return its chats and changed blocks.
+        the world server sends those only once, so they are kept until they are read,
+        even after the block exits
+        """
+        obs = self.observe()
+        self._pending_chats.extend(obs["chats"])
+        self._pending_blocks.extend(obs["changed_blocks"])
+        self._observation = obs
+        try:
+            yield obs
+        finally:
+            self._observation = None
+
     def set_look(self, yaw, pitch):
         self.sio.emit("set_look", {"yaw": float(yaw), "pitch": float(pitch)})
 
@@ -85,52 +196,33 @@ class PyWorldMover:
         self.sio.emit("set_held_item", {"idm": idm})
 
     def dig(self, x, y, z):
-        D = DataCallback()
-        self.sio.emit("dig", {"loc": [int(x), int(y), int(z)]}, callback=D)
         # return True if the world says the block was dug, False otherwise
-        placed = wait_for_data(D)
-        # this is sketchy: if world doesn't respond in time, block placement will
-        # show False even if block was placed....  TODO? check with a get_blocks?
-        if placed is None:
-            placed = False
-        return placed
+        placed = self.call("dig", {"loc": [int(x), int(y), int(z)]})
+        return bool(placed)
 
     def place_block(self, x, y, z):
         """place the block in mainhand.  does nothing if mainhand empty"""
-        D = DataCallback()
-        self.sio.emit("place_block", {"loc": [int(x), int(y), int(z)]}, callback=D)
         # return True if the world says the block was placed, False otherwise
-        placed = wait_for_data(D)
-        # this is sketchy: if world doesn't respond in time, block placement will
-        # show False even if block was placed....  TODO? check with a get_blocks?
-        if placed is None:
-            placed = False
-        return placed
+        placed = self.call("place_block", {"loc": [int(x), int(y), int(z)]})
+        return bool(placed)
 
     def get_player(self):
-        D = DataCallback()
-        self.sio.emit("get_player", callback=D)
+        if self._observation is not None:
+            return self._observation["player"]
+        data = self.call("get_player")
         try:
-            entityId, name, pos, look, mainhand, _ = wait_for_data(D)["player"]
-            if mainhand is not None:
-                mainhand = Item(*mainhand)
-                return Player(entityId, name, Pos(*pos), Look(*look), mainhand)
-            else:
-                return Player(entityId, name, Pos(*pos), Look(*look))
+            return player_from_data(data["player"])
         except:
             return None
 
     def get_line_of_sight(self):
-        D = DataCallback()
-        self.sio.emit("line_of_sight", {}, callback=D)
-        pos = wait_for_data(D)["pos"]
+        pos = self.call("line_of_sight", {})["pos"]
         if pos != "":
             return Pos(*pos)
         else:
             return None
 
     def get_player_line_of_sight(self, player_struct):
-        D = DataCallback()
         pos = player_struct.pos
         look = player_struct.look
         pose_data = {
@@ -138,8 +230,7 @@ class PyWorldMover:
             "yaw": float(look.yaw),
             "pitch": float(look.pitch),
         }
-        self.sio.emit("line_of_sight", pose_data, callback=D)
-        pos = wait_for_data(D)["pos"]
+        pos = self.call("line_of_sight", pose_data)["pos"]
         if pos == "":
             return None
         else:
@@ -151,9 +242,7 @@ class PyWorldMover:
         only return items not in any agent's inventory, matching cuberite
         returns a list of ItemStacks
         """
-        D = DataCallback()
-        self.sio.emit("get_item_info", callback=D)
-        items = wait_for_data(D)
+        items = self.call("get_item_info")
         # TODO "stacks" with count, like MC?
         # right now make a separate "item_stack" for each one
         item_stacks = []
@@ -200,16 +289,10 @@ class PyWorldMover:
                     return
 
     def get_changed_blocks(self):
-        D = DataCallback()
-        self.sio.emit("get_changed_blocks", callback=D)
-        blocks = wait_for_data(D)
-
-        def decode_str_loc(x):
-            return tuple(int(z) for z in x.strip("(").strip(")").split(","))
-
-        if blocks:
-            # can't send dicts with tuples for keys :(
-            blocks = {decode_str_loc(loc): idm for loc, idm in blocks.items()}
+        """returns a list of ((x, y, z), (id, meta)) changed since the last call"""
+        if self._observation is None:
+            self._pending_blocks.extend(decode_changed_blocks(self.call("get_changed_blocks")))
+        blocks, self._pending_blocks = self._pending_blocks, []
         return blocks
 
     def get_blocks(self, x, X, y, Y, z, Z):
@@ -222,11 +305,11 @@ class PyWorldMover:
 
         TODO we don't need yzx orientation anymore...
         """
-        D = DataCallback()
-        self.sio.emit(
-            "get_blocks", {"bounds": (int(x), int(X), int(y), int(Y), int(z), int(Z))}, callback=D
-        )
-        flattened_blocks = wait_for_data(D)
+        bounds = (int(x), int(X), int(y), int(Y), int(z), int(Z))
+        if self.block_encoding is not None:
+            msg = self.call("get_blocks_npy", {"bounds": bounds, "encoding": self.block_encoding})
+            return decode_blocks(msg).astype("int32")
+        flattened_blocks = self.call("get_blocks", {"bounds": bounds})
         npy_blocks = np.zeros((Y - y + 1, Z - z + 1, X - x + 1, 2), dtype="int32")
         for b in flattened_blocks:
             npy_blocks[b[1], b[2], b[0]] = [b[3], b[4]]
@@ -237,34 +320,21 @@ class PyWorldMover:
 
     # TODO is this supposed to include the self Player ?
     def get_other_players(self):
-        D = DataCallback()
-        self.sio.emit("get_players", callback=D)
-        players = wait_for_data(D)
-        out = []
-        for p in players:
-            entityId, name, pos, look, mainhand, _ = p
-            if entityId != self.entityId:
-                if mainhand is not None:
-                    mainhand = Item(*mainhand)
-                    out.append(Player(entityId, name, Pos(*pos), Look(*look), mainhand))
-                else:
-                    out.append(Player(entityId, name, Pos(*pos), Look(*look)))
-        return out
+        if self._observation is not None:
+            return list(self._observation["other_players"])
+        players = self.call("get_players")
+        return [player_from_data(p) for p in players if p[0] != self.entityId]
 
     def get_incoming_chats(self):
-        D = DataCallback()
-        self.sio.emit("get_incoming_chats", callback=D)
-        chats = wait_for_data(D)
-        if chats is not None:
-            chats = chats["chats"]
-        else:
-            chats = []
+        if self._observation is None:
+            self._pending_chats.extend(self.call("get_incoming_chats")["chats"])
+        chats, self._pending_chats = self._pending_chats, []
         return chats
 
     def get_mobs(self):
-        D = DataCallback()
-        self.sio.emit("get_mobs", callback=D)
-        serialized_mobs = wait_for_data(D)
+        if self._observation is not None:
+            return list(self._observation["mobs"])
+        serialized_mobs = self.call("get_mobs")
         mobs = []
         for m in serialized_mobs:
             mobs.append(Mob(m[0], m[1], Pos(m[2], m[3], m[4]), Look(m[5], m[6])))
@@ -0,0 +1,97 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+Compares get_blocks throughput between the pyworld server and PyWorldMover for
+the JSON list-of-tuples transport and the binary encodings, for 32^3 and 64^3
+regions of a world with flat ground and scattered blocks.  The socket itself is
+not included: each transport is timed from the World's array to the mover's array,
+including the serialization socketio does (JSON for lists, none for bytes).
+
+    python -m droidlet.lowlevel.minecraft.tests.benchmarks.benchmark_get_blocks
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from droidlet.lowlevel.minecraft.pyworld.world import World
+from droidlet.lowlevel.minecraft.pyworld.utils import (
+    flat_ground_generator,
+    decode_blocks,
+    BLOCK_ENCODINGS,
+)
+
+
+class Opt:
+    pass
+
+
+def make_world(sl, num_blocks, seed=0):
+    opts = Opt()
+    opts.sl = sl
+    spec = {
+        "players": [],
+        "mobs": [],
+        "items": [],
+        "agent": {},
+        "coord_shift": (0, 63 - sl // 2, 0),
+        "ground_generator": flat_ground_generator,
+    }
+    world = World(opts, spec)
+    rng = np.random.RandomState(seed)
+    for i in range(num_blocks):
+        x, z = rng.randint(0, sl, 2)
+        y = rng.randint(63, 63 + sl // 4)
+        world.place_block(((int(x), int(y), int(z)), (int(rng.randint(1, 60)), 0)))
+    return world
+
+
+def json_get_blocks(world, bounds):
+    x, X, y, Y, z, Z = bounds
+    flattened_blocks = json.loads(json.dumps(world.get_flattened_blocks(bounds)))
+    npy_blocks = np.zeros((Y - y + 1, Z - z + 1, X - x + 1, 2), dtype="int32")
+    for b in flattened_blocks:
+        npy_blocks[b[1], b[2], b[0]] = [b[3], b[4]]
+    return npy_blocks, len(json.dumps(flattened_blocks))
+
+
+def binary_get_blocks(world, bounds, encoding):
+    msg = world.get_encoded_blocks(bounds, encoding=encoding)
+    return decode_blocks(msg).astype("int32"), len(msg["data"])
+
+
+def run(world, size, transport, num_calls, seed=0):
+    rng = np.random.RandomState(seed)
+    times = []
+    nbytes = []
+    for i in range(num_calls):
+        x, z = rng.randint(0, world.sl - size, 2)
+        y = 63 - size // 2
+        bounds = (x, x + size - 1, y, y + size - 1, z, z + size - 1)
+        start = time.perf_counter()
+        if transport == "json":
+            _, n = json_get_blocks(world, bounds)
+        else:
+            _, n = binary_get_blocks(world, bounds, transport)
+        times.append(time.perf_counter() - start)
+        nbytes.append(n)
+    return np.array(times), np.mean(nbytes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sl", type=int, default=128)
+    parser.add_argument("--num_blocks", type=int, default=2000)
+    parser.add_argument("--num_calls", type=int, default=20)
+    args = parser.parse_args()
+
+    world = make_world(args.sl, args.num_blocks)
+    for size in [32, 64]:
+        for transport in ["json"] + BLOCK_ENCODINGS:
+            t, nbytes = run(world, size, transport, args.num_calls)
+            print(
+                "{}^3 {:>5}: mean {:.2f} ms/call, {:.0f} bytes/call".format(
+                    size, transport, 1000 * t.mean(), nbytes
+                )
+            )
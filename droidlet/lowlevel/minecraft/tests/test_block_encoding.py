@@ -0,0 +1,44 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import unittest
+import numpy as np
+from droidlet.lowlevel.minecraft.pyworld.world import World
+from droidlet.lowlevel.minecraft.pyworld.utils import encode_blocks, decode_blocks, BLOCK_ENCODINGS
+
+
+class Opt:
+    pass
+
+
+class BlockEncodingTest(unittest.TestCase):
+    def test_round_trip(self):
+        rng = np.random.RandomState(0)
+        blocks = np.zeros((9, 5, 7, 2), dtype="uint8")
+        blocks[rng.rand(9, 5, 7) < 0.1] = (3, 1)
+        blocks[0, 0, 0] = (255, 15)
+        for encoding in BLOCK_ENCODINGS:
+            for B in [blocks, blocks[:0], blocks.astype("int32")]:
+                decoded = decode_blocks(encode_blocks(B, encoding=encoding))
+                assert decoded.dtype == B.dtype
+                assert (decoded == B).all()
+                assert decoded.shape == B.shape
+
+    def test_world_transports_agree(self):
+        opts = Opt()
+        opts.sl = 32
+        spec = {"players": [], "mobs": [], "items": [], "coord_shift": (0, 0, 0), "agent": {}}
+        world = World(opts, spec)
+        world.place_block(((4, 12, 5), (35, 2)))
+        bounds = (2, 9, 3, 14, 1, 6)
+        x, X, y, Y, z, Z = bounds
+        from_list = np.zeros((Y - y + 1, Z - z + 1, X - x + 1, 2), dtype="int32")
+        for b in world.get_flattened_blocks(bounds):
+            from_list[b[1], b[2], b[0]] = [b[3], b[4]]
+        from_bytes = decode_blocks(world.get_encoded_blocks(bounds))
+        assert (from_list == from_bytes).all()
+        assert tuple(from_bytes[12 - y, 5 - z, 4 - x]) == (35, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
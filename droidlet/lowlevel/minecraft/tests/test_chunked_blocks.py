@@ -0,0 +1,79 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import unittest
+import numpy as np
+from droidlet.lowlevel.minecraft.pyworld.chunked_blocks import ChunkedBlocks
+from droidlet.lowlevel.minecraft.pyworld.world import World
+
+
+class Opt:
+    pass
+
+
+class ChunkedBlocksTest(unittest.TestCase):
+    def test_matches_dense_array(self):
+        sl = 40
+        rng = np.random.default_rng(0)
+        blocks = ChunkedBlocks(sl, chunk_size=16)
+        dense = np.zeros((sl, sl, sl, 2), dtype="uint16")
+
+        def random_slice():
+            a = rng.integers(0, sl)
+            return slice(a, rng.integers(a, sl + 1))
+
+        for i in range(1000):
+            r = rng.random()
+            if r < 0.4:
+                key = tuple(rng.integers(-sl, sl, 3))
+                value = (rng.integers(0, 3), rng.integers(0, 4))
+            elif r < 0.8:
+                key = (random_slice(), random_slice(), random_slice(), 0)
+                value = rng.integers(0, 2)
+            else:
+                key = (random_slice(), rng.integers(0, sl), random_slice())
+                value = rng.integers(0, 3, (2,))
+            blocks[key] = value
+            dense[key] = value
+            key = (random_slice(), random_slice(), random_slice())
+            assert (blocks[key] == dense[key]).all()
+        assert (np.asarray(blocks) == dense).all()
+        nz = dense[:, :, :, 0] > 0
+        top = np.where(nz.any(axis=1), sl - 1 - np.argmax(nz[:, ::-1, :], axis=1), -1)
+        assert (blocks.top == top).all()
+        locs, idms = blocks.nonzero()
+        assert len(locs) == nz.sum()
+        assert (dense[locs[:, 0], locs[:, 1], locs[:, 2]] == idms).all()
+
+    def test_sparse_chunks(self):
+        blocks = ChunkedBlocks(64, chunk_size=16)
+        blocks[:, 0:4, :, 0] = 7
+        assert len(blocks.chunks) == 16
+        assert len(blocks.pop_dirty_chunks()) == 16
+        blocks[40, 50, 3] = (1, 0)
+        assert blocks.height_map()[40, 3] == 50
+        assert blocks.pop_dirty_chunks().tolist() == [[2, 3, 0]]
+        blocks[40, 50, 3] = (0, 0)
+        assert len(blocks.chunks) == 16
+        assert blocks.height_map()[40, 3] == 3
+        blocks[:] = 0
+        assert len(blocks.chunks) == 0
+        assert blocks.top.max() == -1
+
+    def test_world_height_map(self):
+        opts = Opt()
+        opts.sl = 32
+        spec = {"players": [], "mobs": [], "items": [], "coord_shift": (0, 0, 0), "agent": {}}
+        world = World(opts, spec)
+        nz = np.asarray(world.blocks)[:, :, :, 0] > 0
+        assert len(world.blocks_to_dict()) == nz.sum()
+        height_map = world.get_height_map()
+        world.place_block(((3, 20, 3), (1, 0)))
+        assert world.get_height_map()[3, 3] == 20
+        assert tuple(world.get_blocks(3, 3, 20, 20, 3, 3)[0, 0, 0]) == (1, 0)
+        world.dig((3, 20, 3))
+        assert (world.get_height_map() == height_map).all()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import threading
+import time
+import unittest
+from unittest import mock
+from droidlet.base_util import Pos
+from droidlet.lowlevel.minecraft import pyworld_mover
+from droidlet.lowlevel.minecraft.pyworld_mover import PyWorldMover, PyWorldTimeout
+
+AGENT = (1, "craftassist_agent", (0.0, 63.0, 0.0), (0.0, 0.0), None, None)
+OTHER = (2, "speaker", (3.0, 63.0, 4.0), (90.0, 0.0), None, None)
+MOB = (7, 90, 1.0, 63.0, 2.0, 0.0, 0.0)
+
+
+class FakeWorldServer:
+    """
+    stands in for a socketio.Client connected to a world server.  the on_<event> methods
+    answer requests, immediately or after delay seconds on another thread, like the ack
+    callbacks socketio runs on its own thread.  events in ignored are never answered
+    """
+
+    def __init__(self):
+        self.delay = 0
+        self.ignored = set()
+        self.requests = []
+        self.chats = []
+        self.changed_blocks = {}
+
+    def connect(self, url):
+        pass
+
+    def emit(self, event, data=None, callback=None):
+        self.requests.append(event)
+        handler = getattr(self, "on_" + event, None)
+        if callback is None or handler is None or event in self.ignored:
+            return
+        response = handler(data)
+        if self.delay:
+            threading.Timer(self.delay, callback, (response,)).start()
+        else:
+            callback(response)
+
+    def on_get_world_info(self, data):
+        return {"sl": 32, "coord_shift": (0, 0, 0)}
+
+    def on_get_player(self, data):
+        return {"player": AGENT}
+
+    def on_get_players(self, data):
+        return [AGENT, OTHER]
+
+    def on_get_mobs(self, data):
+        return [MOB]
+
+    def on_get_incoming_chats(self, data):
+        chats, self.chats = self.chats, []
+        return {"chats": chats}
+
+    def on_get_changed_blocks(self, data):
+        # like the server, which can't send dicts with tuples for keys
+        blocks = {str(k): list(v) for k, v in self.changed_blocks.items()}
+        self.changed_blocks = {}
+        return blocks
+
+    def on_observe(self, data):
+        return {
+            "player": AGENT,
+            "players": self.on_get_players(data),
+            "changed_blocks": self.on_get_changed_blocks(data),
+            "chats": self.on_get_incoming_chats(data)["chats"],
+            "mobs": self.on_get_mobs(data),
+        }
+
+
+class PyWorldMoverTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeWorldServer()
+        with mock.patch.object(pyworld_mover.socketio, "Client", lambda: self.server):
+            self.mover = PyWorldMover(timeout=1.0)
+
+    def test_response(self):
+        self.assertEqual(self.mover.entityId, 1)
+        player = self.mover.get_player()
+        self.assertEqual(player.name, "craftassist_agent")
+        self.assertEqual(player.pos, Pos(0.0, 63.0, 0.0))
+        # responses arriving on another thread
+        self.server.delay = 0.05
+        self.assertEqual([p.entityId for p in self.mover.get_other_players()], [2])
+
+    def test_timeout(self):
+        self.server.ignored.add("get_player")
+        self.mover.timeout = 0.05
+        start = time.time()
+        with self.assertRaises(PyWorldTimeout):
+            self.mover.get_player()
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_late_response(self):
+        self.server.delay = 0.2
+        response = self.mover.request("get_player")
+        with self.assertRaises(PyWorldTimeout):
+            response.result(0.01)
+        self.assertFalse(response.done())
+        # the late response completes the request, and doesn't get mixed up with the
+        # responses to the next ones
+        self.server.delay = 0
+        self.server.chats = ["hello"]
+        self.assertEqual(self.mover.get_incoming_chats(), ["hello"])
+        self.assertEqual(response.result(1.0), {"player": AGENT})
+        self.assertTrue(response.done())
+        self.assertEqual(self.mover.get_mobs()[0].entityId, 7)
+
+    def test_observation(self):
+        self.server.chats = ["come here"]
+        self.server.changed_blocks = {(1, 2, 3): (4, 0)}
+        self.server.requests = []
+        with self.mover.observation():
+            self.assertEqual(self.mover.get_player().entityId, 1)
+            self.assertEqual([p.entityId for p in self.mover.get_other_players()], [2])
+            self.assertEqual([m.entityId for m in self.mover.get_mobs()], [7])
+            self.assertEqual(self.mover.get_incoming_chats(), ["come here"])
+            self.assertEqual(self.mover.get_incoming_chats(), [])
+        self.assertEqual(self.server.requests, ["observe"])
+
+        # the changed blocks weren't read in the observation, so they are kept for the
+        # next call, along with the ones changed since
+        self.server.changed_blocks = {(5, 6, 7): (0, 0)}
+        self.assertEqual(
+            self.mover.get_changed_blocks(), [((1, 2, 3), (4, 0)), ((5, 6, 7), (0, 0))]
+        )
+        self.assertEqual(self.mover.get_changed_blocks(), [])
+        self.assertEqual(self.server.requests[1:], ["get_changed_blocks"] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,7 @@ Copyright (c) Facebook, Inc. and its affiliates.
 """
 import numpy as np
 import logging
+import functools
 from scipy.spatial.transform import Rotation
 import math
 import os
@@ -19,6 +20,8 @@ from pathlib import Path
 import matplotlib.pyplot as plt
 
 from droidlet.shared_data_struct.rotation import yaw_pitch
+from droidlet.shared_data_struct.robot_shared_utils import ObstacleMapChanges
+from droidlet.lowlevel.robot_coordinate_utils import xyz_pyrobot_to_canonical_coords
 
 MAX_PAN_RAD = np.pi / 4
 CAMERA_HEIGHT = 0.6
@@ -77,6 +80,72 @@ def transform_pose(XYZ, current_pose):
     return XYZ
 
 
+ROS_TO_HABITAT_FRAME = np.array([[0.0, -1.0, 0.0], [0.0, 0.0, -1.0], [1.0, 0.0, 0.0]])
+
+
+@functools.lru_cache(maxsize=4)
+def _uv_one_in_cam(intrinsic_mat, height, width):
+    """the ray through each pixel in camera coords, (3, height * width).
+    intrinsic_mat is a tuple of rows so it can be cached"""
+    intrinsic_mat_inv = np.linalg.inv(np.array(intrinsic_mat))
+    img_pixs = np.mgrid[0:height:1, 0:width:1]
+    img_pixs = img_pixs.reshape(2, -1)
+    img_pixs[[0, 1], :] = img_pixs[[1, 0], :]
+    uv_one = np.concatenate((img_pixs, np.ones((1, img_pixs.shape[1]))))
+    return np.dot(intrinsic_mat_inv, uv_one)
+
+
+def compute_pts_in_world(depth, rot, trans, base_state, intrinsic_mat, backend="habitat"):
+    """
+    Reprojects a depth image to a point cloud in pyrobot world coordinates.
+
+    The camera to base transform (rot, trans), the ros to habitat frame change and the
+    base pose are folded into a single affine transform, so the points are computed
+    with one (N, 3) x (3, 3) product.
+
+    Args:
+        depth (np.array): (H, W) depth in metres
+        rot, trans: the camera pose in the base frame
+        base_state: (x, y, yaw) of the base
+        intrinsic_mat: (3, 3) camera intrinsics
+        backend (str): "habitat" if the camera pose is in the habitat frame
+
+    Returns:
+        (H * W, 3) array of points
+    """
+    height, width = depth.shape[:2]
+    uv_one_in_cam = _uv_one_in_cam(tuple(map(tuple, np.asarray(intrinsic_mat))), height, width)
+    rot = np.asarray(rot, dtype=np.float64)
+    trans = np.asarray(trans, dtype=np.float64).reshape(-1)
+    if backend == "habitat":
+        rot = ROS_TO_HABITAT_FRAME.T @ rot
+        trans = ROS_TO_HABITAT_FRAME.T @ trans
+    # see transform_pose
+    R = Rotation.from_euler("Z", base_state[2]).as_matrix()
+    rot = R @ rot
+    trans = R @ trans + [base_state[0], base_state[1], 0.0]
+    pts_in_cam = np.multiply(uv_one_in_cam, depth.reshape(-1))
+    return (rot @ pts_in_cam).T + trans
+
+
+def slam_map_changes_to_canonical(changes):
+    """converts the output of the slam service's get_map_changes to ObstacleMapChanges,
+    with the map indices transformed to (x, z) canonical coords all at once"""
+    map2real = np.asarray(changes["map2real"])
+
+    def to_canonical(idx):
+        xy = np.asarray(idx, dtype=np.float64).reshape(-1, 2) @ map2real[:, :2].T + map2real[:, 2]
+        xyz = xyz_pyrobot_to_canonical_coords(np.pad(xy, ((0, 0), (0, 1))))
+        return xyz[:, [0, 2]]
+
+    return ObstacleMapChanges(
+        changes["version"],
+        changes["full"],
+        to_canonical(changes["added"]),
+        to_canonical(changes["removed"]),
+    )
+
+
 def get_move_target_for_point(base_pos, target, eps=0.5):
     """
     For point, we first want to move close to the object and then point to it.
@@ -0,0 +1,88 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import unittest
+import numpy as np
+
+from droidlet.lowlevel.frame_transport import (
+    FrameDecoder,
+    FrameEncoder,
+    StaleFrameError,
+    decode_array,
+    encode_array,
+    is_local_address,
+)
+
+
+def random_frame(seed=0, height=48, width=64):
+    rng = np.random.RandomState(seed)
+    rgb = rng.randint(0, 256, size=(height, width, 3)).astype(np.uint8)
+    depth = (rng.rand(height, width) * 10).astype(np.float32)
+    return rgb, depth
+
+
+class FrameTransportTest(unittest.TestCase):
+    def test_lossless_codecs(self):
+        rgb, depth = random_frame()
+        for codec in ["raw", "zlib", "png"]:
+            out = decode_array(encode_array(rgb, codec))
+            np.testing.assert_array_equal(out, rgb)
+            self.assertTrue(out.flags.writeable)
+        for codec in ["raw", "zlib"]:
+            np.testing.assert_array_equal(decode_array(encode_array(depth, codec)), depth)
+
+    def test_depth_scale(self):
+        _, depth = random_frame()
+        for codec in ["raw", "zlib", "png"]:
+            encoded = encode_array(depth, codec, scale=1000.0)
+            self.assertEqual(encoded["dtype"], np.dtype(np.uint16).str)
+            out = decode_array(encoded)
+            self.assertEqual(out.dtype, np.float32)
+            np.testing.assert_allclose(out, depth, atol=0.5e-3 + 1e-6)
+
+    def test_jpeg(self):
+        rgb = np.zeros((48, 64, 3), dtype=np.uint8)
+        rgb[:, :32] = (200, 30, 100)
+        out = decode_array(encode_array(rgb, "jpeg", quality=95))
+        self.assertEqual(out.shape, rgb.shape)
+        self.assertLess(np.abs(out.astype(int) - rgb).mean(), 5)
+
+    def test_unknown_codec(self):
+        rgb, _ = random_frame()
+        self.assertRaises(ValueError, encode_array, rgb, "gif")
+
+    def test_shared_memory(self):
+        encoder = FrameEncoder(shm_slots=2)
+        decoder = FrameDecoder()
+        try:
+            frames = [random_frame(seed) for seed in range(3)]
+            encoded = [encoder.encode(*f, use_shm=True) for f in frames[:2]]
+            # only a few offsets go through pyro
+            self.assertNotIn("data", encoded[0]["rgb"])
+            for frame, e in zip(frames, encoded):
+                rgb, depth = decoder.decode(e)
+                np.testing.assert_array_equal(rgb, frame[0])
+                np.testing.assert_array_equal(depth, frame[1])
+            # the third frame goes in the slot of the first
+            encoded.append(encoder.encode(*frames[2], use_shm=True))
+            self.assertRaises(StaleFrameError, decoder.decode, encoded[0])
+            rgb, _ = decoder.decode(encoded[2])
+            np.testing.assert_array_equal(rgb, frames[2][0])
+
+            # a frame of a different size gets a new segment
+            small = random_frame(3, height=8, width=8)
+            rgb, depth = decoder.decode(encoder.encode(*small, use_shm=True))
+            np.testing.assert_array_equal(depth, small[1])
+            self.assertEqual(list(decoder.attached), [encoder.ring.name])
+        finally:
+            decoder.close()
+            encoder.close()
+
+    def test_is_local_address(self):
+        self.assertTrue(is_local_address("127.0.0.1"))
+        self.assertTrue(is_local_address("localhost"))
+        self.assertFalse(is_local_address(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
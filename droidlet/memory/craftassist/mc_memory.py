@@ -4,7 +4,8 @@ Copyright (c) Facebook, Inc. and its affiliates.
 import copy
 import os
 import random
-from collections import namedtuple
+import numpy as np
+from collections import namedtuple, Counter
 from typing import Optional, List
 from droidlet.memory.sql_memory import AgentMemory, DEFAULT_PIXELS_PER_UNIT
 from droidlet.base_util import diag_adjacent, IDM, XYZ, Block, npy_to_blocks_list
@@ -88,6 +89,8 @@ class MCAgentMemory(AgentMemory):
 
         if copy_from_backup is not None:
             copy_from_backup.backup(self.db)
+            # the backup replaces the Tasks table without firing the index triggers
+            self.task_index.reload()
             self.make_self_mem()
         else:
             self.nodes[SchematicNode.NODE_TYPE]._load_schematics(
@@ -128,9 +131,17 @@ class MCAgentMemory(AgentMemory):
                 near_agent: block objects, holes and blocks near the agent
                 labeled_blocks: labels and resulting locations from semantic segmentation model
 
+        All writes made for one perception_output are grouped into a single
+        memory.batch() transaction.
+
         :return:
         updated_areas_to_perceive: list of (xyz, idm) representing the area agent should perceive
         """
+        with self.batch():
+            return self._update(perception_output, areas_to_perceive)
+
+    def _update(self, perception_output: namedtuple = None, areas_to_perceive: List = []):
+        """Applies perception_output to memory; see update()"""
         if not perception_output:
             return areas_to_perceive
         output = {}
@@ -297,6 +308,10 @@ class MCAgentMemory(AgentMemory):
                 for c, tags in perception_output.near_agent["airtouching_blocks"]:
                     InstSegNode.create(self, c, tags=tags)
 
+        """Update the memory with incremental block object updates from heuristic perception"""
+        if perception_output.block_object_updates:
+            self.update_block_objects(perception_output.block_object_updates)
+
         """Update the memory with labeled blocks from SubComponent classifier"""
         if perception_output.labeled_blocks:
             for label, locations in perception_output.labeled_blocks.items():
@@ -359,6 +374,61 @@ class MCAgentMemory(AgentMemory):
                 self, (xyz, idm), chosen_memid, "BlockObjects", player_placed, agent_placed
             )
 
+    def update_block_objects(self, updates):
+        """
+        Applies the add/modify/remove updates of an IncrementalBlockObjects to the
+        BlockObjects in memory.  The "removed" voxels are deleted from whatever block
+        object holds them (block objects left empty are deleted by the schema triggers).
+        The blocks of each "add" or "modify" are put into the block object holding
+        most of them, merging in any other block objects holding the rest;
+        a block object can only be used for one update, so a component that split
+        keeps its memory for one part and the other parts become new block objects.
+        """
+        claimed = set()
+        for update in updates:
+            self._remove_block_object_voxels(update.get("removed", []))
+            if update["op"] == "remove":
+                continue
+            xyzs = np.array([xyz for xyz, _ in update["blocks"]], dtype="int64").reshape(-1, 3)
+            idms = np.array([idm for _, idm in update["blocks"]], dtype="int64").reshape(-1, 2)
+            owners = [m for m, _ in VoxelObjectNode._voxels_in_region(self, xyzs, "BlockObjects")]
+            candidates = [m for m, _ in Counter(owners).most_common() if m not in claimed]
+            if candidates:
+                memid = candidates[0]
+                if len(candidates) > 1:
+                    # merge tags and voxels of the other block objects
+                    others = candidates[1:]
+                    where = " OR ".join(["subj=?"] * len(others))
+                    self.db_write("UPDATE Triples SET subj=? WHERE " + where, memid, *others)
+                    where = " OR ".join(["uuid=?"] * len(others))
+                    cmd = "UPDATE VoxelObjects SET uuid=? WHERE "
+                    self.db_write(cmd + where, memid, *others)
+                VoxelObjectNode.upsert_blocks(self, xyzs, idms, memid, "BlockObjects")
+                self.set_memory_updated_time(memid)
+            else:
+                if owners:
+                    # voxels of a block object used by an earlier update
+                    self._remove_block_object_voxels(xyzs)
+                memid = BlockObjectNode.create_bulk(self, xyzs, idms)
+                for color_tag in set(update.get("color_tags", [])):
+                    self.nodes[TripleNode.NODE_TYPE].create(
+                        self, subj=memid, pred_text="has_colour", obj_text=color_tag
+                    )
+            claimed.add(memid)
+
+    def _remove_block_object_voxels(self, xyzs):
+        """delete the BlockObjects voxels at xyzs"""
+        xyzs = np.array(xyzs, dtype="int64").reshape(-1, 3)
+        owners = VoxelObjectNode._voxels_in_region(self, xyzs, "BlockObjects")
+        if not owners:
+            return
+        self.db_write_many(
+            "DELETE FROM VoxelObjects WHERE x=? AND y=? AND z=? and ref_type=?",
+            [(x, y, z, "BlockObjects") for _, (x, y, z) in owners],
+        )
+        for memid in set(m for m, _ in owners):
+            VoxelObjectNode._update_voxel_stats(self, memid)
+
     def add_holes_to_mem(self, holes):
         """
         Adds the list of holes to memory and return hole memories.
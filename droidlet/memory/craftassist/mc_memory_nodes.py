@@ -213,6 +213,95 @@ class VoxelObjectNode(ReferenceObjectNode):
             cmd, memid, b, m, memory.get_time(), player_placed, agent_placed, ref_type, x, y, z
         )
 
+    @classmethod
+    def _voxels_in_region(self, memory, xyzs, ref_type):
+        """Return (memid, (x, y, z)) for every voxel of ref_type located at
+        one of the rows of the (N, 3) array xyzs, with a single bounding-box read"""
+        if len(xyzs) == 0:
+            return []
+        m = xyzs.min(axis=0).tolist()
+        M = xyzs.max(axis=0).tolist()
+        r = memory._db_read(
+            "SELECT uuid, x, y, z FROM VoxelObjects WHERE ref_type=? AND x>=? AND x<=? AND y>=? AND y<=? AND z>=? AND z<=?",
+            ref_type,
+            m[0],
+            M[0],
+            m[1],
+            M[1],
+            m[2],
+            M[2],
+        )
+        wanted = set(map(tuple, xyzs.tolist()))
+        return [(memid, (x, y, z)) for memid, x, y, z in r if (x, y, z) in wanted]
+
+    @classmethod
+    def _update_voxel_stats(self, memory, memid):
+        """Recompute the voxel count and the mean x, y, z of a reference object
+        from its voxels with one aggregate update"""
+        memory.db_write(
+            "UPDATE ReferenceObjects SET (voxel_count, x, y, z) = (SELECT COUNT(*), AVG(x), AVG(y), AVG(z) FROM VoxelObjects WHERE uuid=?) WHERE uuid=?",
+            memid,
+            memid,
+        )
+
+    @classmethod
+    def upsert_blocks(
+        self,
+        memory,
+        xyzs,
+        idms,
+        memid: str,
+        ref_type: str,
+        player_placed: bool = False,
+        agent_placed: bool = False,
+    ):
+        """Bulk version of upsert_block: upserts every voxel of the (N, 3) array xyzs
+        with the matching (blockid, meta) row of the (N, 2) array idms (or no block
+        type if idms is None) into memid.  Voxels held by another object of the same
+        ref_type are moved to memid.  Writes use executemany, and voxel_count and the
+        mean location are recomputed once per affected object instead of per voxel.
+        """
+        xyzs = np.asarray(xyzs, dtype=np.int64).reshape(-1, 3)
+        if len(xyzs) == 0:
+            return
+        if idms is None:
+            idms = [(None, None)] * len(xyzs)
+        else:
+            idms = np.asarray(idms).reshape(-1, 2).tolist()
+        # later duplicates of a location win, as they would with repeated upsert_block
+        blocks = {tuple(xyz): tuple(idm) for xyz, idm in zip(xyzs.tolist(), idms)}
+        owners = dict((xyz, old) for old, xyz in self._voxels_in_region(memory, xyzs, ref_type))
+        t = memory.get_time()
+        inserts, updates, removals = [], [], []
+        affected = {memid}
+        for (x, y, z), (b, m) in blocks.items():
+            row = (memid, b, m, t, player_placed, agent_placed, ref_type, x, y, z)
+            old_memid = owners.get((x, y, z))
+            if old_memid == memid:
+                updates.append(row)
+            else:
+                if old_memid is not None:
+                    removals.append((x, y, z, ref_type))
+                    affected.add(old_memid)
+                inserts.append(row)
+        with memory.batch():
+            if removals:
+                memory.db_write_many(
+                    "DELETE FROM VoxelObjects WHERE x=? AND y=? AND z=? and ref_type=?", removals
+                )
+            if updates:
+                memory.db_write_many(
+                    "UPDATE VoxelObjects SET uuid=?, bid=?, meta=?, updated=?, player_placed=?, agent_placed=? WHERE ref_type=? AND x=? AND y=? AND z=?",
+                    updates,
+                )
+            if inserts:
+                memory.db_write_many(
+                    "INSERT INTO VoxelObjects (uuid, bid, meta, updated, player_placed, agent_placed, ref_type, x, y, z) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    inserts,
+                )
+            for a in affected:
+                self._update_voxel_stats(memory, a)
+
 
 class BlockObjectNode(VoxelObjectNode):
     """This is a voxel object that represents a set of physically present blocks.
@@ -258,27 +347,43 @@ class BlockObjectNode(VoxelObjectNode):
                           ((2, 0, 34), (2, 2)), ((3, 0, 34), (10, 0))]
             >>> create(memory, blocks)
         """
+        xyzs = [xyz for xyz, _ in blocks]
+        idms = [idm for _, idm in blocks]
+        return cls.create_bulk(memory, xyzs, idms)
+
+    @classmethod
+    def create_bulk(cls, memory, xyzs, idms) -> str:
+        """Creates a new entry into the ReferenceObjects table from an (N, 3)
+        array of block locations and an (N, 2) array of (blockid, meta)
+        Returns:
+            string: memid of the entry
+        Examples::
+            >>> memory = AgentMemory()
+            >>> xyzs = np.array([[1, 0, 34], [1, 0, 35], [2, 0, 34]])
+            >>> idms = np.array([[10, 1], [10, 1], [2, 2]])
+            >>> create_bulk(memory, xyzs, idms)
+        """
+        xyzs = np.asarray(xyzs, dtype=np.int64).reshape(-1, 3)
         # check if block object already exists in memory
-        for xyz, _ in blocks:
-            old_memids = memory.get_object_info_by_xyz(xyz, "BlockObjects")
-            if old_memids:
-                return old_memids[0]
-        memid = cls.new(memory)
-        # TODO check/assert this isn't there...
-        cmd = "INSERT INTO ReferenceObjects (uuid, x, y, z, ref_type, voxel_count) VALUES ( ?, ?, ?, ?, ?, ?)"
-        # TODO this is going to cause a bug, need better way to initialize and track mean loc
-        memory.db_write(cmd, memid, 0, 0, 0, "BlockObjects", 0)
-        for block in blocks:
-            VoxelObjectNode.upsert_block(memory, block, memid, "BlockObjects")
-        memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_block_object")
-        memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_VOXEL_OBJECT")
-        memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_physical_object")
-        memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_destructible")
-        # this is a hack until memory_filters does "not"
-        memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_not_location")
+        old = dict((xyz, m) for m, xyz in cls._voxels_in_region(memory, xyzs, "BlockObjects"))
+        for xyz in xyzs.tolist():
+            if tuple(xyz) in old:
+                return old[tuple(xyz)]
+        with memory.batch():
+            memid = cls.new(memory)
+            # TODO check/assert this isn't there...
+            cmd = "INSERT INTO ReferenceObjects (uuid, x, y, z, ref_type, voxel_count) VALUES ( ?, ?, ?, ?, ?, ?)"
+            memory.db_write(cmd, memid, 0, 0, 0, "BlockObjects", 0)
+            VoxelObjectNode.upsert_blocks(memory, xyzs, idms, memid, "BlockObjects")
+            memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_block_object")
+            memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_VOXEL_OBJECT")
+            memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_physical_object")
+            memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_destructible")
+            # this is a hack until memory_filters does "not"
+            memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_not_location")
         logging.debug(
             "Added block object {} with {} blocks, {}".format(
-                memid, len(blocks), Counter([idm for _, idm in blocks])
+                memid, len(xyzs), Counter(map(tuple, np.asarray(idms).reshape(-1, 2).tolist()))
             )
         )
 
@@ -331,45 +436,54 @@ class InstSegNode(VoxelObjectNode):
             >>> tags = ["shiny", "bright"]
             >>> create(memory, locs=locs, tags=tags)
         """
-        # TODO option to not overwrite
-        # check if instance segmentation object already exists in memory
-        inst_memids = {}
-        for xyz in locs:
-            m = memory._db_read(
-                'SELECT uuid from VoxelObjects WHERE ref_type="inst_seg" AND x=? AND y=? AND z=?',
-                *xyz,
-            )
-            if len(m) > 0:
-                for memid in m:
-                    inst_memids[memid[0]] = True
-        # FIXME just remember the locs in the first pass
-        for m in inst_memids.keys():
-            olocs = memory._db_read("SELECT x, y, z from VoxelObjects WHERE uuid=?", m)
-            # TODO maybe make an archive?
-            if len(set(olocs) - set(locs)) == 0:
-                memory.forget(m)
+        return cls.create_bulk(memory, locs, tags=tags)
 
-        memid = cls.new(memory)
-        loc = np.mean(locs, axis=0)
-        # TODO check/assert this isn't there...
-        cmd = "INSERT INTO ReferenceObjects (uuid, x, y, z, ref_type) VALUES ( ?, ?, ?, ?, ?)"
-        memory.db_write(cmd, memid, loc[0], loc[1], loc[2], "inst_seg")
-        for loc in locs:
+    @classmethod
+    def create_bulk(cls, memory, xyzs, tags=[]) -> str:
+        """Creates a new entry into the VoxelObjects table from an (N, 3)
+        array of locations
+
+        Returns:
+            string: memid of the entry
+
+        Examples::
+            >>> memory = AgentMemory()
+            >>> xyzs = np.array([[1, 0, 34], [1, 0, 35], [2, 0, 34], [3, 0, 34]])
+            >>> create_bulk(memory, xyzs, tags=["shiny", "bright"])
+        """
+        xyzs = np.asarray(xyzs, dtype=np.int64).reshape(-1, 3)
+        with memory.batch():
+            # TODO option to not overwrite
+            # check if instance segmentation object already exists in memory
+            inst_memids = {m for m, _ in cls._voxels_in_region(memory, xyzs, "inst_seg")}
+            locs = set(map(tuple, xyzs.tolist()))
+            for m in inst_memids:
+                olocs = memory._db_read("SELECT x, y, z from VoxelObjects WHERE uuid=?", m)
+                # TODO maybe make an archive?
+                if len(set(olocs) - locs) == 0:
+                    memory.forget(m)
+
+            memid = cls.new(memory)
+            # TODO check/assert this isn't there...
+            cmd = "INSERT INTO ReferenceObjects (uuid, x, y, z, ref_type) VALUES ( ?, ?, ?, ?, ?)"
+            memory.db_write(cmd, memid, 0, 0, 0, "inst_seg")
+            # instance segmentation objects may overlap, so voxels are not upserted
             cmd = "INSERT INTO VoxelObjects (uuid, x, y, z, ref_type) VALUES ( ?, ?, ?, ?, ?)"
-            memory.db_write(cmd, memid, loc[0], loc[1], loc[2], "inst_seg")
-        memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_VOXEL_OBJECT")
-        memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_inst_seg")
-        memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_destructible")
-        # this is a hack until memory_filters does "not"
-        memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_not_location")
-        for tag in tags:
-            if type(tag) is str:
-                memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, tag)
-            elif type(tag) is dict:
-                for k, v in tag.items():
-                    memory.nodes[TripleNode.NODE_TYPE].create(
-                        memory, subj=memid, pred_text=k, obj_text=v
-                    )
+            memory.db_write_many(cmd, [(memid, x, y, z, "inst_seg") for x, y, z in locs])
+            cls._update_voxel_stats(memory, memid)
+            memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_VOXEL_OBJECT")
+            memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_inst_seg")
+            memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_destructible")
+            # this is a hack until memory_filters does "not"
+            memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_not_location")
+            for tag in tags:
+                if type(tag) is str:
+                    memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, tag)
+                elif type(tag) is dict:
+                    for k, v in tag.items():
+                        memory.nodes[TripleNode.NODE_TYPE].create(
+                            memory, subj=memid, pred_text=k, obj_text=v
+                        )
         return memid
 
     def __init__(self, memory, memid: str):
@@ -19,6 +19,8 @@ NONPICKLE_ATTRS = [
     "remove_condition",
     "stop_condition",
     "movement",
+    # search state of Move tasks, kept between steps without pickling it
+    "planner",
 ]
 
 
@@ -182,8 +184,8 @@ class SwarmWorkerMemory:
     def get_mem_by_id(self, memid: str, node_type: str = None):
         return self._db_command("get_mem_by_id", memid, node_type)
 
-    def basic_search(self, query):
-        return self._db_command("basic_search", query)
+    def basic_search(self, query, get_all=False, params=None):
+        return self._db_command("basic_search", query, get_all, params)
 
     def get_block_object_by_xyz(self, xyz: XYZ) -> Optional["VoxelObjectNode"]:
         return self._db_command("get_block_object_by_xyz", xyz)
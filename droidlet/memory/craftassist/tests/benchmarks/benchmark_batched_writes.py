@@ -0,0 +1,89 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+Compares per-tick latency of MCAgentMemory.update with and without
+memory.batch() on a synthetic CraftAssistPerceptionData stream.  The unbatched
+baseline writes one row per db_write, each in its own transaction, as memory
+did before batch() and the bulk inserts built on db_write_many.
+
+    python -m droidlet.memory.craftassist.tests.benchmarks.benchmark_batched_writes
+"""
+import argparse
+import random
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+from droidlet.memory.craftassist.mc_memory import MCAgentMemory
+from droidlet.shared_data_struct.craftassist_shared_utils import CraftAssistPerceptionData
+
+
+def synthetic_perception_stream(num_ticks, objects_per_tick, radius, seed=0):
+    """Yields one CraftAssistPerceptionData per tick, each with fresh block objects
+    (small random walls), air-touching blocks and changed blocks near the agent"""
+    rng = random.Random(seed)
+    for t in range(num_ticks):
+        block_objects = []
+        airtouching = []
+        for i in range(objects_per_tick):
+            x0 = 4 * radius * t + 2 * radius * i
+            y0, z0 = 60, rng.randint(-radius, radius)
+            h, w = rng.randint(2, 5), rng.randint(2, 5)
+            idm = (rng.choice([1, 2, 3, 4, 5]), 0)
+            blocks = [((x0 + dx, y0 + dy, z0), idm) for dx in range(w) for dy in range(h)]
+            block_objects.append((blocks, ["grey"]))
+            airtouching.append(([(x, y + 1, z) for (x, y, z), _ in blocks], ["_on_surface"]))
+        changed = {
+            ((rng.randint(-radius, radius), 60, rng.randint(-radius, radius)), (1, 0)): (
+                True,
+                True,
+                False,
+            )
+            for _ in range(objects_per_tick)
+        }
+        near_agent = {
+            "block_object_attributes": block_objects,
+            "holes": [],
+            "airtouching_blocks": airtouching,
+        }
+        yield CraftAssistPerceptionData(changed_block_attributes=changed, near_agent=near_agent)
+
+
+def write_per_row(memory):
+    """makes memory run every write through db_write, one row and one commit at a time"""
+    memory.batch = lambda: nullcontext(memory)
+    memory.db_write_many = lambda query, rows: sum(memory.db_write(query, *row) for row in rows)
+
+
+def run(batched, num_ticks, objects_per_tick, radius, db_file=":memory:", warmup=2):
+    memory = MCAgentMemory(db_file=db_file, load_minecraft_specs=False, load_block_types=False)
+    if not batched:
+        write_per_row(memory)
+    tick_times = []
+    stream = synthetic_perception_stream(num_ticks + warmup, objects_per_tick, radius)
+    for perception_output in stream:
+        start = time.perf_counter()
+        memory.update(perception_output)
+        tick_times.append(time.perf_counter() - start)
+        memory.add_tick()
+    return np.array(tick_times[warmup:])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_ticks", type=int, default=50)
+    parser.add_argument("--objects_per_tick", type=int, default=10)
+    parser.add_argument("--radius", type=int, default=15)
+    parser.add_argument(
+        "--db_file", default=":memory:", help="use a file to include the cost of disk commits"
+    )
+    args = parser.parse_args()
+
+    for name, batched in [("unbatched", False), ("batched", True)]:
+        t = run(batched, args.num_ticks, args.objects_per_tick, args.radius, args.db_file)
+        print(
+            "{:>10}: mean {:.2f} ms/tick, p90 {:.2f} ms/tick".format(
+                name, 1000 * t.mean(), 1000 * np.percentile(t, 90)
+            )
+        )
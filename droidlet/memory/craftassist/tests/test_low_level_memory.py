@@ -2,6 +2,7 @@
 Copyright (c) Facebook, Inc. and its affiliates.
 """
 import unittest
+import numpy as np
 from collections import namedtuple
 from droidlet.memory.craftassist.mc_memory import MCAgentMemory
 from droidlet.memory.craftassist.mc_memory_nodes import (
@@ -13,11 +14,17 @@ from droidlet.memory.craftassist.mc_memory_nodes import (
     DanceNode,
     VoxelObjectNode,
 )
-from droidlet.memory.memory_nodes import PlayerNode, TripleNode
+from droidlet.memory.memory_nodes import PlayerNode, TripleNode, TaskNode
 from droidlet.base_util import Pos, Look, Player
 from droidlet.shared_data_struct.craftassist_shared_utils import Slot, Item, Mob, ItemStack
 
 
+class FakeTask:
+    def __init__(self):
+        self.run_count = 0
+        self.finished = False
+
+
 class BasicTest(unittest.TestCase):
     def test_basic_search_entityId(self):
         self.memory = MCAgentMemory()
@@ -48,6 +55,39 @@ class BasicTest(unittest.TestCase):
         VoxelObjectNode.upsert_block(self.memory, ((3, 3, 3), (1, 1)), bo_memid, "BlockObjects")
         assert len(self.memory.get_mem_by_id(bo_memid).blocks) == 2
 
+    def test_bulk_voxel_apis(self):
+        self.memory = MCAgentMemory()
+        xyzs = np.array([[x, 5, z] for x in range(4) for z in range(3)])
+        idms = np.array([[1, 0]] * len(xyzs))
+        bo_memid = BlockObjectNode.create_bulk(self.memory, xyzs, idms)
+        bo = self.memory.get_mem_by_id(bo_memid)
+        assert len(bo.blocks) == 12
+        assert bo.blocks[(3, 5, 2)] == (1, 0)
+        count, x, y, z = self.memory._db_read_one(
+            "SELECT voxel_count, x, y, z FROM ReferenceObjects WHERE uuid=?", bo_memid
+        )
+        assert count == 12
+        assert (x, y, z) == (1.5, 5.0, 1.0)
+        # creating over existing voxels returns the existing object
+        assert BlockObjectNode.create_bulk(self.memory, xyzs[:2], idms[:2]) == bo_memid
+
+        # upserting moves voxels from other objects of the same ref_type
+        other_memid = BlockObjectNode.create(self.memory, [((10, 5, 0), (2, 0))])
+        VoxelObjectNode.upsert_blocks(
+            self.memory, [[10, 5, 0], [0, 5, 0]], [[3, 0], [4, 0]], bo_memid, "BlockObjects"
+        )
+        bo = self.memory.get_mem_by_id(bo_memid)
+        assert len(bo.blocks) == 13
+        assert bo.blocks[(0, 5, 0)] == (4, 0)
+        assert bo.blocks[(10, 5, 0)] == (3, 0)
+        # the other object lost its only voxel, so it is removed
+        assert not self.memory.check_memid_exists(other_memid, "ReferenceObjects")
+
+        inst_seg_memid = InstSegNode.create_bulk(self.memory, xyzs, tags=["floor"])
+        inst_seg = self.memory.get_mem_by_id(inst_seg_memid)
+        assert len(inst_seg.locs) == 12
+        assert "floor" in inst_seg.tags
+
     def test_block_objects_methods(self):
         self.memory = MCAgentMemory()
         bo_memid = BlockObjectNode.create(self.memory, [((1, 1, 1), (1, 2)), ((2, 2, 2), (2, 3))])
@@ -148,6 +188,15 @@ class BasicTest(unittest.TestCase):
         ItemStackNode.maybe_update_item_stack_position(self.memory, new_item)
         assert self.memory.get_mem_by_id(item_memid).pos == (2.0, 2.0, 2.0)
 
+    def test_copy_from_backup(self):
+        backup = MCAgentMemory()
+        memid = TaskNode.create(backup, FakeTask())
+        # like a prebuilt db, the backup has no self memory
+        backup.db_write("DELETE FROM Memories WHERE uuid=?", backup.self_memid)
+        self.memory = MCAgentMemory(copy_from_backup=backup.db)
+        # the tasks copied from the backup are in the task index
+        assert self.memory.task_index.get_memids(prio=TaskNode.CHECK_PRIO) == [memid]
+
     def test_dance_api(self):
         self.memory = MCAgentMemory()
 
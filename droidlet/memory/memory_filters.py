@@ -1,6 +1,9 @@
 """
 Copyright (c) Facebook, Inc. and its affiliates.
 """
+import re
+import weakref
+from collections import OrderedDict
 from typing import List
 import torch
 from droidlet.memory.filters_conversions import get_inequality_symbol, sqly_to_new_filters
@@ -51,7 +54,7 @@ def check_value_comparison_match(value, comparison_symbol):
 
 def get_all_memids_of_node_type(agent_memory, memtype, allow_archives=False):
     # FIXME memtype might be a union of node types
-    memtypes = agent_memory.node_children[memtype]
+    memtypes = list(agent_memory.node_children[memtype])
     node_type_clause = "(" + (" OR node_type=? " * len(memtypes))[3:-1] + ")"
     cmd = "SELECT uuid FROM Memories WHERE " + node_type_clause
     # FIXME deal with this better with node types:
@@ -265,6 +268,122 @@ def random_subsample_idx(num_mems, n, same="DISALLOWED"):
     return torch.multinomial(torch.ones(num_mems), n, replacement=replace).tolist()
 
 
+TRIPLE_SEARCH_COLUMNS = ["subj", "subj_text", "pred_text", "obj", "obj_text"]
+
+
+class NotCompilable(Exception):
+    """raised when a where clause can't be compiled into SQL and must be interpreted"""
+
+
+class QueryParam:
+    """a named placeholder in a cached query, written ":name" in the SQLy text"""
+
+    PATTERN = re.compile(r"^:([A-Za-z_]\w*)$")
+
+    def __init__(self, name):
+        self.name = name
+
+    def bind(self, params):
+        # placeholders without a value are left as the literal text they were parsed from
+        if params is not None and self.name in params:
+            return params[self.name]
+        return ":" + self.name
+
+    def __repr__(self):
+        return "QueryParam({})".format(self.name)
+
+
+def parameterize(d):
+    """
+    returns a copy of the FILTERS dict d with each string value of the form
+    ":name" replaced by a QueryParam
+    """
+    if type(d) is dict:
+        return {k: parameterize(v) for k, v in d.items()}
+    if type(d) is list:
+        return [parameterize(v) for v in d]
+    if type(d) is str:
+        m = QueryParam.PATTERN.match(d)
+        if m:
+            return QueryParam(m.group(1))
+    return d
+
+
+def bind_params(d, params):
+    """
+    returns a copy of the FILTERS dict d with each QueryParam replaced by
+    its value in the params dict
+    """
+    if type(d) is dict:
+        return {k: bind_params(v, params) for k, v in d.items()}
+    if type(d) is list:
+        return [bind_params(v, params) for v in d]
+    if isinstance(d, QueryParam):
+        return d.bind(params)
+    return d
+
+
+class QueryPlan:
+    """
+    a parsed SQLy query.  the where clause is compiled lazily, once
+    for each agent_memory and memtype it is searched with
+    """
+
+    def __init__(self, query):
+        self.filters = parameterize(sqly_to_new_filters(query))
+        # agent_memory --> {memtype: (sql, args) or None if not compilable}
+        self.compiled = weakref.WeakKeyDictionary()
+
+
+class QueryPlanCache:
+    """
+    LRU cache of QueryPlans keyed by SQLy query text, so queries repeated
+    every step (e.g. by the agent's task_step) are parsed and compiled once.
+
+    queries that differ only in their values can share a plan by writing
+    the values as ":name" placeholders and passing them in at search time:
+        searcher.search(
+            memory,
+            query="SELECT MEMORY FROM Task WHERE ((prio>=1) AND (_has_parent_task=#=:parent))",
+            params={"parent": memid},
+        )
+    a max_size of 0 disables caching
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.plans = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        plan = self.plans.get(query)
+        if plan is not None:
+            self.hits += 1
+            self.plans.move_to_end(query)
+            return plan
+        self.misses += 1
+        plan = QueryPlan(query)
+        if self.max_size > 0:
+            self.plans[query] = plan
+            if len(self.plans) > self.max_size:
+                self.plans.popitem(last=False)
+        return plan
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.plans),
+            "max_size": self.max_size,
+        }
+
+    def clear(self):
+        self.plans.clear()
+        self.hits = 0
+        self.misses = 0
+
+
 class MemorySearcher:
     """
     Basic string form:
@@ -308,13 +427,19 @@ class MemorySearcher:
     # TODO eventually allow any attribute- if its not a "simple" attribute,
     #  pass in as attribute object (callable with proper signature)
 
-    def __init__(self, query=None, ignore_self=False):
+    def __init__(
+        self, query=None, ignore_self=False, compile_where_clauses=True, plan_cache_size=256
+    ):
         self.query = query
         self.ignore_self = ignore_self
+        self.compile_where_clauses = compile_where_clauses
+        # table name --> set of column names, for each agent_memory searched
+        self._columns_cache = weakref.WeakKeyDictionary()
+        self.plan_cache = QueryPlanCache(max_size=plan_cache_size)
 
-    def maybe_convert_query(self, query):
+    def maybe_convert_query(self, query, params=None):
         if type(query) is str:
-            return sqly_to_new_filters(query)
+            return bind_params(self.plan_cache.get(query).filters, params)
         else:
             return query
 
@@ -383,25 +508,49 @@ class MemorySearcher:
         node_children = agent_memory.node_children[memtype]
         return [m for m in memids if agent_memory.get_node_from_memid(m) in node_children]
 
-    def handle_where(self, agent_memory, where_clause, memtype):
+    def handle_where(self, agent_memory, where_clause, memtype, plan=None, params=None):
         """
-        returns a list of memids whose memories satisfy the where clause
+        returns a list of memids whose memories satisfy the where clause.
+        the clause is compiled into a single SQL statement if possible,
+        otherwise it is interpreted leaf by leaf.
+        if a cached QueryPlan for the query is given, its compiled
+        statement is reused with the params bound
+        """
+        if self.compile_where_clauses:
+            if plan is not None:
+                compiled = self.compile_plan(agent_memory, plan, memtype)
+                if compiled is not None:
+                    sql, args = compiled
+                    args = [bind_params(a, params) for a in args]
+                    return [r[0] for r in agent_memory._db_read(sql, *args)]
+            try:
+                sql, args = self.compile_where(agent_memory, where_clause, memtype)
+            except NotCompilable:
+                pass
+            else:
+                return [r[0] for r in agent_memory._db_read(sql, *args)]
+        return self.interpret_where(agent_memory, where_clause, memtype)
+
+    def interpret_where(self, agent_memory, where_clause, memtype):
+        """
+        returns a list of memids whose memories satisfy the where clause,
+        running each leaf as its own query and combining the results in python
         """
         # do this brutally for now, if we need can make more efficient
         if where_clause.get("AND"):
             memid_lists = []
             for c in where_clause["AND"]:
-                memid_lists.append(self.handle_where(agent_memory, c, memtype))
+                memid_lists.append(self.interpret_where(agent_memory, c, memtype))
             return list(set.intersection(*[set(m) for m in memid_lists]))
         if where_clause.get("OR"):
             memid_lists = []
             for c in where_clause["OR"]:
-                memid_lists.append(self.handle_where(agent_memory, c, memtype))
+                memid_lists.append(self.interpret_where(agent_memory, c, memtype))
             return list(set.union(*[set(m) for m in memid_lists]))
         if where_clause.get("NOT"):
             # maybe FIXME? don't retrieve everything until necessary
             all_memids = set(get_all_memids_of_node_type(agent_memory, memtype))
-            memids = self.handle_where(agent_memory, where_clause["NOT"][0], memtype)
+            memids = self.interpret_where(agent_memory, where_clause["NOT"][0], memtype)
             return list(all_memids - set(memids))
 
         if where_clause.get("input_left"):
@@ -417,6 +566,166 @@ class MemorySearcher:
         except:
             raise Exception("poorly formed triple dict{}".format(where_clause))
 
+    ###########################
+    ### WHERE clause compiler ###
+    ###########################
+
+    def compile_where(self, agent_memory, where_clause, memtype):
+        """
+        compiles a where clause into a single parameterized SQL statement
+        returning the memids of memtype (or its children) satisfying the clause.
+        AND/OR/NOT become SQL conjunctions, properties are read from Memories or
+        from a LEFT JOIN on the memtype's table, and triples become subqueries on
+        Triples.  Attribute leaves are run through the interpreter and their
+        memids inlined as parameters.
+
+        returns the SQL string and the list of its arguments;
+        raises NotCompilable if the clause can't be compiled
+        """
+        memtypes = [m for m in agent_memory.node_children[memtype] if type(m) is str]
+        joins = {}
+        condition, args = self._compile_clause(agent_memory, where_clause, memtype, joins)
+        sql = "SELECT DISTINCT M.uuid FROM Memories AS M"
+        if joins.get("R"):
+            sql += " LEFT JOIN {} AS R ON R.uuid=M.uuid".format(joins["R"])
+        sql += " WHERE M.node_type IN ({}) AND ({})".format(
+            ", ".join(["?"] * len(memtypes)), condition
+        )
+        return sql, memtypes + args
+
+    def compile_plan(self, agent_memory, plan, memtype):
+        """
+        returns the compiled (sql, args) of the where clause of a QueryPlan,
+        with QueryParams left in args to be bound at search time,
+        or None if the where clause can't be compiled
+        """
+        compiled = plan.compiled.setdefault(agent_memory, {})
+        if memtype not in compiled:
+            try:
+                compiled[memtype] = self.compile_where(
+                    agent_memory, plan.filters["where_clause"], memtype
+                )
+            except NotCompilable:
+                compiled[memtype] = None
+        return compiled[memtype]
+
+    def _table_columns(self, agent_memory, table):
+        columns = self._columns_cache.setdefault(agent_memory, {})
+        if table not in columns:
+            columns[table] = {
+                c[1] for c in agent_memory._db_read("PRAGMA table_info({})".format(table))
+            }
+        return columns[table]
+
+    def _compile_clause(self, agent_memory, where_clause, memtype, joins):
+        for conjunction in ["AND", "OR"]:
+            if where_clause.get(conjunction):
+                compiled = [
+                    self._compile_clause(agent_memory, c, memtype, joins)
+                    for c in where_clause[conjunction]
+                ]
+                condition = "(" + " {} ".format(conjunction).join(c for c, _ in compiled) + ")"
+                return condition, [a for _, args in compiled for a in args]
+        if where_clause.get("NOT"):
+            # negation is over non-snapshot memories, as in get_all_memids_of_node_type.
+            # a NULL column (e.g. no row in the LEFT JOIN) makes the clause NULL,
+            # but the interpreter counts it as not matching, so negate it as false
+            condition, args = self._compile_clause(
+                agent_memory, where_clause["NOT"][0], memtype, joins
+            )
+            return "(M.is_snapshot=0 AND NOT COALESCE({}, 0))".format(condition), args
+        if where_clause.get("input_left"):
+            return self._compile_comparator_leaf(agent_memory, where_clause, memtype, joins)
+        return self._compile_triple_leaf(agent_memory, where_clause)
+
+    def _compile_comparator_leaf(self, agent_memory, where_clause, memtype, joins):
+        input_left = where_clause["input_left"].get("attribute")
+        input_right = where_clause["input_right"]
+        if isinstance(input_left, Attribute):
+            # attributes are python callables, run them through the interpreter
+            memids = self.handle_comparator_where_leaf(agent_memory, where_clause, memtype)
+            if not memids:
+                return "0", []
+            return "M.uuid IN ({})".format(", ".join(["?"] * len(memids))), list(memids)
+        if type(input_left) is not str or type(input_right) is dict:
+            raise NotCompilable(where_clause)
+        ctype = where_clause.get("comparison_type", "EQUAL")
+        comparison_symbol = get_inequality_symbol(ctype)
+        if type(ctype) is dict and ctype.get("close_tolerance"):
+            if isinstance(input_right, QueryParam):
+                # the bounds can't be computed until the value is bound
+                raise NotCompilable(where_clause)
+            v = try_float(input_right, where_clause)
+            comparison = "({0}>? AND {0}<?)"
+            args = [v - ctype["close_tolerance"], v + ctype["close_tolerance"]]
+        elif comparison_symbol[0] == "<" or comparison_symbol[0] == ">":
+            comparison = "{}" + comparison_symbol + "?"
+            if isinstance(input_right, QueryParam):
+                args = [input_right]
+            else:
+                args = [try_float(input_right, where_clause)]
+        elif type(ctype) is dict and ctype.get("modulus"):
+            comparison = "{} % ?=?"
+            args = [ctype["modulus"], input_right]
+        elif comparison_symbol in ["=", "!="]:
+            comparison = "{}" + comparison_symbol + "?"
+            args = [input_right]
+        else:
+            comparison = None
+            args = [input_right]
+
+        # same order of precedence as search_by_property
+        if input_left in self._table_columns(agent_memory, "Memories"):
+            column = "M." + input_left
+        else:
+            T = agent_memory.nodes[memtype].TABLE
+            if input_left in self._table_columns(agent_memory, T):
+                joins["R"] = T
+                column = "R." + input_left
+            else:
+                # it is a triple, only equality with obj_text or obj is allowed
+                if comparison_symbol == "=":
+                    triple = {"pred_text": input_left, "obj_text": input_right}
+                elif comparison_symbol == "=#=":
+                    triple = {"pred_text": input_left, "obj": input_right}
+                else:
+                    raise NotCompilable(where_clause)
+                return self._compile_triple_leaf(agent_memory, triple)
+        if comparison is None:
+            raise NotCompilable(where_clause)
+        return comparison.format(column), args
+
+    def _compile_triple_leaf(self, agent_memory, where_clause):
+        triple = {}
+        for k, v in where_clause.items():
+            if callable(v):
+                # this should be a searcher, run it
+                try:
+                    mems, vals = v()
+                except:
+                    raise Exception("error in subquery {}".format(where_clause))
+                # the subquery could not get a value, so the leaf matches nothing
+                if len(vals) == 0:
+                    return "0", []
+                v = vals[0]
+            triple[k] = v
+        if any(k not in TRIPLE_SEARCH_COLUMNS for k in triple):
+            raise NotCompilable(where_clause)
+        try:
+            check_well_formed_triple(triple)
+        except:
+            raise Exception("poorly formed triple dict{}".format(where_clause))
+        pairs = [(k, v) for k, v in triple.items() if v is not None]
+        # as in get_triples, only triples whose subject is not a snapshot are used;
+        # when the subject is given, the memories searched for are the objects
+        column = "obj" if triple.get("subj") else "subj"
+        sql = "M.uuid IN (SELECT T.{} FROM Triples AS T INNER JOIN Memories AS TM ON T.subj=TM.uuid WHERE TM.is_snapshot=0".format(
+            column
+        )
+        for k, _ in pairs:
+            sql += " AND T.{}=?".format(k)
+        return sql + ")", [v for _, v in pairs]
+
     def handle_selector(self, agent_memory, query, memids):
         if query.get("selector"):
             selector_d = query["selector"]
@@ -496,17 +805,30 @@ class MemorySearcher:
             # TODO switch everything to dicts
             return [values_dict[m] for m in memids]
 
-    def search(self, agent_memory, query=None, default_memtype="ReferenceObject", get_all=False):
+    def search(
+        self,
+        agent_memory,
+        query=None,
+        default_memtype="ReferenceObject",
+        get_all=False,
+        params=None,
+    ):
         # returns a list of memids and accompanying values
         # TODO values are MemoryNodes when query is SELECT MEMORIES
+        # params are the values of ":name" placeholders in a SQLy query, see QueryPlanCache
         query = query or self.query
         if not query:
             return [], []
-        query = self.maybe_convert_query(query)
+        plan = None
+        if type(query) is str:
+            plan = self.plan_cache.get(query)
+            query = bind_params(plan.filters, params)
         # TODO/FIXME memtype ALL
         memtype = query.get("memory_type", default_memtype)
         if query.get("where_clause"):
-            memids = self.handle_where(agent_memory, query["where_clause"], memtype)
+            memids = self.handle_where(
+                agent_memory, query["where_clause"], memtype, plan=plan, params=params
+            )
         else:
             # queries with no WHERE clause will not return archived/snapshotted memories.
             # to get a snapshot or to get all mems snapshotted or not use explicit WHERE.
@@ -1140,9 +1140,15 @@ class TaskNode(MemoryNode):
         self.memory = agent_memory
 
     def update_node(self):
-        prio, running, run_count, finished, paused = self.agent_memory._db_read_one(
-            "SELECT prio, running, run_count, finished, paused FROM Tasks WHERE uuid=?", self.memid
-        )
+        task_index = getattr(self.agent_memory, "task_index", None)
+        status = task_index.get_status(self.memid) if task_index is not None else None
+        if status is not None:
+            prio, running, run_count, paused, finished = status
+        else:
+            prio, running, run_count, finished, paused = self.agent_memory._db_read_one(
+                "SELECT prio, running, run_count, finished, paused FROM Tasks WHERE uuid=?",
+                self.memid,
+            )
         self.prio = prio
         self.paused = paused
         self.run_count = run_count
@@ -1247,6 +1253,7 @@ class TaskNode(MemoryNode):
         and whatever is in the dict will be put on the task.
         """
         status_out = {}
+        updates = []
         for k in ["finished", "prio", "running", "paused"]:
             # update the task itself, hopefully don't need to do this when task objects are re-written as MemoryNode s
             if force_task_update:
@@ -1266,8 +1273,11 @@ class TaskNode(MemoryNode):
                     status.get(k) if status.get(k) is not None else getattr(self.task, k, None)
                 )
             if (status.get(k) is not None) or (force_db_update and status_out[k]):
-                cmd = "UPDATE Tasks SET " + k + "=? WHERE uuid=?"
-                self.agent_memory.db_write(cmd, status_out[k], self.memid)
+                updates.append(k)
+        if updates:
+            # one write for all the columns, so the task index and Updates see a single change
+            cmd = "UPDATE Tasks SET " + ", ".join(k + "=?" for k in updates) + " WHERE uuid=?"
+            self.agent_memory.db_write(cmd, *[status_out[k] for k in updates], self.memid)
         return status_out
 
     # FIXME! or torch me
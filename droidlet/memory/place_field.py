@@ -112,23 +112,64 @@ class PlaceField:
     # this is pretty brutal, using rn on robot to sync with slam service.
     # overrides slam service for "detections" with memids that have been labeled
     # as obstacles (e.g. self_memid)
-    def sync_traversible(self, locs, h=0):
-        # overwrite traversibility map from slam service
-        self.maps[h]["map"][:] = 0
-        self.maps[h]["updated"][:] = self.get_time()
-        for (x, z) in locs:
-            i, j = self.real2map(x, z, h)
-            s = max(i - self.map_size + 1, j - self.map_size + 1, -i, -j)
+    def sync_traversible(self, locs, h=0, removed=None):
+        """
+        overwrite the traversibility map at height h from the slam service.
+        locs is an (N, 2) array or list of (x, z) obstacle locations.
+        if removed is None, locs are all the obstacles and everything else is cleared.
+        otherwise locs are the obstacles added since the last sync and removed
+        the (x, z) locations that are not obstacles anymore (see ObstacleMapChanges),
+        so only the changed pixels are touched.  a pixel stays an obstacle while
+        any of the slam obstacles in it remain.
+        pixels of memids placed as obstacles (e.g. self_memid) are kept as obstacles.
+        """
+        t = self.get_time()
+        locs = np.asarray(locs, dtype=np.float64).reshape(-1, 2)
+        removed = None if removed is None else np.asarray(removed, dtype=np.float64).reshape(-1, 2)
+        all_locs = locs if removed is None else np.concatenate([locs, removed])
+        if len(all_locs) > 0:
+            ij = self.real2map_many(all_locs, h)
+            s = max(ij.max() - self.maps[h]["map"].shape[0] + 1, -ij.min())
             if s > 0:
                 self.extend_map(h=h, extension=s)
-                i, j = self.real2map(x, z, h)
-            self.maps[h]["map"][i, j] = 1
+        m = self.maps[h]
+        # a pixel can cover several slam cells, so count the slam obstacles in each
+        # pixel and only clear it when the last one is removed
+        counts = m["slam_obstacles"]
+        if removed is None:
+            counts[:] = 0
+            m["updated"][:] = t
+        else:
+            ri, rj = self._in_map(self.real2map_many(removed, h), h)
+            np.subtract.at(counts, (ri, rj), 1)
+        i, j = self._in_map(self.real2map_many(locs, h), h)
+        np.add.at(counts, (i, j), 1)
+        if removed is None:
+            m["map"][:] = counts > 0
+        else:
+            np.maximum(counts, 0, out=counts)
+            i, j = np.concatenate([ri, i]), np.concatenate([rj, j])
+            m["map"][i, j] = counts[i, j] > 0
+        m["updated"][i, j] = t
         # replace memids that are obstacles if they were clobbered from map
         for k, v in self.memid2locs.items():
-            for idx, t in v.items():
+            for idx, is_obstacle in v.items():
                 i, j, height = self.idx2ijh(idx)
-                if height == h and t > 0:
-                    self.maps[h]["map"][i, j] = 1
+                if height == h and is_obstacle > 0:
+                    m["map"][i, j] = 1
+
+    def real2map_many(self, locs, h):
+        """
+        like real2map, for an (N, 2) array of (x, z); returns an (N, 2) int array of (i, j)
+        """
+        n = self.maps[h]["map"].shape[0]
+        return np.round(np.asarray(locs) * self.pixels_per_unit + n // 2).astype(np.int64)
+
+    def _in_map(self, ij, h):
+        """the rows and columns of the (i, j) in the map at height h, dropping the others"""
+        n = self.maps[h]["map"].shape[0]
+        ij = ij[((ij >= 0) & (ij < n)).all(axis=1)]
+        return ij[:, 0], ij[:, 1]
 
     def get_obstacle_list(self):
         """
@@ -269,16 +310,25 @@ class PlaceField:
             h = list(self.maps.keys())[0]
         if not self.maps.get(h):
             self.maps[h] = {}
-            for m, v in {"updated": -1, "map": 0, "memids": 0}.items():
+            for m, v in {"updated": -1, "map": 0, "memids": 0, "slam_obstacles": 0}.items():
                 self.maps[h][m] = v * np.ones((MAP_INIT_SIZE, MAP_INIT_SIZE))
         w = self.maps[h]["map"].shape[0]
         new_w = w + 2 * extension
         if new_w > MAX_MAP_SIZE:
             return -1
-        for m, v in {"updated": -1, "map": 0, "memids": 0}.items():
+        for m, v in {"updated": -1, "map": 0, "memids": 0, "slam_obstacles": 0}.items():
             new_map = v * np.ones((new_w, new_w))
             new_map[extension:-extension, extension:-extension] = self.maps[h][m]
             self.maps[h][m] = new_map
+        # the pixels of memids on this map moved with it
+        for memid, locs in getattr(self, "memid2locs", {}).items():
+            moved = {}
+            for idx, is_obstacle in locs.items():
+                i, j, height = self.idx2ijh(idx)
+                if height == h:
+                    idx = self.ijh2idx(i + extension, j + extension, h)
+                moved[idx] = is_obstacle
+            self.memid2locs[memid] = moved
         return new_w
 
     def get_closest(self, xyz):
@@ -325,7 +375,7 @@ class EmptyPlaceField:
     this will be used as a dummy instead of regular PlaceField
     """
 
-    def sync_traversible(self, locs, h=0):
+    def sync_traversible(self, locs, h=0, removed=None):
         pass
 
     def update_map(self, changes):
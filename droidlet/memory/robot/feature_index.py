@@ -0,0 +1,120 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import numpy as np
+
+
+def normalize_features(features, eps=1e-8):
+    """returns the rows of features (anything np.asarray takes, e.g. a cpu torch tensor)
+    scaled to unit L2 norm, as float32"""
+    features = np.atleast_2d(np.asarray(features, dtype="float32"))
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.maximum(norms, eps)
+
+
+class DetectedObjectFeatureIndex:
+    """
+    write-through cache of the parts of the DetectedObjects in memory that the
+    deduplicator compares against, so that perceiving does not need to read and
+    unpickle every DetectedObjectFeatures row each step.
+
+    row i of
+        features: (N, dim) float32 array, the L2 normalized feature_repr
+        xyz: (N, 3) float array
+        eids: (N,) int array
+        memids: list of N memids
+    all refer to the same object.  DetectedObjectNode.create and .update keep it
+    in sync, and LocoAgentMemory removes the rows of deleted memories.
+    objects without a feature_repr are not indexed.
+
+    Args:
+        dim (int): length of the feature vectors
+        capacity (int): number of rows to allocate up front; doubles when full
+    """
+
+    def __init__(self, dim=512, capacity=64):
+        self.dim = dim
+        self._features = np.zeros((capacity, dim), dtype="float32")
+        self._xyz = np.zeros((capacity, 3), dtype="float64")
+        self._eids = np.zeros(capacity, dtype="int64")
+        self.memids = []
+        # memid --> row
+        self.rows = {}
+
+    @classmethod
+    def from_objects(cls, objects):
+        """build an index from a list of objects or dicts with eid, xyz and feature_repr,
+        e.g. the output of DetectedObjectNode.get_all"""
+        index = None
+        for i, obj in enumerate(objects):
+            if not isinstance(obj, dict):
+                obj = obj.__dict__
+            if obj.get("feature_repr") is None:
+                continue
+            if index is None:
+                index = cls(dim=np.asarray(obj["feature_repr"]).size)
+            index.upsert(obj.get("memid", i), obj["eid"], obj["xyz"], obj["feature_repr"])
+        return index if index is not None else cls()
+
+    def __len__(self):
+        return len(self.memids)
+
+    def __contains__(self, memid):
+        return memid in self.rows
+
+    @property
+    def features(self):
+        return self._features[: len(self)]
+
+    @property
+    def xyz(self):
+        return self._xyz[: len(self)]
+
+    @property
+    def eids(self):
+        return self._eids[: len(self)]
+
+    def _grow(self):
+        capacity = 2 * len(self._eids)
+        for name in ["_features", "_xyz", "_eids"]:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, name, new)
+
+    def upsert(self, memid, eid, xyz, feature_repr):
+        """add or overwrite the row of memid.  a feature_repr of None removes it"""
+        if feature_repr is None:
+            self.remove([memid])
+            return
+        feature = normalize_features(feature_repr).reshape(-1)
+        if feature.size != self.dim:
+            raise ValueError(
+                "feature_repr has {} values, the index expects {}".format(feature.size, self.dim)
+            )
+        row = self.rows.get(memid)
+        if row is None:
+            if len(self) == len(self._eids):
+                self._grow()
+            row = len(self)
+            self.rows[memid] = row
+            self.memids.append(memid)
+        self._features[row] = feature
+        self._xyz[row] = xyz
+        self._eids[row] = eid
+
+    def remove(self, memids):
+        """drop the rows of memids that are in the index; the last row is moved into each hole"""
+        for memid in memids:
+            row = self.rows.pop(memid, None)
+            if row is None:
+                continue
+            last = len(self) - 1
+            if row != last:
+                moved = self.memids[last]
+                self._features[row] = self._features[last]
+                self._xyz[row] = self._xyz[last]
+                self._eids[row] = self._eids[last]
+                self.memids[row] = moved
+                self.rows[moved] = row
+            self.memids.pop()
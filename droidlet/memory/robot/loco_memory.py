@@ -9,6 +9,8 @@ from collections import namedtuple
 from droidlet.memory.memory_nodes import PlayerNode, TripleNode
 from droidlet.memory.sql_memory import AgentMemory
 from droidlet.memory.robot.loco_memory_nodes import *
+from droidlet.memory.robot.feature_index import DetectedObjectFeatureIndex
+from droidlet.shared_data_struct.robot_shared_utils import ObstacleMapChanges
 
 SCHEMAS = [
     os.path.join(os.path.dirname(__file__), "..", "base_memory_schema.sql"),
@@ -27,12 +29,16 @@ class LocoAgentMemory(AgentMemory):
         schema_paths=SCHEMAS,
         coordinate_transforms=None,
     ):
+        # features, locations and eids of the DetectedObjects, for deduplication.
+        # kept in sync by DetectedObjectNode.create/update and on deletes
+        self.detected_object_index = DetectedObjectFeatureIndex()
         super(LocoAgentMemory, self).__init__(
             db_file=db_file,
             schema_paths=schema_paths,
             db_log_path=db_log_path,
             nodelist=NODELIST,
             coordinate_transforms=coordinate_transforms,
+            on_delete_callback=self.detected_object_index.remove,
         )
         self.banned_default_behaviors = []  # FIXME: move into triple store?
         self._safe_pickle_saved_attrs = {}
@@ -93,8 +99,16 @@ class LocoAgentMemory(AgentMemory):
             for human in perception_output.humans:
                 HumanPoseNode.create(self, human)
                 # FIXME, not putting in map, need to dedup?
-        # FIXME make a proper diff.  what to do about discrepancies with objects?
-        self.place_field.sync_traversible(perception_output.obstacle_map, h=0)
+        # FIXME what to do about discrepancies with objects?
+        obstacle_map = perception_output.obstacle_map
+        if isinstance(obstacle_map, ObstacleMapChanges):
+            self.place_field.sync_traversible(
+                obstacle_map.added,
+                h=0,
+                removed=None if obstacle_map.full else obstacle_map.removed,
+            )
+        else:
+            self.place_field.sync_traversible(obstacle_map, h=0)
 
     #################
     ###  Players  ###
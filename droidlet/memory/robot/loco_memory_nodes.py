@@ -75,6 +75,10 @@ class DetectedObjectNode(ReferenceObjectNode):
             memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, detected_obj.label)
         memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_physical_object")
         memory.nodes[TripleNode.NODE_TYPE].tag(memory, memid, "_not_location")
+        xyz = detected_obj.get_xyz()
+        memory.detected_object_index.upsert(
+            memid, detected_obj.eid, (xyz["x"], xyz["y"], xyz["z"]), detected_obj.feature_repr
+        )
         return memid
 
     @classmethod
@@ -99,6 +103,10 @@ class DetectedObjectNode(ReferenceObjectNode):
             pickle.dumps(detected_obj.feature_repr),
             memid,
         )
+        xyz = detected_obj.get_xyz()
+        memory.detected_object_index.upsert(
+            memid, detected_obj.eid, (xyz["x"], xyz["y"], xyz["z"]), detected_obj.feature_repr
+        )
         return memid
 
     @classmethod
@@ -2,6 +2,7 @@
 Copyright (c) Facebook, Inc. and its affiliates.
 """
 import unittest
+import numpy as np
 from droidlet.memory.memory_nodes import PlayerNode, TripleNode
 from droidlet.memory.robot.loco_memory import LocoAgentMemory
 from droidlet.memory.robot.loco_memory_nodes import DanceNode, DetectedObjectNode
@@ -66,6 +67,40 @@ class BasicTest(unittest.TestCase):
             assert len(self.memory.get_detected_objects_tagged(t)) == 1
             assert self.memory.get_detected_objects_tagged(t).pop() == detected_object_mem_id
 
+    def test_detected_object_index(self):
+        self.memory = LocoAgentMemory()
+        index = self.memory.detected_object_index
+        rng = np.random.RandomState(0)
+        memids = []
+        for eid in range(100):
+            d = DO(
+                eid=eid,
+                label="thing",
+                properties=[],
+                color="red",
+                xyz=list(rng.randn(3)),
+                bounds=[0, 0, 0, 0, 0, 0],
+                bbox=[0.1, 0.1, 1.0, 1.0],
+                mask=[1, 2, 3],
+                feature_repr=rng.randn(512).astype("float32"),
+            )
+            memids.append(DetectedObjectNode.create(self.memory, d))
+        d.xyz = [5.0, 5.0, 5.0]
+        d.feature_repr = np.ones(512)
+        DetectedObjectNode.update(self.memory, d)
+        for memid in memids[:30:3]:
+            self.memory.forget(memid)
+
+        objects = DetectedObjectNode.get_all(self.memory)
+        assert len(index) == len(objects) == 90
+        for o in objects:
+            row = index.rows[o["memid"]]
+            assert index.eids[row] == o["eid"]
+            assert np.allclose(index.xyz[row], o["xyz"])
+            f = np.asarray(o["feature_repr"], dtype="float32")
+            assert np.allclose(index.features[row], f / np.linalg.norm(f))
+        assert np.allclose(index.xyz[index.rows[memids[-1]]], 5.0)
+
     def test_dance_api(self):
         self.memory = LocoAgentMemory()
 
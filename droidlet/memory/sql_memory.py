@@ -11,6 +11,8 @@ import pickle
 import sqlite3
 import uuid
 import datetime
+from collections import Counter
+from contextlib import contextmanager
 from itertools import zip_longest
 from typing import cast, Optional, List, Tuple, Sequence, Union
 from droidlet.base_util import XYZ
@@ -19,6 +21,7 @@ from droidlet.memory.memory_filters import MemorySearcher
 from droidlet.event import dispatch
 from droidlet.memory.memory_util import parse_sql, format_query
 from droidlet.memory.place_field import PlaceField, EmptyPlaceField
+from droidlet.memory.task_index import TaskIndex
 
 from droidlet.memory.memory_nodes import (  # noqa
     TaskNode,
@@ -45,6 +48,8 @@ NONPICKLE_ATTRS = [
     "init_condition",
     "terminate_condition",
     "movement",
+    # search state of Move tasks, kept between steps without pickling it
+    "planner",
 ]
 
 DEFAULT_PIXELS_PER_UNIT = 100
@@ -75,6 +80,7 @@ class AgentMemory:
         nodes (dict): Mapping of node name to table name
         self_memid (str): MemoryID for the AgentMemory
         searcher (MemorySearcher): A class to process searches through memory
+        task_index (TaskIndex): In-process index of the Tasks table status columns
         time (int): The time of the agent
     """
 
@@ -97,6 +103,9 @@ class AgentMemory:
         self.db = sqlite3.connect(db_file, check_same_thread=False)
         self.task_db = {}
         self._safe_pickle_saved_attrs = {}
+        # nesting depth of batch() contexts and the writes made inside them
+        self._batch_depth = 0
+        self._batch_writes = []
 
         self.on_delete_callback = on_delete_callback
 
@@ -112,6 +121,7 @@ class AgentMemory:
         self.all_tables = [
             c[0] for c in self._db_read("SELECT name FROM sqlite_master WHERE type='table';")
         ]
+        self.task_index = TaskIndex(self)
         self.nodes = {}
         for node in nodelist:
             self.nodes[node.NODE_TYPE] = node
@@ -356,17 +366,20 @@ class AgentMemory:
         for u in uuids:
             self.forget(u[0])
 
-    def basic_search(self, query, get_all=False):
+    def basic_search(self, query, get_all=False, params=None):
         """Perform a basic search using the query
 
         Args:
             query (dict): A FILTERS dict or sqly query
+            params (dict): values for ":name" placeholders in a sqly query
 
         Returns:
             list[memid], list[value]: the memids and respective values from the search
 
+        Examples::
+            >>> basic_search("SELECT MEMORY FROM Task WHERE prio=:prio", params={"prio": 0})
         """
-        return self.searcher.search(self, query=query, get_all=get_all)
+        return self.searcher.search(self, query=query, get_all=get_all, params=params)
 
     #    ###############
     #    ###  Sets   ###
@@ -642,7 +655,9 @@ class AgentMemory:
         """Return the number of rows affected.  As a side effect,
            sets the updated_time entry for each affected memory,
            and applies self.on_delete_callback to the list of deleted memids
-           if there are any and on_delete_callback is not None
+           if there are any and on_delete_callback is not None.
+           Inside a batch() context the side effects are deferred until the
+           outermost batch commits.
 
         Args:
             query (string): The query to be run against the database
@@ -657,17 +672,10 @@ class AgentMemory:
         """
         start_time = datetime.datetime.now()
         r = self._db_write(query, *args)
-        # some of this can be implemented with TRIGGERS and a python sqlite fn
-        # but its a bit of a pain bc we want the agent's time in the update
-        # not system time
-        updated_memids = self._db_read("SELECT * FROM Updates")
-        updated = [mem[0] for mem in updated_memids if mem[1] == "update"]
-        deleted = [mem[0] for mem in updated_memids if mem[1] == "delete"]
-        for u in set(updated):
-            self.set_memory_updated_time(u)
-        if self.on_delete_callback is not None and deleted:
-            self.on_delete_callback(deleted)
-        self._db_write("DELETE FROM Updates")
+        if self._batch_depth > 0:
+            self._batch_writes.append((query, r))
+            return r
+        self._process_updates()
         # format the data to send to dashboard timeline
         query_table, query_operation = parse_sql(query[: query.find("(") - 1])
         query_dict = format_query(query, *args)
@@ -687,12 +695,112 @@ class AgentMemory:
         dispatch.send("memory", data=hook_data)
         return r
 
+    def db_write_many(self, query: str, rows: Sequence[Sequence]) -> int:
+        """Run the same write query once for each tuple of arguments in rows,
+        with a single executemany.  The Updates table is processed and the
+        dashboard is notified once for all the rows.
+
+        Args:
+            query (string): The query to be run against the database
+            rows (list[tuple]): One tuple of query arguments per row
+
+        Returns:
+            int: Number of rows affected
+
+        Examples ::
+            >>> query = "INSERT INTO VoxelObjects (uuid, x, y, z, ref_type) VALUES (?, ?, ?, ?, ?)"
+            >>> rows = [(memid, 0, 0, 0, "inst_seg"), (memid, 0, 1, 0, "inst_seg")]
+            >>> db_write_many(query, rows)
+        """
+        with self.batch():
+            r = self._db_write_many(query, rows)
+            self._batch_writes.append((query, r))
+        return r
+
+    @contextmanager
+    def batch(self):
+        """Group all db_write calls made inside the context into a single
+        SQLite transaction.  The Updates table is processed (and updated_time
+        stamped) once when the outermost batch exits, and one aggregated
+        "memory" event is sent to the dashboard instead of one per write.
+        If an exception escapes the outermost batch, the transaction is
+        rolled back.  Batches may be nested; only the outermost one commits.
+
+        Examples ::
+            >>> with memory.batch():
+            ...     for block in blocks:
+            ...         VoxelObjectNode.upsert_block(memory, block, memid, "BlockObjects")
+        """
+        self._batch_depth += 1
+        if self._batch_depth > 1:
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+            return
+
+        start_time = datetime.datetime.now()
+        try:
+            yield self
+            self._process_updates()
+        except BaseException:
+            self._batch_depth = 0
+            self._batch_writes = []
+            self.db.rollback()
+            self.task_index.reload()
+            raise
+        self._batch_depth = 0
+        self.db.commit()
+        writes, self._batch_writes = self._batch_writes, []
+        if not writes:
+            return
+        tables = Counter()
+        operations = Counter()
+        for query, _ in writes:
+            query_table, query_operation = parse_sql(query[: query.find("(") - 1])
+            tables[query_table] += 1
+            operations[query_operation.strip()] += 1
+        end_time = datetime.datetime.now()
+        hook_data = {
+            "name": "memory",
+            "start_time": start_time,
+            "end_time": end_time,
+            "elapsed_time": (end_time - start_time).total_seconds(),
+            "agent_time": self.get_time(),
+            "table_name": ", ".join(sorted(t for t in tables if t)),
+            "operation": "BATCH",
+            "arguments": {"num_writes": len(writes), "operations": dict(operations)},
+            "result": sum(r for _, r in writes),
+        }
+        dispatch.send("memory", data=hook_data)
+
+    def _process_updates(self):
+        """Stamp the updated_time of every memory recorded in the Updates table,
+        run on_delete_callback on the deleted ones, and clear the table."""
+        # some of this can be implemented with TRIGGERS and a python sqlite fn
+        # but its a bit of a pain bc we want the agent's time in the update
+        # not system time
+        updated_memids = self._db_read("SELECT * FROM Updates")
+        if not updated_memids:
+            return
+        updated = {mem[0] for mem in updated_memids if mem[1] == "update"}
+        deleted = [mem[0] for mem in updated_memids if mem[1] == "delete"]
+        if updated:
+            self._db_write_many(
+                "UPDATE Memories SET updated_time=? WHERE uuid=?",
+                [(self.get_time(), u) for u in updated],
+            )
+        if self.on_delete_callback is not None and deleted:
+            self.on_delete_callback(deleted)
+        self._db_write("DELETE FROM Updates")
+
     def _db_write(self, query: str, *args) -> int:
         args = tuple(a.item() if isinstance(a, np.number) else a for a in args)
         try:
             c = self.db.cursor()
             c.execute(query, args)
-            self.db.commit()
+            if self._batch_depth == 0:
+                self.db.commit()
             c.close()
             self._write_to_db_log(query, *args)
             return c.rowcount
@@ -700,6 +808,28 @@ class AgentMemory:
             logging.error("Bad write: {} : {}".format(query, args))
             raise
 
+    def _db_write_many(self, query: str, rows: Sequence[Sequence]) -> int:
+        """Run the same write query once for each tuple of arguments in rows
+        with a single executemany.  Like _db_write, this does not process the
+        Updates table or notify the dashboard.
+
+        Returns:
+            int: Number of rows affected
+        """
+        rows = [tuple(a.item() if isinstance(a, np.number) else a for a in row) for row in rows]
+        try:
+            c = self.db.cursor()
+            c.executemany(query, rows)
+            if self._batch_depth == 0:
+                self.db.commit()
+            c.close()
+            for row in rows:
+                self._write_to_db_log(query, *row)
+            return c.rowcount
+        except:
+            logging.error("Bad write: {} : {} rows".format(query, len(rows)))
+            raise
+
     def _db_script(self, script: str):
         """Execute a script against the database
 
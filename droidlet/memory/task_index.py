@@ -0,0 +1,130 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import weakref
+from collections import namedtuple
+
+TaskStatus = namedtuple("TaskStatus", "prio, running, run_count, paused, finished")
+
+# TEMP triggers are not part of the db file or the db log; they call back
+# into the TaskIndex of the connection that created them
+TASK_INDEX_TRIGGERS = """
+CREATE TEMP TRIGGER TaskIndexInsert AFTER INSERT ON main.Tasks
+    BEGIN SELECT task_index_set(NEW.uuid, NEW.prio, NEW.running, NEW.run_count, NEW.paused, NEW.finished);
+END;
+
+CREATE TEMP TRIGGER TaskIndexUpdate AFTER UPDATE OF prio, running, run_count, paused, finished ON main.Tasks
+    BEGIN SELECT task_index_set(NEW.uuid, NEW.prio, NEW.running, NEW.run_count, NEW.paused, NEW.finished);
+END;
+
+CREATE TEMP TRIGGER TaskIndexDelete AFTER DELETE ON main.Tasks
+    BEGIN SELECT task_index_remove(OLD.uuid);
+END;
+"""
+
+
+def _weak_callback(method):
+    """
+    wraps a bound method of the TaskIndex for db.create_function.  the connection
+    keeps its functions alive but does not show them to the garbage collector, so
+    a strong reference would keep the index, its memory and the connection itself
+    alive forever
+    """
+    ref = weakref.WeakMethod(method)
+
+    def callback(*args):
+        return ref()(*args)
+
+    return callback
+
+
+class TaskIndex:
+    """
+    in-process index of the status columns (prio, running, run_count, paused, finished)
+    of the Tasks table, so the agent's scheduler can find tasks by prio and paused state,
+    and TaskNodes can read their status, without going to SQL.
+
+    the Tasks table stays the source of truth.  triggers on it call back into the
+    index on every INSERT, UPDATE of a status column and DELETE (including delete
+    cascades from Memories), so the index follows writes from any code path:
+    TaskNode.get_update_status, task_stack_pause, forget, etc.
+    writes that are rolled back are not undone in the index; reload() after a rollback.
+
+    Args:
+        agent_memory (AgentMemory): the memory whose Tasks table is indexed
+    """
+
+    def __init__(self, agent_memory):
+        self.agent_memory = agent_memory
+        # memid --> TaskStatus
+        self.status = {}
+        # prio --> {memid: None}, in order of entering that prio
+        self.prio_memids = {}
+        db = agent_memory.db
+        db.create_function("task_index_set", 6, _weak_callback(self._set))
+        db.create_function("task_index_remove", 1, _weak_callback(self._remove))
+        c = db.cursor()
+        c.executescript(TASK_INDEX_TRIGGERS)
+        c.close()
+        self.reload()
+
+    def reload(self):
+        """rebuild the index from the Tasks table"""
+        self.status = {}
+        self.prio_memids = {}
+        r = self.agent_memory._db_read(
+            "SELECT uuid, prio, running, run_count, paused, finished FROM Tasks ORDER BY created"
+        )
+        for row in r:
+            self._set(*row)
+
+    def _set(self, memid, prio, running, run_count, paused, finished):
+        old = self.status.get(memid)
+        if old is not None and old.prio != prio:
+            self._discard_prio(memid, old.prio)
+        self.status[memid] = TaskStatus(prio, running, run_count, paused, finished)
+        self.prio_memids.setdefault(prio, {})[memid] = None
+
+    def _remove(self, memid):
+        old = self.status.pop(memid, None)
+        if old is not None:
+            self._discard_prio(memid, old.prio)
+
+    def _discard_prio(self, memid, prio):
+        memids = self.prio_memids[prio]
+        del memids[memid]
+        if not memids:
+            del self.prio_memids[prio]
+
+    def get_status(self, memid):
+        """returns the TaskStatus of the task with the given memid, or None if there is no such task"""
+        return self.status.get(memid)
+
+    def get_memids(self, prio=None, above_prio=None, unpaused=False, unfinished=False):
+        """
+        returns the memids of the tasks satisfying all of the given conditions
+
+        Args:
+            prio (int): prio equal to this
+            above_prio (int): prio strictly greater than this
+            unpaused (bool): paused <= 0
+            unfinished (bool): finished < 0
+
+        Examples::
+            >>> # same as basic_search("SELECT MEMORY FROM Task WHERE ((prio>0) AND (paused <= 0))")
+            >>> get_memids(above_prio=TaskNode.CHECK_PRIO, unpaused=True)
+        """
+        if prio is not None:
+            prios = [prio] if prio in self.prio_memids else []
+        else:
+            prios = [p for p in self.prio_memids if above_prio is None or p > above_prio]
+        memids = []
+        for p in prios:
+            for memid in self.prio_memids[p]:
+                status = self.status[memid]
+                if unpaused and status.paused > 0:
+                    continue
+                if unfinished and status.finished >= 0:
+                    continue
+                memids.append(memid)
+        return memids
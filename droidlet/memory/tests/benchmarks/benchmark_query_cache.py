@@ -0,0 +1,81 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+Compares per-step latency of the SQLy searches run by the agent's task_step
+(and by each Task checking for active children) with and without the
+MemorySearcher's query plan cache, on a deep stack of tasks.
+
+    python -m droidlet.memory.tests.benchmarks.benchmark_query_cache
+"""
+import argparse
+import time
+
+import numpy as np
+
+from droidlet.memory.sql_memory import AgentMemory
+from droidlet.memory.memory_filters import MemorySearcher
+from droidlet.memory.memory_nodes import TaskNode, TripleNode
+
+
+class NoopTask:
+    """stands in for an uninstantiated Task class in the task eggs"""
+
+    pass
+
+
+def build_task_stack(memory, depth):
+    """a chain of depth running tasks, each the parent of the next"""
+    memids = []
+    for i in range(depth):
+        task = {"class": NoopTask, "task_data": {"task_node_data": {"prio": 1}}}
+        memid = TaskNode.create(memory, task)
+        if memids:
+            TripleNode.create(memory, subj=memid, pred_text="_has_parent_task", obj=memids[-1])
+        memids.append(memid)
+    return memids
+
+
+def step(memory, memids, cached):
+    memory.basic_search("SELECT MEMORY FROM Task WHERE prio={}".format(TaskNode.CHECK_PRIO))
+    memory.basic_search(
+        "SELECT MEMORY FROM Task WHERE ((prio>{}) AND (paused <= 0))".format(TaskNode.CHECK_PRIO)
+    )
+    for memid in memids:
+        if cached:
+            memory.basic_search(
+                "SELECT MEMORY FROM Task WHERE ((prio>=1) AND (_has_parent_task=#=:parent))",
+                params={"parent": memid},
+            )
+        else:
+            memory.basic_search(
+                "SELECT MEMORY FROM Task WHERE ((prio>=1) AND (_has_parent_task=#={}))".format(
+                    memid
+                )
+            )
+
+
+def run(cached, depth, num_steps, warmup=2):
+    memory = AgentMemory()
+    memory.searcher = MemorySearcher(plan_cache_size=256 if cached else 0)
+    memids = build_task_stack(memory, depth)
+    step_times = []
+    for i in range(num_steps + warmup):
+        start = time.perf_counter()
+        step(memory, memids, cached)
+        step_times.append(time.perf_counter() - start)
+    return np.array(step_times[warmup:]), memory.searcher.plan_cache.stats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=128, help="number of tasks in the stack")
+    parser.add_argument("--num_steps", type=int, default=50)
+    args = parser.parse_args()
+
+    for name, cached in [("uncached", False), ("cached", True)]:
+        t, stats = run(cached, args.depth, args.num_steps)
+        print(
+            "{:>10}: mean {:.2f} ms/step, p90 {:.2f} ms/step, cache {}".format(
+                name, 1000 * t.mean(), 1000 * np.percentile(t, 90), stats
+            )
+        )
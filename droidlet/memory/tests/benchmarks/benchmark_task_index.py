@@ -0,0 +1,91 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+Compares per-step latency of the agent's task_step scheduling loop reading
+tasks through SQL searches vs. through the in-process TaskIndex, with a
+stack of live tasks that are all stepped every agent step.
+
+    python -m droidlet.memory.tests.benchmarks.benchmark_task_index
+"""
+import argparse
+import time
+
+import numpy as np
+
+from droidlet.memory.sql_memory import AgentMemory
+from droidlet.memory.memory_nodes import TaskNode
+
+
+class AlwaysTrue:
+    def check(self):
+        return True
+
+
+class BenchTask:
+    """a task that never finishes; each step just counts"""
+
+    def __init__(self):
+        self.run_count = 0
+        self.finished = False
+        self.init_condition = AlwaysTrue()
+
+    def step(self):
+        self.run_count += 1
+
+
+def get_task_mems(memory, use_index, prio=None, above_prio=None):
+    if use_index:
+        memids = memory.task_index.get_memids(
+            prio=prio, above_prio=above_prio, unpaused=above_prio is not None
+        )
+        return [TaskNode(memory, memid) for memid in memids]
+    if prio is not None:
+        query = "SELECT MEMORY FROM Task WHERE prio={}".format(prio)
+    else:
+        query = "SELECT MEMORY FROM Task WHERE ((prio>{}) AND (paused <= 0))".format(above_prio)
+    return memory.basic_search(query)[1]
+
+
+def task_step(memory, use_index):
+    """the scheduling part of DroidletAgent.task_step and controller_step"""
+    for mem in get_task_mems(memory, use_index, prio=TaskNode.CHECK_PRIO):
+        if mem.task.init_condition.check():
+            mem.get_update_status({"prio": TaskNode.CHECK_PRIO + 1})
+    task_mems = get_task_mems(memory, use_index, above_prio=TaskNode.CHECK_PRIO)
+    task_mems.sort(reverse=True, key=lambda x: x.prio)
+    for mem in task_mems:
+        mem.update_node()
+        if mem.prio > TaskNode.CHECK_PRIO:
+            mem.get_update_status({"running": 1})
+            mem.task.step()
+    get_task_mems(memory, use_index, prio=TaskNode.EGG_PRIO)
+
+
+def run(use_index, num_tasks, num_steps, warmup=2):
+    memory = AgentMemory()
+    if not use_index:
+        # TaskNodes fall back to reading their status from the Tasks table
+        memory.task_index = None
+    for i in range(num_tasks):
+        TaskNode.create(memory, BenchTask())
+    step_times = []
+    for i in range(num_steps + warmup):
+        start = time.perf_counter()
+        task_step(memory, use_index)
+        step_times.append(time.perf_counter() - start)
+    return np.array(step_times[warmup:])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_tasks", type=int, default=128, help="number of live tasks")
+    parser.add_argument("--num_steps", type=int, default=50)
+    args = parser.parse_args()
+
+    for name, use_index in [("sql", False), ("task_index", True)]:
+        t = run(use_index, args.num_tasks, args.num_steps)
+        print(
+            "{:>10}: mean {:.2f} ms/step, p90 {:.2f} ms/step".format(
+                name, 1000 * t.mean(), 1000 * np.percentile(t, 90)
+            )
+        )
@@ -1,7 +1,9 @@
 """
 Copyright (c) Facebook, Inc. and its affiliates.
 """
+import gc
 import unittest
+import weakref
 import numpy as np
 from droidlet.memory.memory_nodes import (
     SelfNode,
@@ -11,10 +13,13 @@ from droidlet.memory.memory_nodes import (
     NamedAbstractionNode,
     TimeNode,
     TripleNode,
+    TaskNode,
 )
 from droidlet.memory.sql_memory import AgentMemory
 from droidlet.base_util import Pos, Look, Player
 from droidlet.memory.memory_filters import MemorySearcher
+from droidlet.memory.filters_conversions import sqly_to_new_filters
+from droidlet.event import dispatch
 
 
 class IncrementTime:
@@ -28,6 +33,12 @@ class IncrementTime:
         self.time += 1
 
 
+class FakeTask:
+    def __init__(self):
+        self.run_count = 0
+        self.finished = False
+
+
 class BasicTest(unittest.TestCase):
     def setUp(self):
         self.time = IncrementTime()
@@ -321,6 +332,111 @@ class BasicTest(unittest.TestCase):
         assert triple_memid in memids
         assert robert_memid not in memids
 
+    def test_compiled_where(self):
+        self.memory = AgentMemory()
+        rachel_memid = PlayerNode.create(
+            self.memory, Player(10, "rachel", Pos(1, 0, 1), Look(0, 0))
+        )
+        robert_memid = PlayerNode.create(
+            self.memory, Player(11, "robert", Pos(4, 0, 5), Look(0, 0))
+        )
+        sam_memid = PlayerNode.create(self.memory, Player(12, "sam", Pos(-2, 0, 5), Look(0, 0)))
+        for memid, tags in [
+            (rachel_memid, ["girl", "plays_football"]),
+            (robert_memid, ["boy", "plays_football"]),
+            (sam_memid, ["girl", "plays_volleyball"]),
+        ]:
+            for tag in tags:
+                self.memory.nodes[TripleNode.NODE_TYPE].tag(self.memory, memid, tag)
+        TripleNode.create(self.memory, subj=sam_memid, pred_text="mother_of", obj=robert_memid)
+        # a location has no name
+        LocationNode.create(self.memory, (3, 0, 3))
+
+        compiled = MemorySearcher()
+        interpreted = MemorySearcher(compile_where_clauses=False)
+        queries = [
+            "SELECT MEMORY FROM ReferenceObject WHERE (NOT has_tag=girl)",
+            "SELECT MEMORY FROM ReferenceObject WHERE ((has_tag=plays_volleyball) OR (NOT has_tag=girl))",
+            "SELECT MEMORY FROM ReferenceObject WHERE ((has_tag=plays_football) AND (x>0))",
+            "SELECT MEMORY FROM ReferenceObject WHERE ((z=5) AND (NOT name=sam))",
+            "SELECT MEMORY FROM ReferenceObject WHERE (NOT name=sam)",
+            "SELECT MEMORY FROM ReferenceObject WHERE ((NOT x>0) AND (NOT name=sam))",
+            "SELECT MEMORY FROM ReferenceObject WHERE <<#{}, mother_of, ?>>".format(sam_memid),
+            "SELECT MEMORY FROM ReferenceObject WHERE <<?, mother_of, #{}>>".format(robert_memid),
+            "SELECT MEMORY FROM Player WHERE create_time > -100",
+            "SELECT MEMORY FROM Triple WHERE has_tag=girl",
+        ]
+        for query in queries:
+            c_memids, _ = compiled.search(self.memory, query=query)
+            i_memids, _ = interpreted.search(self.memory, query=query)
+            assert set(c_memids) == set(i_memids), query
+
+        # NOT is true for a memory with no ReferenceObjects row to join, as interpreted
+        LocationNode.new(self.memory)
+        where_clauses = [sqly_to_new_filters(q)["where_clause"] for q in queries[3:6]]
+        # NOT over an OR of the same leaves
+        leaves = [c["NOT"][0] for c in where_clauses[2]["AND"]]
+        where_clauses.append({"NOT": [{"OR": leaves}]})
+        for where_clause in where_clauses:
+            c_memids = compiled.handle_where(self.memory, where_clause, "ReferenceObject")
+            i_memids = interpreted.handle_where(self.memory, where_clause, "ReferenceObject")
+            assert set(c_memids) == set(i_memids), where_clause
+
+        # the whole tree is a single statement with a node type filter
+        sql, args = compiled.compile_where(
+            self.memory,
+            sqly_to_new_filters(queries[1])["where_clause"],
+            "ReferenceObject",
+        )
+        assert sql.count("SELECT") == 3
+        assert "M.node_type IN" in sql
+        assert "girl" in args
+
+    def test_query_plan_cache(self):
+        self.memory = AgentMemory()
+        rachel_memid = PlayerNode.create(
+            self.memory, Player(10, "rachel", Pos(1, 0, 1), Look(0, 0))
+        )
+        sam_memid = PlayerNode.create(self.memory, Player(12, "sam", Pos(-2, 0, 5), Look(0, 0)))
+        self.memory.nodes[TripleNode.NODE_TYPE].tag(self.memory, rachel_memid, "girl")
+        self.memory.nodes[TripleNode.NODE_TYPE].tag(self.memory, sam_memid, "girl")
+        TripleNode.create(self.memory, subj=sam_memid, pred_text="mother_of", obj=rachel_memid)
+
+        m = MemorySearcher(plan_cache_size=2)
+        query = "SELECT MEMORY FROM ReferenceObject WHERE ((has_tag=:tag) AND (x>:x))"
+        memids, _ = m.search(self.memory, query=query, params={"tag": "girl", "x": 0})
+        assert memids == [rachel_memid]
+        memids, _ = m.search(self.memory, query=query, params={"tag": "girl", "x": -5})
+        assert set(memids) == {rachel_memid, sam_memid}
+        memids, _ = m.search(self.memory, query=query, params={"tag": "boy", "x": -5})
+        assert memids == []
+        assert m.plan_cache.stats() == {"hits": 2, "misses": 1, "size": 1, "max_size": 2}
+
+        # placeholders can stand for memids, and agree with the literal query
+        query = "SELECT MEMORY FROM ReferenceObject WHERE <<?, mother_of, #:child>>"
+        memids, _ = m.search(self.memory, query=query, params={"child": rachel_memid})
+        literal_memids, _ = m.search(
+            self.memory, query=query.replace(":child", rachel_memid), params={}
+        )
+        assert memids == literal_memids == [sam_memid]
+
+        # least recently used plan was evicted
+        assert len(m.plan_cache.plans) == 2
+        assert "((has_tag=:tag) AND (x>:x))" not in " ".join(m.plan_cache.plans)
+        m.plan_cache.clear()
+        assert m.plan_cache.stats()["misses"] == 0
+
+        # the cached filters are not changed by binding
+        self.memory.basic_search(
+            "SELECT MEMORY FROM Player WHERE name=:name", params={"name": "sam"}
+        )
+        plan = self.memory.searcher.plan_cache.plans["SELECT MEMORY FROM Player WHERE name=:name"]
+        _, mems = self.memory.basic_search(
+            "SELECT MEMORY FROM Player WHERE name=:name", params={"name": "rachel"}
+        )
+        assert [mem.memid for mem in mems] == [rachel_memid]
+        assert "sam" not in str(plan.filters)
+
     def test_chat_apis_memory(self):
         self.memory = AgentMemory()
         # Test add_chat
@@ -446,6 +562,87 @@ class BasicTest(unittest.TestCase):
         )
         assert len(triples) == 0
 
+    def test_batch(self):
+        self.memory = AgentMemory(agent_time=self.time)
+        joe_memid = PlayerNode.create(self.memory, Player(10, "joe", Pos(1, 0, 1), Look(0, 0)))
+        jane_memid = PlayerNode.create(self.memory, Player(11, "jane", Pos(-1, 0, 1), Look(0, 0)))
+        events = []
+
+        def record(**kwargs):
+            events.append(kwargs["data"])
+
+        dispatch.connect(record, "memory")
+        self.time.add_tick()
+        cmd = "UPDATE ReferenceObjects SET x=? WHERE uuid=?"
+        with self.memory.batch():
+            self.memory.db_write(cmd, 2, joe_memid)
+            with self.memory.batch():
+                self.memory.db_write(cmd, 3, jane_memid)
+            # updated_time is stamped when the outermost batch commits
+            assert self.memory._db_read("SELECT * FROM Updates")
+        dispatch.disconnect(record, "memory")
+        assert len(events) == 1
+        assert events[0]["operation"] == "BATCH"
+        assert events[0]["arguments"]["num_writes"] == 2
+        assert not self.memory._db_read("SELECT * FROM Updates")
+        cmd = "SELECT updated_time FROM Memories WHERE uuid=?"
+        assert self.memory._db_read(cmd, joe_memid)[0][0] == 1
+        assert self.memory._db_read(cmd, jane_memid)[0][0] == 1
+
+        # an exception rolls back every write in the batch
+        with self.assertRaises(ValueError):
+            with self.memory.batch():
+                self.memory.db_write("UPDATE ReferenceObjects SET x=? WHERE uuid=?", 5, joe_memid)
+                raise ValueError
+        assert self.memory._db_read_one("SELECT x FROM ReferenceObjects WHERE uuid=?", joe_memid)[
+            0
+        ] == 2
+
+    def test_task_index(self):
+        self.memory = AgentMemory()
+        index = self.memory.task_index
+        memids = [TaskNode.create(self.memory, FakeTask()) for i in range(4)]
+        assert index.get_memids(prio=TaskNode.CHECK_PRIO) == memids
+        TaskNode(self.memory, memids[0]).get_update_status({"prio": 2})
+        TaskNode(self.memory, memids[1]).get_update_status({"prio": 1, "paused": 1})
+        assert index.get_memids(prio=TaskNode.CHECK_PRIO) == memids[2:]
+        assert set(index.get_memids(above_prio=TaskNode.CHECK_PRIO)) == set(memids[:2])
+        assert index.get_memids(above_prio=TaskNode.CHECK_PRIO, unpaused=True) == [memids[0]]
+        node = TaskNode(self.memory, memids[1])
+        assert (node.prio, node.paused) == (1, 1)
+
+        # writes that don't go through TaskNode are indexed too
+        self.memory.task_stack_resume()
+        assert set(index.get_memids(above_prio=TaskNode.CHECK_PRIO, unpaused=True)) == set(
+            memids[:2]
+        )
+        self.memory.forget(memids[3])
+        assert index.get_status(memids[3]) is None
+        node = TaskNode(self.memory, memids[0])
+        node.task.finished = True
+        node.get_update_status({})
+        assert set(index.get_memids(unfinished=True)) == set(memids[1:3])
+
+        # the index agrees with the table, and is reloaded after a rollback
+        with self.assertRaises(ValueError):
+            with self.memory.batch():
+                self.memory.db_write("UPDATE Tasks SET prio=5")
+                assert len(index.get_memids(prio=5)) == 3
+                raise ValueError
+        assert index.get_memids(prio=5) == []
+        r = self.memory._db_read(
+            "SELECT uuid, prio, running, run_count, paused, finished FROM Tasks"
+        )
+        assert {m: tuple(status) for m, status in index.status.items()} == {
+            row[0]: row[1:] for row in r
+        }
+
+        # the callbacks of the index on the connection don't keep the memory alive
+        memory_ref = weakref.ref(self.memory)
+        del self.memory, index, node
+        gc.collect()
+        assert memory_ref() is None
+
 
 class PlaceFieldTest(unittest.TestCase):
     def test_place_field(self):
@@ -480,6 +677,43 @@ class PlaceFieldTest(unittest.TestCase):
         assert recovered_pos == (new_jane_x, new_jane_z)
         assert PF.maps[0]["map"].sum() == 6
 
+    def test_sync_traversible_changes(self):
+        rng = np.random.RandomState(0)
+        memory = AgentMemory()
+        full = AgentMemory()
+        for m in [memory, full]:
+            m.place_field.update_map([{"pos": (3, 0, 3), "memid": m.self_memid}])
+        obstacles = set()
+        for step in range(10):
+            added = {tuple(l) for l in rng.randint(-20, 20, (30, 2))} - obstacles
+            removed = set(list(obstacles)[:10]) | {(3, 3)}
+            if step == 5:
+                # beyond MAX_MAP_SIZE, dropped
+                added.add((600, -600))
+            obstacles = (obstacles - removed) | added
+            memory.place_field.sync_traversible(list(added), removed=list(removed))
+            full.place_field.sync_traversible(list(obstacles))
+            assert (memory.place_field.maps[0]["map"] == full.place_field.maps[0]["map"]).all()
+            if step == 0:
+                # self stays an obstacle even though slam removed it
+                i, j = memory.place_field.real2map(3, 3, 0)
+                assert memory.place_field.maps[0]["map"][i, j] == 1
+        assert memory.place_field.maps[0]["map"].shape[0] > 1027
+
+    def test_sync_traversible_sub_pixel_changes(self):
+        memory = AgentMemory(place_field_pixels_per_unit=1)
+        full = AgentMemory(place_field_pixels_per_unit=1)
+        # slam cells are 5cm, so these all land in the pixel at (5, 5)
+        cells = [(5.0, 5.0), (5.05, 5.0), (5.0, 5.1)]
+        memory.place_field.sync_traversible(cells)
+        memory.place_field.sync_traversible([], removed=[(5.05, 5.0)])
+        full.place_field.sync_traversible([(5.0, 5.0), (5.0, 5.1)])
+        i, j = memory.place_field.real2map(5, 5, 0)
+        assert memory.place_field.maps[0]["map"][i, j] == 1
+        assert (memory.place_field.maps[0]["map"] == full.place_field.maps[0]["map"]).all()
+        memory.place_field.sync_traversible([], removed=[(5.0, 5.0), (5.0, 5.1)])
+        assert memory.place_field.maps[0]["map"][i, j] == 0
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,9 @@
+import pickle
+import time
 import traceback
 import queue
+from collections import OrderedDict, deque
+from multiprocessing import shared_memory
 from typing import Callable, List
 import cloudpickle
 
@@ -39,8 +43,111 @@ class Process(multiprocessing.Process):
         return self._exception
 
 
+class SharedArrayRing:
+    """Passes the large buffers of task arguments (numpy arrays) to worker processes
+    through shared memory instead of pickling them through a queue.
+
+    The arguments are pickled with protocol 5, with the buffers of at least threshold
+    bytes taken out of band and copied to one of `slots` preallocated slots of a shared
+    memory segment.  The worker copies them out of the slot and frees it before running
+    the task.  When no slot is free, or the buffers don't fit in one, the arguments are
+    pickled in band as usual.  The segment is made the first time it is needed, with
+    slots twice as large as that first message.
+
+    Args:
+        slots (int): number of messages that can be in shared memory at once, 0 to never
+            use shared memory
+        threshold (int): buffers smaller than this many bytes are pickled in band
+    """
+
+    ALIGN = 64
+
+    def __init__(self, slots=4, threshold=2**16):
+        self.slots = slots
+        self.threshold = threshold
+        self.slot_bytes = 0
+        self.name = None
+        self._shm = None
+        # slot ids, put back by the workers.  only the parent takes from it, so a
+        # SimpleQueue, which writes synchronously, can be checked with empty()
+        self._free = multiprocessing.SimpleQueue()
+        for slot in range(slots):
+            self._free.put(slot)
+        # segments attached to by the workers, by name
+        self._attached = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shm"] = None
+        state["_attached"] = {}
+        return state
+
+    def _aligned(self, nbytes):
+        return -(-nbytes // self.ALIGN) * self.ALIGN
+
+    def dumps(self, obj):
+        """returns the message to send for obj, to pass to loads in the worker"""
+        buffers = []
+
+        def out_of_band(buf):
+            if buf.raw().nbytes < self.threshold:
+                return True
+            buffers.append(buf)
+            return False
+
+        data = pickle.dumps(obj, protocol=5, buffer_callback=out_of_band)
+        if not buffers:
+            return (None, None, [], data)
+        sizes = [buf.raw().nbytes for buf in buffers]
+        need = sum(self._aligned(n) for n in sizes)
+        if self._shm is None and self.slots > 0:
+            self.slot_bytes = self._aligned(max(2 * need, 2**20))
+            self._shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+            self.name = self._shm.name
+        if need > self.slot_bytes or self._free.empty():
+            return (None, None, [], pickle.dumps(obj, protocol=5))
+        slot = self._free.get()
+        spans = []
+        offset = slot * self.slot_bytes
+        for buf, nbytes in zip(buffers, sizes):
+            self._shm.buf[offset : offset + nbytes] = buf.raw()
+            spans.append((offset, nbytes))
+            offset += self._aligned(nbytes)
+        return (self.name, slot, spans, data)
+
+    def loads(self, message):
+        """returns the object of a message from dumps, and frees its slot"""
+        name, slot, spans, data = message
+        if name is None:
+            return pickle.loads(data)
+        shm = self._attached.get(name)
+        if shm is None:
+            # the workers are spawned and share the resource tracker of the parent, which
+            # unlinks the segment
+            shm = shared_memory.SharedMemory(name=name)
+            self._attached[name] = shm
+        # copied out of the slot, so the arrays stay valid and writable
+        buffers = [bytearray(shm.buf[offset : offset + nbytes]) for offset, nbytes in spans]
+        self._free.put(slot)
+        return pickle.loads(data, buffers=buffers)
+
+    def release(self, message):
+        """frees the slot of a message from dumps that will not be loaded"""
+        if message[1] is not None:
+            self._free.put(message[1])
+
+    def close(self):
+        for shm in self._attached.values():
+            shm.close()
+        self._attached = {}
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
 def _runner(
-    _init_fn, init_args, _process_fn, shutdown_event, input_queue, output_queue, exec_empty
+    _init_fn, init_args, _process_fn, ring, shutdown_event, input_queue, output_queue, exec_empty
 ):
     try:
         init_fn = cloudpickle.loads(_init_fn)
@@ -49,13 +156,17 @@ def _runner(
 
         while not shutdown_event.is_set():
             try:
-                process_args = input_queue.get(block=True, timeout=0.033)
-                process_args_aug = (initial_state, *process_args)
-                process_return = process_fn(*process_args_aug)
-                output_queue.put(process_return)
+                # only poll when there is something to do while waiting
+                message = input_queue.get(block=True, timeout=0.033 if exec_empty else None)
             except queue.Empty:
-                if exec_empty:
-                    process_fn(initial_state)
+                process_fn(initial_state)
+                continue
+            if message is None:
+                # stop
+                break
+            process_args_aug = (initial_state, *ring.loads(message))
+            process_return = process_fn(*process_args_aug)
+            output_queue.put(process_return)
     except:
         # if the queues are not empty, then the multiprocessing
         # finalizers don't exit cleanly and result in a hang,
@@ -70,10 +181,21 @@ def _runner(
 
 
 class BackgroundTask:
-    def __init__(self, init_fn: Callable, init_args: List, process_fn: Callable):
+    """Runs process_fn(init_fn(*init_args), *args) in another process on the args of
+    each put.  Large numpy arrays in args go through shared memory, see SharedArrayRing.
+
+    Args:
+        shm_slots (int): number of puts whose arrays can be waiting in shared memory
+            at once, 0 to always pickle them
+    """
+
+    def __init__(
+        self, init_fn: Callable, init_args: List, process_fn: Callable, shm_slots: int = 4
+    ):
         self._init_fn = init_fn
         self._init_args = init_args
         self._process_fn = process_fn
+        self._ring = SharedArrayRing(shm_slots)
         self._send_queue = multiprocessing.Queue()
         self._recv_queue = multiprocessing.Queue()
         self._shutdown_event = multiprocessing.Event()
@@ -85,6 +207,7 @@ class BackgroundTask:
                 cloudpickle.dumps(self._init_fn),
                 self._init_args,
                 cloudpickle.dumps(self._process_fn),
+                self._ring,
                 self._shutdown_event,
                 self._send_queue,
                 self._recv_queue,
@@ -94,8 +217,9 @@ class BackgroundTask:
         self._process.daemon = True
         self._process.start()
 
-    def join(self):
-        self._process.join()
+    def join(self, timeout=None):
+        self._process.join(timeout)
+        self._ring.close()
 
     def _raise(self):
         if not hasattr(self, "_process"):
@@ -109,10 +233,11 @@ class BackgroundTask:
     def stop(self):
         self._raise()
         self._shutdown_event.set()
+        self._send_queue.put(None)
 
     def put(self, *args):
         self._raise()
-        self._send_queue.put(args)
+        self._send_queue.put(self._ring.dumps(args))
 
     def get(self, block=True, timeout=None):
         self._raise()
@@ -123,6 +248,412 @@ class BackgroundTask:
         return self._recv_queue.get_nowait()
 
 
+def _pool_runner(_init_fn, init_args, _process_fn, ring, input_queue, output_queue):
+    try:
+        init_fn = cloudpickle.loads(_init_fn)
+        process_fn = cloudpickle.loads(_process_fn)
+        initial_state = init_fn(*init_args)
+
+        while True:
+            task = input_queue.get()
+            if task is None:
+                # stop
+                break
+            task_id, message = task
+            output_queue.put((task_id, process_fn(initial_state, *ring.loads(message))))
+    except:
+        # see _runner
+        while not input_queue.empty():
+            input_queue.get()
+        while not output_queue.empty():
+            output_queue.get()
+        raise
+
+
+class BackgroundTaskPool:
+    """Like BackgroundTask, with num_workers processes, each with its own
+    init_fn(*init_args), taking the puts in turn.
+
+    At most max_pending puts wait for a worker: put blocks, or raises queue.Full, when
+    that many are waiting.  If ordered, get returns the results in the order of the
+    puts, else as soon as they are ready.
+
+    Args:
+        num_workers (int): number of worker processes
+        ordered (bool): return the results in the order of the puts
+        max_pending (int): puts waiting for a worker, by default 2 * num_workers
+        shm_slots (int): number of puts whose arrays can be in shared memory at once,
+            by default enough that puts only fall back to pickling when they are larger
+            than the first one; 0 to always pickle them
+    """
+
+    def __init__(
+        self,
+        init_fn: Callable,
+        init_args: List,
+        process_fn: Callable,
+        num_workers: int = 2,
+        ordered: bool = True,
+        max_pending: int = None,
+        shm_slots: int = None,
+    ):
+        self._init_fn = init_fn
+        self._init_args = init_args
+        self._process_fn = process_fn
+        self.num_workers = num_workers
+        self.ordered = ordered
+        self.max_pending = max_pending or 2 * num_workers
+        if shm_slots is None:
+            # the waiting puts, the one being put and those the workers are copying
+            shm_slots = self.max_pending + 1 + num_workers
+        self._ring = SharedArrayRing(shm_slots)
+        self._send_queue = multiprocessing.Queue(self.max_pending)
+        self._recv_queue = multiprocessing.Queue()
+        self._next_put = 0
+        self._next_get = 0
+        # results that came before those of earlier puts, when ordered
+        self._results = {}
+        self._processes = []
+
+    def start(self):
+        args = (
+            cloudpickle.dumps(self._init_fn),
+            self._init_args,
+            cloudpickle.dumps(self._process_fn),
+            self._ring,
+            self._send_queue,
+            self._recv_queue,
+        )
+        for _ in range(self.num_workers):
+            process = Process(target=_pool_runner, args=args)
+            process.daemon = True
+            process.start()
+            self._processes.append(process)
+
+    def _raise(self):
+        if not self._processes:
+            raise RuntimeError(
+                "BackgroundTaskPool has not yet been started." " Did you forget to call .start()?"
+            )
+        for process in self._processes:
+            if process.exception:
+                error, _traceback = process.exception
+                raise ChildProcessError(_traceback)
+
+    def put(self, *args, block=True, timeout=None):
+        """queues process_fn(state, *args) and returns its task id.  raises queue.Full if
+        max_pending puts are waiting and block is False, or still after timeout seconds"""
+        self._raise()
+        message = self._ring.dumps(args)
+        try:
+            self._send_queue.put((self._next_put, message), block, timeout)
+        except queue.Full:
+            self._ring.release(message)
+            raise
+        self._next_put += 1
+        return self._next_put - 1
+
+    def get(self, block=True, timeout=None):
+        """returns the result of a put, see ordered.  raises queue.Empty if none is ready
+        and block is False, or still after timeout seconds"""
+        deadline = None if timeout is None else time.time() + timeout
+        while not (self.ordered and self._next_get in self._results):
+            self._raise()
+            # wake up now and then to notice workers that died
+            wait = 0.1 if deadline is None else min(0.1, deadline - time.time())
+            try:
+                if block and wait > 0:
+                    task_id, result = self._recv_queue.get(True, wait)
+                else:
+                    task_id, result = self._recv_queue.get_nowait()
+            except queue.Empty:
+                if not block or (deadline is not None and time.time() >= deadline):
+                    raise
+                continue
+            if not self.ordered:
+                return result
+            self._results[task_id] = result
+        self._next_get += 1
+        return self._results.pop(self._next_get - 1)
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def stop(self):
+        """stops the workers once they finish their current task; waiting puts are dropped"""
+        self._raise()
+        for _ in self._processes:
+            while True:
+                try:
+                    self._send_queue.put_nowait(None)
+                    break
+                except queue.Full:
+                    try:
+                        task = self._send_queue.get_nowait()
+                    except queue.Empty:
+                        continue
+                    if task is not None:
+                        self._ring.release(task[1])
+
+    def join(self, timeout=None):
+        for process in self._processes:
+            process.join(timeout)
+        self._ring.close()
+
+
+def _stage_runner(_init_fn, init_args, _process_fn, batch_size, ring, input_queue, output_queue):
+    try:
+        init_fn = cloudpickle.loads(_init_fn)
+        process_fn = cloudpickle.loads(_process_fn)
+        initial_state = init_fn(*init_args)
+
+        stop = False
+        while not stop:
+            batch = [input_queue.get()]
+            # batch the frames that are already waiting
+            while len(batch) < batch_size:
+                try:
+                    batch.append(input_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                # stop, after the frames before it
+                stop = True
+                batch = batch[: batch.index(None)]
+                if not batch:
+                    break
+            batch = [(frame_id, ring.loads(message)) for frame_id, message in batch]
+            start = time.time()
+            outputs = process_fn(initial_state, [args for _, args in batch])
+            latency = time.time() - start
+            for (frame_id, _), output in zip(batch, outputs):
+                output_queue.put((frame_id, output, latency))
+    except:
+        # see _runner
+        while not input_queue.empty():
+            input_queue.get()
+        while not output_queue.empty():
+            output_queue.get()
+        raise
+
+
+class PipelineStage(BackgroundTask):
+    """A BackgroundTask running one model of a Pipeline.
+
+    Its input queue holds at most max_queue frames: when it is full, the oldest frame is
+    dropped for the new one, so the stage always works on the latest frames.  It takes up
+    to batch_size waiting frames at once: process_fn(state, batch) gets a list of the
+    argument tuples given to Pipeline.put and returns a list with the output of each.
+
+    Args:
+        name (str): name of the stage, the key of its outputs
+        max_queue (int): frames kept waiting, by default batch_size
+    """
+
+    def __init__(
+        self,
+        name: str,
+        init_fn: Callable,
+        init_args: List,
+        process_fn: Callable,
+        batch_size: int = 1,
+        max_queue: int = None,
+    ):
+        max_queue = max_queue or batch_size
+        # the waiting frames, the one being put and the one the stage is copying
+        super().__init__(init_fn, init_args, process_fn, shm_slots=max_queue + 2)
+        self.name = name
+        self.batch_size = batch_size
+        self._send_queue = multiprocessing.Queue(max_queue)
+
+    def start(self):
+        self._process = Process(
+            target=_stage_runner,
+            args=(
+                cloudpickle.dumps(self._init_fn),
+                self._init_args,
+                cloudpickle.dumps(self._process_fn),
+                self.batch_size,
+                self._ring,
+                self._send_queue,
+                self._recv_queue,
+            ),
+        )
+        self._process.daemon = True
+        self._process.start()
+
+    def _put_latest(self, item):
+        """queues item, dropping the oldest items if the queue is full.  returns them"""
+        dropped = []
+        while True:
+            try:
+                self._send_queue.put_nowait(item)
+                return dropped
+            except queue.Full:
+                try:
+                    dropped.append(self._send_queue.get_nowait())
+                except queue.Empty:
+                    # the stage just took it
+                    pass
+
+    def put(self, frame_id, *args):
+        """queues a frame, and returns the ids of the frames dropped to make room for it"""
+        self._raise()
+        dropped = self._put_latest((frame_id, self._ring.dumps(args)))
+        for _, message in dropped:
+            self._ring.release(message)
+        return [frame_id for frame_id, _ in dropped]
+
+    def stop(self):
+        self._raise()
+        for _, message in self._put_latest(None):
+            self._ring.release(message)
+
+
+class StageStats:
+    """latency and throughput counters of a PipelineStage"""
+
+    def __init__(self, window=50):
+        self.frames = 0
+        self.dropped = 0
+        self.latency = None
+        # times of the last results
+        self.times = deque(maxlen=window)
+
+    def add(self, latency):
+        self.frames += 1
+        self.latency = latency if self.latency is None else 0.9 * self.latency + 0.1 * latency
+        self.times.append(time.time())
+
+    def to_dict(self):
+        fps = 0.0
+        if len(self.times) > 1 and self.times[-1] > self.times[0]:
+            fps = (len(self.times) - 1) / (self.times[-1] - self.times[0])
+        return {
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "latency_ms": None if self.latency is None else 1000 * self.latency,
+            "fps": fps,
+        }
+
+
+class Pipeline:
+    """Runs several PipelineStages in parallel on the same frames and joins their outputs
+    by frame.
+
+    A frame is returned by get once every stage has either processed it or skipped it
+    (it was dropped, or the stage went on to a newer frame), or join_timeout seconds after
+    it was put if some stage has processed it, so a slow stage does not hold back the
+    others.  Outputs of a frame that come after it was returned are returned on their own.
+
+    Args:
+        stages (List[PipelineStage]): the stages, with different names
+        join_timeout (float): seconds to wait for the slowest stages before returning a frame
+    """
+
+    def __init__(self, stages: List[PipelineStage], join_timeout: float = 1.0):
+        self.stages = stages
+        self.join_timeout = join_timeout
+        self.next_frame_id = 0
+        # frame_id -> frame, for the frames some stage may still return
+        self.frames = OrderedDict()
+        self.stats = {stage.name: StageStats() for stage in stages}
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+        # the stages finish their current frames, then their shared memory is freed
+        for stage in self.stages:
+            stage.join(self.join_timeout)
+
+    def put(self, *args):
+        """sends a frame to all the stages and returns its frame id"""
+        frame_id = self.next_frame_id
+        self.next_frame_id += 1
+        self.frames[frame_id] = {
+            "args": args,
+            "time": time.time(),
+            "outputs": {},
+            "done": set(),
+        }
+        for stage in self.stages:
+            for dropped_id in stage.put(frame_id, *args):
+                self.stats[stage.name].dropped += 1
+                self._done(stage.name, dropped_id)
+        return frame_id
+
+    def _done(self, name, frame_id):
+        frame = self.frames.get(frame_id)
+        if frame is not None:
+            frame["done"].add(name)
+
+    def _collect(self):
+        """moves the outputs of the stages to their frames"""
+        for stage in self.stages:
+            while True:
+                try:
+                    frame_id, output, latency = stage.get_nowait()
+                except queue.Empty:
+                    break
+                self.stats[stage.name].add(latency)
+                # stages process frames in order, so they skipped the older ones
+                for older_id in self.frames:
+                    if older_id >= frame_id:
+                        break
+                    self._done(stage.name, older_id)
+                frame = self.frames.get(frame_id)
+                if frame is not None:
+                    frame["outputs"][stage.name] = output
+                    frame["done"].add(stage.name)
+
+    def _ready(self, wait_for=None):
+        out = []
+        now = time.time()
+        for frame_id in list(self.frames):
+            frame = self.frames[frame_id]
+            complete = len(frame["done"]) == len(self.stages)
+            timed_out = now - frame["time"] > self.join_timeout and frame_id != wait_for
+            if frame["outputs"] and (complete or timed_out):
+                out.append((frame_id, frame["args"], frame["outputs"]))
+                frame["outputs"] = {}
+            if complete:
+                del self.frames[frame_id]
+        return out
+
+    def get(self, block=False, timeout=None, frame_id=None):
+        """returns a list of the (frame id, args given to put, {stage name: output}) that
+        are ready, oldest first.
+
+        Args:
+            block (bool): wait until some frame is ready
+            timeout (float): how long to block, in seconds; raises queue.Empty after it
+            frame_id (int): if not None, wait until every stage is done with this frame
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        out = []
+        while True:
+            for stage in self.stages:
+                stage._raise()
+            self._collect()
+            out += self._ready(wait_for=frame_id)
+            if frame_id is not None:
+                if frame_id not in self.frames:
+                    return out
+            elif out or not block:
+                return out
+            if deadline is not None and time.time() > deadline:
+                raise queue.Empty
+            time.sleep(0.001)
+
+    def get_stats(self):
+        """returns {stage name: {"frames", "dropped", "latency_ms", "fps"}}"""
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
+
+
 # https://stackoverflow.com/a/31614591
 # CC BY-SA 4.0
 class PropagatingThread(Thread):
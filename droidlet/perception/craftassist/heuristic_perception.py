@@ -5,15 +5,18 @@ Copyright (c) Facebook, Inc. and its affiliates.
 import heapq
 import math
 import numpy as np
+from scipy import ndimage
 from scipy.ndimage.filters import median_filter
 from scipy.optimize import linprog
 from copy import deepcopy
 import logging
-from droidlet.base_util import depth_first_search, to_block_pos, manhat_dist, euclid_dist
+from droidlet.base_util import to_block_pos, manhat_dist, euclid_dist
 from droidlet.shared_data_struct.craftassist_shared_utils import CraftAssistPerceptionData
 
 GROUND_BLOCKS = [1, 2, 3, 7, 8, 9, 12, 79, 80]
 MAX_RADIUS = 20
+# structuring element for labeling with 26-connectivity (diagonal adjacency)
+DIAG_ADJACENT = np.ones((3, 3, 3), dtype="bool")
 
 
 # Taken from : stackoverflow.com/questions/16750618/
@@ -39,12 +42,14 @@ def all_nearby_objects(get_blocks, pos, boring_blocks, passable_blocks, max_radi
     mask, off, blocks = all_close_interesting_blocks(
         get_blocks, pos, boring_blocks, passable_blocks, max_radius
     )
-    components = connected_components(mask)
-    logging.debug("all_nearby_objects found {} objects near {}".format(len(components), pos))
-    xyzbms = [
-        [((c[2] + off[2], c[0] + off[0], c[1] + off[1]), tuple(blocks[c])) for c in component_yzxs]
-        for component_yzxs in components
-    ]
+    labels, num = label_components(mask)
+    voxels = component_stats(labels, num)["voxels"]
+    logging.debug("all_nearby_objects found {} objects near {}".format(num, pos))
+    xyzbms = []
+    for yzxs in voxels:
+        xyzs = (yzxs[:, [2, 0, 1]] + [off[2], off[0], off[1]]).tolist()
+        idms = blocks[yzxs[:, 0], yzxs[:, 1], yzxs[:, 2]].tolist()
+        xyzbms.append([(tuple(xyz), tuple(idm)) for xyz, idm in zip(xyzs, idms)])
     return xyzbms
 
 
@@ -84,16 +89,12 @@ def accessible_interesting_blocks(blocks, pos, boring_blocks, passable_blocks):
     passable = np.isin(blocks, passable_blocks)
     interesting = np.isin(blocks, boring_blocks, invert=True)
     passable_or_interesting = passable | interesting
-    X = np.zeros_like(passable)
-
-    def _fn(p):
-        if passable_or_interesting[p]:
-            X[p] = True
-            return True
-        return False
-
-    depth_first_search(blocks.shape[:3], pos, _fn)
-    return X & interesting
+    pos = tuple(pos)
+    if not passable_or_interesting[pos]:
+        return np.zeros_like(passable)
+    # the 6-connected component of passable or interesting blocks containing pos
+    labels, _ = ndimage.label(passable_or_interesting)
+    return (labels == labels[pos]) & interesting
 
 
 def find_closest_component(mask, relpos):
@@ -105,69 +106,103 @@ def find_closest_component(mask, relpos):
 
     Returns: a list of indices of the closest connected component, or None
     """
-    components = connected_components(mask)
-    if len(components) == 0:
+    labels, num = label_components(mask)
+    if num == 0:
         return None
-    centroids = [np.mean(cs, axis=0) for cs in components]
-    dists = [manhat_dist(c, relpos) for c in centroids]
-    return components[np.argmin(dists)]
+    stats = component_stats(labels, num)
+    dists = np.abs(stats["centroids"] - relpos).sum(axis=1)
+    return [tuple(c) for c in stats["voxels"][np.argmin(dists)].tolist()]
 
 
-def connected_components(X, unique_idm=False):
-    """Find all connected nonzero components in a array X.
+def label_components(X, unique_idm=False):
+    """Label the connected nonzero components of an array X, with
+    diagonal (26-) adjacency.
     X is either rank 3 (volume) or rank 4 (volume-idm)
     If unique_idm == True, different block types are different
     components
 
-    Returns a list of lists of indices of connected components
+    Returns (labels, num): labels is an int array with the shape of the
+    volume, 0 at air and 1, ..., num at the components; components are
+    numbered in the (C) order of their first voxel
     """
-    visited = np.zeros((X.shape[0], X.shape[1], X.shape[2]), dtype="bool")
-    components = []
-    current_component = set()
-    diag_adj = build_safe_diag_adjacent([0, X.shape[0], 0, X.shape[1], 0, X.shape[2]])
-
-    if len(X.shape) == 3:
-        X = np.expand_dims(X, axis=3)
-
-    def is_air(X, i, j, k):
-        return X[i, j, k, 0] == 0
-
+    if len(X.shape) == 4:
+        nonzero = X[:, :, :, 0] != 0
+        if unique_idm:
+            codes = (X[:, :, :, 0].astype("int64") << 32) | X[:, :, :, 1].astype("int64")
+    else:
+        nonzero = X != 0
+        codes = X
     if not unique_idm:
-
-        def _build_fn(X, current_component, idm):
-            def _fn(p):
-                if X[p[0], p[1], p[2], 0]:
-                    current_component.add(p)
-                    return True
-
-            return _fn
-
+        labels, num = ndimage.label(nonzero, structure=DIAG_ADJACENT)
     else:
+        labels = np.zeros(nonzero.shape, dtype="int32")
+        num = 0
+        for code in np.unique(codes[nonzero]):
+            code_labels, code_num = ndimage.label(codes == code, structure=DIAG_ADJACENT)
+            in_code = code_labels > 0
+            labels[in_code] = code_labels[in_code] + num
+            num += code_num
+    if num > 0:
+        # renumber by first voxel
+        flat = labels.ravel()
+        _, first = np.unique(flat[flat > 0], return_index=True)
+        renumber = np.zeros(num + 1, dtype=labels.dtype)
+        renumber[np.argsort(first) + 1] = np.arange(1, num + 1)
+        labels = renumber[labels]
+    return labels, num
+
+
+def component_stats(labels, num):
+    """Collect the voxels, size, centroid and bounding box of each component
+    of the output of label_components in one pass over the labeled voxels
+
+    Returns a dict with
+        "voxels": list of num (size, 3) int arrays of the indices of the
+            voxels of each component, in C order
+        "sizes": (num,) int array
+        "centroids": (num, 3) float array
+        "bounds": (num, 2, 3) int array, the min and max (inclusive) index
+            along each axis
+    """
+    if num == 0:
+        return {
+            "voxels": [],
+            "sizes": np.zeros(0, dtype="int64"),
+            "centroids": np.zeros((0, 3)),
+            "bounds": np.zeros((0, 2, 3), dtype="int64"),
+        }
+    flat = labels.ravel()
+    idx = np.flatnonzero(flat)
+    idx = idx[np.argsort(flat[idx], kind="stable")]
+    voxels = np.stack(np.unravel_index(idx, labels.shape), axis=1)
+    sizes = np.bincount(flat[idx], minlength=num + 1)[1:]
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    return {
+        "voxels": np.split(voxels, starts[1:]),
+        "sizes": sizes,
+        "centroids": np.add.reduceat(voxels, starts, axis=0) / sizes[:, None],
+        "bounds": np.stack(
+            [
+                np.minimum.reduceat(voxels, starts, axis=0),
+                np.maximum.reduceat(voxels, starts, axis=0),
+            ],
+            axis=1,
+        ),
+    }
 
-        def _build_fn(X, current_component, idm):
-            def _fn(p):
-                if tuple(X[p]) == idm:
-                    current_component.add(p)
-                    return True
-
-            return _fn
 
-    for i in range(visited.shape[0]):
-        for j in range(visited.shape[1]):
-            for k in range(visited.shape[2]):
-                if visited[i, j, k]:
-                    continue
-                visited[i, j, k] = True
-                if is_air(X, i, j, k):
-                    continue
-                # found a new component
-                pos = (i, j, k)
-                _fn = _build_fn(X, current_component, tuple(X[i, j, k, :]))
-                visited |= depth_first_search(X.shape[:3], pos, _fn, diag_adj)
-                components.append(list(current_component))
-                current_component.clear()
+def connected_components(X, unique_idm=False):
+    """Find all connected nonzero components in a array X.
+    X is either rank 3 (volume) or rank 4 (volume-idm)
+    If unique_idm == True, different block types are different
+    components
 
-    return components
+    Returns a list of lists of indices of connected components
+    """
+    labels, num = label_components(X, unique_idm=unique_idm)
+    return [
+        [tuple(p) for p in voxels.tolist()] for voxels in component_stats(labels, num)["voxels"]
+    ]
 
 
 def check_between(entities, get_locs_from_entity, fat_scale=0.2):
@@ -382,95 +417,119 @@ def get_nearby_airtouching_blocks(
     return blocktypes, all_components, all_tags
 
 
+def get_column_tops(agent, location, radius, max_height, slab_height=16):
+    """Find the highest block at or below max_height in each column of the
+    (2 * radius + 1) x (2 * radius + 1) square of columns centered at location,
+    skipping mobile blocks (the agent, the speaker at location, mobs).
+    Reads the blocks with one get_blocks per slab of slab_height
+
+    Returns:
+        (heights, idms): heights is an (x, z) int array, idms an (x, z, 2) array
+    """
+    sx, sy, sz = location
+    map_size = 2 * radius + 1
+    xs = np.arange(sx - radius, sx + radius + 1)
+    zs = np.arange(sz - radius, sz + radius + 1)
+    heights = np.zeros((map_size, map_size), dtype="int64")
+    idms = np.zeros((map_size, map_size, 2), dtype="int64")
+    found = np.zeros((map_size, map_size), dtype="bool")
+    top = max_height
+    while not found.all():
+        bottom = top - slab_height + 1
+        yzxb = agent.get_blocks(sx - radius, sx + radius, bottom, top, sz - radius, sz + radius)
+        xzyb = yzxb.transpose(2, 1, 0, 3)
+        ys = np.arange(bottom, top + 1)
+        solid = (xzyb[:, :, :, 0] != 0) & (xzyb[:, :, :, 0] != 383) & ~found[:, :, None]
+        for ex, ey, ez in [location, agent.pos]:
+            solid &= ~(
+                (xs[:, None, None] == ex) & (ys[None, None, :] == ey) & (zs[None, :, None] == ez)
+            )
+        has = solid.any(axis=2)
+        k = slab_height - 1 - np.argmax(solid[:, :, ::-1], axis=2)
+        i, j = np.nonzero(has)
+        heights[i, j] = bottom + k[i, j]
+        idms[i, j] = xzyb[i, j, k[i, j]]
+        found |= has
+        top = bottom - 1
+    return heights, idms
+
+
+def label_plateaus(heights):
+    """Label the 4-connected regions of equal height in an (x, z) height map
+
+    Returns (labels, num) as in label_components
+    """
+    labels = np.zeros(heights.shape, dtype="int32")
+    num = 0
+    for h in np.unique(heights):
+        h_labels, h_num = ndimage.label(heights == h)
+        in_h = h_labels > 0
+        labels[in_h] = h_labels[in_h] + num
+        num += h_num
+    return labels, num
+
+
 def get_all_nearby_holes(agent, location, block_data, fill_idmeta, radius=15, store_inst_seg=True):
     """Returns:
     a list of holes. Each hole is an InstSegNode"""
     sx, sy, sz = location
     max_height = sy + 5
     map_size = radius * 2 + 1
-    height_map = [[sz] * map_size for i in range(map_size)]
-    hid_map = [[-1] * map_size for i in range(map_size)]
-    idm_map = [[(0, 0)] * map_size for i in range(map_size)]
+    height_map, idm_map = get_column_tops(agent, location, radius, max_height)
+    hid_map = -np.ones((map_size, map_size), dtype="int64")
     visited = set([])
-    global current_connected_comp, current_idm
-    current_connected_comp = []
-    current_idm = (2, 0)
-
-    # utility functions
-    def get_block_info(x, z):  # fudge factor 5
-        height = max_height
-        while True:
-            B = agent.get_blocks(x, x, height, height, z, z)
-            if (
-                (B[0, 0, 0, 0] != 0)
-                and (x != sx or z != sz or height != sy)
-                and (x != agent.pos[0] or z != agent.pos[2] or height != agent.pos[1])
-                and (B[0, 0, 0, 0] != 383)
-            ):  # if it's not a mobile block (agent, speaker, mobs)
-                return height, tuple(B[0, 0, 0])
-            height -= 1
-
-    gx = [0, 0, -1, 1]
-    gz = [1, -1, 0, 0]
-
-    def dfs(x, y, z):
-        """Traverse current connected component and return minimum
-        height of all surrounding blocks"""
-        build_height = 100000
-        if (x, y, z) in visited:
-            return build_height
-        global current_connected_comp, current_idm
-        current_connected_comp.append((x - radius + sx, y, z - radius + sz))  # absolute positions
-        visited.add((x, y, z))
-        for d in range(4):
-            nx = x + gx[d]
-            nz = z + gz[d]
-            if nx >= 0 and nz >= 0 and nx < map_size and nz < map_size:
-                if height_map[x][z] == height_map[nx][nz]:
-                    build_height = min(build_height, dfs(nx, y, nz))
-                else:
-                    build_height = min(build_height, height_map[nx][nz])
-                    current_idm = idm_map[nx][nz]
-            else:
-                # bad ... hole is not within defined radius
-                return -100000
-        return build_height
-
-    # find all holes
-    blocks_queue = []
-    for i in range(map_size):
-        for j in range(map_size):
-            height_map[i][j], idm_map[i][j] = get_block_info(i - radius + sx, j - radius + sz)
-            heapq.heappush(blocks_queue, (height_map[i][j] + 1, (i, height_map[i][j] + 1, j)))
+
+    # find all holes.  a hole is a level region (a "plateau" of the height map)
+    # whose rim is all higher than it; it is filled up to the lowest point of
+    # the rim one layer at a time, merging with the neighboring plateaus it
+    # reaches.  plateaus touching the edge of the map are not holes
+    blocks_queue = [(int(h) + 1, (i, int(h) + 1, j)) for (i, j), h in np.ndenumerate(height_map)]
+    heapq.heapify(blocks_queue)
+    labels, _ = label_plateaus(height_map)
     holes = []
     while len(blocks_queue) > 0:
         hxyz = heapq.heappop(blocks_queue)
         h, (x, y, z) = hxyz  # NB: relative positions
         if (x, y, z) in visited or y > max_height:
             continue
-        assert h == height_map[x][z] + 1, " h=%d heightmap=%d, x,z=%d,%d" % (
+        assert h == height_map[x, z] + 1, " h=%d heightmap=%d, x,z=%d,%d" % (
             h,
-            height_map[x][z],
+            height_map[x, z],
             x,
             z,
         )  # sanity check
-        current_connected_comp = []
-        current_idm = (2, 0)
-        build_height = dfs(x, y, z)
-        if build_height >= h:
-            holes.append((current_connected_comp.copy(), current_idm))
-            cur_hid = len(holes) - 1
-            for n, xyz in enumerate(current_connected_comp):
-                x, y, z = xyz
-                rx, ry, rz = x - sx + radius, y + 1, z - sz + radius
-                heapq.heappush(blocks_queue, (ry, (rx, ry, rz)))
-                height_map[rx][rz] += 1
-                if hid_map[rx][rz] != -1:
-                    holes[cur_hid][0].extend(holes[hid_map[rx][rz]][0])
-                    holes[hid_map[rx][rz]] = ([], (0, 0))
-                hid_map[rx][rz] = cur_hid
-
-    # A bug in the algorithm above produces holes that include non-air blocks.
+        plateau = labels == labels[x, z]
+        cells = np.argwhere(plateau)
+        visited.update((i, y, j) for i, j in cells.tolist())
+        if (
+            plateau[0, :].any()
+            or plateau[-1, :].any()
+            or plateau[:, 0].any()
+            or plateau[:, -1].any()
+        ):
+            # bad ... hole is not within defined radius
+            continue
+        rim = np.argwhere(ndimage.binary_dilation(plateau) & ~plateau)
+        rim_heights = height_map[rim[:, 0], rim[:, 1]]
+        if rim_heights.min() < h:
+            continue
+        lowest = rim[np.argmin(rim_heights)]
+        current_idm = tuple(idm_map[lowest[0], lowest[1]].tolist())
+        # absolute positions
+        current_connected_comp = [(i - radius + sx, y, j - radius + sz) for i, j in cells.tolist()]
+        holes.append((current_connected_comp, current_idm))
+        cur_hid = len(holes) - 1
+        for hid in np.unique(hid_map[plateau]).tolist():
+            if hid != -1:
+                holes[cur_hid][0].extend(holes[hid][0])
+                holes[hid] = ([], (0, 0))
+        hid_map[plateau] = cur_hid
+        height_map[plateau] += 1
+        for i, j in cells.tolist():
+            heapq.heappush(blocks_queue, (y + 1, (i, y + 1, j)))
+        labels, _ = label_plateaus(height_map)
+
+    # holes can include the mobile blocks skipped by get_column_tops (agent, speaker, mobs).
     # Just patch the problem here, since this function will eventually be
     # performed by an ML model
     for i, (xyzs, idm) in enumerate(holes):
@@ -483,6 +542,126 @@ def get_all_nearby_holes(agent, location, block_data, fill_idmeta, radius=15, st
     return holes
 
 
+class IncrementalBlockObjects:
+    """Keeps the connected components of the accessible interesting blocks in
+    the (2 * radius + 1)^3 cube around a center, and updates them from
+    changed-block deltas, re-labeling only the components touching a changed block.
+
+    reset() and apply_changes() return lists of updates for
+    MCAgentMemory.update_block_objects:
+        {"op": "add", "blocks": [(xyz, idm), ...]}: a new component
+        {"op": "modify", "blocks": [(xyz, idm), ...], "removed": [xyz, ...]}:
+            a component replacing one or more previous components (it grew,
+            shrank, merged or split); "removed" are the voxels of those that
+            are not in any component anymore
+        {"op": "remove", "removed": [xyz, ...]}: a component that is gone
+
+    Blocks changed to an interesting type are assumed to be accessible;
+    accessibility of the rest of the cube is only recomputed by reset()
+
+    Args:
+        boring_blocks (list): block ids that are not interesting
+        passable_blocks (list): block ids that can be passed through
+        radius (int): half the side of the tracked cube
+    """
+
+    def __init__(self, boring_blocks, passable_blocks, radius=MAX_RADIUS):
+        self.boring_blocks = boring_blocks
+        self.passable_blocks = passable_blocks
+        self.radius = radius
+        self.center = None
+
+    def contains(self, xyz, margin=0):
+        """is xyz in the tracked cube, at least margin away from its faces"""
+        if self.center is None:
+            return False
+        return bool((np.abs(np.subtract(xyz, self.center)) <= self.radius - margin).all())
+
+    def reset(self, get_blocks, center):
+        """Segment the cube around center from scratch, returns an "add" update per component"""
+        center = np.round(center).astype("int64")
+        mask, _, yzxb = all_close_interesting_blocks(
+            get_blocks, center, self.boring_blocks, self.passable_blocks, self.radius
+        )
+        self.center = center
+        self.origin = center - self.radius
+        # x, y, z order from here on
+        self.blocks = yzxb.transpose(2, 0, 1, 3).copy()
+        self.mask = mask.transpose(2, 0, 1).copy()
+        labels, num = label_components(self.mask)
+        self.labels = labels.astype("int64")
+        self.next_label = num + 1
+        stats = component_stats(labels, num)
+        # label --> (2, 3) min and max corner
+        self.bounds = {i + 1: stats["bounds"][i] for i in range(num)}
+        return [{"op": "add", "blocks": self._blocks(voxels)} for voxels in stats["voxels"]]
+
+    def apply_changes(self, changed_blocks):
+        """Update the segmentation with a dict of {xyz: idm} of changed blocks, returns the updates"""
+        rel = []
+        for xyz, idm in changed_blocks.items():
+            r = tuple(np.subtract(xyz, self.origin).tolist())
+            if all(0 <= r[i] < self.mask.shape[i] for i in range(3)):
+                self.blocks[r] = idm
+                self.mask[r] = idm[0] not in self.boring_blocks
+                rel.append(r)
+        if len(rel) == 0:
+            return []
+        rel = np.array(rel)
+        # the previous components touching a changed block
+        affected = set()
+        for r in rel:
+            near = tuple(slice(max(a - 1, 0), a + 2) for a in r)
+            affected.update(np.unique(self.labels[near]).tolist())
+        affected.discard(0)
+        lo = rel.min(axis=0)
+        hi = rel.max(axis=0)
+        for l in affected:
+            lo = np.minimum(lo, self.bounds[l][0])
+            hi = np.maximum(hi, self.bounds[l][1])
+        box = tuple(slice(a, b + 1) for a, b in zip(lo, hi))
+        old = self.labels[box]
+        was_affected = np.isin(old, list(affected))
+        changed = np.zeros(old.shape, dtype="bool")
+        changed[tuple((rel - lo).T)] = True
+        # no other component can touch these, so they can be labeled on their own
+        new, num = label_components(self.mask[box] & (was_affected | changed))
+        stats = component_stats(new, num)
+        in_new = new > 0
+
+        updates = []
+        matched = set()
+        old_voxels = {l: np.argwhere(old == l) for l in affected}
+        for voxels in stats["voxels"]:
+            overlap = set(np.unique(old[tuple(voxels.T)]).tolist()) - {0}
+            blocks = self._blocks(voxels + lo)
+            if not overlap:
+                updates.append({"op": "add", "blocks": blocks})
+                continue
+            matched |= overlap
+            gone = np.concatenate([old_voxels[l] for l in overlap])
+            gone = gone[~in_new[tuple(gone.T)]]
+            updates.append({"op": "modify", "blocks": blocks, "removed": self._xyzs(gone + lo)})
+        for l in affected - matched:
+            updates.append({"op": "remove", "removed": self._xyzs(old_voxels[l] + lo)})
+
+        for l in affected:
+            del self.bounds[l]
+        old[was_affected] = 0
+        old[in_new] = new[in_new] + self.next_label - 1
+        for i in range(num):
+            self.bounds[self.next_label + i] = stats["bounds"][i] + lo
+        self.next_label += num
+        return updates
+
+    def _xyzs(self, rel):
+        return [tuple(xyz) for xyz in (rel + self.origin).tolist()]
+
+    def _blocks(self, rel):
+        idms = self.blocks[tuple(rel.T)].tolist()
+        return list(zip(self._xyzs(rel), map(tuple, idms)))
+
+
 def maybe_get_type_name(idm, block_data):
     try:
         type_name = block_data["bid_to_name"][idm]
@@ -509,12 +688,27 @@ class PerceptionWrapper:
     |     a block placement, it would be dealt with via maybe_add_block_to_memory
     |     in low_level_perception.py)
 
+    | In incremental mode, the block objects near the agent are kept by an
+    |     IncrementalBlockObjects and updated from the changed blocks passed to
+    |     on_blocks_changed, and sent to memory as block_object_updates.  Holes and
+    |     air-touching blocks near the agent are only recomputed when blocks
+    |     changed or the agent moved, and areas to perceive inside the tracked
+    |     cube don't recompute their block objects.
+
     Args:
         agent (LocoMCAgent): reference to the minecraft Agent
         perceive_freq (int): if not forced, how many Agent steps between perception
+        incremental (bool): run in incremental mode
     """
 
-    def __init__(self, agent, low_level_data, perceive_freq=20, mark_airtouching_blocks=False):
+    def __init__(
+        self,
+        agent,
+        low_level_data,
+        perceive_freq=20,
+        mark_airtouching_blocks=False,
+        incremental=False,
+    ):
         self.mark_airtouching_blocks = mark_airtouching_blocks
         self.perceive_freq = perceive_freq
         self.agent = agent
@@ -525,6 +719,26 @@ class PerceptionWrapper:
         self.boring_blocks = low_level_data["boring_blocks"]
         self.passable_blocks = low_level_data["passable_blocks"]
         self.color_bid_map = low_level_data["color_bid_map"]
+        self.incremental = incremental
+        if incremental:
+            self.block_objects = IncrementalBlockObjects(self.boring_blocks, self.passable_blocks)
+            # re-center the tracked cube when the agent gets this close to its faces
+            self.recenter_margin = self.radius
+            # {xyz: idm} changed since the last perceive
+            self.changed_blocks = {}
+            self.last_perceived_pos = None
+
+    def on_blocks_changed(self, changed_blocks):
+        """Record a dict of {xyz: idm} changed blocks, for incremental mode"""
+        if self.incremental:
+            self.changed_blocks.update(changed_blocks)
+
+    def get_color_tags(self, blocks):
+        color_tags = []
+        for _, idm in blocks:
+            type_name = maybe_get_type_name(idm, self.block_data)
+            color_tags.extend(self.color_data["name_to_colors"].get(type_name, []))
+        return color_tags
 
     def perceive(self, force=False):
         """Called by the core event loop for the agent to run all perceptual
@@ -550,6 +764,8 @@ class PerceptionWrapper:
             - block_object_attributes(list) - List of [obj, color_tags] of all nearby objects
             - holes(list) - List of non-zero length holes where each item in list is (connected_component, idmeta)
             - airtouching_blocks(list) - List of [shifted_coordinates, list of tags]
+        in incremental mode, block objects near the agent are returned separately, as
+        block_object_updates (see IncrementalBlockObjects), each with its color_tags
         """
         perceive_info = {}
         perceive_info[
@@ -558,13 +774,36 @@ class PerceptionWrapper:
         perceive_info[
             "near_agent"
         ] = {}  # dictionary with children: block objects and holes near the agent
+        block_object_updates = []
+        near_agent_changed = True
+        if self.incremental:
+            changed_blocks = self.changed_blocks
+            self.changed_blocks = {}
+            if not self.block_objects.contains(self.agent.pos, margin=self.recenter_margin):
+                block_object_updates = self.block_objects.reset(
+                    self.agent.get_blocks, self.agent.pos
+                )
+            else:
+                block_object_updates = self.block_objects.apply_changes(changed_blocks)
+            for update in block_object_updates:
+                if "blocks" in update:
+                    update["color_tags"] = self.get_color_tags(update["blocks"])
+            agent_pos = tuple(self.agent.pos)
+            near_agent_changed = len(changed_blocks) > 0 or agent_pos != self.last_perceived_pos
+            self.last_perceived_pos = agent_pos
+
         # 1. perceive blocks in marked areas to perceive
         for pos, radius in self.agent.areas_to_perceive:
             # 1.1 Get block objects and their colors
             obj_tag_list = []
-            for obj in all_nearby_objects(
-                self.agent.get_blocks, pos, self.boring_blocks, self.passable_blocks, radius
-            ):
+            if self.incremental and self.block_objects.contains(pos, margin=radius):
+                # already updated from the changed blocks
+                nearby_objects = []
+            else:
+                nearby_objects = all_nearby_objects(
+                    self.agent.get_blocks, pos, self.boring_blocks, self.passable_blocks, radius
+                )
+            for obj in nearby_objects:
                 color_tags = []
                 for idm in obj:
                     type_name = maybe_get_type_name(idm, self.block_data)
@@ -595,31 +834,30 @@ class PerceptionWrapper:
                     )
 
         # 2. perceive blocks and their colors near the agent
+        # (in incremental mode, these are the block_object_updates)
         near_obj_tag_list = []
-        for objs in all_nearby_objects(
-            self.agent.get_blocks, self.agent.pos, self.boring_blocks, self.passable_blocks
-        ):
-            color_tags = []
-            for obj in objs:
-                idm = obj[1]
-                type_name = maybe_get_type_name(idm, self.block_data)
-                color_tags.extend(self.color_data["name_to_colors"].get(type_name, []))
-            near_obj_tag_list.append([objs, color_tags])
+        if not self.incremental:
+            for objs in all_nearby_objects(
+                self.agent.get_blocks, self.agent.pos, self.boring_blocks, self.passable_blocks
+            ):
+                near_obj_tag_list.append([objs, self.get_color_tags(objs)])
         perceive_info["near_agent"] = perceive_info.get("near_agent", {})
         perceive_info["near_agent"]["block_object_attributes"] = (
             near_obj_tag_list if near_obj_tag_list else None
         )
         # 3. Get all holes near agent
-        holes = get_all_nearby_holes(
-            self.agent,
-            self.agent.pos,
-            self.block_data,
-            self.agent.low_level_data["fill_idmeta"],
-            radius=self.radius,
-        )
+        holes = None
+        if near_agent_changed:
+            holes = get_all_nearby_holes(
+                self.agent,
+                self.agent.pos,
+                self.block_data,
+                self.agent.low_level_data["fill_idmeta"],
+                radius=self.radius,
+            )
         perceive_info["near_agent"]["holes"] = holes if holes else None
         # 4. Get all air-touching blocks near agent
-        if self.mark_airtouching_blocks:
+        if self.mark_airtouching_blocks and near_agent_changed:
             blocktypes, shifted_c, tags = get_nearby_airtouching_blocks(
                 self.agent,
                 self.agent.pos,
@@ -635,6 +873,7 @@ class PerceptionWrapper:
         return CraftAssistPerceptionData(
             in_perceive_area=perceive_info["in_perceive_area"],
             near_agent=perceive_info["near_agent"],
+            block_object_updates=block_object_updates,
         )
 
 
@@ -0,0 +1,250 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+Compares the array-space connected component labeling and hole finding of
+heuristic_perception with the previous per-voxel DFS implementations (kept
+here as the reference), on random scenes from small_scenes_with_shapes, over
+the (2 * radius + 1)^3 cube PerceptionWrapper.perceive looks at.
+
+    python -m droidlet.perception.craftassist.tests.benchmarks.benchmark_connected_components
+"""
+import argparse
+import heapq
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from droidlet.base_util import Pos, depth_first_search
+from droidlet.lowlevel.minecraft.mc_util import fill_idmeta
+from droidlet.lowlevel.minecraft.small_scenes_with_shapes import build_shape_scene
+from droidlet.perception.craftassist.heuristic_perception import (
+    build_safe_diag_adjacent,
+    connected_components,
+    get_all_nearby_holes,
+)
+
+
+class SceneAgent:
+    """serves get_blocks from a dense (x, y, z, 2) array; everything outside it is air"""
+
+    def __init__(self, blocks, pos):
+        self.blocks = blocks
+        self.pos = pos
+
+    def get_blocks(self, x, X, y, Y, z, Z):
+        out = np.zeros((X - x + 1, Y - y + 1, Z - z + 1, 2), dtype="int32")
+        lo = np.maximum((x, y, z), 0)
+        hi = np.minimum((X + 1, Y + 1, Z + 1), self.blocks.shape[:3])
+        if (hi > lo).all():
+            out[
+                lo[0] - x : hi[0] - x, lo[1] - y : hi[1] - y, lo[2] - z : hi[2] - z
+            ] = self.blocks[lo[0] : hi[0], lo[1] : hi[1], lo[2] : hi[2]]
+        return out.transpose(1, 2, 0, 3)
+
+
+def build_scene(sl, h, num_shapes, num_holes):
+    args = SimpleNamespace(
+        SL=sl,
+        H=h,
+        GROUND_DEPTH=5,
+        MAX_NUM_SHAPES=num_shapes,
+        MAX_NUM_GROUND_HOLES=num_holes,
+        fence=False,
+        iglu_scenes="",
+        mob_config="",
+        cuberite_x_offset=0,
+        cuberite_y_offset=0,
+        cuberite_z_offset=0,
+    )
+    scene = build_shape_scene(args)
+    blocks = np.zeros((sl, h, sl, 2), dtype="int32")
+    for b in scene["schematic_for_cuberite"]:
+        blocks[b["x"], b["y"], b["z"]] = (b["id"], b["meta"])
+    return blocks
+
+
+def reference_connected_components(X, unique_idm=False):
+    """the per-voxel DFS connected_components this benchmark compares against"""
+    visited = np.zeros((X.shape[0], X.shape[1], X.shape[2]), dtype="bool")
+    components = []
+    current_component = set()
+    diag_adj = build_safe_diag_adjacent([0, X.shape[0], 0, X.shape[1], 0, X.shape[2]])
+
+    if len(X.shape) == 3:
+        X = np.expand_dims(X, axis=3)
+
+    if not unique_idm:
+
+        def _build_fn(X, current_component, idm):
+            def _fn(p):
+                if X[p[0], p[1], p[2], 0]:
+                    current_component.add(p)
+                    return True
+
+            return _fn
+
+    else:
+
+        def _build_fn(X, current_component, idm):
+            def _fn(p):
+                if tuple(X[p]) == idm:
+                    current_component.add(p)
+                    return True
+
+            return _fn
+
+    for i in range(visited.shape[0]):
+        for j in range(visited.shape[1]):
+            for k in range(visited.shape[2]):
+                if visited[i, j, k]:
+                    continue
+                visited[i, j, k] = True
+                if X[i, j, k, 0] == 0:
+                    continue
+                pos = (i, j, k)
+                _fn = _build_fn(X, current_component, tuple(X[i, j, k, :]))
+                visited |= depth_first_search(X.shape[:3], pos, _fn, diag_adj)
+                components.append(list(current_component))
+                current_component.clear()
+
+    return components
+
+
+def reference_get_all_nearby_holes(agent, location, fill_idmeta, radius=15):
+    """the per-column get_blocks and recursive DFS get_all_nearby_holes this benchmark compares against.
+    the DFS goes through the whole level region when it reaches the edge of the map, so that
+    the region is rejected as a whole as get_all_nearby_holes does (before, it stopped there
+    and the unvisited remainder of the region could be reported as a hole)"""
+    sx, sy, sz = location
+    max_height = sy + 5
+    map_size = radius * 2 + 1
+    height_map = [[sz] * map_size for i in range(map_size)]
+    hid_map = [[-1] * map_size for i in range(map_size)]
+    idm_map = [[(0, 0)] * map_size for i in range(map_size)]
+    visited = set([])
+    state = {"comp": [], "idm": (2, 0)}
+
+    def get_block_info(x, z):
+        height = max_height
+        while True:
+            B = agent.get_blocks(x, x, height, height, z, z)
+            if (
+                (B[0, 0, 0, 0] != 0)
+                and (x != sx or z != sz or height != sy)
+                and (x != agent.pos[0] or z != agent.pos[2] or height != agent.pos[1])
+                and (B[0, 0, 0, 0] != 383)
+            ):
+                return height, tuple(B[0, 0, 0])
+            height -= 1
+
+    gx = [0, 0, -1, 1]
+    gz = [1, -1, 0, 0]
+
+    def dfs(x, y, z):
+        build_height = 100000
+        if (x, y, z) in visited:
+            return build_height
+        state["comp"].append((x - radius + sx, y, z - radius + sz))
+        visited.add((x, y, z))
+        for d in range(4):
+            nx = x + gx[d]
+            nz = z + gz[d]
+            if nx >= 0 and nz >= 0 and nx < map_size and nz < map_size:
+                if height_map[x][z] == height_map[nx][nz]:
+                    build_height = min(build_height, dfs(nx, y, nz))
+                else:
+                    build_height = min(build_height, height_map[nx][nz])
+                    state["idm"] = idm_map[nx][nz]
+            else:
+                build_height = -100000
+        return build_height
+
+    blocks_queue = []
+    for i in range(map_size):
+        for j in range(map_size):
+            height_map[i][j], idm_map[i][j] = get_block_info(i - radius + sx, j - radius + sz)
+            heapq.heappush(blocks_queue, (height_map[i][j] + 1, (i, height_map[i][j] + 1, j)))
+    holes = []
+    while len(blocks_queue) > 0:
+        h, (x, y, z) = heapq.heappop(blocks_queue)
+        if (x, y, z) in visited or y > max_height:
+            continue
+        state["comp"] = []
+        state["idm"] = (2, 0)
+        build_height = dfs(x, y, z)
+        if build_height >= h:
+            holes.append((state["comp"].copy(), state["idm"]))
+            cur_hid = len(holes) - 1
+            for xyz in state["comp"]:
+                x, y, z = xyz
+                rx, ry, rz = x - sx + radius, y + 1, z - sz + radius
+                heapq.heappush(blocks_queue, (ry, (rx, ry, rz)))
+                height_map[rx][rz] += 1
+                if hid_map[rx][rz] != -1:
+                    holes[cur_hid][0].extend(holes[hid_map[rx][rz]][0])
+                    holes[hid_map[rx][rz]] = ([], (0, 0))
+                hid_map[rx][rz] = cur_hid
+
+    for i, (xyzs, idm) in enumerate(holes):
+        blocks = fill_idmeta(agent, xyzs)
+        xyzs = [xyz for xyz, (d, _) in blocks if d == 0]
+        holes[i] = (xyzs, idm)
+    return [h for h in holes if len(h[0]) > 0]
+
+
+def as_sets(components):
+    return sorted(sorted(map(tuple, c)) for c in components)
+
+
+def holes_as_sets(holes):
+    return sorted((sorted(map(tuple, xyzs)), tuple(idm)) for xyzs, idm in holes)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return time.perf_counter() - start, out
+
+
+def run(num_scenes, radius, num_shapes, num_holes, seed=0):
+    np.random.seed(seed)
+    sl = 2 * radius + 1
+    times = {k: [] for k in ["cc_reference", "cc", "holes_reference", "holes"]}
+    for i in range(num_scenes):
+        blocks = build_scene(sl, sl, num_shapes, num_holes)
+        pos = Pos(radius, 5, radius)
+        agent = SceneAgent(blocks, pos)
+        yzxb = agent.get_blocks(0, sl - 1, 0, sl - 1, 0, sl - 1)
+        for unique_idm in [False, True]:
+            t_ref, ref = timed(reference_connected_components, yzxb, unique_idm=unique_idm)
+            t, out = timed(connected_components, yzxb, unique_idm=unique_idm)
+            times["cc_reference"].append(t_ref)
+            times["cc"].append(t)
+            # the reference drops blocks next to components of a different idm
+            # when unique_idm=True, so only the plain labeling is expected to agree
+            if not unique_idm:
+                assert as_sets(ref) == as_sets(out), "components differ in scene {}".format(i)
+        t_ref, ref = timed(reference_get_all_nearby_holes, agent, pos, fill_idmeta, radius=radius)
+        t, out = timed(get_all_nearby_holes, agent, pos, None, fill_idmeta, radius=radius)
+        times["holes_reference"].append(t_ref)
+        times["holes"].append(t)
+        assert holes_as_sets(ref) == holes_as_sets(out), "holes differ in scene {}".format(i)
+    return {k: np.array(v) for k, v in times.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_scenes", type=int, default=10)
+    parser.add_argument("--radius", type=int, default=15, help="perceived cube is 2 * radius + 1")
+    parser.add_argument("--num_shapes", type=int, default=8)
+    parser.add_argument("--num_holes", type=int, default=5)
+    args = parser.parse_args()
+
+    times = run(args.num_scenes, args.radius, args.num_shapes, args.num_holes)
+    for name, t in times.items():
+        print(
+            "{:>16}: mean {:.2f} ms, p90 {:.2f} ms".format(
+                name, 1000 * t.mean(), 1000 * np.percentile(t, 90)
+            )
+        )
@@ -0,0 +1,137 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import unittest
+import numpy as np
+from droidlet.base_util import Pos
+from droidlet.lowlevel.minecraft.mc_util import fill_idmeta
+from droidlet.memory.craftassist.mc_memory import MCAgentMemory
+from droidlet.perception.craftassist.heuristic_perception import (
+    connected_components,
+    label_components,
+    component_stats,
+    get_all_nearby_holes,
+    IncrementalBlockObjects,
+)
+
+
+class FakeWorldAgent:
+    """serves get_blocks from an (x, y, z, 2) array; everything outside it is air"""
+
+    def __init__(self, blocks, pos):
+        self.blocks = blocks
+        self.pos = pos
+
+    def get_blocks(self, x, X, y, Y, z, Z):
+        out = np.zeros((Y - y + 1, Z - z + 1, X - x + 1, 2), dtype="int32")
+        for i in range(x, X + 1):
+            for j in range(max(y, 0), min(Y + 1, self.blocks.shape[1])):
+                for k in range(z, Z + 1):
+                    if 0 <= i < self.blocks.shape[0] and 0 <= k < self.blocks.shape[2]:
+                        out[j - y, k - z, i - x] = self.blocks[i, j, k]
+        return out
+
+
+class ConnectedComponentsTest(unittest.TestCase):
+    def test_diagonal_adjacency(self):
+        X = np.zeros((6, 6, 6), dtype="int32")
+        X[4, 4, 4] = 1
+        X[0, 0, 0] = 1
+        X[1, 1, 1] = 2
+        X[3, 0, 0] = 1
+        components = connected_components(X)
+        assert [sorted(c) for c in components] == [
+            [(0, 0, 0), (1, 1, 1)],
+            [(3, 0, 0)],
+            [(4, 4, 4)],
+        ]
+        components = connected_components(X, unique_idm=True)
+        assert [sorted(c) for c in components] == [[(0, 0, 0)], [(1, 1, 1)], [(3, 0, 0)], [(4, 4, 4)]]
+
+    def test_unique_idm(self):
+        X = np.zeros((5, 5, 5, 2), dtype="int32")
+        X[0:3, 0, 0] = (1, 0)
+        X[3, 0, 0] = (1, 1)
+        X[4, 0, 0] = (1, 0)
+        assert len(connected_components(X)) == 1
+        components = connected_components(X, unique_idm=True)
+        assert [sorted(c) for c in components] == [
+            [(0, 0, 0), (1, 0, 0), (2, 0, 0)],
+            [(3, 0, 0)],
+            [(4, 0, 0)],
+        ]
+
+    def test_component_stats(self):
+        X = np.zeros((8, 8, 8), dtype="int32")
+        X[1:3, 2:5, 3] = 1
+        X[6, 6, 6] = 1
+        labels, num = label_components(X)
+        assert num == 2
+        stats = component_stats(labels, num)
+        assert stats["sizes"].tolist() == [6, 1]
+        assert np.allclose(stats["centroids"][0], (1.5, 3, 3))
+        assert stats["bounds"][0].tolist() == [[1, 2, 3], [2, 4, 3]]
+        assert stats["bounds"][1].tolist() == [[6, 6, 6], [6, 6, 6]]
+        stats = component_stats(*label_components(np.zeros((3, 3, 3))))
+        assert stats["voxels"] == [] and stats["centroids"].shape == (0, 3)
+
+
+class HolesTest(unittest.TestCase):
+    def test_pit(self):
+        blocks = np.zeros((16, 8, 16, 2), dtype="int32")
+        blocks[:, 0:4] = (2, 0)
+        blocks[3:5, 2:4, 6:9] = 0
+        # a pit at the edge of the perceived area is not a hole
+        blocks[14:, 3, 14:] = 0
+        agent = FakeWorldAgent(blocks, Pos(8, 4, 8))
+        holes = get_all_nearby_holes(agent, (7, 4, 7), None, fill_idmeta, radius=7)
+        assert len(holes) == 1
+        xyzs, idm = holes[0]
+        assert idm == (2, 0)
+        assert sorted(xyzs) == sorted(
+            (x, y, z) for x in range(3, 5) for y in range(2, 4) for z in range(6, 9)
+        )
+
+
+class IncrementalBlockObjectsTest(unittest.TestCase):
+    def get_segmentation(self, tracker):
+        _, labels = np.unique(tracker.labels, return_inverse=True)
+        labels = labels.reshape(tracker.labels.shape)
+        voxels = component_stats(labels, labels.max())["voxels"]
+        return set(frozenset(tracker._xyzs(v)) for v in voxels)
+
+    def get_memory_block_objects(self, memory):
+        r = memory._db_read("SELECT uuid, x, y, z FROM VoxelObjects WHERE ref_type='BlockObjects'")
+        objects = {}
+        for memid, x, y, z in r:
+            objects.setdefault(memid, set()).add((x, y, z))
+        return set(frozenset(v) for v in objects.values())
+
+    def test_matches_reset(self):
+        rng = np.random.RandomState(0)
+        blocks = np.zeros((24, 24, 24, 2), dtype="int32")
+        blocks[:, 0:4] = (2, 0)
+        agent = FakeWorldAgent(blocks, Pos(11, 4, 11))
+        tracker = IncrementalBlockObjects([0, 2], [0], radius=6)
+        memory = MCAgentMemory()
+        memory.update_block_objects(tracker.reset(agent.get_blocks, agent.pos))
+        for step in range(40):
+            changed_blocks = {}
+            for i in range(rng.randint(1, 6)):
+                xyz = tuple(int(a) for a in rng.randint((6, 4, 6), (18, 12, 18)))
+                idm = (int(rng.choice([0, 5, 7])), 0)
+                blocks[xyz] = idm
+                changed_blocks[xyz] = idm
+            updates = tracker.apply_changes(changed_blocks)
+            memory.update_block_objects(updates)
+            segmentation = self.get_segmentation(tracker)
+            fresh = IncrementalBlockObjects([0, 2], [0], radius=6)
+            fresh.reset(agent.get_blocks, agent.pos)
+            assert segmentation == self.get_segmentation(fresh)
+            assert segmentation == self.get_memory_block_objects(memory)
+        # changes outside the tracked cube are ignored
+        assert tracker.apply_changes({(0, 10, 0): (5, 0)}) == []
+
+
+if __name__ == "__main__":
+    unittest.main()
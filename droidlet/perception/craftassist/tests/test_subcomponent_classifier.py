@@ -0,0 +1,75 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import queue
+import unittest
+import numpy as np
+from droidlet.perception.craftassist.voxel_models.subcomponent_classifier import (
+    SubcomponentClassifierWrapper,
+)
+
+
+class FakeWorldAgent:
+    """serves get_blocks from an (x, y, z, 2) array; everything outside it is air"""
+
+    def __init__(self, blocks, pos):
+        self.blocks = blocks
+        self.pos = pos
+        self.areas_to_perceive = []
+        self.count = 0
+        self.memory = None
+
+    def get_blocks(self, x, X, y, Y, z, Z):
+        out = np.zeros((X - x + 1, Y - y + 1, Z - z + 1, 2), dtype="int32")
+        lo = np.maximum([x, y, z], 0)
+        hi = np.minimum([X + 1, Y + 1, Z + 1], self.blocks.shape[:3])
+        if (hi > lo).all():
+            out[
+                lo[0] - x : hi[0] - x, lo[1] - y : hi[1] - y, lo[2] - z : hi[2] - z
+            ] = self.blocks[lo[0] : hi[0], lo[1] : hi[1], lo[2] : hi[2]]
+        return out.transpose(1, 2, 0, 3)
+
+
+class FakeClassifier:
+    """takes capacity objects between two calls to get_nowait, and labels each
+    block of an object with the object's x coordinate"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.pending = []
+        self.labeled = []
+
+    def put(self, obj, block=True):
+        if len(self.pending) == self.capacity:
+            raise queue.Full
+        self.pending.append(obj)
+
+    def get_nowait(self):
+        if not self.pending:
+            raise queue.Empty
+        obj = self.pending.pop(0)
+        self.labeled.append(obj)
+        return {loc: ["x{}".format(obj[0][0][0])] for loc, _ in obj}, obj
+
+
+class SubcomponentClassifierWrapperTest(unittest.TestCase):
+    def test_no_starvation(self):
+        # five separate stone pillars near the agent
+        blocks = np.zeros((20, 8, 20, 2), dtype="int32")
+        blocks[:, 0, :, 0] = 2
+        for x in range(2, 17, 3):
+            blocks[x, 1:3, 10, 0] = 1
+        agent = FakeWorldAgent(blocks, (10, 1, 5))
+        low_level_data = {"boring_blocks": (0, 2), "passable_blocks": (0,)}
+        wrapper = SubcomponentClassifierWrapper(agent, None, low_level_data, perceive_freq=1)
+        wrapper.subcomponent_classifier = FakeClassifier(capacity=2)
+
+        labels = set()
+        for _ in range(3):
+            labels.update(wrapper.perceive().labeled_blocks)
+        # all the pillars are labeled, though only two fit in the queue at a time
+        self.assertEqual(labels, {"x{}".format(x) for x in range(2, 17, 3)})
+
+
+if __name__ == "__main__":
+    unittest.main()
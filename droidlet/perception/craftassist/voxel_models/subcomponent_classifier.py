@@ -3,7 +3,8 @@ Copyright (c) Facebook, Inc. and its affiliates.
 """
 
 import logging
-from multiprocessing import Queue, Process
+import queue
+from droidlet.parallel import BackgroundTaskPool
 from droidlet.perception.craftassist.heuristic_perception import all_nearby_objects
 from droidlet.shared_data_struct.craftassist_shared_utils import CraftAssistPerceptionData
 from .semantic_segmentation.semseg_models import SemSegWrapper
@@ -36,6 +37,9 @@ class SubcomponentClassifierWrapper:
             self.subcomponent_classifier.start()
         else:
             self.subcomponent_classifier = None
+        # objects that did not fit in the classifier's queue on the last perceive:
+        # frozenset of their blocks --> rank.  they are put first, in order, on the next one
+        self.skipped = {}
 
     def perceive(self, force=False):
         """
@@ -71,12 +75,26 @@ class SubcomponentClassifierWrapper:
         ):
             to_label.append(obj)
 
-        for obj in to_label:
-            self.subcomponent_classifier.block_objs_q.put(obj)
+        # the objects skipped last time go first, so that the ones at the end of
+        # to_label are not starved when the classifier is behind
+        keys = [frozenset(obj) for obj in to_label]
+        last = len(self.skipped)
+        order = sorted(range(len(to_label)), key=lambda i: self.skipped.get(keys[i], last))
+        self.skipped = {}
+        for n, i in enumerate(order):
+            try:
+                self.subcomponent_classifier.put(to_label[i], block=False)
+            except queue.Full:
+                # the classifier is behind, the rest is labeled on a later perceive
+                self.skipped = {keys[j]: rank for rank, j in enumerate(order[n:])}
+                break
 
         # everytime we try to retrieve as many recognition results as possible
-        while not self.subcomponent_classifier.loc2labels_q.empty():
-            loc2labels, obj = self.subcomponent_classifier.loc2labels_q.get()
+        while True:
+            try:
+                loc2labels, obj = self.subcomponent_classifier.get_nowait()
+            except queue.Empty:
+                break
             loc2ids = dict(obj)
             label2blocks = {}
 
@@ -108,60 +126,72 @@ class SubcomponentClassifierWrapper:
         return CraftAssistPerceptionData(labeled_blocks=perceive_info["labeled_blocks"])
 
 
-class SubComponentClassifier(Process):
+def watch_single_object(model, tuple_blocks):
     """
-    A classifier class that calls a voxel model to output object tags.
+    Input: a SemSegWrapper, and a list of tuples, where each tuple is ((x, y, z), [bid, mid]).
+           This list represents a block object.
+    Output: a dict of (loc, [tag1, tag2, ..]) pairs for all non-air blocks.
+    """
+
+    def get_tags(p):
+        """
+        convert a list of tag indices to a list of tags
+        """
+        return [model.tags[i][0] for i in p]
+
+    def apply_offsets(cube_loc, offsets):
+        """
+        Convert the cube location back to world location
+        """
+        return (cube_loc[0] + offsets[0], cube_loc[1] + offsets[1], cube_loc[2] + offsets[2])
+
+    np_blocks, offsets = blocks_list_to_npy(blocks=tuple_blocks, xyz=True)
+
+    pred = model.segment_object(np_blocks)
+
+    # convert prediction results to string tags
+    return dict([(apply_offsets(loc, offsets), get_tags([p])) for loc, p in pred.items()])
+
+
+def _classify(model, tuple_blocks):
+    """process_fn of the SubComponentClassifier workers"""
+    return watch_single_object(model, tuple_blocks), tuple_blocks
+
+
+class SubComponentClassifier(BackgroundTaskPool):
     """
+    A classifier class that calls a voxel model to output object tags.
 
-    def __init__(self, voxel_model_path=None):
-        super().__init__()
+    Block objects are put to num_workers processes, each loading the model; get
+    returns the (loc2labels dict, block object) of each as soon as it is labeled.
+    """
 
+    def __init__(self, voxel_model_path=None, num_workers=1, max_pending=32):
         if voxel_model_path is not None:
             logging.info(
                 "SubComponentClassifier using voxel_model_path={}".format(voxel_model_path)
             )
-            self.model = SemSegWrapper(voxel_model_path)
         else:
             raise Exception("specify a segmentation model")
-
-        self.block_objs_q = Queue()  # store block objects to be recognized
-        self.loc2labels_q = Queue()  # store loc2labels dicts to be retrieved by the agent
-        self.daemon = True
-
-    def run(self):
-        """
-        The main recognition loop of the classifier
-        """
-        while True:  # run forever
-            tb = self.block_objs_q.get(block=True, timeout=None)
-            loc2labels = self._watch_single_object(tb)
-            self.loc2labels_q.put((loc2labels, tb))
+        super().__init__(
+            SemSegWrapper,
+            (voxel_model_path,),
+            _classify,
+            num_workers=num_workers,
+            ordered=False,
+            max_pending=max_pending,
+        )
+        self.voxel_model_path = voxel_model_path
+        # only loaded in this process to label objects synchronously
+        self.model = None
 
     def _watch_single_object(self, tuple_blocks):
         """
-        Input: a list of tuples, where each tuple is ((x, y, z), [bid, mid]). This list
-               represents a block object.
-        Output: a dict of (loc, [tag1, tag2, ..]) pairs for all non-air blocks.
+        Labels a block object in this process, see watch_single_object
         """
-
-        def get_tags(p):
-            """
-            convert a list of tag indices to a list of tags
-            """
-            return [self.model.tags[i][0] for i in p]
-
-        def apply_offsets(cube_loc, offsets):
-            """
-            Convert the cube location back to world location
-            """
-            return (cube_loc[0] + offsets[0], cube_loc[1] + offsets[1], cube_loc[2] + offsets[2])
-
-        np_blocks, offsets = blocks_list_to_npy(blocks=tuple_blocks, xyz=True)
-
-        pred = self.model.segment_object(np_blocks)
-
-        # convert prediction results to string tags
-        return dict([(apply_offsets(loc, offsets), get_tags([p])) for loc, p in pred.items()])
+        if self.model is None:
+            self.model = SemSegWrapper(self.voxel_model_path)
+        return watch_single_object(self.model, tuple_blocks)
 
     def recognize(self, list_of_tuple_blocks):
         """
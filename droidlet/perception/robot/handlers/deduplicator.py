@@ -8,22 +8,29 @@ import torchvision.models as models
 from torchvision import transforms
 
 from .core import AbstractHandler
-from droidlet.interpreter.robot.objects import AttributeDict
+from droidlet.memory.robot.feature_index import DetectedObjectFeatureIndex, normalize_features
 
 
 class ObjectDeduplicator(AbstractHandler):
     """Class for deduplicating a given set of objects from a given set of existing objects"""
 
+    # a previous object matches if its features are this similar and it is this close
+    SCORE_THRESH = 0.95
+    DIST_THRESH = 0.6
+
     def __init__(self):
         self.object_id_counter = 1
-        self.dedupe_model = models.resnet18(pretrained=True).cuda()
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.dedupe_model = models.resnet18(pretrained=True).to(self.device)
         self.layer = self.dedupe_model._modules.get("avgpool")
         self.dedupe_model.eval()
         self.transforms = [
             transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
             transforms.ToTensor(),
         ]
-        self._temp_buffer = torch.zeros(512).pin_memory()
+        self._temp_buffer = torch.zeros(512)
+        if self.device.type == "cuda":
+            self._temp_buffer = self._temp_buffer.pin_memory()
 
         def copy_data(m, i, o):
             self._temp_buffer.copy_(torch.flatten(o).data)
@@ -32,7 +39,7 @@ class ObjectDeduplicator(AbstractHandler):
 
     def get_feature_repr(self, img):
         normalize, to_tensor = self.transforms
-        t_img = normalize(to_tensor(img)).unsqueeze(0).cuda()
+        t_img = normalize(to_tensor(img)).unsqueeze(0).to(self.device)
 
         with torch.no_grad():
             self.dedupe_model(t_img)
@@ -40,15 +47,52 @@ class ObjectDeduplicator(AbstractHandler):
 
     # Not accounting for moving objects
     def is_match(self, score, dist):
-        score_thresh = 0.95
-        dist_thresh = 0.6
-        if score > score_thresh and dist > dist_thresh:
+        if score > self.SCORE_THRESH and dist > self.DIST_THRESH:
             return False  # Similar object, different places.
-        elif score > score_thresh and dist < dist_thresh:
+        elif score > self.SCORE_THRESH and dist < self.DIST_THRESH:
             return True  # same object, same place
         else:
             return False
 
+    def match(self, current_objects, previous_objects):
+        """find the best matching previous object for each of the current objects, with one
+        cosine similarity matrix between their features and distance gating (see is_match).
+
+        Args:
+            current_objects (List[WorldObject]): objects with feature_repr set
+            previous_objects (DetectedObjectFeatureIndex): the objects to compare to
+
+        Returns:
+            an int array with, for each current object, the row in previous_objects of
+            the most similar matching object, or -1 if none match
+        """
+        best = np.full(len(current_objects), -1)
+        idx = [i for i, o in enumerate(current_objects) if o.feature_repr is not None]
+        if len(previous_objects) == 0 or len(idx) == 0:
+            return best
+        features = normalize_features(
+            np.stack([np.asarray(current_objects[i].feature_repr) for i in idx])
+        )
+        xy = np.array([current_objects[i].xyz[:2] for i in idx], dtype="float64")
+        # (num_previous, num_current)
+        scores = previous_objects.features @ features.T
+        dists = np.linalg.norm(previous_objects.xyz[:, None, :2] - xy[None], axis=2)
+        matches = (scores > self.SCORE_THRESH) & (dists < self.DIST_THRESH)
+        rows = np.where(matches, scores, -np.inf).argmax(axis=0)
+        cols = np.arange(len(idx))
+        best[idx] = np.where(matches[rows, cols], rows, -1)
+        if self.verbose > 0:
+            for c, (i, r) in enumerate(zip(idx, rows)):
+                logging.debug(
+                    "Similarity {}.{} = {}, {}".format(
+                        current_objects[i].label,
+                        previous_objects.eids[r],
+                        scores[r, c],
+                        dists[r, c],
+                    )
+                )
+        return best
+
     def is_novel(self, current_object, previous_objects):
         """this is long-term tracking (not in-frame). it does some feature
         matching to figure out if we've seen this exact instance of object
@@ -59,40 +103,18 @@ class ObjectDeduplicator(AbstractHandler):
 
         Args:
             current_object (WorldObject): current object to compare
-            previous_objects (List[WorldObject]): all previous objects to compare to
+            previous_objects (DetectedObjectFeatureIndex or List[WorldObject]): all previous
+                objects to compare to
 
 
         """
+        if not isinstance(previous_objects, DetectedObjectFeatureIndex):
+            previous_objects = DetectedObjectFeatureIndex.from_objects(previous_objects)
         current_object.feature_repr = self.get_feature_repr(current_object.get_masked_img())
-        cos = torch.nn.CosineSimilarity(dim=1)
-        is_novel = True
-
-        # Future = use all object features to calculate novelty
-        for previous_object in previous_objects:
-            if isinstance(previous_object, dict):
-                previous_object = AttributeDict(previous_object)
-            if (
-                previous_object.feature_repr is not None
-                and current_object.feature_repr is not None
-            ):
-                score = cos(
-                    previous_object.feature_repr.unsqueeze(0),
-                    current_object.feature_repr.unsqueeze(0),
-                )
-                dist = np.linalg.norm(
-                    np.asarray(current_object.xyz[:2]) - np.asarray(previous_object.xyz[:2])
-                )
-                if self.verbose > 0:
-                    logging.debug(
-                        "Similarity {}.{} = {}, {}".format(
-                            current_object.label, previous_object.label, score.item(), dist
-                        )
-                    )
-                # FIXME pick best match?
-                if self.is_match(score.item(), dist):
-                    is_novel = False
-                    current_object.eid = previous_object.eid
-                    break
+        row = self.match([current_object], previous_objects)[0]
+        is_novel = row < 0
+        if not is_novel:
+            current_object.eid = int(previous_objects.eids[row])
         if self.verbose > 0:
             logging.info("world object {}, is_novel {}".format(current_object.label, is_novel))
         return is_novel
@@ -104,16 +126,24 @@ class ObjectDeduplicator(AbstractHandler):
 
         Args:
             current_objects (list[WorldObject]): a list of all WorldObjects detected in the current frame
-            previous_objects (list[WorldObject]): a list of all previous WorldObjects ever detected
+            previous_objects (DetectedObjectFeatureIndex or list[WorldObject]): all previous WorldObjects
+                ever detected, e.g. the agent memory's detected_object_index
         """
 
         if self.verbose > 0:
             logging.info("In ObjectDeduplicationHandler ... ")
+        if not isinstance(previous_objects, DetectedObjectFeatureIndex):
+            previous_objects = DetectedObjectFeatureIndex.from_objects(previous_objects)
+        for current_object in current_objects:
+            current_object.feature_repr = self.get_feature_repr(current_object.get_masked_img())
+        matches = self.match(current_objects, previous_objects)
+
         self.object_id_counter = self.object_id_counter + 1
         new_objects = []
         updated_objects = []
-        for current_object in current_objects:
-            if self.is_novel(current_object, previous_objects):
+        updated_eids = set()
+        for current_object, row in zip(current_objects, matches):
+            if row < 0:
                 current_object.eid = self.object_id_counter
                 self.object_id_counter = self.object_id_counter + 1
                 new_objects.append(current_object)
@@ -124,11 +154,11 @@ class ObjectDeduplicator(AbstractHandler):
                         f" Center:({current_object.center})"
                     )
             else:
-                exists = False
-                for u in updated_objects:
-                    if u.eid == current_object.eid:
-                        exists = True
-                if exists == False:
+                current_object.eid = int(previous_objects.eids[row])
+                if current_object.eid not in updated_eids:
+                    updated_eids.add(current_object.eid)
                     updated_objects.append(current_object)
+            if self.verbose > 0:
+                logging.info("world object {}, is_novel {}".format(current_object.label, row < 0))
 
         return new_objects, updated_objects
@@ -1,56 +1,55 @@
 """
 Copyright (c) Facebook, Inc. and its affiliates.
 """
-from droidlet.parallel import BackgroundTask
+from droidlet.parallel import Pipeline, PipelineStage
 from droidlet.perception.robot.handlers import (
     ObjectDetection,
     FaceRecognition,
     HumanPose,
-    ObjectTracking,
     ObjectDeduplicator,
 )
 from droidlet.interpreter.robot.objects import AttributeDict
 from droidlet.shared_data_struct.robot_shared_utils import RobotPerceptionData
 from droidlet.event import sio
-import queue
+
+
+def run_handler(handler, batch):
+    """process_fn of the perception pipeline stages: runs handler on the rgb_depth of
+    each (rgb_depth, xyz) frame"""
+    return [handler(rgb_depth) for rgb_depth, _ in batch]
 
 
 class Perception:
     """Home for all perceptual modules used by the LocobotAgent.
 
     It provides a multiprocessing mechanism to run the more compute intensive perceptual
-    models (for example our object detector) as a separate process.
+    models (for example our object detector) as separate processes.  Each model is a stage
+    of a Pipeline, working on the latest frame it can get, so a slow model does not hold
+    back the others.
 
     Args:
         model_data_dir (string): path for all perception models (default: droidlet/artifacts/models/perception/locobot)
+        join_timeout (float): seconds to wait for the slower models before using the
+            outputs of the others on a frame
     """
 
-    def __init__(self, model_data_dir, default_keypoints_path=False):
+    def __init__(self, model_data_dir, default_keypoints_path=False, join_timeout=1.0):
         self.model_data_dir = model_data_dir
 
-        def slow_perceive_init(weights_dir):
-            return AttributeDict(
-                {
-                    "detector": ObjectDetection(weights_dir),
-                    "human_pose": HumanPose(weights_dir, default_keypoints_path),
-                    "face_recognizer": FaceRecognition(),
-                    "tracker": ObjectTracking(),
-                }
-            )
-
-        def slow_perceive_run(models, rgb_depth, xyz):
-            detections = models.detector(rgb_depth)
-            humans = models.human_pose(rgb_depth)
-            face_detections = models.face_recognizer(rgb_depth)
-            if face_detections:
-                detections += face_detections
-            return rgb_depth, detections, humans, xyz
-
-        self.vprocess = BackgroundTask(
-            init_fn=slow_perceive_init, init_args=(model_data_dir,), process_fn=slow_perceive_run
+        self.pipeline = Pipeline(
+            [
+                PipelineStage("detector", ObjectDetection, (model_data_dir,), run_handler),
+                PipelineStage(
+                    "human_pose",
+                    HumanPose,
+                    (model_data_dir, default_keypoints_path),
+                    run_handler,
+                ),
+                PipelineStage("face_recognizer", FaceRecognition, (), run_handler),
+            ],
+            join_timeout=join_timeout,
         )
-        self.vprocess.start()
-        self.slow_vision_ready = True
+        self.pipeline.start()
 
         self.vision = self.setup_vision_handlers()
         self.audio = None
@@ -84,21 +83,27 @@ class Perception:
 
         Args:
 
-            force (boolean): set to True to force waiting on the SlowPerception models to finish, and execute
-                all perceptual models to execute sequentially (doing that is a good debugging tool)
+            force (boolean): set to True to force waiting on all the SlowPerception models to finish
+                on this frame (doing that is a good debugging tool)
                 (default: False)
 
         """
 
-        if self.slow_vision_ready:
-            self.vprocess.put(rgb_depth, xyz)
-            self.slow_vision_ready = False
-
-        try:
-            old_image, detections, humans, old_xyz = self.vprocess.get(block=force)
-            self.slow_vision_ready = True
-        except queue.Empty:
-            old_image, detections, humans, old_xyz = None, None, None, None
+        frame_id = self.pipeline.put(rgb_depth, xyz)
+        frames = self.pipeline.get(frame_id=frame_id if force else None)
+
+        # the latest output of each model
+        outputs = {}
+        old_image = None
+        for _, (image, _), frame_outputs in frames:
+            outputs.update(frame_outputs)
+            if "detector" in frame_outputs or old_image is None:
+                old_image = image
+        detections = outputs.get("detector")
+        face_detections = outputs.get("face_recognizer")
+        if face_detections:
+            detections = (detections or []) + face_detections
+        humans = outputs.get("human_pose")
 
         new_detections, updated_detections = None, None
         log_detections = detections
@@ -134,6 +139,7 @@ class Perception:
             return
 
         sio.emit("image_settings", self.log_settings)
+        sio.emit("perception_stats", self.pipeline.get_stats())
         resolution = self.log_settings["image_resolution"]
         quality = self.log_settings["image_quality"]
 
@@ -3,12 +3,12 @@ Copyright (c) Facebook, Inc. and its affiliates.
 """
 import logging
 import os
-from typing import Dict
+from typing import Dict, List
 from .nsp_transformer_model.query_model import NSPBertModel as Model
 
 
 class DroidletSemanticParsingModel:
-    def __init__(self, models_dir, data_dir):
+    def __init__(self, models_dir, data_dir, quantize=False):
         """The SemanticParsingModel converts natural language
         commands to logical forms.
 
@@ -26,16 +26,23 @@ class DroidletSemanticParsingModel:
         args:
             models_dir (str): path to semantic parsing models
             data_dir (str): path to ground truth data directory
+            quantize (bool): run the model on CPU with int8 Linear layers
         """
         # Instantiate the main model
         nlu_model_dir = os.path.join(models_dir, "ttad_bert_updated")
         logging.info("using model_dir={}".format(nlu_model_dir))
 
         if os.path.isdir(data_dir) and os.path.isdir(nlu_model_dir):
-            self.model = Model(model_dir=nlu_model_dir, data_dir=data_dir)
+            self.model = Model(model_dir=nlu_model_dir, data_dir=data_dir, quantize=quantize)
         else:
             raise NotADirectoryError
 
+    @property
+    def model_version(self) -> str:
+        """Identifies the loaded model: parses of the same chat by the same model version
+        are the same."""
+        return self.model.model_version
+
     def query_for_logical_form(self, chat: str) -> Dict:
         """Get logical form output for a given chat command.
         First check the ground truth file for the chat string. If not
@@ -65,3 +72,17 @@ class DroidletSemanticParsingModel:
         logging.info("Querying the semantic parsing model")
         logical_form = self.model.parse(chat=chat)
         return logical_form
+
+    def query_for_logical_forms(self, chats: List[str]) -> List[Dict]:
+        """Get logical form outputs for several chat commands, eg. received in the same
+        agent step. The chats are parsed in batches, which is faster than querying
+        them one by one.
+
+        Args:
+            chats (List[str]): Input chats provided by the users.
+
+        Return:
+            List[Dict]: Logical form of each chat, see `query_for_logical_form`
+        """
+        logging.info("Querying the semantic parsing model for {} chats".format(len(chats)))
+        return self.model.parse_many(chats=chats)
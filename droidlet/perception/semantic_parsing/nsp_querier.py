@@ -6,7 +6,8 @@ import logging
 import pkg_resources
 import re
 import time
-from typing import Dict, Tuple
+from collections import OrderedDict, deque
+from typing import Dict, List, Tuple
 from .utils import preprocess
 from .load_and_check_datasets import get_ground_truth
 from .nsp_model_wrapper import DroidletSemanticParsingModel
@@ -58,7 +59,9 @@ class NSPQuerier(object):
         )
         try:
             self.parsing_model = DroidletSemanticParsingModel(
-                opts.nsp_models_dir, opts.nsp_data_dir
+                opts.nsp_models_dir,
+                opts.nsp_data_dir,
+                quantize=getattr(opts, "nsp_quantize", False),
             )
         except NotADirectoryError:
             # No parsing model
@@ -67,6 +70,13 @@ class NSPQuerier(object):
         self.ground_truth_actions = get_ground_truth(
             self.opts.no_ground_truth, self.opts.ground_truth_data_dir
         )
+        # (model version, preprocessed chat) -> logical form of the parsing model,
+        # least recently used first
+        self.parse_cache = OrderedDict()
+        self.parse_cache_size = getattr(opts, "nsp_parse_cache_size", 1000)
+        # (speaker, chat, preprocessed chat, logical form) of the chats parsed but not
+        # returned by perceive yet
+        self.pending_chats = deque()
 
         # Socket event listener
         # TODO(kavya): I might want to move this to SemanticParserWrapper
@@ -126,14 +136,19 @@ class NSPQuerier(object):
             incoming_chats.append((speaker, chat))
 
         if len(incoming_chats) > 0:
+            self.agent.last_chat_time = time.time()
+            # Parse all the incoming chats at once, where chat -> [speaker, chat]
+            parses = self.get_parses([chat for _, chat in incoming_chats])
+            for (speaker, chat), (preprocessed_chat, chat_parse) in zip(incoming_chats, parses):
+                self.pending_chats.append((speaker, chat, preprocessed_chat, chat_parse))
+
+        if self.pending_chats:
             # force to get objects, speaker info
             if self.agent.perceive_on_chat:
                 force = True
-            self.agent.last_chat_time = time.time()
-            # For now just process the first incoming chat, where chat -> [speaker, chat]
-            speaker, chat = incoming_chats[0]
+            # For now just process one chat per call, the next ones on the next calls
+            speaker, chat, preprocessed_chat, chat_parse = self.pending_chats.popleft()
             received_chats_flag = True
-            preprocessed_chat, chat_parse = self.get_parse(chat)
 
         return force, received_chats_flag, speaker, chat, preprocessed_chat, chat_parse
 
@@ -156,12 +171,22 @@ class NSPQuerier(object):
         Returns:
             Dict: logical form found either in ground truth or from model
         """
-        # 1. Preprocess chat
-        chat = self.preprocess_chat(chatstr)
+        return self.get_parses([chatstr])[0]
+
+    def get_parses(self, chatstrs: List[str]) -> List[Tuple[str, Dict]]:
+        """Same as get_parse for several chats, eg. received in the same agent step:
+        the chats that need the parsing model are parsed in one batch.
+        Args:
+            chatstrs (List[str]) : chats or commands that need to be parsed
+        Returns:
+            List[Tuple[str, Dict]]: preprocessed chat and logical form of each chat
+        """
+        # 1. Preprocess chats
+        chats = [self.preprocess_chat(chatstr) for chatstr in chatstrs]
 
-        # 2. Get logical form from either ground truth or query the parsing model
-        logical_form = self.get_logical_form(chat=chat, parsing_model=self.parsing_model)
-        return chat, logical_form
+        # 2. Get logical forms from either ground truth or query the parsing model
+        logical_forms = self.get_logical_forms(chats=chats, parsing_model=self.parsing_model)
+        return list(zip(chats, logical_forms))
 
     def validate_parse_tree(self, parse_tree: Dict, debug: bool = True) -> bool:
         """Validate the parse tree against current grammar.
@@ -205,33 +230,87 @@ class NSPQuerier(object):
                 }]
             }
         """
-        logical_form_source = "ground_truth"
-        # Check if chat is in ground_truth otherwise query parsing model
-        if chat in self.ground_truth_actions:
-            logical_form = copy.deepcopy(self.ground_truth_actions[chat])
-            logging.info('Found ground truth action for "{}"'.format(chat))
+        return self.get_logical_forms([chat], parsing_model)[0]
+
+    def get_logical_forms(self, chats: List[str], parsing_model) -> List[Dict]:
+        """Same as get_logical_form for several chats. The chats found neither in the
+        ground truth nor in the parse cache are parsed by the model in one batch.
+        Args:
+            chats (List[str]): Input chats provided by the users.
+            parsing_model (NSPBertModel): Semantic parsing model, pre-trained and loaded
+                by agent
+        Return:
+            List[Dict]: Logical form of each chat.
+        """
+        model_version = getattr(parsing_model, "model_version", None)
+        # chat -> (logical form, source)
+        found = {}
+        to_parse = []
+        for chat in chats:
+            if chat in found:
+                continue
+            # Check if chat is in ground_truth otherwise query parsing model
+            if chat in self.ground_truth_actions:
+                found[chat] = (copy.deepcopy(self.ground_truth_actions[chat]), "ground_truth")
+                logging.info('Found ground truth action for "{}"'.format(chat))
+            elif parsing_model:
+                logical_form = self.get_cached_parse(model_version, chat)
+                if logical_form is not None:
+                    found[chat] = (logical_form, "NLU_model")
+                elif chat not in to_parse:
+                    to_parse.append(chat)
+            else:
+                found[chat] = ({"dialogue_type": "NOOP"}, "not_found_in_gt_no_model")
+                logging.info(
+                    "Not found in ground truth, no parsing model initiated. Returning NOOP."
+                )
+        if to_parse:
+            for chat, logical_form in zip(
+                to_parse, parsing_model.query_for_logical_forms(to_parse)
+            ):
+                self.cache_parse(model_version, chat, logical_form)
+                found[chat] = (logical_form, "NLU_model")
+
+        logical_forms = []
+        for chat in chats:
+            logical_form, logical_form_source = found[chat]
+            # each chat gets its own copy
+            logical_form = copy.deepcopy(logical_form)
             # log the current UTC time
             time_now = time.time()
-        elif self.parsing_model:
-            logical_form = parsing_model.query_for_logical_form(chat)
-            time_now = time.time()
-            logical_form_source = "NLU_model"
-        else:
-            logical_form = {"dialogue_type": "NOOP"}
-            logging.info("Not found in ground truth, no parsing model initiated. Returning NOOP.")
-            time_now = time.time()
-            logical_form_source = "not_found_in_gt_no_model"
-        # log the logical form and chat with source
-        self.NSPLogger.log_dialogue_outputs(
-            [chat, logical_form, logical_form_source, "craftassist", time_now]
-        )
-        # check if logical_form conforms to the grammar
-        is_valid_json = self.validate_parse_tree(logical_form)
-        if not is_valid_json:
-            # Send a NOOP
-            logging.error("Invalid parse tree for command %r \n" % (chat))
-            logging.error("Parse tree failed grammar validation: \n %r \n" % (logical_form))
-            logical_form = {"dialogue_type": "NOOP"}
-            logging.error("Returning NOOP")
-
-        return logical_form
+            # log the logical form and chat with source
+            self.NSPLogger.log_dialogue_outputs(
+                [chat, logical_form, logical_form_source, "craftassist", time_now]
+            )
+            # check if logical_form conforms to the grammar
+            is_valid_json = self.validate_parse_tree(logical_form)
+            if not is_valid_json:
+                # Send a NOOP
+                logging.error("Invalid parse tree for command %r \n" % (chat))
+                logging.error("Parse tree failed grammar validation: \n %r \n" % (logical_form))
+                logical_form = {"dialogue_type": "NOOP"}
+                logging.error("Returning NOOP")
+            logical_forms.append(logical_form)
+
+        return logical_forms
+
+    def get_cached_parse(self, model_version, chat: str):
+        """Returns a copy of the logical form of chat parsed by the model of model_version,
+        or None if it is not in the parse cache.
+        """
+        key = (model_version, chat)
+        if model_version is None or key not in self.parse_cache:
+            return None
+        self.parse_cache.move_to_end(key)
+        return copy.deepcopy(self.parse_cache[key])
+
+    def cache_parse(self, model_version, chat: str, logical_form: Dict):
+        """Adds the logical form of chat parsed by the model of model_version to the parse
+        cache, and evicts the least recently used parses beyond parse_cache_size.
+        """
+        if model_version is None or self.parse_cache_size <= 0:
+            return
+        self.parse_cache[(model_version, chat)] = copy.deepcopy(logical_form)
+        self.parse_cache.move_to_end((model_version, chat))
+        while len(self.parse_cache) > self.parse_cache_size:
+            self.parse_cache.popitem(last=False)
@@ -22,8 +22,18 @@ Action = {
     {arg_type}: {arg_dict}   # e.g. Move dict = {"Location": {Location}}
 }
 """
+from collections import OrderedDict
+
 from .action_node import *
 
+from droidlet.perception.semantic_parsing.nsp_templated_data_generation.tree_components import (
+    BlockObject,
+    Object,
+    Mob,
+    Filters,
+    Upsert,
+)
+
 
 class GetMemory(ActionNode):
     """The BotCurrentAction
@@ -4,8 +4,9 @@ Copyright (c) Facebook, Inc. and its affiliates.
 This file generates action trees and language based on options from
 command line.
 """
+import argparse
 import json
-from generate_data import *
+from droidlet.perception.semantic_parsing.nsp_templated_data_generation.generate_data import *
 
 
 class Action(ActionNode):
@@ -257,9 +258,13 @@ def generate_actions(n, action_type=None, template_attributes={}, composite=Fals
     return texts, dicts
 
 
-if __name__ == "__main__":
-    import argparse
+def format_dialogue(text, action_dict):
+    """The sentences of the dialogue, then the action tree, then an empty line"""
+    return "".join(sentence + "\n" for sentence in text) + json.dumps(action_dict) + "\n\n"
+
 
+def build_parser():
+    """Command line options of the generation scripts"""
     parser = argparse.ArgumentParser()
     parser.add_argument("-n", type=int, default=100)
     parser.add_argument("--seed", "-s", type=int, default=0)
@@ -335,12 +340,13 @@ if __name__ == "__main__":
         default=None,
         help="The file containing supported block objects",
     )
+    return parser
 
-    args = parser.parse_args()
 
-    # load file containing negative examples of chats
+def load_noop_chats(chats_file):
+    """Adds the chats of chats_file as negative examples for Noop"""
     try:
-        f = open(args.chats_file)
+        f = open(chats_file)
         chats = [line.strip() for line in f]
         f.close()
         Noop.CHATS += [
@@ -415,7 +421,9 @@ if __name__ == "__main__":
     except:
         print("chats file not found")
 
-    random.seed(args.seed)
+
+def get_template_attributes(args):
+    """Numeric ranges and names given on the command line, for the templates"""
     template_attributes = {}
     arg_dict = args.__dict__
     for key in arg_dict:
@@ -430,13 +438,29 @@ if __name__ == "__main__":
                     template_attributes[arg_name_file_map[key]] = [
                         line.strip() for line in f.readlines()
                     ]
+    return template_attributes
+
+
+def get_composite_flag(args):
+    """True or False if composite actions were asked for / against on the command line,
+    None to pick at random inside generate_actions()"""
     composite_flag = None
-    # assign composite_flag if user explcitly mentioned to create / avoid them
-    # else pick True at random inside generate_actions()
     if args.composite_action:
         composite_flag = True
     if args.no_composite_actions:
         composite_flag = False
+    return composite_flag
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+
+    # load file containing negative examples of chats
+    load_noop_chats(args.chats_file)
+
+    random.seed(args.seed)
+    template_attributes = get_template_attributes(args)
+    composite_flag = get_composite_flag(args)
     for text, d in zip(
         *generate_actions(
             args.n,
@@ -445,7 +469,4 @@ if __name__ == "__main__":
             composite=composite_flag,
         )
     ):
-        for sentence in text:
-            print(sentence)
-        print(json.dumps(d))
-        print()
+        print(format_dialogue(text, d), end="")
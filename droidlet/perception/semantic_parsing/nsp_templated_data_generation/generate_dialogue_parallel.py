@@ -0,0 +1,211 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+This file generates action trees and language like generate_dialogue.py, in
+parallel worker processes, and writes them to gzipped output shards.
+
+The dialogues are generated in chunks. Each chunk is seeded from the seed and the
+chunk index, and the chunks are deduplicated and written in order, so the output
+only depends on the options and not on the number of processes.
+
+python -m droidlet.perception.semantic_parsing.nsp_templated_data_generation.generate_dialogue_parallel \
+    -n 1000000 --num_processes 16 --output_dir templated_generations/
+zcat templated_generations/templated_*.txt.gz > templated_pre.txt
+"""
+import copy
+import gzip
+import hashlib
+import io
+import multiprocessing
+import os
+import random
+import time
+from collections import deque
+
+from droidlet.perception.semantic_parsing.nsp_templated_data_generation.generate_dialogue import (
+    Action,
+    build_parser,
+    format_dialogue,
+    generate_actions,
+    get_composite_flag,
+    get_template_attributes,
+    load_noop_chats,
+)
+
+
+def generate_chunk(seed, chunk_id, chunk_size, action_type, template_attributes, composite):
+    """Generates chunk_size dialogues, seeded from seed and chunk_id.
+
+    Returns:
+        the (command, dialogue) pairs, with the dialogues formatted by format_dialogue,
+        and the number of dialogues the generators failed on. Raises the error of the
+        generators if they failed on all of them.
+    """
+    random.seed("{}:{}".format(seed, chunk_id))
+    # generate_actions modifies the template attributes
+    template_attributes = copy.deepcopy(template_attributes)
+    dialogues = []
+    failed = 0
+    for _ in range(chunk_size):
+        try:
+            texts, dicts = generate_actions(
+                1, action_type, template_attributes=template_attributes, composite=composite
+            )
+        except Exception as e:
+            failed += 1
+            if failed == chunk_size:
+                raise e
+            continue
+        dialogues.append((" ".join(texts[0]), format_dialogue(texts[0], dicts[0])))
+    return dialogues, failed
+
+
+def _generate_chunk(task):
+    return generate_chunk(*task)
+
+
+class ShardWriter:
+    """Writes dialogues to gzipped files of shard_size dialogues in output_dir"""
+
+    def __init__(self, output_dir, shard_size, prefix="templated"):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.prefix = prefix
+        self.num_shards = 0
+        self.count = 0
+        self.f = None
+
+    def write(self, dialogue):
+        if self.count % self.shard_size == 0:
+            self.close()
+            path = os.path.join(
+                self.output_dir, "{}_{:05d}.txt.gz".format(self.prefix, self.num_shards)
+            )
+            # no timestamp in the gzip header, so that the files are reproducible
+            self.f = io.TextIOWrapper(gzip.GzipFile(path, "wb", mtime=0), encoding="utf-8")
+            self.num_shards += 1
+        self.f.write(dialogue)
+        self.count += 1
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+def generate_shards(
+    n,
+    output_dir,
+    seed=0,
+    action_type=Action.CHOICES,
+    template_attributes={},
+    composite=None,
+    chats_file=None,
+    num_processes=1,
+    chunk_size=1000,
+    shard_size=100000,
+    max_stale_chunks=100,
+    log_interval=10.0,
+):
+    """Generates n distinct dialogues with num_processes workers, and writes them to
+    gzipped shards of shard_size dialogues in output_dir.
+    action_type, template_attributes and composite are passed to generate_actions.
+    Stops before n dialogues if max_stale_chunks chunks in a row add no new command,
+    e.g. if the templates of action_type can't make n distinct commands.
+
+    Returns:
+        number of dialogues generated, kept and failed, and the number missing to n
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # 8 bytes hashes of the commands written so far, see generate_actions
+    seen = set()
+    counts = {"generated": 0, "kept": 0, "failed": 0, "missing": 0}
+    writer = ShardWriter(output_dir, shard_size)
+    start = last_log = time.time()
+    if chats_file is None:
+        pool = multiprocessing.Pool(num_processes)
+    else:
+        pool = multiprocessing.Pool(
+            num_processes, initializer=load_noop_chats, initargs=(chats_file,)
+        )
+    try:
+        pending = deque()
+        chunk_id = 0
+        # number of chunks in a row without new commands
+        stale_chunks = 0
+        while counts["kept"] < n and stale_chunks < max_stale_chunks:
+            # keep the workers busy, results are used in chunk order
+            while len(pending) < 2 * num_processes:
+                task = (seed, chunk_id, chunk_size, action_type, template_attributes, composite)
+                pending.append(pool.apply_async(_generate_chunk, (task,)))
+                chunk_id += 1
+            dialogues, failed = pending.popleft().get()
+            counts["generated"] += len(dialogues) + failed
+            counts["failed"] += failed
+            stale_chunks += 1
+            for command, dialogue in dialogues:
+                key = hashlib.blake2b(command.encode("utf-8"), digest_size=8).digest()
+                if key in seen:
+                    continue
+                seen.add(key)
+                stale_chunks = 0
+                writer.write(dialogue)
+                counts["kept"] += 1
+                if counts["kept"] == n:
+                    break
+            done = counts["kept"] == n or stale_chunks == max_stale_chunks
+            if time.time() - last_log > log_interval or done:
+                last_log = time.time()
+                print(
+                    "{kept} dialogues kept out of {generated} generated, {failed} failed, "
+                    "{rate:.0f} dialogues/s".format(
+                        rate=counts["generated"] / (last_log - start), **counts
+                    )
+                )
+    finally:
+        pool.terminate()
+        writer.close()
+    counts["missing"] = n - counts["kept"]
+    if counts["missing"] > 0:
+        print(
+            "stopped {missing} dialogues short of {n}: no new command in the last {chunks} "
+            "chunks of {chunk_size} dialogues".format(
+                n=n, chunks=max_stale_chunks, chunk_size=chunk_size, **counts
+            )
+        )
+    return counts
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    parser.add_argument("--output_dir", type=str, default="templated_generations")
+    parser.add_argument(
+        "--num_processes", type=int, default=os.cpu_count(), help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--chunk_size", type=int, default=1000, help="Number of dialogues per worker task"
+    )
+    parser.add_argument(
+        "--shard_size", type=int, default=100000, help="Number of dialogues per output file"
+    )
+    parser.add_argument(
+        "--max_stale_chunks",
+        type=int,
+        default=100,
+        help="Stop after this many chunks in a row without new commands",
+    )
+    args = parser.parse_args()
+
+    generate_shards(
+        args.n,
+        args.output_dir,
+        seed=args.seed,
+        action_type=args.action_type,
+        template_attributes=get_template_attributes(args),
+        composite=get_composite_flag(args),
+        chats_file=args.chats_file,
+        num_processes=args.num_processes,
+        chunk_size=args.chunk_size,
+        shard_size=args.shard_size,
+        max_stale_chunks=args.max_stale_chunks,
+    )
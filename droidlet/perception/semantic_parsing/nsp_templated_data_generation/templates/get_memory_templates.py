@@ -3,6 +3,7 @@ Copyright (c) Facebook, Inc. and its affiliates.
 """
 
 # fmt: off
+from ..template_objects import *
 """
 Every template contains an ordered list of TemplateObjects.
 TemplateObject is defined in template_objects.py
@@ -1,8 +1,11 @@
 """
 Copyright (c) Facebook, Inc. and its affiliates.
 """
+import hashlib
 import json
 import numpy as np
+import os
+import random
 import re
 from os.path import isfile, isdir
 from os.path import join as pjoin
@@ -10,6 +13,62 @@ from torch.utils.data import Dataset
 from .tokenization_utils import fixed_span_values
 from .utils_caip import make_full_tree, process_txt_data, tokenize_linearize
 
+SHARD_ARRAYS = ["offsets", "text", "tree", "raw"]
+
+
+def shard_key(tokenizer, full_tree_voc):
+    """Identifies the tokenizer and tree vocabulary the token and node ids of a shard refer to"""
+    tree_voc_hash = hashlib.sha1(json.dumps(full_tree_voc).encode("utf-8")).hexdigest()
+    return {
+        "tokenizer": [getattr(tokenizer, "name_or_path", ""), tokenizer.vocab_size],
+        "tree_voc": tree_voc_hash,
+    }
+
+
+class CAIPShard:
+    """Pre-tokenized examples of a data file, written by preprocess_caip.py
+
+    The arrays are memory-mapped, so examples are read from disk when needed and the
+    pages are shared by all the processes reading the shard. They are opened on first
+    access: DataLoader workers get the path and map the files themselves.
+
+    Args:
+        path: path of the shard files, without the ``.<array>.npy`` suffix
+        num_examples: number of examples in the shard
+
+    """
+
+    def __init__(self, path, num_examples):
+        self.path = path
+        self.num_examples = num_examples
+        self.arrays = None
+
+    def __getstate__(self):
+        return {"path": self.path, "num_examples": self.num_examples, "arrays": None}
+
+    def _open(self):
+        if self.arrays is None:
+            self.arrays = {
+                k: np.load("{}.{}.npy".format(self.path, k), mmap_mode="r") for k in SHARD_ARRAYS
+            }
+        return self.arrays
+
+    def __len__(self):
+        return self.num_examples
+
+    def __getitem__(self, idx):
+        """(text, tree) pair of the example, as loaded by process_txt_data"""
+        arrays = self._open()
+        start, end = arrays["offsets"][idx, 2], arrays["offsets"][idx + 1, 2]
+        return json.loads(arrays["raw"][start:end].tobytes().decode("utf-8"))
+
+    def encoded(self, idx):
+        """Token ids of the input and rows of the linearized tree of the example"""
+        arrays = self._open()
+        text_start, tree_start, _ = arrays["offsets"][idx]
+        text_end, tree_end, _ = arrays["offsets"][idx + 1]
+        return arrays["text"][text_start:text_end], arrays["tree"][tree_start:tree_end]
+
 
 class CAIPDataset(Dataset):
     """Torch Dataset for the CAIP format, applies BPE and linearizes trees on-the-fly
@@ -24,7 +83,8 @@ class CAIPDataset(Dataset):
         dataset_length: Size of dataset
         tree_voc: Tree vocabulary file
         tree_idxs: Tree dictionary
-        data: Dictionary containing datasets loaded into memory.
+        data: Dictionary containing datasets loaded into memory, or the CAIPShard of
+            the data file if args.shard_dir has an up to date one.
 
     """
 
@@ -59,13 +119,17 @@ class CAIPDataset(Dataset):
             self.dtypes = [e[0] for e in dtypes]
             self.sample_probas = np.array([k[1] for k in dtypes])
         self.sample_probas /= self.sample_probas.sum()
+        self.shard_dir = getattr(args, "shard_dir", "")
+        self.shard_index = None
+        if prefix != "":
+            self.shard_index = self.load_shard_index(full_tree_voc)
         if prefix == "train":
             for k in self.dtypes:
                 fname = pjoin(args.data_dir, prefix, k + ".txt")
                 print(fname)
                 assert isfile(fname)
                 print("loading {}".format(fname))
-                self.data[k] = process_txt_data(fname)
+                self.data[k] = self.load_data_file(fname, prefix, k)
             self.hard_buffer_size = 1024
             self.hard_buffer_counter = 0
         elif prefix == "":
@@ -74,7 +138,7 @@ class CAIPDataset(Dataset):
             fname = pjoin(args.data_dir, prefix, dtype + ".txt")
             if isfile(fname):
                 print("loading {}".format(fname))
-                self.data[dtype] = process_txt_data(fname)
+                self.data[dtype] = self.load_data_file(fname, prefix, dtype)
             else:
                 print("could not find dataset {}".format(fname))
                 self.data[dtype] = []
@@ -101,27 +165,48 @@ class CAIPDataset(Dataset):
         if args.examples_per_epoch > 0:
             self.dataset_length = min(self.dataset_length, args.examples_per_epoch)
 
-    def _contains_span_indices(self, token_idx_list: list):
-        return token_idx_list[1] >= 0 and token_idx_list[2] >= 0
+    def load_shard_index(self, full_tree_voc):
+        """Loads the index of the pre-tokenized shards in shard_dir, if they match the
+        tokenizer and tree vocabulary"""
+        index_path = pjoin(self.shard_dir, "index.json") if self.shard_dir else ""
+        if not isfile(index_path):
+            return None
+        if full_tree_voc is None:
+            print("not using shards from {}: no tree vocabulary".format(self.shard_dir))
+            return None
+        with open(index_path) as fd:
+            index = json.load(fd)
+        key = shard_key(self.tokenizer, full_tree_voc)
+        if any(index[k] != v for k, v in key.items()):
+            print(
+                "not using shards from {}: tokenizer or tree vocabulary changed".format(
+                    self.shard_dir
+                )
+            )
+            return None
+        return index
 
-    def __len__(self):
-        return self.dataset_length
+    def load_data_file(self, fname, prefix, dtype):
+        """Returns the pre-tokenized shard of the data file if it is up to date,
+        the (text, tree) pairs of the file otherwise"""
+        if self.shard_index is not None:
+            shard = self.shard_index["files"].get("{}/{}".format(prefix, dtype))
+            stat = os.stat(fname)
+            if shard is not None and shard["source"] == [stat.st_size, stat.st_mtime_ns]:
+                print("using pre-tokenized shard of {}".format(fname))
+                return CAIPShard(pjoin(self.shard_dir, prefix, dtype), shard["num_examples"])
+            print("no up to date shard of {}".format(fname))
+        return process_txt_data(fname)
 
-    def __getitem__(self, idx):
-        """Sample data type and get example"""
-        if self.sampling:
-            dtype = np.random.choice(self.dtypes, p=self.sample_probas)
-            if len(self.data[dtype]) == 0:
-                dtype = self.dtype
-        else:
-            dtype = self.dtype
-        try:
-            t = self.data[dtype][idx % len(self.data[dtype])]
-            p_text, p_tree = t
-        except ValueError as e:
-            print(e)
+    def encode(self, p_text, p_tree, word_noise=0.0):
+        """Applies BPE to the text and linearizes the tree
+
+        Returns:
+            BPE-ed text, its token ids and the rows of the linearized tree:
+            [node id, span start, span end, text span start, text span end, fixed value]
+        """
         text, tree = tokenize_linearize(
-            p_text, p_tree, self.tokenizer, self.full_tree, self.word_noise
+            p_text, p_tree, self.tokenizer, self.full_tree, word_noise
         )
 
         text_idx_ls = self.tokenizer.convert_tokens_to_ids(text.split())
@@ -144,10 +229,48 @@ class CAIPDataset(Dataset):
             + tree
             + [("</S>", -1, -1, -1, -1, -1)]
         ]
+        return text, text_idx_ls, tree_idx_ls
+
+    def _contains_span_indices(self, token_idx_list: list):
+        return token_idx_list[1] >= 0 and token_idx_list[2] >= 0
+
+    def __len__(self):
+        return self.dataset_length
+
+    def __getitem__(self, idx):
+        """Sample data type and get example"""
+        if self.sampling:
+            dtype = np.random.choice(self.dtypes, p=self.sample_probas)
+            if len(self.data[dtype]) == 0:
+                dtype = self.dtype
+        else:
+            dtype = self.dtype
+        data = self.data[dtype]
+        idx = idx % len(data)
+        try:
+            t = data[idx]
+            p_text, p_tree = t
+        except ValueError as e:
+            print(e)
+        if isinstance(data, CAIPShard):
+            text_idx_ls, tree_idx_ls = data.encoded(idx)
+            text_idx_ls = text_idx_ls.tolist()
+            tree_idx_ls = tree_idx_ls.tolist()
+            if self.word_noise > 0:
+                special_ids = [self.tokenizer.cls_token_id, self.tokenizer.sep_token_id]
+                text_idx_ls = [
+                    self.tokenizer.unk_token_id
+                    if w not in special_ids and random.random() < self.word_noise
+                    else w
+                    for w in text_idx_ls
+                ]
+            text = " ".join(self.tokenizer.convert_ids_to_tokens(text_idx_ls))
+        else:
+            text, text_idx_ls, tree_idx_ls = self.encode(p_text, p_tree, self.word_noise)
         if self.tree_to_text:
             stripped_tree_tokens = []
-            for w, _, _, _, _, _ in tree:
-                tree_node = w.lower()
+            for node_idx_ls in tree_idx_ls[1:-1]:
+                tree_node = self.tree_voc[node_idx_ls[0]].lower()
                 tree_node_processed = re.sub("[^0-9a-zA-Z]+", " ", tree_node)
                 tree_tokens = tree_node_processed.split(" ")
                 stripped_tree_tokens += [x for x in tree_tokens if x != ""]
@@ -85,29 +85,41 @@ class DecoderWithLoss(nn.Module):
         self.fixed_span_loss = torch.nn.CrossEntropyLoss(ignore_index=-1, reduction="none")
         self.tree_to_text = args.tree_to_text
 
-    def step(self, y, y_mask, x_reps, x_mask):
+    def step(self, y, y_mask, x_reps, x_mask, past_key_values=None, use_cache=False):
         """Without loss, used at prediction time.
 
         TODO: add previously computed y_rep, currently y only has the node indices, not spans.
 
+        Incremental decoding: with use_cache=True, the result also has the "past_key_values"
+        of the decoder, i.e. the self-attention keys/values of y and the cross-attention
+        keys/values of x_reps. Passed back with a longer y, only the positions of y after
+        the cached ones are run through the decoder, and scored.
+
         Args:
             y: targets
             y_mask: mask for targets
             x_reps: encoder hidden states
             x_mask: input mask
+            past_key_values: cache returned by the previous step
+            use_cache: whether to return the cache
 
         Returns:
             Dictionary containing scores from each output head
 
         """
-        y_rep = self.bert(
-            labels=y,
-            input_ids=y,
+        past_length = past_key_values[0][0].shape[2] if past_key_values is not None else 0
+        model_out = self.bert(
+            labels=y[:, past_length:],
+            input_ids=y[:, past_length:],
             attention_mask=y_mask,
             encoder_hidden_states=x_reps,
             encoder_attention_mask=x_mask,
-        )[0]
-        y_mask_target = y_mask
+            past_key_values=past_key_values,
+            use_cache=use_cache,
+            return_dict=True,
+        )
+        y_rep = model_out[0]
+        y_mask_target = y_mask[:, past_length:]
         lm_scores = self.lm_head(y_rep)
         y_span_pre_b = y_rep
         for hw in self.span_b_proj:
@@ -154,8 +166,30 @@ class DecoderWithLoss(nn.Module):
             "text_span_end_scores": torch.log_softmax(text_span_end_scores, dim=-1).detach(),
             "fixed_value_scores": torch.log_softmax(fixed_value_scores, dim=-1).detach(),
         }
+        if use_cache:
+            res["past_key_values"] = model_out.past_key_values
         return res
 
+    @staticmethod
+    def reorder_cache(past_key_values, beam_ids):
+        """Selects the rows of the step cache of the beams kept by beam search.
+
+        Only the self-attention keys/values are reordered: the cross-attention ones are
+        projections of the encoder output, which is the same for all beams.
+
+        Args:
+            past_key_values: cache returned by step
+            beam_ids: index of the previous beam of each new beam
+
+        Returns:
+            The cache of the new beams
+        """
+        return tuple(
+            (layer_past[0].index_select(0, beam_ids), layer_past[1].index_select(0, beam_ids))
+            + tuple(layer_past[2:])
+            for layer_past in past_key_values
+        )
+
     def forward(self, labels, y, y_mask, x_reps, x_mask, is_eval=False):
         """Same as step, except with loss. Set is_eval=True for validation.
 
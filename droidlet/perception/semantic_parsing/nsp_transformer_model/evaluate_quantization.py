@@ -0,0 +1,119 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+Compares the NSP model with and without dynamic int8 quantization (see
+utils_model.quantize_model) on CPU, on the annotated data splits:
+- accuracy: teacher-forced accuracy of the full linearized tree, see compute_accuracy
+- exact match: fraction of chats whose beam search parse is the annotated tree
+- agreement: fraction of chats whose int8 parse is the fp32 parse
+- latency: time to parse one chat, as NSPBertModel.parse does in the agent
+
+python -m droidlet.perception.semantic_parsing.nsp_transformer_model.evaluate_quantization \
+    --model_dir droidlet/artifacts/models/nlu/ttad_bert_updated/ \
+    --data_dir droidlet/artifacts/datasets/annotated_data/
+"""
+import argparse
+import functools
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Subset
+
+from droidlet.perception.semantic_parsing.nsp_transformer_model.caip_dataset import CAIPDataset
+from droidlet.perception.semantic_parsing.nsp_transformer_model.query_model import NSPBertModel
+from droidlet.perception.semantic_parsing.nsp_transformer_model.utils_caip import caip_collate
+from droidlet.perception.semantic_parsing.nsp_transformer_model.utils_parsing import (
+    compute_accuracy,
+)
+
+
+def tree_accuracy(model, dataset, batch_size):
+    """Teacher-forced accuracy of the full linearized trees of dataset"""
+    dataloader = DataLoader(
+        dataset,
+        batch_size=batch_size,
+        collate_fn=functools.partial(caip_collate, tokenizer=model.tokenizer),
+    )
+    correct = 0
+    with torch.no_grad():
+        for batch in dataloader:
+            x, x_mask, y, y_mask = batch[:4]
+            outputs = model.encoder_decoder(x, x_mask, y, y_mask, None, True)
+            _, _, _, full_acc = compute_accuracy(outputs, y)
+            correct += full_acc.sum().item()
+    return correct / len(dataset)
+
+
+def parse_chats(model, chats):
+    """Parses the chats one by one, returns the trees and the time taken by each"""
+    trees = []
+    times = []
+    for chat in chats:
+        start = time.perf_counter()
+        trees.append(model.parse(chat))
+        times.append(time.perf_counter() - start)
+    return trees, np.array(times)
+
+
+def run(opts):
+    torch.set_num_threads(opts.num_threads)
+    models = {
+        "fp32": NSPBertModel(opts.model_dir, opts.data_dir),
+        "int8": NSPBertModel(opts.model_dir, opts.data_dir, quantize=True),
+    }
+    # compare on CPU
+    models["fp32"].encoder_decoder.cpu()
+
+    for split in opts.splits.split(","):
+        dataset = CAIPDataset(
+            models["fp32"].tokenizer,
+            models["fp32"].args,
+            prefix=split,
+            dtype=opts.dtype,
+            full_tree_voc=models["fp32"].full_tree_voc,
+        )
+        if len(dataset.data[opts.dtype]) == 0:
+            continue
+        dataset = Subset(dataset, range(min(len(dataset), opts.max_examples)))
+        chats = [dataset[i][2][1] for i in range(len(dataset))]
+        gold_trees = [dataset[i][2][2] for i in range(len(dataset))]
+        print("{}: {} chats".format(split, len(chats)))
+
+        parses = {}
+        for name, model in models.items():
+            accuracy = tree_accuracy(model, dataset, opts.batch_size)
+            parses[name], times = parse_chats(model, chats)
+            exact_match = np.mean([p == g for p, g in zip(parses[name], gold_trees)])
+            print(
+                "  {}: accuracy {:.3f}, exact match {:.3f}, "
+                "latency mean {:.1f} ms, p90 {:.1f} ms".format(
+                    name,
+                    accuracy,
+                    exact_match,
+                    1000 * times.mean(),
+                    1000 * np.percentile(times, 90),
+                )
+            )
+        agreement = np.mean([p == q for p, q in zip(parses["fp32"], parses["int8"])])
+        print("  int8 parses equal to fp32 parses: {:.3f}".format(agreement))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--model_dir",
+        default="droidlet/artifacts/models/nlu/ttad_bert_updated/",
+        help="Directory of the NSP model, where the quantized model is cached",
+    )
+    parser.add_argument(
+        "--data_dir",
+        default="droidlet/artifacts/datasets/annotated_data/",
+        help="train/valid/test data",
+    )
+    parser.add_argument("--splits", default="valid,test", help="Comma separated data splits")
+    parser.add_argument("--dtype", default="annotated", help="Data type of the splits")
+    parser.add_argument("--max_examples", default=500, type=int, help="Chats per split")
+    parser.add_argument("--batch_size", default=32, type=int, help="Batch size for accuracy")
+    parser.add_argument("--num_threads", default=4, type=int, help="CPU threads used by torch")
+    run(parser.parse_args())
@@ -18,6 +18,7 @@ from typing import Optional, Tuple
 import torch
 
 # from transformers.file_utils import ModelOutput
+from transformers.file_utils import is_tensor
 from collections import OrderedDict, UserDict
 from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
 
@@ -0,0 +1,153 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+Pre-tokenizes the CAIP data files for training: applies BPE to the inputs and
+linearizes the trees once, and writes the token ids, tree node ids, span and text
+span targets to memory-mapped arrays. CAIPDataset reads them instead of the data
+files when given the shard directory (train_model.py --shard_dir).
+
+For each data file <split>/<dtype>.txt, the shard <shard_dir>/<split>/<dtype> has:
+- text.npy: int32 token ids of the inputs
+- tree.npy: int32 [N, 6] rows of the linearized trees, see CAIPDataset.encode
+- raw.npy: uint8 utf-8 json of the (text, tree) pairs
+- offsets.npy: int64 [num_examples + 1, 3] start of each example in the three arrays
+<shard_dir>/index.json records the tokenizer, the tree vocabulary and the data file
+each shard was made from, so that out of date shards are not used.
+
+python droidlet/perception/semantic_parsing/nsp_transformer_model/preprocess_caip.py \
+    --data_dir droidlet/artifacts/datasets/annotated_data/ \
+    --tree_voc_file droidlet/artifacts/models/nlu/ttad_bert_updated/caip_test_model_tree.json \
+    --shard_dir droidlet/artifacts/datasets/annotated_data_shards/
+"""
+import argparse
+import array
+import json
+import os
+from os.path import isfile
+from os.path import join as pjoin
+
+import numpy as np
+from transformers import AutoTokenizer
+
+from droidlet.perception.semantic_parsing.nsp_transformer_model.caip_dataset import (
+    CAIPDataset,
+    shard_key,
+)
+from droidlet.perception.semantic_parsing.nsp_transformer_model.utils_caip import process_txt_data
+
+
+def write_shard(dataset, examples, path):
+    """Encodes the (text, tree) pairs with dataset.encode and writes them to the shard at path.
+
+    Returns:
+        number of examples written and number of examples which could not be encoded
+    """
+    text_ids = array.array("i")
+    tree_ids = array.array("i")
+    raw = bytearray()
+    offsets = [[0, 0, 0]]
+    skipped = 0
+    for p_text, p_tree in examples:
+        try:
+            _, text_idx_ls, tree_idx_ls = dataset.encode(p_text, p_tree)
+        except (IndexError, KeyError) as e:
+            print("skipping {}: {}".format(p_text, repr(e)))
+            skipped += 1
+            continue
+        text_ids.extend(text_idx_ls)
+        for row in tree_idx_ls:
+            tree_ids.extend(row)
+        raw += json.dumps([p_text, p_tree]).encode("utf-8")
+        offsets.append([len(text_ids), len(tree_ids) // 6, len(raw)])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path + ".text.npy", np.frombuffer(text_ids, dtype=np.int32))
+    np.save(path + ".tree.npy", np.frombuffer(tree_ids, dtype=np.int32).reshape(-1, 6))
+    np.save(path + ".raw.npy", np.frombuffer(bytes(raw), dtype=np.uint8))
+    np.save(path + ".offsets.npy", np.array(offsets, dtype=np.int64))
+    return len(offsets) - 1, skipped
+
+
+def preprocess(args, tokenizer, full_tree_voc):
+    """Writes the shards of all the data files of the splits and data types in args"""
+    # only used to encode the examples, loads no data
+    dataset = CAIPDataset(tokenizer, args, prefix="", full_tree_voc=full_tree_voc)
+    key = shard_key(tokenizer, full_tree_voc)
+    index_path = pjoin(args.shard_dir, "index.json")
+    index = {"files": {}}
+    if isfile(index_path):
+        with open(index_path) as fd:
+            index = json.load(fd)
+        if any(index[k] != v for k, v in key.items()):
+            index = {"files": {}}
+    index.update(key)
+    for split in args.splits.split(","):
+        for dtype in args.dtype_samples:
+            fname = pjoin(args.data_dir, split, dtype + ".txt")
+            if not isfile(fname):
+                continue
+            print("pre-tokenizing {}".format(fname))
+            # the shard is not used until it is fully written
+            index["files"].pop("{}/{}".format(split, dtype), None)
+            with open(index_path, "w") as fd:
+                json.dump(index, fd, indent=2)
+            stat = os.stat(fname)
+            num_examples, skipped = write_shard(
+                dataset, process_txt_data(fname), pjoin(args.shard_dir, split, dtype)
+            )
+            print("{} examples, {} skipped".format(num_examples, skipped))
+            index["files"]["{}/{}".format(split, dtype)] = {
+                "source": [stat.st_size, stat.st_mtime_ns],
+                "num_examples": num_examples,
+            }
+            with open(index_path, "w") as fd:
+                json.dump(index, fd, indent=2)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--data_dir",
+        default="droidlet/artifacts/datasets/annotated_data/",
+        type=str,
+        help="train/valid/test data",
+    )
+    parser.add_argument(
+        "--shard_dir",
+        default="droidlet/artifacts/datasets/annotated_data_shards/",
+        type=str,
+        help="Where the pre-tokenized shards are written",
+    )
+    parser.add_argument(
+        "--tree_voc_file",
+        default="droidlet/artifacts/models/nlu/ttad_bert_updated/caip_test_model_tree.json",
+        type=str,
+        help="Pre-computed grammar and output vocabulary, as used for training",
+    )
+    parser.add_argument(
+        "--pretrained_encoder_name",
+        default="distilbert-base-uncased",
+        type=str,
+        help="Pretrained text encoder, as used for training",
+    )
+    parser.add_argument("--splits", default="train,valid,test", help="Comma separated splits")
+    parser.add_argument(
+        "--dtype_samples",
+        default="templated:.55;templated_filters:.05;annotated:.4",
+        type=str,
+        help="Data types to pre-tokenize, in the format of train_model.py",
+    )
+    args = parser.parse_args()
+    dtype_samples = {}
+    for x in args.dtype_samples.split(";"):
+        y = x.split(":")
+        dtype_samples[y[0]] = float(y[1])
+    args.dtype_samples = dtype_samples
+    args.tree_to_text = False
+    args.examples_per_epoch = -1
+
+    with open(args.tree_voc_file) as fd:
+        full_tree, tree_i2w = json.load(fd)
+    tokenizer = AutoTokenizer.from_pretrained(args.pretrained_encoder_name)
+    os.makedirs(args.shard_dir, exist_ok=True)
+    preprocess(args, tokenizer, (full_tree, tree_i2w))
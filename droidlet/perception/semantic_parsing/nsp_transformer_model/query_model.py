@@ -8,8 +8,8 @@ import pickle
 
 import torch
 
-from .utils_model import build_model, load_model
-from .utils_parsing import beam_search
+from .utils_model import build_model, load_model, load_quantized_model
+from .utils_parsing import batch_beam_search
 from .utils_parsing import *
 from .decoder_with_loss import *
 from .encoder_decoder import *
@@ -32,18 +32,34 @@ class NSPBertModel(object):
         data_dir (str): Path to directory containing all datasets used by the NSP model.
             Note that this data is not used in inference, rather we load from the ground truth
             data directory.
+        quantize (bool): Run the model on CPU with int8 Linear layers, see
+            `load_quantized_model`. Faster on CPU, at the cost of some accuracy.
     """
 
-    def __init__(self, model_dir, data_dir, model_name="caip_test_model"):
-        sd, tree_voc, tree_idxs, args, full_tree_voc = load_model(model_dir)
-        decoder_with_loss, encoder_decoder, tokenizer = build_model(args, full_tree_voc[1])
+    def __init__(self, model_dir, data_dir, model_name="caip_test_model", quantize=False):
+        # identifies the checkpoint, eg. to cache parses
+        model_path = os.path.abspath(os.path.join(model_dir, model_name + ".pth"))
+        model_stat = os.stat(model_path)
+        self.model_version = "{}:{}:{}".format(
+            model_path, model_stat.st_size, model_stat.st_mtime_ns
+        )
+        if quantize:
+            encoder_decoder, tokenizer, args, full_tree_voc = load_quantized_model(
+                model_dir, model_name
+            )
+            self.model_version += ":int8"
+        else:
+            sd, tree_voc, tree_idxs, args, full_tree_voc = load_model(model_dir)
+            decoder_with_loss, encoder_decoder, tokenizer = build_model(args, full_tree_voc[1])
+            encoder_decoder.load_state_dict(sd, strict=True)
+            if torch.cuda.is_available():
+                encoder_decoder.cuda()
         args.data_dir = data_dir
+        self.args = args
+        self.full_tree_voc = full_tree_voc
         self.tokenizer = tokenizer
         self.dataset = CAIPDataset(self.tokenizer, args, prefix="", full_tree_voc=full_tree_voc)
         self.encoder_decoder = encoder_decoder
-        self.encoder_decoder.load_state_dict(sd, strict=True)
-        if torch.cuda.is_available():
-            self.encoder_decoder.cuda()
         self.encoder_decoder.eval()
 
     def parse(self, chat, noop_thres=0.95, beam_size=5, well_formed_pen=1e2):
@@ -54,11 +70,34 @@ class NSPBertModel(object):
         Returns:
             dict: Logical form.
         """
-        btr = beam_search(
-            chat, self.encoder_decoder, self.tokenizer, self.dataset, beam_size, well_formed_pen
-        )
-        if btr[0][0].get("dialogue_type", "NONE") == "NOOP" and math.exp(btr[0][1]) < noop_thres:
-            tree = btr[1][0]
-        else:
-            tree = btr[0][0]
-        return tree
+        return self.parse_many([chat], noop_thres, beam_size, well_formed_pen)[0]
+
+    def parse_many(self, chats, noop_thres=0.95, beam_size=5, well_formed_pen=1e2, batch_size=16):
+        """Given several chats, eg. received in the same agent step, query the parser and
+        return their logical forms. The chats are padded together and decoded by batches of
+        batch_size, see `batch_beam_search`
+        Args:
+            chats (list[str]): Preprocessed chat commands. Used as text inputs to parser.
+        Returns:
+            list[dict]: Logical form of each chat.
+        """
+        trees = []
+        with torch.no_grad():
+            for i in range(0, len(chats), batch_size):
+                btrs = batch_beam_search(
+                    chats[i : i + batch_size],
+                    self.encoder_decoder,
+                    self.tokenizer,
+                    self.dataset,
+                    beam_size,
+                    well_formed_pen,
+                )
+                for btr in btrs:
+                    if (
+                        btr[0][0].get("dialogue_type", "NONE") == "NOOP"
+                        and math.exp(btr[0][1]) < noop_thres
+                    ):
+                        trees.append(btr[1][0])
+                    else:
+                        trees.append(btr[0][0])
+        return trees
@@ -471,6 +471,12 @@ if __name__ == "__main__":
         type=str,
         help="The root folder of the fairo project",
     )
+    parser.add_argument(
+        "--shard_dir",
+        default="",
+        type=str,
+        help="Pre-tokenized data written by preprocess_caip.py, used for the files it is up to date with",
+    )
     parser.add_argument("--tensorboard_dir", default="")
     parser.add_argument(
         "--output_dir",
@@ -1,3 +1,5 @@
+import argparse
+import logging
 import os
 import torch
 from droidlet.perception.semantic_parsing.nsp_transformer_model.decoder_with_loss import (
@@ -49,3 +51,57 @@ def load_model(model_dir, model_name="caip_test_model"):
             raise Exception("Failed to load model with path {}".format(path))
 
     return sd, tree_voc, tree_idxs, args, full_tree_voc
+
+
+def quantize_model(encoder_decoder):
+    """Applies dynamic int8 quantization to the Linear layers of the model, for CPU
+    inference: their weights are quantized once, their inputs on the fly.
+    The embeddings and layer norms are kept in fp32.
+    """
+    return torch.quantization.quantize_dynamic(
+        encoder_decoder.cpu().eval(), {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def load_quantized_model(model_dir, model_name="caip_test_model", cache=True):
+    """Loads the model with int8 Linear layers, see quantize_model.
+
+    The quantized weights are cached in model_dir next to the checkpoint, as
+    ``<model_name>_int8.pth``, and quantized again if the checkpoint changes.
+
+    Returns:
+        encoder_decoder, tokenizer, args and full_tree_voc of the model
+    """
+    path = os.path.join(model_dir, model_name + ".pth")
+    quantized_path = os.path.join(model_dir, model_name + "_int8.pth")
+    stat = os.stat(path)
+    source = [stat.st_size, stat.st_mtime_ns]
+    if os.path.isfile(quantized_path):
+        M = torch.load(quantized_path, map_location="cpu")
+        if M["source"] == source:
+            args = argparse.Namespace(**M["args"])
+            full_tree_voc = M["full_tree_voc"]
+            _, encoder_decoder, tokenizer = build_model(args, full_tree_voc[1])
+            encoder_decoder = quantize_model(encoder_decoder)
+            encoder_decoder.load_state_dict(M["state_dict"], strict=True)
+            return encoder_decoder, tokenizer, args, full_tree_voc
+        logging.info("{} changed, quantizing it again".format(path))
+
+    sd, tree_voc, tree_idxs, args, full_tree_voc = load_model(model_dir, model_name)
+    _, encoder_decoder, tokenizer = build_model(args, full_tree_voc[1])
+    encoder_decoder.load_state_dict(sd, strict=True)
+    encoder_decoder = quantize_model(encoder_decoder)
+    if cache:
+        try:
+            torch.save(
+                {
+                    "state_dict": encoder_decoder.state_dict(),
+                    "source": source,
+                    "args": vars(args),
+                    "full_tree_voc": full_tree_voc,
+                },
+                quantized_path,
+            )
+        except OSError as e:
+            logging.warning("Could not cache the quantized model: {}".format(e))
+    return encoder_decoder, tokenizer, args, full_tree_voc
@@ -18,125 +18,150 @@ def beam_search(txt, model, tokenizer, dataset, beam_size=5, well_formed_pen=1e2
         well_formed_pen (float): penalization for poorly formed trees
 
     Returns:
-        logical form (dict)
+        list of (logical form (dict), score, sequence) of the beams, best first
 
     """
-    model_device = model.decoder.lm_head.predictions.decoder.weight.device
+    return batch_beam_search([txt], model, tokenizer, dataset, beam_size, well_formed_pen)[0]
+
+
+def batch_beam_search(txts, model, tokenizer, dataset, beam_size=5, well_formed_pen=1e2):
+    """Beam search decoding of several chats at once, see `beam_search`.
+    The chats are padded into one encoder batch, and the beams of all chats are decoded
+    together as one decoder batch of len(txts) * beam_size rows.
+
+    Args:
+        txts (list[str]): chat inputs
+        model: model class with pretrained model
+        tokenizer: pretrained tokenizer
+        beam_size (int): Number of branches to keep in beam search for each chat
+        well_formed_pen (float): penalization for poorly formed trees
+
+    Returns:
+        list of the beam search results of the chats, see `beam_search`
+
+    """
+    # not a Linear weight, which quantized models don't have
+    model_device = model.decoder.bert.embeddings.word_embeddings.weight.device
+    n_txts = len(txts)
+    n_rows = n_txts * beam_size
     # prepare batch
-    text, idx_maps = tokenize_mapidx(txt, tokenizer)
-    idx_rev_map = [(0, 0)] * len(text.split())
-    for line_id, idx_map in enumerate(idx_maps):
-        for pre_id, (a, b) in enumerate(idx_map):
-            idx_rev_map[a] = (line_id, pre_id)
-            idx_rev_map[b] = (line_id, pre_id)
-    idx_rev_map[-1] = idx_rev_map[-2]
     tree = [("<S>", -1, -1, -1, -1, -1)]
-    text_idx_ls = dataset.tokenizer.convert_tokens_to_ids(text.split())
     tree_idx_ls = [
         [dataset.tree_idxs[w], bi, ei, text_span_bi, text_span_ei, fixed_val]
         for w, bi, ei, text_span_bi, text_span_ei, fixed_val in tree
     ]
-    pre_batch = [(text_idx_ls, tree_idx_ls, (text, txt, {}))]
+    pre_batch = []
+    idx_rev_maps = []
+    for txt in txts:
+        text, idx_maps = tokenize_mapidx(txt, tokenizer)
+        idx_rev_map = [(0, 0)] * len(text.split())
+        for line_id, idx_map in enumerate(idx_maps):
+            for pre_id, (a, b) in enumerate(idx_map):
+                idx_rev_map[a] = (line_id, pre_id)
+                idx_rev_map[b] = (line_id, pre_id)
+        idx_rev_map[-1] = idx_rev_map[-2]
+        idx_rev_maps.append(idx_rev_map)
+        text_idx_ls = dataset.tokenizer.convert_tokens_to_ids(text.split())
+        pre_batch.append((text_idx_ls, tree_idx_ls, (text, txt, {})))
     batch = caip_collate(pre_batch, tokenizer)
     batch = [t.to(model_device) for t in batch[:4]]
     x, x_mask, y, y_mask = batch
     x_reps = model.encoder(input_ids=x, attention_mask=x_mask)[0].detach()
-    x_mask = x_mask.expand(beam_size, -1)
-    x_reps = x_reps.expand(beam_size, -1, -1)
+    # the beams of chat n are rows n * beam_size to (n + 1) * beam_size - 1
+    x_mask = x_mask.repeat_interleave(beam_size, dim=0)
+    x_reps = x_reps.repeat_interleave(beam_size, dim=0)
+    y_mask = y_mask.repeat_interleave(beam_size, dim=0)
+    # first row of the beams of each chat
+    row_offsets = torch.arange(0, n_rows, beam_size, device=model_device)[:, None]  # N x 1
     # start decoding
-    y = torch.LongTensor([[dataset.tree_idxs["<S>"]] for _ in range(beam_size)]).to(
+    y = torch.LongTensor([[dataset.tree_idxs["<S>"]] for _ in range(n_rows)]).to(
         model_device
     )  # B x 1
-    beam_scores = torch.Tensor([-1e9 for _ in range(beam_size)]).to(model_device)  # B
-    beam_scores[0] = 0
-    beam_seqs = [[("<S>", -1, -1, -1, -1, -1)] for _ in range(beam_size)]
-    finished = [False for _ in range(beam_size)]
+    beam_scores = torch.Tensor([-1e9 for _ in range(n_rows)]).to(model_device)  # B
+    beam_scores[row_offsets[:, 0]] = 0
+    beam_seqs = [[("<S>", -1, -1, -1, -1, -1)] for _ in range(n_rows)]
+    finished = torch.zeros(n_rows, dtype=torch.bool, device=model_device)  # B
+    eos_id = dataset.tree_idxs["</S>"]
     fixed_value_vocab_size = len(fixed_span_values_voc)
     pad_scores = torch.Tensor([-1e9] * (len(dataset.tree_voc) - fixed_value_vocab_size)).to(
         model_device
     )
     pad_scores[dataset.tree_idxs["[PAD]"]] = 0
+    # spans are invalid if beginning > end (lower triangle of the T x T span scores),
+    # or if they contain padding of the chat
+    x_pad_scores = (1 - x_mask.type_as(x_reps)) * -1e9  # B x T
+    invalid_span_scores = (
+        torch.tril(
+            torch.full((x_reps.shape[1], x_reps.shape[1]), -1e9, device=model_device),
+            diagonal=-1,
+        )[None, :, :]
+        + x_pad_scores[:, :, None]
+        + x_pad_scores[:, None, :]
+    )  # B x T x T
+    # decoder cache: each step only runs the decoder on the last predicted token
+    past_key_values = None
     for i in range(100):
-        outputs = model.decoder.step(y, y_mask, x_reps, x_mask)
+        outputs = model.decoder.step(
+            y, y_mask, x_reps, x_mask, past_key_values=past_key_values, use_cache=True
+        )
         # next word, grab the final token
         lm_scores = outputs["lm_scores"][:, -1, :]  # B x V
-        for i, fshed in enumerate(finished):
-            if fshed:
-                # set predictions to padding tokens
-                lm_scores[i] = pad_scores
+        # set predictions of finished beams to padding tokens
+        lm_scores = torch.where(finished[:, None], pad_scores[None, :], lm_scores)
         beam_lm_scores = lm_scores + beam_scores[:, None]  # B x V
-        beam_lm_lin = beam_lm_scores.view(-1)
-        # get the highest probability tokens
-        s_scores, s_ids = beam_lm_lin.sort(dim=-1, descending=True)
-        s_beam_ids = s_ids // beam_lm_scores.shape[-1]
-        s_word_ids = s_ids % beam_lm_scores.shape[-1]
+        beam_lm_lin = beam_lm_scores.view(n_txts, -1)  # N x beam_size * V
+        # get the highest probability tokens of the beams of each chat
+        beam_scores, s_ids = beam_lm_lin.topk(beam_size)
+        beam_scores = beam_scores.view(-1)
+        n_beam_ids = (row_offsets + s_ids // beam_lm_scores.shape[-1]).view(-1)
+        n_word_ids = (s_ids % beam_lm_scores.shape[-1]).view(-1)
         # re-order and add next token
-        beam_scores = s_scores[:beam_size]
-        n_beam_ids = s_beam_ids[:beam_size]
-        n_word_ids = s_word_ids[:beam_size]
+        past_key_values = model.decoder.reorder_cache(outputs["past_key_values"], n_beam_ids)
         # convert tokens to words
-        n_words = [dataset.tree_voc[nw_id.item()] for nw_id in n_word_ids]
+        n_words = [dataset.tree_voc[nw_id] for nw_id in n_word_ids.tolist()]
         y = torch.cat([y[n_beam_ids], n_word_ids[:, None]], dim=1)
         # find out which of the beams are finished
-        pre_finished = [finished[b_id.item()] for b_id in n_beam_ids]
-        new_finished = [w_id.item() == dataset.tree_idxs["</S>"] for w_id in n_word_ids]
-        finished = [p or n for p, n in zip(pre_finished, new_finished)]
-        n_mask = 1 - torch.Tensor(finished).type_as(y_mask)
+        finished = finished[n_beam_ids] | (n_word_ids == eos_id)
+        n_mask = (~finished).type_as(y_mask)
         y_mask = torch.cat([y_mask[n_beam_ids], n_mask[:, None]], dim=1)
         # predicted span
         span_b_scores = outputs["span_b_scores"][:, -1, :][n_beam_ids]  # B x T
         span_e_scores = outputs["span_e_scores"][:, -1, :][n_beam_ids]  # B x T
         span_be_scores = span_b_scores[:, :, None] + span_e_scores[:, None, :]
-        # scores are invalid if beginning > end
-        # Create triangular matrix with negative infinity for invalid combos
-        invalid_scores = torch.tril(torch.ones(span_be_scores.shape), diagonal=-1) * -1e9
         # Make invalid scores very small
-        span_be_scores += invalid_scores.type_as(span_be_scores)
+        span_be_scores += invalid_span_scores
         # Create linearized view
         span_be_lin = span_be_scores.view(span_be_scores.shape[0], -1)
-        # Sort linearized scores by descending order
-        _, s_sbe_ids = span_be_lin.sort(dim=-1, descending=True)
         # Grab token IDs for top scores
-        s_sb_ids = s_sbe_ids[:, 0] // span_b_scores.shape[-1]
-        s_se_ids = s_sbe_ids[:, 0] % span_b_scores.shape[-1]
-        beam_b_ids = [bb_id.item() for bb_id in s_sb_ids]
-        beam_e_ids = [be_id.item() for be_id in s_se_ids]
+        s_sbe_ids = span_be_lin.argmax(dim=-1)
+        beam_b_ids = (s_sbe_ids // span_b_scores.shape[-1]).tolist()
+        beam_e_ids = (s_sbe_ids % span_b_scores.shape[-1]).tolist()
 
         # predict text spans
         text_span_start_scores = outputs["text_span_start_scores"][:, -1, :][n_beam_ids]  # B x T
         text_span_end_scores = outputs["text_span_end_scores"][:, -1, :][n_beam_ids]  # B x T
         text_span_scores = text_span_start_scores[:, :, None] + text_span_end_scores[:, None, :]
-        invalid_text_span_scores = (
-            torch.tril(torch.ones(text_span_scores.shape), diagonal=-1) * -1e9
-        )
-        text_span_scores += invalid_text_span_scores.type_as(text_span_scores)
+        text_span_scores += invalid_span_scores
         text_span_lin_scores = text_span_scores.view(text_span_scores.shape[0], -1)
-        _, text_span_ids = text_span_lin_scores.sort(dim=-1, descending=True)
-        text_span_start_ids = text_span_ids[:, 0] // text_span_start_scores.shape[-1]
-        text_span_end_ids = text_span_ids[:, 0] % text_span_start_scores.shape[-1]
-        text_span_beam_start_ids = [bb_id.item() for bb_id in text_span_start_ids]
-        text_span_beam_end_ids = [be_id.item() for be_id in text_span_end_ids]
+        text_span_ids = text_span_lin_scores.argmax(dim=-1)
+        text_span_beam_start_ids = (text_span_ids // text_span_start_scores.shape[-1]).tolist()
+        text_span_beam_end_ids = (text_span_ids % text_span_start_scores.shape[-1]).tolist()
 
         # predict fixed values
         fixed_value_scores = outputs["fixed_value_scores"][:, -1, :][n_beam_ids]  # B x T
-        fixed_value_lin_scores = fixed_value_scores.view(-1)
-        # get the highest probability tokens
-        fixed_value_ranked_scores, fixed_value_ids = fixed_value_lin_scores.sort(
-            dim=-1, descending=True
-        )
-        fixed_value_beam_ids = fixed_value_ids // fixed_value_scores.shape[-1]
+        fixed_value_lin_scores = fixed_value_scores.view(n_txts, -1)
+        # get the highest probability tokens of the beams of each chat
+        _, fixed_value_ids = fixed_value_lin_scores.topk(beam_size)
         # map back to which word in sequence, since
-        fixed_value_word_ids = fixed_value_ids % fixed_value_scores.shape[-1]
-        # re-order and add next token
-        fixed_value_beam_scores = fixed_value_ranked_scores[:beam_size]
-        fixed_value_beam_ids = fixed_value_beam_ids[:beam_size]
-        fixed_value_word_ids = fixed_value_word_ids[:beam_size]
+        fixed_value_word_ids = (fixed_value_ids % fixed_value_scores.shape[-1]).view(-1)
         # convert tokens to words
-        fixed_value_words = [fixed_span_values_voc[nw_id.item()] for nw_id in fixed_value_word_ids]
+        fixed_value_words = [
+            fixed_span_values_voc[nw_id] for nw_id in fixed_value_word_ids.tolist()
+        ]
 
         # update beam_seq
         beam_seqs = [
-            beam_seqs[n_beam_ids[i].item()]
+            beam_seqs[b_id]
             + [
                 (
                     n_words[i],
@@ -147,7 +172,7 @@ def beam_search(txt, model, tokenizer, dataset, beam_size=5, well_formed_pen=1e2
                     fixed_value_words[i],
                 )
             ]
-            for i in range(beam_size)
+            for i, b_id in enumerate(n_beam_ids.tolist())
         ]
         # penalize poorly formed trees
         for i, seq in enumerate(beam_seqs):
@@ -156,7 +181,7 @@ def beam_search(txt, model, tokenizer, dataset, beam_size=5, well_formed_pen=1e2
                 if not well_formed:
                     beam_scores[i] -= well_formed_pen
         # check whether all beams have reached EOS
-        if all(finished):
+        if finished.all():
             break
     # only keep span predictions for span nodes, then map back to tree
     beam_seqs = [
@@ -180,13 +205,16 @@ def beam_search(txt, model, tokenizer, dataset, beam_size=5, well_formed_pen=1e2
         for res in beam_seqs
     ]
     # delinearize predicted sequences into tree
-    beam_trees = [seq_to_tree(dataset.full_tree, res[1:-1], idx_rev_map)[0] for res in beam_seqs]
-    pre_res = [
-        (tree, score.item(), seq) for tree, score, seq in zip(beam_trees, beam_scores, beam_seqs)
+    beam_trees = [
+        seq_to_tree(dataset.full_tree, res[1:-1], idx_rev_maps[row // beam_size])[0]
+        for row, res in enumerate(beam_seqs)
     ]
+    pre_res = list(zip(beam_trees, beam_scores.tolist(), beam_seqs))
     # sort one last time to have well-formed trees on top
-    res = sorted(pre_res, key=lambda x: x[1], reverse=True)
-    return res
+    return [
+        sorted(pre_res[row : row + beam_size], key=lambda x: x[1], reverse=True)
+        for row in range(0, n_rows, beam_size)
+    ]
 
 
 def compute_accuracy(outputs, y):
@@ -0,0 +1,118 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import types
+import unittest
+
+import torch
+from transformers import BertConfig, BertModel
+
+from droidlet.perception.semantic_parsing.nsp_transformer_model.decoder_with_loss import (
+    DecoderWithLoss,
+)
+from droidlet.perception.semantic_parsing.nsp_transformer_model.tokenization_utils import (
+    fixed_span_values,
+)
+from droidlet.perception.semantic_parsing.nsp_transformer_model.utils_parsing import (
+    batch_beam_search,
+    beam_search,
+)
+
+SPEC_TOKENS = ["[PAD]", "unused", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "<S>", "</S>"]
+TREE_NODES = [
+    "C:dialogue_type|NOOP",
+    "C:dialogue_type|HUMAN_GIVE_COMMAND",
+    "C:action_type|DANCE",
+    "S:reference_object",
+    "BE:reference_object",
+    "TS:has_name",
+    "TBE:has_name",
+    "FS:fixed_value",
+]
+CHATS = [
+    "dance",
+    "build a big red cube over there",
+    "go to the house",
+    "come here and dance with me",
+]
+
+
+class WordTokenizer:
+    """splits on whitespace, each word of the chats is in the vocabulary"""
+
+    pad_token_id = 0
+
+    def __init__(self, words):
+        self.vocab = {w: i for i, w in enumerate(SPEC_TOKENS + sorted(words))}
+
+    def tokenize(self, text):
+        return text.split()
+
+    def convert_tokens_to_ids(self, tokens):
+        return [self.vocab.get(w, self.vocab["[UNK]"]) for w in tokens]
+
+
+class TestBatchBeamSearch(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tokenizer = WordTokenizer({w for chat in CHATS for w in chat.split()})
+        tree_voc = SPEC_TOKENS + TREE_NODES + list(fixed_span_values)
+        self.dataset = types.SimpleNamespace(
+            tokenizer=self.tokenizer,
+            tree_voc=tree_voc,
+            tree_idxs={w: i for i, w in enumerate(tree_voc)},
+            full_tree={},
+        )
+        encoder_config = BertConfig(
+            vocab_size=len(self.tokenizer.vocab),
+            hidden_size=16,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=32,
+        )
+        decoder_config = BertConfig(
+            vocab_size=len(SPEC_TOKENS + TREE_NODES),
+            hidden_size=16,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=32,
+        )
+        decoder_config.is_decoder = True
+        decoder_config.add_cross_attention = True
+        args = types.SimpleNamespace(
+            num_highway=2, node_label_smoothing=0, lambda_span_loss=0.5, tree_to_text=False
+        )
+        self.model = types.SimpleNamespace(
+            encoder=BertModel(encoder_config).eval(),
+            decoder=DecoderWithLoss(decoder_config, args, self.tokenizer).eval(),
+        )
+        # larger weights than the initialization, and no special tokens but </S>, so that
+        # the beams depend on the chats and have spans
+        with torch.no_grad():
+            for module in (self.model.encoder, self.model.decoder):
+                for p in module.parameters():
+                    if p.dim() > 1:
+                        p.normal_(std=0.3)
+            node_bias = self.model.decoder.lm_head.predictions.bias
+            node_bias[: len(SPEC_TOKENS)] = -1e4
+            node_bias[self.dataset.tree_idxs["</S>"]] = 0
+
+    def test_same_as_single_chats(self):
+        beam_size = 3
+        with torch.no_grad():
+            batched = batch_beam_search(CHATS, self.model, self.tokenizer, self.dataset, beam_size)
+            singles = [
+                beam_search(chat, self.model, self.tokenizer, self.dataset, beam_size)
+                for chat in CHATS
+            ]
+        self.assertEqual(len(batched), len(CHATS))
+        for chat_beams, single_beams in zip(batched, singles):
+            self.assertEqual(len(chat_beams), beam_size)
+            for (tree, score, seq), (s_tree, s_score, s_seq) in zip(chat_beams, single_beams):
+                self.assertEqual(seq, s_seq)
+                self.assertEqual(tree, s_tree)
+                self.assertAlmostEqual(score, s_score, places=4)
+
+
+if __name__ == "__main__":
+    unittest.main()
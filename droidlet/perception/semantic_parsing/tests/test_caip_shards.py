@@ -0,0 +1,133 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import json
+import os
+import pickle
+import tempfile
+import types
+import unittest
+
+from droidlet.perception.semantic_parsing.nsp_transformer_model.caip_dataset import (
+    CAIPDataset,
+    CAIPShard,
+)
+from droidlet.perception.semantic_parsing.nsp_transformer_model.preprocess_caip import preprocess
+from droidlet.perception.semantic_parsing.nsp_transformer_model.utils_caip import make_full_tree
+
+EXAMPLES = [
+    [
+        "build a red cube",
+        {
+            "dialogue_type": "HUMAN_GIVE_COMMAND",
+            "event_sequence": [
+                {
+                    "action_type": "BUILD",
+                    "schematic": {"text_span": [0, [2, 3]], "has_colour": [0, [2, 2]]},
+                }
+            ],
+        },
+    ],
+    ["hello there", {"dialogue_type": "NOOP"}],
+    [
+        "go to the house",
+        {
+            "dialogue_type": "HUMAN_GIVE_COMMAND",
+            "event_sequence": [
+                {"action_type": "MOVE", "location": {"text_span": [0, [3, 3]]}}
+            ],
+        },
+    ],
+]
+
+
+class FakeTokenizer:
+    """Word level tokenizer, with the token ids of a pre-trained tokenizer"""
+
+    name_or_path = "fake"
+    special_tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]"]
+
+    def __init__(self):
+        words = sorted({w for text, _ in EXAMPLES for w in text.split()})
+        self.voc = self.special_tokens + words
+        self.ids = {w: i for i, w in enumerate(self.voc)}
+        self.vocab_size = len(self.voc)
+        self.pad_token_id, self.unk_token_id, self.cls_token_id, self.sep_token_id = range(4)
+
+    def tokenize(self, text):
+        return text.split()
+
+    def convert_tokens_to_ids(self, tokens):
+        return [self.ids[w] for w in tokens]
+
+    def convert_ids_to_tokens(self, ids):
+        return [self.voc[i] for i in ids]
+
+
+class TestCAIPShards(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.args = types.SimpleNamespace(
+            data_dir=os.path.join(self.tmp_dir.name, "data"),
+            shard_dir=os.path.join(self.tmp_dir.name, "shards"),
+            splits="train,valid",
+            dtype_samples={"annotated": 1.0},
+            tree_to_text=False,
+            examples_per_epoch=-1,
+        )
+        for split in ["train", "valid"]:
+            os.makedirs(os.path.join(self.args.data_dir, split))
+            with open(os.path.join(self.args.data_dir, split, "annotated.txt"), "w") as f:
+                for text, tree in EXAMPLES:
+                    f.write("{}|{}\n".format(text, json.dumps(tree)))
+        os.makedirs(self.args.shard_dir)
+        self.tokenizer = FakeTokenizer()
+        self.full_tree_voc = make_full_tree([(EXAMPLES, 1)])
+        preprocess(self.args, self.tokenizer, self.full_tree_voc)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_dataset(self, shard_dir, prefix="train"):
+        args = types.SimpleNamespace(**vars(self.args))
+        args.shard_dir = shard_dir
+        return CAIPDataset(
+            self.tokenizer, args, prefix=prefix, dtype="annotated", full_tree_voc=self.full_tree_voc
+        )
+
+    def test_same_examples(self):
+        for prefix in ["train", "valid"]:
+            dataset = self.make_dataset(self.args.shard_dir, prefix)
+            self.assertIsInstance(dataset.data["annotated"], CAIPShard)
+            txt_dataset = self.make_dataset("", prefix)
+            self.assertIsInstance(txt_dataset.data["annotated"], list)
+            self.assertEqual(len(dataset), len(EXAMPLES))
+            for i in range(len(EXAMPLES)):
+                self.assertEqual(dataset[i], txt_dataset[i])
+
+    def test_workers(self):
+        dataset = self.make_dataset(self.args.shard_dir)
+        expected = dataset[0]
+        # workers open their own memory maps
+        worker_dataset = pickle.loads(pickle.dumps(dataset))
+        self.assertIsNone(worker_dataset.data["annotated"].arrays)
+        self.assertEqual(worker_dataset[0], expected)
+
+    def test_word_noise(self):
+        dataset = self.make_dataset(self.args.shard_dir)
+        dataset.word_noise = 1.0
+        text_idx_ls, _, (text, _, _) = dataset[0]
+        self.assertEqual(text, "[CLS] [UNK] [UNK] [UNK] [UNK] [SEP]")
+        self.assertEqual(text_idx_ls, [2, 1, 1, 1, 1, 3])
+
+    def test_out_of_date(self):
+        with open(os.path.join(self.args.data_dir, "valid", "annotated.txt"), "a") as f:
+            f.write("{}|{}\n".format(EXAMPLES[1][0], json.dumps(EXAMPLES[1][1])))
+        self.assertIsInstance(self.make_dataset(self.args.shard_dir).data["annotated"], CAIPShard)
+        dataset = self.make_dataset(self.args.shard_dir, "valid")
+        self.assertIsInstance(dataset.data["annotated"], list)
+        self.assertEqual(len(dataset), len(EXAMPLES) + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
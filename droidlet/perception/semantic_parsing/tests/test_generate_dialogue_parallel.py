@@ -0,0 +1,78 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import glob
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from droidlet.perception.semantic_parsing.nsp_templated_data_generation.generate_dialogue_parallel import (
+    generate_shards,
+)
+
+
+def read_shards(output_dir):
+    """The dialogues of the shards, as (sentences, action dict) pairs"""
+    dialogues = []
+    for path in sorted(glob.glob(os.path.join(output_dir, "*.txt.gz"))):
+        with gzip.open(path, "rt") as f:
+            for block in f.read().split("\n\n")[:-1]:
+                lines = block.split("\n")
+                dialogues.append((lines[:-1], json.loads(lines[-1])))
+    return dialogues
+
+
+class TestGenerateDialogueParallel(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def generate(self, name, **kwargs):
+        output_dir = os.path.join(self.tmp_dir.name, name)
+        counts = generate_shards(300, output_dir, chunk_size=40, shard_size=120, **kwargs)
+        return counts, output_dir
+
+    def test_shards(self):
+        counts, output_dir = self.generate("shards", num_processes=2)
+        self.assertEqual(counts["kept"], 300)
+        self.assertEqual(counts["missing"], 0)
+        self.assertEqual(len(glob.glob(os.path.join(output_dir, "*.txt.gz"))), 3)
+        dialogues = read_shards(output_dir)
+        self.assertEqual(len(dialogues), 300)
+        # no duplicated commands
+        self.assertEqual(len({" ".join(text) for text, _ in dialogues}), 300)
+
+    def test_reproducible(self):
+        _, output_dir = self.generate("single", num_processes=1)
+        _, parallel_output_dir = self.generate("parallel", num_processes=3)
+        for path in sorted(glob.glob(os.path.join(output_dir, "*.txt.gz"))):
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(os.path.join(parallel_output_dir, os.path.basename(path)), "rb") as f:
+                self.assertEqual(f.read(), data)
+        _, other_seed_output_dir = self.generate("other_seed", num_processes=3, seed=1)
+        self.assertNotEqual(read_shards(output_dir), read_shards(other_seed_output_dir))
+
+    def test_action_type(self):
+        _, output_dir = self.generate("dance", num_processes=2, action_type="dance")
+        for _, action_dict in read_shards(output_dir):
+            action_types = [a["action_type"] for a in action_dict["action_sequence"]]
+            self.assertIn("DANCE", action_types)
+
+    def test_too_few_distinct_commands(self):
+        # the noop templates only make a few distinct commands without a chats file
+        output_dir = os.path.join(self.tmp_dir.name, "noop")
+        counts = generate_shards(
+            300, output_dir, action_type="noop", chunk_size=40, max_stale_chunks=3
+        )
+        self.assertLess(counts["kept"], 300)
+        self.assertEqual(counts["missing"], 300 - counts["kept"])
+        self.assertEqual(len(read_shards(output_dir)), counts["kept"])
+
+
+if __name__ == "__main__":
+    unittest.main()
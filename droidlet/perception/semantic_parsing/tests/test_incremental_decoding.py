@@ -0,0 +1,95 @@
+import types
+import unittest
+
+import torch
+from transformers import BertConfig
+
+from droidlet.perception.semantic_parsing.nsp_transformer_model.decoder_with_loss import (
+    DecoderWithLoss,
+)
+from droidlet.perception.semantic_parsing.nsp_transformer_model.utils_model import quantize_model
+
+
+class TestIncrementalDecoding(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        # 12 layers so that the expert layers are used
+        config = BertConfig(
+            vocab_size=30,
+            hidden_size=16,
+            num_hidden_layers=12,
+            num_attention_heads=2,
+            intermediate_size=32,
+        )
+        config.is_decoder = True
+        config.add_cross_attention = True
+        args = types.SimpleNamespace(
+            num_highway=2, node_label_smoothing=0, lambda_span_loss=0.5, tree_to_text=False
+        )
+        tokenizer = types.SimpleNamespace(pad_token_id=0)
+        self.decoder = DecoderWithLoss(config, args, tokenizer).eval()
+        # like beam search: rows 0 and 1 are beams of the same chat, row 2 of another chat
+        self.x_reps = torch.randn(2, 7, 16)[[0, 0, 1]]
+        self.x_mask = torch.ones(3, 7, dtype=torch.long)
+
+    def test_cached_step(self):
+        y = torch.randint(1, 30, (3, 6))
+        y_mask = torch.ones(3, 6, dtype=torch.long)
+        # finished beam
+        y_mask[1, 4:] = 0
+        # beams are only selected among the beams of the same chat
+        beam_ids = [torch.tensor([0, 0, 2]), torch.tensor([1, 0, 2])]
+        with torch.no_grad():
+            past_key_values = None
+            for length in range(1, 7):
+                outputs = self.decoder.step(
+                    y[:, :length],
+                    y_mask[:, :length],
+                    self.x_reps,
+                    self.x_mask,
+                    past_key_values=past_key_values,
+                    use_cache=True,
+                )
+                full_outputs = self.decoder.step(
+                    y[:, :length], y_mask[:, :length], self.x_reps, self.x_mask
+                )
+                for k, v in full_outputs.items():
+                    self.assertEqual(outputs[k].shape[1], 1)
+                    self.assertTrue(torch.allclose(outputs[k][:, -1], v[:, -1], atol=1e-5))
+                past_key_values = outputs["past_key_values"]
+                if length <= len(beam_ids):
+                    # beam selection: reorder the previous tokens along with the cache
+                    b_ids = beam_ids[length - 1]
+                    past_key_values = self.decoder.reorder_cache(past_key_values, b_ids)
+                    y[:, :length] = y[b_ids, :length]
+
+    def test_quantized_step(self):
+        decoder = quantize_model(self.decoder)
+        self.assertIsInstance(self.decoder.lm_head.predictions.decoder, torch.nn.Linear)
+        self.assertNotIsInstance(decoder.lm_head.predictions.decoder, torch.nn.Linear)
+        y = torch.randint(1, 30, (3, 4))
+        y_mask = torch.ones(3, 4, dtype=torch.long)
+        with torch.no_grad():
+            outputs = decoder.step(
+                y[:, :3], y_mask[:, :3], self.x_reps, self.x_mask, use_cache=True
+            )
+            outputs = decoder.step(
+                y,
+                y_mask,
+                self.x_reps,
+                self.x_mask,
+                past_key_values=outputs["past_key_values"],
+                use_cache=True,
+            )
+            full_outputs = self.decoder.step(y, y_mask, self.x_reps, self.x_mask)
+        self.assertEqual(outputs["lm_scores"].shape, (3, 1, 30))
+        # int8 weights: close to the fp32 probabilities
+        self.assertTrue(
+            torch.allclose(
+                outputs["lm_scores"][:, -1].exp(), full_outputs["lm_scores"][:, -1].exp(), atol=0.1
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
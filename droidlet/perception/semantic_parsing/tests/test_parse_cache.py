@@ -0,0 +1,65 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import unittest
+from droidlet.perception.semantic_parsing.nsp_querier import NSPQuerier
+from droidlet.shared_data_structs import MockOpt
+
+
+class FakeParsingModel:
+    def __init__(self, model_version="v1"):
+        self.model_version = model_version
+        self.queries = []
+
+    def query_for_logical_forms(self, chats):
+        self.queries.append(list(chats))
+        return [
+            {"dialogue_type": "HUMAN_GIVE_COMMAND", "event_sequence": [{"action_type": "DANCE"}]}
+            for _ in chats
+        ]
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        opts = MockOpt()
+        opts.nsp_parse_cache_size = 2
+        # no models dir, the parsing model is set by the tests
+        self.chat_parser = NSPQuerier(opts=opts)
+        self.chat_parser.ground_truth_actions = {"stop": {"dialogue_type": "NOOP"}}
+        self.model = FakeParsingModel()
+        self.chat_parser.parsing_model = self.model
+
+    def test_batched_query(self):
+        logical_forms = self.chat_parser.get_logical_forms(
+            ["dance", "stop", "spin", "dance"], self.model
+        )
+        # one query for the chats not in the ground truth, without duplicates
+        self.assertEqual(self.model.queries, [["dance", "spin"]])
+        self.assertEqual(logical_forms[1], {"dialogue_type": "NOOP"})
+        self.assertEqual(logical_forms[0], logical_forms[3])
+        self.assertIsNot(logical_forms[0], logical_forms[3])
+
+    def test_cache(self):
+        self.chat_parser.get_logical_forms(["dance", "spin"], self.model)
+        logical_form = self.chat_parser.get_logical_form("dance", self.model)
+        self.assertEqual(len(self.model.queries), 1)
+        # the cached parse is not modified through the returned logical forms
+        logical_form["dialogue_type"] = "NOOP"
+        self.assertEqual(
+            self.chat_parser.get_logical_form("dance", self.model)["dialogue_type"],
+            "HUMAN_GIVE_COMMAND",
+        )
+        # "spin" is the least recently used parse
+        self.chat_parser.get_logical_form("jump", self.model)
+        self.chat_parser.get_logical_forms(["dance", "spin"], self.model)
+        self.assertEqual(self.model.queries, [["dance", "spin"], ["jump"], ["spin"]])
+
+    def test_model_version(self):
+        self.chat_parser.get_logical_form("dance", self.model)
+        new_model = FakeParsingModel("v2")
+        self.chat_parser.get_logical_form("dance", new_model)
+        self.assertEqual(new_model.queries, [["dance"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
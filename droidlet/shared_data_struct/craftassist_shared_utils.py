@@ -6,6 +6,7 @@ from collections import namedtuple
 from droidlet.base_util import adjacent, get_bounds, manhat_dist
 from droidlet.lowlevel.minecraft.craftassist_cuberite_utils.block_data import PASSABLE_BLOCKS
 from droidlet.shared_data_structs import PriorityQueue
+from droidlet.shared_data_struct.voxel_search import DStarLite
 
 # mainHand is the item in the player or agent's hand, that will be placed by a place block action
 # it is defined in lowlevel/minecraft/client/src/types.h as Item, and has fields id, meta
@@ -30,8 +31,9 @@ CraftAssistPerceptionData = namedtuple(
         "in_perceive_area",
         "near_agent",
         "labeled_blocks",
+        "block_object_updates",
     ],
-    defaults=[None, [], {}, None, [], {}, {}, {}, {}],
+    defaults=[None, [], {}, None, [], {}, {}, {}, {}, []],
 )
 
 MOBS_BY_ID = {
@@ -112,13 +114,15 @@ def _astar(X, start, goal, approx=0):
 
     Returns: a list of relative positions, from start to goal
     """
-    start = tuple(start)
-    goal = tuple(goal)
+    start = tuple(int(s) for s in start)
+    goal = tuple(int(g) for g in goal)
 
     visited = set()
     came_from = {}
+    # priorities are (f, -g): among nodes with equal f, expand the one closest
+    # to the goal first, so on open terrain only nodes along the path are expanded
     q = PriorityQueue()
-    q.push(start, manhat_dist(start, goal))
+    q.push(start, (manhat_dist(start, goal), 0))
     G = np.full_like(X, np.iinfo(np.uint32).max, "uint32")
     G[start] = 0
 
@@ -146,20 +150,117 @@ def _astar(X, start, goal, approx=0):
             ):
                 continue
 
-            g = G[p] + 1
+            g = int(G[p]) + 1
             if g >= G[a]:
                 continue
             came_from[a] = p
             G[a] = g
             f = g + manhat_dist(a, goal)
             if q.contains(a):
-                q.replace(a, f)
+                q.replace(a, (f, -g))
             else:
-                q.push(a, f)
+                q.push(a, (f, -g))
 
     return None
 
 
+class VoxelPathPlanner:
+    """Plans paths to a fixed target from a start that moves, e.g. for a Move task.
+
+    The blocks around the start and target are fetched once (the same region astar
+    uses) and kept; replanning after the agent moves or a few blocks change reuses
+    the previous search (see DStarLite) instead of running astar on a new region.
+
+    Args:
+    - agent: the Agent object
+    - target: an absolute (x, y, z)
+    - approx: proximity to target before search is complete (0 = exact)
+    - pos: (optional) plans from specified tuple instead of the agent's pos
+    """
+
+    def __init__(self, agent, target, approx=0, pos="agent"):
+        if type(pos) is str and pos == "agent":
+            pos = agent.pos
+        corners = np.array([pos, target]).astype("int32")
+        mx, my, mz = corners.min(axis=0) - 10
+        Mx, My, Mz = corners.max(axis=0) + 10
+        my, My = max(my, 0), min(My, 255)
+        self.origin = np.array([mx, my, mz])
+        blocks = agent.get_blocks(mx, Mx, my, My, mz, Mz)
+        # yzx, like blocks
+        self.blocked = np.isin(blocks[:, :, :, 0], PASSABLE_BLOCKS, invert=True)
+        obstacles = self.blocked[:-1, :, :] | self.blocked[1:, :, :]  # check head and feet
+        start, goal = (corners - self.origin)[:, [1, 2, 0]]
+        self.search = DStarLite(obstacles, start, goal, approx)
+
+    def _to_yzx(self, xyz):
+        x, y, z = np.asarray(xyz).astype("int64") - self.origin
+        return int(y), int(z), int(x)
+
+    def contains(self, pos):
+        """True if a path can be planned from pos, i.e. it is inside the fetched region"""
+        p = self._to_yzx(pos)
+        return all(0 <= a < n for a, n in zip(p, self.search.shape))
+
+    def update_blocks(self, blocks):
+        """Records changed blocks, given as a list of ((x, y, z), (id, meta)).
+        Returns the changes to the obstacles, to be passed to plan()"""
+        changed = {}
+        for xyz, idm in blocks:
+            y, z, x = self._to_yzx(xyz)
+            if not all(0 <= a < n for a, n in zip((y, z, x), self.blocked.shape)):
+                continue
+            self.blocked[y, z, x] = idm[0] not in PASSABLE_BLOCKS
+            # the block is the head of the cell below and the feet of its own cell
+            for cy in (y - 1, y):
+                if 0 <= cy < self.search.shape[0]:
+                    changed[(cy, z, x)] = self.blocked[cy, z, x] or self.blocked[cy + 1, z, x]
+        return changed
+
+    def refresh(self, agent, pos, radius=2):
+        """Fetches the blocks within radius of pos again from the agent, and records the
+        ones that changed.  Returns the changes to the obstacles, to be passed to plan()"""
+        x, y, z = (int(a) for a in pos)
+        my, My = max(y - radius, 0), min(y + radius, 255)
+        blocks = agent.get_blocks(x - radius, x + radius, my, My, z - radius, z + radius)
+        blocked = np.isin(blocks[:, :, :, 0], PASSABLE_BLOCKS, invert=True)
+        # overlap of the refetched cube with the kept region, in yzx
+        lo = np.array(self._to_yzx((x - radius, my, z - radius)))
+        a = np.maximum(lo, 0)
+        b = np.minimum(lo + blocked.shape, self.blocked.shape)
+        if (b <= a).any():
+            return {}
+        new = blocked[tuple(slice(i - l, j - l) for i, j, l in zip(a, b, lo))]
+        old = self.blocked[tuple(slice(i, j) for i, j in zip(a, b))]
+        changes = []
+        for p in np.argwhere(new != old) + a - lo:
+            dy, dz, dx = p
+            xyz = (x - radius + dx, my + dy, z - radius + dz)
+            changes.append((xyz, tuple(blocks[dy, dz, dx])))
+        return self.update_blocks(changes)
+
+    def plan(self, pos, changed=None):
+        """Find a path from pos to the target.
+
+        Args:
+        - pos: the start, an absolute (x, y, z) inside the fetched region
+        - changed: changes to the obstacles since the last plan, as returned by
+          update_blocks or refresh
+
+        Returns: a list of (x, y, z) positions in the same order as astar, or None
+        """
+        t_start = time.time()
+        path = self.search.replan(self._to_yzx(pos), changed)
+        if path is not None:
+            mx, my, mz = self.origin
+            path = [(p[2] + mx, p[0] + my, p[1] + mz) for p in reversed(path)]
+        t_elapsed = time.time() - t_start
+        logging.debug(
+            "D* Lite returned {}-len path in {}".format(len(path) if path else "None", t_elapsed)
+        )
+        return path
+
+
 def arrange(arrangement, schematic=None, shapeparams={}):
     """This function arranges an Optional schematic in a given arrangement
     and returns the offsets"""
@@ -8,3 +8,7 @@ RobotPerceptionData = namedtuple(
     ["new_objects", "updated_objects", "humans", "obstacle_map", "self_pose"],
     defaults=[None, None, None, [], None],
 )
+# obstacle cells that changed in the slam map after a given version; added and removed
+# are (N, 2) arrays of (x, z) in canonical coords.  if full is True, added are all the
+# obstacles and removed is empty, see LoCoBotMover.get_obstacle_changes_in_canonical_coords
+ObstacleMapChanges = namedtuple("ObstacleMapChanges", ["version", "full", "added", "removed"])
@@ -0,0 +1,167 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+Times path planning for long Move targets on random obstacle fields: the
+previous A* (list based priority queue with a linear scan + heapify on
+decrease-key, kept here as the reference), the current _astar, and DStarLite.
+For replanning, the start walks along the path while a few cells change near
+it, and each replan is timed for DStarLite against a fresh _astar.
+
+    python -m droidlet.shared_data_struct.tests.benchmarks.benchmark_astar
+"""
+
+import argparse
+import heapq
+import time
+
+import numpy as np
+
+from droidlet.base_util import adjacent, manhat_dist
+from droidlet.shared_data_struct.craftassist_shared_utils import _astar
+from droidlet.shared_data_struct.voxel_search import DStarLite
+
+
+class ReferencePriorityQueue:
+    def __init__(self):
+        self.q = []
+        self.set = set()
+
+    def push(self, x, prio):
+        heapq.heappush(self.q, (prio, x))
+        self.set.add(x)
+
+    def pop(self):
+        prio, x = heapq.heappop(self.q)
+        self.set.remove(x)
+        return prio, x
+
+    def contains(self, x):
+        return x in self.set
+
+    def replace(self, x, newp):
+        for i in range(len(self.q)):
+            oldp, y = self.q[i]
+            if x == y:
+                self.q[i] = (newp, x)
+                heapq.heapify(self.q)
+                return
+        raise ValueError("Not found: {}".format(x))
+
+    def __len__(self):
+        return len(self.q)
+
+
+def reference_astar(X, start, goal, approx=0):
+    """the _astar this benchmark compares against"""
+    start = tuple(int(s) for s in start)
+    goal = tuple(int(g) for g in goal)
+    visited = set()
+    came_from = {}
+    q = ReferencePriorityQueue()
+    q.push(start, manhat_dist(start, goal))
+    G = np.full_like(X, np.iinfo(np.uint32).max, "uint32")
+    G[start] = 0
+    while len(q) > 0:
+        _, p = q.pop()
+        if manhat_dist(p, goal) <= approx:
+            path = []
+            while p in came_from:
+                path.append(p)
+                p = came_from[p]
+            return [start] + list(reversed(path))
+        visited.add(p)
+        for a in adjacent(p):
+            if a in visited or any(c < 0 or c >= n for c, n in zip(a, X.shape)) or X[a]:
+                continue
+            g = int(G[p]) + 1
+            if g >= G[a]:
+                continue
+            came_from[a] = p
+            G[a] = g
+            f = g + manhat_dist(a, goal)
+            if q.contains(a):
+                q.replace(a, f)
+            else:
+                q.push(a, f)
+    return None
+
+
+def random_field(rng, length, density, margin=10):
+    """
+    a (y, z, x) obstacle field for a Move target length blocks away along x and z,
+    padded by margin like the region astar fetches, with the start and goal cleared
+    """
+    side = length // 2 + 2 * margin
+    X = rng.rand(2 * margin + 8, side, side) < density
+    start = (margin, margin, margin)
+    goal = (margin + 4, side - margin - 1, side - margin - 1)
+    X[start] = False
+    X[goal] = False
+    return X, start, goal
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return time.perf_counter() - start, out
+
+
+def run(num_fields, length, density, num_replans, changes_per_replan, seed=0):
+    rng = np.random.RandomState(seed)
+    times = {k: [] for k in ["astar_reference", "astar", "dstar", "replan_astar", "replan_dstar"]}
+    mismatches = 0
+    for i in range(num_fields):
+        X, start, goal = random_field(rng, length, density)
+        t, ref = timed(reference_astar, X, start, goal)
+        times["astar_reference"].append(t)
+        t, path = timed(_astar, X, start, goal)
+        times["astar"].append(t)
+        search = DStarLite(X.copy(), start, goal)
+        t, dpath = timed(search.replan)
+        times["dstar"].append(t)
+        if ref is None or path is None:
+            mismatches += (ref is None) != (path is None) or (dpath is None) != (ref is None)
+            continue
+        mismatches += len(ref) != len(path) or len(ref) != len(dpath)
+        for j in range(num_replans):
+            # walk a few steps, then toggle cells near the new start
+            start = dpath[min(3, len(dpath) - 1)]
+            changed = {}
+            for k in range(changes_per_replan):
+                c = tuple(np.clip(np.add(start, rng.randint(-3, 4, 3)), 0, np.array(X.shape) - 1))
+                if c != start and c != goal:
+                    changed[c] = rng.rand() < 0.5
+            for c, v in changed.items():
+                X[c] = v
+            t, path = timed(_astar, X, start, goal)
+            times["replan_astar"].append(t)
+            t, dpath = timed(search.replan, start, changed)
+            times["replan_dstar"].append(t)
+            if path is None or dpath is None:
+                mismatches += (path is None) != (dpath is None)
+                break
+            mismatches += len(path) != len(dpath)
+    return {k: np.array(v) for k, v in times.items()}, mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_fields", type=int, default=10)
+    parser.add_argument("--length", type=int, default=80, help="manhattan distance to the target")
+    parser.add_argument("--density", type=float, default=0.25, help="fraction of obstacle cells")
+    parser.add_argument("--num_replans", type=int, default=10)
+    parser.add_argument("--changes_per_replan", type=int, default=3)
+    args = parser.parse_args()
+
+    times, mismatches = run(
+        args.num_fields, args.length, args.density, args.num_replans, args.changes_per_replan
+    )
+    for name, t in times.items():
+        if len(t) == 0:
+            continue
+        print(
+            "{:>16}: mean {:.2f} ms, p90 {:.2f} ms".format(
+                name, 1000 * t.mean(), 1000 * np.percentile(t, 90)
+            )
+        )
+    print("plans whose length differs from _astar: {}".format(mismatches))
@@ -0,0 +1,110 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+
+import unittest
+import numpy as np
+from droidlet.base_util import manhat_dist
+from droidlet.shared_data_structs import PriorityQueue
+from droidlet.shared_data_struct.craftassist_shared_utils import _astar, VoxelPathPlanner
+from droidlet.shared_data_struct.voxel_search import DStarLite
+
+
+class FakeBlocksAgent:
+    """serves get_blocks from an (x, y, z) array of block ids; everything outside it is air"""
+
+    def __init__(self, ids, pos):
+        self.ids = ids
+        self.pos = pos
+
+    def get_blocks(self, x, X, y, Y, z, Z):
+        out = np.zeros((Y - y + 1, Z - z + 1, X - x + 1, 2), dtype="int32")
+        for i in range(x, X + 1):
+            for j in range(y, Y + 1):
+                for k in range(z, Z + 1):
+                    if all(0 <= a < n for a, n in zip((i, j, k), self.ids.shape)):
+                        out[j - y, k - z, i - x, 0] = self.ids[i, j, k]
+        return out
+
+
+def assert_valid_path(X, path, start, goal, approx):
+    assert path[0] == tuple(start)
+    assert manhat_dist(path[-1], goal) <= approx
+    for p, q in zip(path[:-1], path[1:]):
+        assert manhat_dist(p, q) == 1 and not X[q]
+
+
+class PriorityQueueTest(unittest.TestCase):
+    def test_replace_and_remove(self):
+        q = PriorityQueue()
+        for i, x in enumerate("abcde"):
+            q.push(x, 10 - i)
+        q.replace("a", 0)
+        q.remove("b")
+        q.push("c", 20)
+        with self.assertRaises(ValueError):
+            q.remove("b")
+        assert len(q) == 4 and not q.contains("b")
+        assert q.peek() == (0, "a")
+        assert [q.pop()[1] for _ in range(len(q))] == ["a", "e", "d", "c"]
+
+
+class DStarLiteTest(unittest.TestCase):
+    def test_matches_astar(self):
+        rng = np.random.RandomState(0)
+        for _ in range(40):
+            X = rng.rand(10, 10, 10) < 0.3
+            start = tuple(rng.randint(0, 10, 3))
+            goal = tuple(rng.randint(0, 10, 3))
+            approx = rng.randint(0, 2)
+            X[start] = False
+            search = DStarLite(X.copy(), start, goal, approx)
+            path = search.replan()
+            for _ in range(5):
+                expected = _astar(X, start, goal, approx)
+                if expected is None:
+                    assert path is None
+                else:
+                    assert len(path) == len(expected)
+                    assert_valid_path(X, path, start, goal, approx)
+                    start = path[min(2, len(path) - 1)]
+                # change a few cells, not including the new start
+                changed = {tuple(rng.randint(0, 10, 3)): rng.rand() < 0.5 for _ in range(4)}
+                changed.pop(start, None)
+                for p, v in changed.items():
+                    X[p] = v
+                path = search.replan(start, changed)
+
+
+class VoxelPathPlannerTest(unittest.TestCase):
+    def test_replan_after_blocks_change(self):
+        ids = np.zeros((40, 20, 40), dtype="int32")
+        ids[:, 0:3, :] = 2
+        agent = FakeBlocksAgent(ids, (5, 3, 5))
+        target = (30, 3, 25)
+        planner = VoxelPathPlanner(agent, target)
+        path = planner.plan(agent.pos)
+        # same order as astar: target first, agent's pos last
+        assert path[0] == target and path[-1] == agent.pos
+        assert len(path) == manhat_dist(agent.pos, target) + 1
+        # wall off the x = 10 plane next to the agent, leaving a gap at z = 30
+        ids[10, 3:, :] = 1
+        ids[10, 3:, 30] = 0
+        agent.pos = (8, 3, 5)
+        changed = planner.update_blocks(
+            [((10, y, z), (1, 0)) for y in range(3, 20) for z in range(40) if z != 30]
+        )
+        path = planner.plan(agent.pos, changed)
+        assert (10, 3, 30) in path
+        assert (
+            len(path) == manhat_dist(agent.pos, (10, 3, 30)) + manhat_dist((10, 3, 30), target) + 1
+        )
+        # refresh picks up a block dug out of the wall near the agent
+        ids[10, 3:5, 6] = 0
+        agent.pos = (9, 3, 6)
+        path = planner.plan(agent.pos, planner.refresh(agent, agent.pos))
+        assert len(path) == manhat_dist(agent.pos, target) + 1
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+"""
+import math
+
+from droidlet.shared_data_structs import PriorityQueue
+
+INF = math.inf
+
+
+def grid_neighbors(shape, p):
+    """the 6-connected neighbors of p inside a 3d grid of the given shape"""
+    x, y, z = p
+    out = []
+    if x > 0:
+        out.append((x - 1, y, z))
+    if x < shape[0] - 1:
+        out.append((x + 1, y, z))
+    if y > 0:
+        out.append((x, y - 1, z))
+    if y < shape[1] - 1:
+        out.append((x, y + 1, z))
+    if z > 0:
+        out.append((x, y, z - 1))
+    if z < shape[2] - 1:
+        out.append((x, y, z + 1))
+    return out
+
+
+class DStarLite:
+    """Incremental shortest paths through a 3d grid of obstacles with unit
+    6-connected moves (D* Lite, Koenig and Likhachev 2002).
+
+    The search runs backwards from the goal, so when the start moves and/or a
+    few cells change, replan() only repairs the part of the previous search
+    affected by the changes instead of searching again from scratch.
+
+    Args:
+    - X: a 3d array of obstacles, i.e. False -> passable, True -> not passable.
+      It is not copied, and set_obstacles() writes to it
+    - start/goal: positions in X
+    - approx: every passable position within this manhattan distance of
+      goal is a goal (0 = exact)
+    """
+
+    def __init__(self, X, start, goal, approx=0):
+        self.X = X
+        self.shape = X.shape
+        self.start = tuple(int(s) for s in start)
+        self.last_start = self.start
+        self.km = 0
+        self.g = {}
+        self.rhs = {}
+        self.q = PriorityQueue()
+        # number of vertices expanded so far
+        self.expanded = 0
+        goal = tuple(int(g) for g in goal)
+        self.goals = set()
+        for x in range(max(goal[0] - approx, 0), min(goal[0] + approx + 1, self.shape[0])):
+            for y in range(max(goal[1] - approx, 0), min(goal[1] + approx + 1, self.shape[1])):
+                for z in range(max(goal[2] - approx, 0), min(goal[2] + approx + 1, self.shape[2])):
+                    s = (x, y, z)
+                    if abs(s[0] - goal[0]) + abs(s[1] - goal[1]) + abs(s[2] - goal[2]) <= approx:
+                        self.goals.add(s)
+        for s in self.goals:
+            if not X[s]:
+                self.rhs[s] = 0
+                self.q.push(s, self._key(s))
+
+    def _key(self, s):
+        g = self.g.get(s, INF)
+        rhs = self.rhs.get(s, INF)
+        start = self.start
+        h = abs(s[0] - start[0]) + abs(s[1] - start[1]) + abs(s[2] - start[2])
+        if g < rhs:
+            # underconsistent vertices go first among ties, smallest g first as
+            # in the paper, so no vertex is finalized from a stale neighbor
+            return (g + h + self.km, 0, g)
+        # among overconsistent ties, expand the one closest to the start first,
+        # so on open terrain only vertices along the path are expanded
+        return (rhs + h + self.km, 1, -rhs)
+
+    def _update_vertex(self, u):
+        X = self.X
+        g = self.g
+        if u in self.goals and not X[u]:
+            rhs = 0
+        else:
+            rhs = INF
+            for n in grid_neighbors(self.shape, u):
+                if not X[n]:
+                    rhs = min(rhs, g.get(n, INF) + 1)
+        self.rhs[u] = rhs
+        if self.q.contains(u):
+            self.q.remove(u)
+        if g.get(u, INF) != rhs:
+            self.q.push(u, self._key(u))
+
+    def compute_shortest_path(self):
+        """Expand vertices until the distance from start is known.  Returns it, or INF if there is no path"""
+        q = self.q
+        g = self.g
+        rhs = self.rhs
+        start = self.start
+        while len(q) > 0:
+            k_old, u = q.peek()
+            if not (k_old < self._key(start) or rhs.get(start, INF) != g.get(start, INF)):
+                break
+            q.pop()
+            self.expanded += 1
+            k_new = self._key(u)
+            g_u = g.get(u, INF)
+            rhs_u = rhs.get(u, INF)
+            if k_old < k_new:
+                q.push(u, k_new)
+            elif g_u > rhs_u:
+                g[u] = rhs_u
+                # an obstacle can be left (the agent may start inside one)
+                # but not entered, so its neighbors never depend on it
+                if not self.X[u]:
+                    for s in grid_neighbors(self.shape, u):
+                        self._update_vertex(s)
+            else:
+                g[u] = INF
+                self._update_vertex(u)
+                if not self.X[u]:
+                    for s in grid_neighbors(self.shape, u):
+                        self._update_vertex(s)
+        return g.get(start, INF)
+
+    def move_start(self, start):
+        """Set a new start; the previous search stays valid"""
+        start = tuple(int(s) for s in start)
+        last = self.last_start
+        self.km += abs(start[0] - last[0]) + abs(start[1] - last[1]) + abs(start[2] - last[2])
+        self.last_start = start
+        self.start = start
+
+    def set_obstacles(self, changed):
+        """Update X from a dict of {position: is_obstacle}"""
+        dirty = set()
+        for p, is_obstacle in changed.items():
+            p = tuple(int(a) for a in p)
+            if bool(self.X[p]) != bool(is_obstacle):
+                self.X[p] = is_obstacle
+                dirty.add(p)
+                dirty.update(grid_neighbors(self.shape, p))
+        for p in dirty:
+            self._update_vertex(p)
+
+    def get_path(self):
+        """Returns a shortest path as a list of positions from start to a goal, or None"""
+        p = self.start
+        if p in self.goals:
+            return [p]
+        if self.g.get(p, INF) == INF:
+            return None
+        path = [p]
+        while p not in self.goals:
+            best = None
+            best_g = INF
+            for n in grid_neighbors(self.shape, p):
+                if not self.X[n] and self.g.get(n, INF) < best_g:
+                    best = n
+                    best_g = self.g[n]
+            if best is None or len(path) > self.X.size:
+                return None
+            p = best
+            path.append(p)
+        return path
+
+    def replan(self, start=None, changed=None):
+        """Move the start and/or update obstacles (see set_obstacles), and
+        return a shortest path from start, reusing the previous search"""
+        if start is not None:
+            self.move_start(start)
+        if changed:
+            self.set_obstacles(changed)
+        self.compute_shortest_path()
+        return self.get_path()
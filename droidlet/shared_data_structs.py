@@ -41,17 +41,27 @@ class RGBDepth:
         rgb (np.array): RGB image fetched from the robot
         depth (np.array): depth map fetched from the robot
         pts (np.array [(x,y,z)]): array of x,y,z coordinates of the pointcloud corresponding
-        to the rgb and depth maps.
+        to the rgb and depth maps.  can also be a function returning it, which is only
+        called the first time ptcloud is used
     """
 
     rgb: np.array
     depth: np.array
-    ptcloud: np.array
 
     def __init__(self, rgb, depth, pts):
         self.rgb = rgb
         self.depth = depth
-        self.ptcloud = pts.reshape(rgb.shape)
+        self.ptcloud = pts
+
+    @property
+    def ptcloud(self):
+        if callable(self._ptcloud):
+            self._ptcloud = self._ptcloud().reshape(self.rgb.shape)
+        return self._ptcloud
+
+    @ptcloud.setter
+    def ptcloud(self, pts):
+        self._ptcloud = pts if callable(pts) else pts.reshape(self.rgb.shape)
 
     def get_pillow_image(self):
         from PIL import Image
@@ -129,33 +139,63 @@ class MockOpt:
 
 
 class PriorityQueue:
+    """
+    min-priority queue of hashable items with O(log n) push, pop, replace and remove.
+    each item is in the queue at most once; replace and remove leave the old heap entry
+    in place and mark it removed (lazy deletion), and pop skips removed entries.
+    ties in priority are broken by insertion order.
+    """
+
+    REMOVED = object()
+
     def __init__(self):
         self.q = []
-        self.set = set()
+        # item --> its live heap entry [prio, count, item]
+        self.entries = {}
+        self.count = 0
 
     def push(self, x, prio):
-        heapq.heappush(self.q, (prio, x))
-        self.set.add(x)
+        if x in self.entries:
+            self._invalidate(x)
+        entry = [prio, self.count, x]
+        self.count += 1
+        self.entries[x] = entry
+        heapq.heappush(self.q, entry)
 
     def pop(self):
-        prio, x = heapq.heappop(self.q)
-        self.set.remove(x)
+        self._drop_removed()
+        prio, _, x = heapq.heappop(self.q)
+        del self.entries[x]
+        return prio, x
+
+    def peek(self):
+        """returns the (prio, item) pop would return, without removing it"""
+        self._drop_removed()
+        prio, _, x = self.q[0]
         return prio, x
 
     def contains(self, x):
-        return x in self.set
+        return x in self.entries
 
     def replace(self, x, newp):
-        for i in range(len(self.q)):
-            oldp, y = self.q[i]
-            if x == y:
-                self.q[i] = (newp, x)
-                heapq.heapify(self.q)  # TODO: probably slow
-                return
-        raise ValueError("Not found: {}".format(x))
+        if x not in self.entries:
+            raise ValueError("Not found: {}".format(x))
+        self.push(x, newp)
+
+    def remove(self, x):
+        if x not in self.entries:
+            raise ValueError("Not found: {}".format(x))
+        self._invalidate(x)
+
+    def _invalidate(self, x):
+        self.entries.pop(x)[2] = self.REMOVED
+
+    def _drop_removed(self):
+        while self.q and self.q[0][2] is self.REMOVED:
+            heapq.heappop(self.q)
 
     def __len__(self):
-        return len(self.q)
+        return len(self.entries)
 
 
 TICKS_PER_SEC = 100
@@ -122,10 +122,10 @@ class Task(object):
                     {"prio": -2, "finished": True}
                 )
                 return
-            query = "SELECT MEMORY FROM Task WHERE ((prio>=1) AND (_has_parent_task=#={}))".format(
-                self.memid
+            query = "SELECT MEMORY FROM Task WHERE ((prio>=1) AND (_has_parent_task=#=:parent))"
+            _, child_task_mems = self.agent.memory.basic_search(
+                query, params={"parent": self.memid}
             )
-            _, child_task_mems = self.agent.memory.basic_search(query)
             if child_task_mems:  # this task has active children, step them
                 return
             r = stepfn(self)
@@ -241,10 +241,8 @@ class ControlBlock(Task):
             for task_mem in self_mem.all_descendent_tasks(include_root=True):
                 task_mem.get_update_status({"finished": True})
             return
-        query = "SELECT MEMORY FROM Task WHERE ((prio>=1) AND (_has_parent_task=#={}))".format(
-            self.memid
-        )
-        _, child_task_mems = self.agent.memory.basic_search(query)
+        query = "SELECT MEMORY FROM Task WHERE ((prio>=1) AND (_has_parent_task=#=:parent))"
+        _, child_task_mems = self.agent.memory.basic_search(query, params={"parent": self.memid})
         if (
             child_task_mems
         ):  # this task has active children, don't step self, let agent step children
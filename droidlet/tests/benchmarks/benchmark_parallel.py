@@ -0,0 +1,106 @@
+"""
+Copyright (c) Facebook, Inc. and its affiliates.
+
+Measures the round trips per second of droidlet.parallel tasks on rgb-d sized frames:
+    transport: a BackgroundTask that only sums each frame, with the frames pickled
+        through the queue (shm_slots=0, as before shared memory) and through shared memory
+    pool: a BackgroundTaskPool with a model that takes --work_ms per frame, for 1 and
+        --num_workers workers, keeping up to 2 frames per worker in flight
+
+    python -m droidlet.tests.benchmarks.benchmark_parallel
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from droidlet.parallel import BackgroundTask, BackgroundTaskPool
+
+
+def frame_init():
+    return None
+
+
+def frame_sum(state, rgb, depth):
+    return int(rgb[::8, ::8].sum()), float(depth[::8, ::8].sum())
+
+
+def frame_model(state, rgb, depth, work_ms):
+    start = time.perf_counter()
+    while time.perf_counter() - start < work_ms / 1000:
+        pass
+    return frame_sum(state, rgb, depth)
+
+
+def fake_frame(rng, height, width):
+    rgb = rng.randint(0, 256, size=(height, width, 3), dtype=np.uint8)
+    depth = rng.uniform(0.5, 5.0, size=(height, width)).astype(np.float32)
+    return rgb, depth
+
+
+def run_transport(frames, num_frames, shm_slots):
+    task = BackgroundTask(frame_init, (), frame_sum, shm_slots=shm_slots)
+    task.start()
+    try:
+        task.put(*frames[0])
+        task.get(timeout=120)  # warm up
+        times = []
+        for i in range(num_frames):
+            start = time.perf_counter()
+            task.put(*frames[i % len(frames)])
+            task.get(timeout=60)
+            times.append(time.perf_counter() - start)
+    finally:
+        task.stop()
+        task.join()
+    return np.array(times)
+
+
+def run_pool(frames, num_frames, num_workers, work_ms):
+    pool = BackgroundTaskPool(frame_init, (), frame_model, num_workers=num_workers)
+    pool.start()
+    try:
+        for _ in range(num_workers):
+            pool.put(*frames[0], work_ms)
+        for _ in range(num_workers):
+            pool.get(timeout=120)  # warm up
+        start = time.perf_counter()
+        for i in range(num_frames):
+            if i >= pool.max_pending:
+                pool.get(timeout=60)
+            pool.put(*frames[i % len(frames)], work_ms)
+        for _ in range(min(num_frames, pool.max_pending)):
+            pool.get(timeout=60)
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.stop()
+        pool.join()
+    return elapsed / num_frames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--num_frames", type=int, default=100)
+    parser.add_argument("--num_workers", type=int, default=4)
+    parser.add_argument("--work_ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    frames = [fake_frame(rng, args.height, args.width) for _ in range(4)]
+    for name, shm_slots in [("pickle", 0), ("shm", 4)]:
+        t = run_transport(frames, args.num_frames, shm_slots)
+        print(
+            "transport {:>6}: {:7.1f} round trips/s (mean {:.2f} ms, p90 {:.2f} ms)".format(
+                name, 1 / t.mean(), 1000 * t.mean(), 1000 * np.percentile(t, 90)
+            )
+        )
+    for num_workers in sorted({1, args.num_workers}):
+        t = run_pool(frames, args.num_frames, num_workers, args.work_ms)
+        print(
+            "pool {:>2} workers: {:7.1f} frames/s ({:.2f} ms per frame)".format(
+                num_workers, 1 / t, 1000 * t
+            )
+        )
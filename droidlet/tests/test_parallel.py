@@ -1,4 +1,15 @@
-from droidlet.parallel import BackgroundTask
+import queue
+import time
+
+import numpy as np
+
+from droidlet.parallel import (
+    BackgroundTask,
+    BackgroundTaskPool,
+    Pipeline,
+    PipelineStage,
+    SharedArrayRing,
+)
 
 
 class Foo:
@@ -33,6 +44,174 @@ class TestBackgroundtask(unittest.TestCase):
         foo.forward()
 
 
+class TestPipeline(unittest.TestCase):
+    def make_stage(self, name, fn, delay=0.0, **kwargs):
+        # init_args are pickled, unlike the functions
+        def init_fn():
+            return fn
+
+        def process_fn(f, batch):
+            time.sleep(delay)
+            return [f(x, len(batch)) for (x,) in batch]
+
+        return PipelineStage(name, init_fn, (), process_fn, **kwargs)
+
+    def test_join(self):
+        pipeline = Pipeline(
+            [
+                self.make_stage("double", lambda x, n: 2 * x),
+                self.make_stage("square", lambda x, n: x * x),
+            ]
+        )
+        pipeline.start()
+        try:
+            for x in [3, 4]:
+                frame_id = pipeline.put(x)
+                frames = pipeline.get(frame_id=frame_id, timeout=60)
+                self.assertEqual(frames[-1][0], frame_id)
+                self.assertEqual(frames[-1][1], (x,))
+                self.assertEqual(frames[-1][2], {"double": 2 * x, "square": x * x})
+        finally:
+            pipeline.stop()
+
+    def test_slow_stage(self):
+        pipeline = Pipeline(
+            [
+                self.make_stage("fast", lambda x, n: x),
+                self.make_stage("slow", lambda x, n: x, delay=1.0),
+            ],
+            join_timeout=0.1,
+        )
+        pipeline.start()
+        try:
+            # wait for both stages to be up
+            pipeline.get(frame_id=pipeline.put(0), timeout=60)
+            outputs = {"fast": [], "slow": []}
+            for x in range(1, 11):
+                pipeline.put(x)
+                time.sleep(0.05)
+                for _, _, frame_outputs in pipeline.get():
+                    for name, output in frame_outputs.items():
+                        outputs[name].append(output)
+            for _, _, frame_outputs in pipeline.get(frame_id=pipeline.put(11), timeout=60):
+                for name, output in frame_outputs.items():
+                    outputs[name].append(output)
+            # the slow stage skipped most frames without holding back the fast one
+            self.assertEqual(outputs["fast"], list(range(1, 12)))
+            self.assertLess(len(outputs["slow"]), 5)
+            self.assertEqual(outputs["slow"][-1], 11)
+            stats = pipeline.get_stats()
+            self.assertGreater(stats["slow"]["dropped"], 0)
+            self.assertEqual(stats["fast"]["dropped"], 0)
+        finally:
+            pipeline.stop()
+
+    def test_batch(self):
+        # the stage is still starting when the frames are put, so it gets them at once
+        pipeline = Pipeline([self.make_stage("batch", lambda x, n: n, batch_size=4)])
+        pipeline.start()
+        try:
+            for x in range(3):
+                pipeline.put(x)
+            frames = pipeline.get(frame_id=pipeline.put(3), timeout=60)
+            self.assertEqual([f[2]["batch"] for f in frames], [4, 4, 4, 4])
+        finally:
+            pipeline.stop()
+
+
+def _pool_init():
+    return {}
+
+
+def _pool_square(state, x):
+    # later puts finish first
+    time.sleep(0.05 * (x % 3))
+    return x * x
+
+
+def _pool_sum(state, arr, offset):
+    # the arrays are writable copies
+    arr += offset
+    return arr.sum(), arr.shape, arr.dtype
+
+
+class TestSharedArrayRing(unittest.TestCase):
+    def test_round_trip(self):
+        ring = SharedArrayRing(slots=1)
+        try:
+            arr = np.arange(200000, dtype=np.float32).reshape(400, 500)
+            message = ring.dumps((arr, np.zeros(3), "a"))
+            self.assertIsNotNone(message[0])
+            # no free slot: pickled as usual
+            self.assertIsNone(ring.dumps((arr,))[0])
+            out, small, name = ring.loads(message)
+            np.testing.assert_array_equal(out, arr)
+            self.assertTrue(out.flags.writeable)
+            self.assertEqual(name, "a")
+            # loads freed the slot
+            self.assertEqual(ring.loads(ring.dumps((arr,)))[0][1, 2], arr[1, 2])
+        finally:
+            ring.close()
+
+
+class TestBackgroundTaskPool(unittest.TestCase):
+    def test_ordered(self):
+        pool = BackgroundTaskPool(_pool_init, (), _pool_square, num_workers=3, max_pending=10)
+        pool.start()
+        try:
+            for x in range(10):
+                pool.put(x)
+            self.assertEqual([pool.get(timeout=60) for _ in range(10)], [x * x for x in range(10)])
+        finally:
+            pool.stop()
+            pool.join()
+
+    def test_unordered(self):
+        pool = BackgroundTaskPool(
+            _pool_init, (), _pool_square, num_workers=3, ordered=False, max_pending=10
+        )
+        pool.start()
+        try:
+            for x in range(10):
+                pool.put(x)
+            results = [pool.get(timeout=60) for _ in range(10)]
+            self.assertEqual(sorted(results), [x * x for x in range(10)])
+            with self.assertRaises(queue.Empty):
+                pool.get_nowait()
+        finally:
+            pool.stop()
+            pool.join()
+
+    def test_backpressure(self):
+        pool = BackgroundTaskPool(_pool_init, (), _pool_square, num_workers=1, max_pending=1)
+        pool.start()
+        try:
+            with self.assertRaises(queue.Full):
+                for x in range(3):
+                    pool.put(x, block=False)
+        finally:
+            pool.stop()
+            pool.join()
+
+    def test_shared_memory(self):
+        pool = BackgroundTaskPool(_pool_init, (), _pool_sum, num_workers=2)
+        pool.start()
+        try:
+            arr = np.ones((480, 640, 3), dtype=np.uint8)
+            for offset in range(4):
+                pool.put(arr, offset)
+            for offset in range(4):
+                self.assertEqual(
+                    pool.get(timeout=60), (arr.size * (1 + offset), arr.shape, arr.dtype)
+                )
+            self.assertIsNotNone(pool._ring.name)
+            # the parent's array was not modified
+            self.assertEqual(arr.max(), 1)
+        finally:
+            pool.stop()
+            pool.join()
+
+
 if __name__ == "__main__":
     foo = Foo()
     foo.forward()
@@ -3,7 +3,7 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 import io
-from typing import Dict, Generator, List, Tuple
+from typing import Dict, Generator, List, Tuple, Union
 import time
 import tempfile
 import threading
@@ -14,6 +14,8 @@ import grpc  # This requires `conda install grpcio protobuf`
 import torch
 
 import polymetis
+from polymetis.robot_state_log import RobotStateLog, RobotStateLogWriter
+from polymetis.robot_state_subscription import RobotStateSubscription
 from polymetis_pb2 import LogInterval, RobotState, ControllerChunk, Empty
 from polymetis_pb2_grpc import PolymetisControllerServerStub
 
@@ -63,10 +65,17 @@ class BaseRobotInterface:
     Args:
         ip_address: IP address of the gRPC-based controller manager server.
         port: Port to connect to on the IP address.
+        subscribe: If True, subscribes to the stream of robot states, see `subscribe_robot_state`.
+        state_buffer_size: Number of robot states kept by the subscription.
     """
 
     def __init__(
-        self, ip_address: str = "localhost", port: int = 50051, enforce_version=True
+        self,
+        ip_address: str = "localhost",
+        port: int = 50051,
+        enforce_version=True,
+        subscribe: bool = False,
+        state_buffer_size: int = 10000,
     ):
         # Create connection
         self.channel = grpc.insecure_channel(f"{ip_address}:{port}")
@@ -83,10 +92,54 @@ class BaseRobotInterface:
                 client_ver == server_ver
             ), "Version mismatch between client & server detected! Set enforce_version=False to bypass this error."
 
+        self.state_subscription = None
+        if subscribe:
+            self.subscribe_robot_state(state_buffer_size)
+
     def __del__(self):
         # Close connection in destructor
+        self.unsubscribe_robot_state()
         self.channel.close()
 
+    def subscribe_robot_state(
+        self, buffer_size: int = 10000, timeout: float = None
+    ) -> RobotStateSubscription:
+        """Subscribes to the stream of robot states of the server.
+        The robot state getters then read the latest streamed state instead of
+        doing an RPC each, and policy logs are taken from the states received
+        instead of being downloaded again.
+
+        Args:
+            buffer_size: Number of robot states kept.
+            timeout: Amount of time (in seconds) to wait for the first state before throwing a TimeoutError.
+
+        Returns:
+            The RobotStateSubscription.
+        """
+        self.unsubscribe_robot_state()
+        subscription = RobotStateSubscription(
+            self.grpc_connection, self.metadata.dof, buffer_size=buffer_size
+        )
+        if not subscription.wait_for_state(0, timeout=timeout):
+            subscription.close()
+            raise TimeoutError("No robot state received from the stream.")
+        self.state_subscription = subscription
+        return subscription
+
+    def unsubscribe_robot_state(self):
+        """Cancels the subscription to the stream of robot states, if any."""
+        subscription = getattr(self, "state_subscription", None)
+        if subscription is not None:
+            subscription.close()
+            self.state_subscription = None
+
+    def _active_subscription(self) -> RobotStateSubscription:
+        """Returns the state subscription if it is receiving states, else None."""
+        subscription = self.state_subscription
+        if subscription is not None and subscription.is_active():
+            return subscription
+        return None
+
     @staticmethod
     def _get_msg_generator(scripted_module) -> Generator:
         """Given a scripted module, return a generator of its serialized bits
@@ -110,18 +163,41 @@ class BaseRobotInterface:
         return msg_generator
 
     def _get_robot_state_log(
-        self, log_interval: LogInterval, timeout: float = None
-    ) -> List[RobotState]:
+        self,
+        log_interval: LogInterval,
+        timeout: float = None,
+        as_arrays: bool = False,
+        log_path: str = None,
+    ) -> Union[List[RobotState], RobotStateLog]:
         """A private helper method to get the states corresponding to a log_interval from the server.
 
         Args:
             log_interval: a message holding start and end indices for a trajectory of RobotStates.
             timeout: Amount of time (in seconds) to wait before throwing a TimeoutError.
+            as_arrays: If True, the states are converted to a RobotStateLog of numpy arrays as they are received.
+            log_path: If given, the states are written to a RobotStateLog in this directory as they are received, see RobotStateLogWriter.
 
         Returns:
-            If successful, returns a list of RobotState objects.
+            If successful, returns a list of RobotState objects, or a RobotStateLog if `as_arrays` or `log_path`.
 
         """
+        writer = None
+        if as_arrays or log_path is not None:
+            writer = RobotStateLogWriter(self.metadata.dof, path=log_path)
+
+        subscription = self._active_subscription()
+        if subscription is not None:
+            # Take the states from the stream if it has all of them
+            start_time = time.time()
+            results = subscription.get_log(log_interval, timeout=timeout)
+            if results is not None:
+                if writer is None:
+                    return results
+                writer.extend(results)
+                return writer.close()
+            if timeout is not None:
+                timeout = timeout - (time.time() - start_time)
+
         robot_state_generator = self.grpc_connection.GetRobotStateLog(log_interval)
 
         def cancel_rpc():
@@ -136,7 +212,10 @@ class BaseRobotInterface:
         def read_stream():
             try:
                 for state in robot_state_generator:
-                    results.append(state)
+                    if writer is None:
+                        results.append(state)
+                    else:
+                        writer.append(state)
             except grpc.RpcError as e:
                 log.error(f"Unable to read stream of robot states: {e}")
 
@@ -148,46 +227,66 @@ class BaseRobotInterface:
             raise TimeoutError("Operation timed out.")
         else:
             atexit.unregister(cancel_rpc)
-            return results
+            return results if writer is None else writer.close()
 
     def get_robot_state(self) -> RobotState:
         """Returns the latest RobotState."""
+        subscription = self._active_subscription()
+        if subscription is not None:
+            return subscription.get_latest_state()
         return self.grpc_connection.GetRobotState(EMPTY)
 
+    def _get_robot_state_field(self, name: str) -> torch.Tensor:
+        """Returns a field of the latest RobotState as a tensor."""
+        subscription = self._active_subscription()
+        if subscription is not None:
+            return subscription.get_latest(name)
+        return torch.Tensor(getattr(self.get_robot_state(), name))
+
     def get_previous_interval(self, timeout: float = None) -> LogInterval:
         """Get the log indices associated with the currently running policy."""
         log_interval = self.grpc_connection.GetEpisodeInterval(EMPTY)
         assert log_interval.start != -1, "Cannot find previous episode."
         return log_interval
 
-    def get_previous_log(self, timeout: float = None) -> List[RobotState]:
+    def get_previous_log(
+        self, timeout: float = None, as_arrays: bool = False, log_path: str = None
+    ) -> Union[List[RobotState], RobotStateLog]:
         """Get the list of RobotStates associated with the currently running policy.
 
         Args:
             timeout: Amount of time (in seconds) to wait before throwing a TimeoutError.
+            as_arrays: If True, returns the states as a RobotStateLog of numpy arrays.
+            log_path: If given, writes the states to a RobotStateLog in this directory.
 
         Returns:
-            If successful, returns a list of RobotState objects.
+            If successful, returns a list of RobotState objects, or a RobotStateLog if `as_arrays` or `log_path`.
 
         """
         log_interval = self.get_previous_interval(timeout)
-        return self._get_robot_state_log(log_interval, timeout=timeout)
+        return self._get_robot_state_log(
+            log_interval, timeout=timeout, as_arrays=as_arrays, log_path=log_path
+        )
 
     def send_torch_policy(
         self,
         torch_policy: toco.PolicyModule,
         blocking: bool = True,
         timeout: float = None,
-    ) -> List[RobotState]:
+        as_arrays: bool = False,
+        log_path: str = None,
+    ) -> Union[List[RobotState], RobotStateLog]:
         """Sends the ScriptableTorchPolicy to the server.
 
         Args:
             torch_policy: An instance of ScriptableTorchPolicy to control the robot.
             blocking: If True, blocks until the policy is finished executing, then returns the list of RobotStates.
             timeout: Amount of time (in seconds) to wait before throwing a TimeoutError.
+            as_arrays: If True, returns the states as a RobotStateLog of numpy arrays.
+            log_path: If given, writes the states to a RobotStateLog in this directory.
 
         Returns:
-            If `blocking`, returns a list of RobotState objects. Otherwise, returns None.
+            If `blocking`, returns a list of RobotState objects, or a RobotStateLog if `as_arrays` or `log_path`. Otherwise, returns None.
 
         """
         start_time = time.time()
@@ -215,7 +314,9 @@ class BaseRobotInterface:
             if timeout is not None:
                 time_passed = time.time() - start_time
                 timeout = timeout - time_passed
-            return self._get_robot_state_log(log_interval, timeout=timeout)
+            return self._get_robot_state_log(
+                log_interval, timeout=timeout, as_arrays=as_arrays, log_path=log_path
+            )
 
     def update_current_policy(self, param_dict: Dict[str, torch.Tensor]) -> int:
         """Updates the current policy's with a (possibly incomplete) dictionary holding the updated values.
@@ -241,16 +342,22 @@ class BaseRobotInterface:
         return update_interval.start - episode_interval.start
 
     def terminate_current_policy(
-        self, return_log: bool = True, timeout: float = None
-    ) -> List[RobotState]:
+        self,
+        return_log: bool = True,
+        timeout: float = None,
+        as_arrays: bool = False,
+        log_path: str = None,
+    ) -> Union[List[RobotState], RobotStateLog]:
         """Terminates the currently running policy and (optionally) return its trajectory.
 
         Args:
             return_log: whether or not to block & return the policy's trajectory.
             timeout: Amount of time (in seconds) to wait before throwing a TimeoutError.
+            as_arrays: If True, returns the states as a RobotStateLog of numpy arrays.
+            log_path: If given, writes the states to a RobotStateLog in this directory.
 
         Returns:
-            If `return_log`, returns the list of RobotStates the list of RobotStates corresponding to the current policy's execution.
+            If `return_log`, returns the list of RobotStates the list of RobotStates corresponding to the current policy's execution, or a RobotStateLog if `as_arrays` or `log_path`.
 
         """
         # Send termination
@@ -258,7 +365,9 @@ class BaseRobotInterface:
 
         # Query episode log
         if return_log:
-            return self._get_robot_state_log(log_interval, timeout=timeout)
+            return self._get_robot_state_log(
+                log_interval, timeout=timeout, as_arrays=as_arrays, log_path=log_path
+            )
 
 
 class RobotInterface(BaseRobotInterface):
@@ -334,10 +443,10 @@ class RobotInterface(BaseRobotInterface):
     """
 
     def get_joint_positions(self) -> torch.Tensor:
-        return torch.Tensor(self.get_robot_state().joint_positions)
+        return self._get_robot_state_field("joint_positions")
 
     def get_joint_velocities(self) -> torch.Tensor:
-        return torch.Tensor(self.get_robot_state().joint_velocities)
+        return self._get_robot_state_field("joint_velocities")
 
     """
     End-effector computation methods
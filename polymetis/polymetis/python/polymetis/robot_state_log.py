@@ -0,0 +1,232 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import os
+import struct
+from typing import Dict, Iterable
+
+import numpy as np
+
+from polymetis_pb2 import RobotState
+
+# RobotState fields with one value per joint
+JOINT_FIELDS = [
+    "joint_positions",
+    "joint_velocities",
+    "joint_torques_computed",
+    "prev_joint_torques_computed",
+    "prev_joint_torques_computed_safened",
+    "motor_torques_measured",
+    "motor_torques_external",
+    "motor_torques_desired",
+]
+
+# RobotState fields with a single value, and their dtypes
+SCALAR_FIELDS = {
+    "prev_controller_latency_ms": np.float32,
+    "prev_command_successful": np.bool_,
+    "error_code": np.int32,
+}
+
+# Size of the .npy headers written by RobotStateLogWriter, so they can be
+# rewritten in place as the files grow
+NPY_HEADER_SIZE = 128
+
+
+def timestamp_ns(robot_state: RobotState) -> int:
+    """Returns the timestamp of a RobotState in nanoseconds."""
+    return robot_state.timestamp.seconds * 1_000_000_000 + robot_state.timestamp.nanos
+
+
+def column_specs(num_dofs: int) -> Dict[str, tuple]:
+    """Returns {column name: (dtype, shape of a row)} of the columns of a log:
+    `timestamp_ns` and the RobotState fields."""
+    specs = {"timestamp_ns": (np.dtype(np.int64), ())}
+    for name in JOINT_FIELDS:
+        specs[name] = (np.dtype(np.float32), (num_dofs,))
+    for name, dtype in SCALAR_FIELDS.items():
+        specs[name] = (np.dtype(dtype), ())
+    return specs
+
+
+def allocate_columns(num_rows: int, num_dofs: int) -> Dict[str, np.ndarray]:
+    """Returns preallocated columns for num_rows states."""
+    return {
+        name: np.zeros((num_rows,) + shape, dtype=dtype)
+        for name, (dtype, shape) in column_specs(num_dofs).items()
+    }
+
+
+def write_robot_state(
+    columns: Dict[str, np.ndarray], i: int, robot_state: RobotState
+) -> None:
+    """Writes a RobotState to row i of columns.  Joint fields that the state
+    leaves empty are NaN."""
+    columns["timestamp_ns"][i] = timestamp_ns(robot_state)
+    for name in JOINT_FIELDS:
+        values = getattr(robot_state, name)
+        row = columns[name][i]
+        n = min(len(values), len(row))
+        row[:n] = values[:n]
+        row[n:] = np.nan
+    for name in SCALAR_FIELDS:
+        columns[name][i] = getattr(robot_state, name)
+
+
+def _npy_header(dtype: np.dtype, shape: tuple) -> bytes:
+    """A version 1.0 .npy header of NPY_HEADER_SIZE bytes."""
+    header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+        np.lib.format.dtype_to_descr(dtype),
+        tuple(shape),
+    )
+    # magic string, version and header length take 10 bytes
+    header = header.ljust(NPY_HEADER_SIZE - 11) + "\n"
+    return (
+        np.lib.format.magic(1, 0)
+        + struct.pack("<H", len(header))
+        + header.encode("latin1")
+    )
+
+
+class RobotStateLog:
+    """A log of RobotStates stored as columns: one numpy array per RobotState field,
+    plus `timestamp_ns`, with one row per state.  Columns are accessed as
+    `log["joint_positions"]` or `log.joint_positions`.
+
+    Args:
+        columns: the columns, by name.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.columns["timestamp_ns"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        columns = self.__dict__.get("columns", {})
+        if name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    def keys(self):
+        return self.columns.keys()
+
+    @classmethod
+    def from_states(cls, robot_states: Iterable[RobotState], num_dofs: int):
+        """Converts a list of RobotStates."""
+        writer = RobotStateLogWriter(num_dofs)
+        writer.extend(robot_states)
+        return writer.close()
+
+    def save(self, path: str):
+        """Saves the columns as .npy files in directory path."""
+        os.makedirs(path, exist_ok=True)
+        for name, column in self.columns.items():
+            np.save(os.path.join(path, f"{name}.npy"), column)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = "r"):
+        """Loads a log saved by `save` or written by a RobotStateLogWriter.
+        By default the columns are memory-mapped, not read."""
+        columns = {}
+        for filename in sorted(os.listdir(path)):
+            if not filename.endswith(".npy"):
+                continue
+            filename = os.path.join(path, filename)
+            try:
+                column = np.load(filename, mmap_mode=mmap_mode)
+            except ValueError:
+                # Empty columns can't be memory-mapped
+                column = np.load(filename)
+            columns[os.path.basename(filename)[: -len(".npy")]] = column
+        return cls(columns)
+
+
+class RobotStateLogWriter:
+    """Converts RobotStates to the columns of a RobotStateLog as they come.
+
+    States are copied to preallocated chunks of `chunk_size` rows.  If path is
+    given, each full chunk is appended to one .npy file per column in directory
+    path, whose header is updated at every chunk: the files can be loaded with
+    `RobotStateLog.load` while the log is being written, and only one chunk of
+    states is kept in memory.  Otherwise the chunks are kept in memory.
+
+    Args:
+        num_dofs: number of joints of the robot.
+        path: directory to write the columns to.
+        chunk_size: number of states per chunk.
+    """
+
+    def __init__(self, num_dofs: int, path: str = None, chunk_size: int = 1000):
+        self.num_dofs = num_dofs
+        self.path = path
+        self.chunk_size = chunk_size
+        self.specs = column_specs(num_dofs)
+        self.chunk = allocate_columns(chunk_size, num_dofs)
+        # Number of states in the chunk, and written before it
+        self.chunk_len = 0
+        self.written_len = 0
+
+        if path is None:
+            self.chunks = {name: [] for name in self.specs}
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.files = {}
+            for name, (dtype, shape) in self.specs.items():
+                f = open(os.path.join(path, f"{name}.npy"), "w+b")
+                f.write(_npy_header(dtype, (0,) + shape))
+                self.files[name] = f
+
+    def __len__(self) -> int:
+        return self.written_len + self.chunk_len
+
+    def append(self, robot_state: RobotState):
+        write_robot_state(self.chunk, self.chunk_len, robot_state)
+        self.chunk_len += 1
+        if self.chunk_len == self.chunk_size:
+            self.flush()
+
+    def extend(self, robot_states: Iterable[RobotState]):
+        for robot_state in robot_states:
+            self.append(robot_state)
+
+    def flush(self):
+        """Writes the states of the current chunk."""
+        if self.chunk_len == 0:
+            return
+        length = self.written_len + self.chunk_len
+        for name, (dtype, shape) in self.specs.items():
+            data = self.chunk[name][: self.chunk_len]
+            if self.path is None:
+                self.chunks[name].append(data.copy())
+            else:
+                f = self.files[name]
+                f.seek(0, os.SEEK_END)
+                f.write(data.tobytes())
+                f.seek(0)
+                f.write(_npy_header(dtype, (length,) + shape))
+                f.flush()
+        self.written_len = length
+        self.chunk_len = 0
+
+    def close(self) -> RobotStateLog:
+        """Writes the remaining states and returns the log, memory-mapped if it
+        was written to path."""
+        self.flush()
+        if self.path is not None:
+            for f in self.files.values():
+                f.close()
+            return RobotStateLog.load(self.path)
+        columns = {}
+        for name, (dtype, shape) in self.specs.items():
+            chunks = self.chunks[name]
+            if chunks:
+                columns[name] = np.concatenate(chunks)
+            else:
+                columns[name] = np.zeros((0,) + shape, dtype=dtype)
+        return RobotStateLog(columns)
@@ -0,0 +1,228 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import threading
+import logging
+from typing import List, Optional
+
+import grpc
+import numpy as np
+import torch
+
+from polymetis.robot_state_log import (
+    RobotStateLog,
+    RobotStateLogWriter,
+    allocate_columns,
+    timestamp_ns,
+    write_robot_state,
+)
+from polymetis_pb2 import LogInterval, RobotState, Empty
+
+log = logging.getLogger(__name__)
+
+
+# Grpc empty object
+EMPTY = Empty()
+
+
+class RobotStateSubscription:
+    """Keeps the latest RobotStates of a server, received through a single
+    `GetRobotStateStream` RPC, so reading the robot state does not need an RPC.
+
+    A background thread writes each state to a ring buffer of preallocated numpy
+    arrays, one per RobotState field, holding the latest `buffer_size` states.
+    It is the only writer: it fills the slot of a state before counting it, and
+    readers copy a slot and check that it was not overwritten meanwhile, so reads
+    take no lock.  Joint fields that a state leaves empty are NaN.
+
+    Args:
+        grpc_connection: the PolymetisControllerServerStub to subscribe to.
+        num_dofs: number of joints of the robot.
+        buffer_size: number of states kept.
+    """
+
+    def __init__(self, grpc_connection, num_dofs: int, buffer_size: int = 10000):
+        self.grpc_connection = grpc_connection
+        self.num_dofs = num_dofs
+        self.buffer_size = buffer_size
+
+        # Preallocated ring buffer, state number i is in slot i % buffer_size
+        self.arrays = allocate_columns(buffer_size, num_dofs)
+        self.timestamps = self.arrays["timestamp_ns"]
+        self.messages: List[Optional[RobotState]] = [None] * buffer_size
+        # Number of states received, only written by the stream thread
+        self.count = 0
+
+        self._new_state = threading.Condition()
+        self._closed = False
+        # RobotStateLogWriter the streamed states are also written to
+        self._recorder = None
+        self._recorder_lock = threading.Lock()
+        self.error = None
+        self._stream = self.grpc_connection.GetRobotStateStream(EMPTY)
+        self._thread = threading.Thread(target=self._read_stream, daemon=True)
+        self._thread.start()
+
+    def _write(self, robot_state: RobotState):
+        i = self.count % self.buffer_size
+        write_robot_state(self.arrays, i, robot_state)
+        self.messages[i] = robot_state
+
+        # Publish the state once its slot is written
+        self.count += 1
+
+    def _read_stream(self):
+        try:
+            for robot_state in self._stream:
+                self._write(robot_state)
+                if self._recorder is not None:
+                    with self._recorder_lock:
+                        if self._recorder is not None:
+                            self._recorder.append(robot_state)
+                with self._new_state:
+                    self._new_state.notify_all()
+        except grpc.RpcError as e:
+            if not self._closed:
+                log.error(f"Robot state stream interrupted: {e}")
+                self.error = e
+        finally:
+            with self._new_state:
+                self._new_state.notify_all()
+
+    def is_active(self) -> bool:
+        """Whether the stream is running and has received a state."""
+        return self.count > 0 and self._thread.is_alive()
+
+    def close(self):
+        """Cancels the stream."""
+        self._closed = True
+        self._stream.cancel()
+        self._thread.join()
+
+    def record(self, path: str = None, chunk_size: int = 1000) -> RobotStateLogWriter:
+        """Starts writing the streamed states to a RobotStateLogWriter, e.g. to log a
+        long session to disk without keeping its states in memory.  Returns the
+        writer, whose `len` is the number of states written so far.
+
+        Args:
+            path: directory to write the columns to, see RobotStateLogWriter.
+            chunk_size: number of states written at once.
+        """
+        writer = RobotStateLogWriter(self.num_dofs, path=path, chunk_size=chunk_size)
+        with self._recorder_lock:
+            if self._recorder is not None:
+                raise RuntimeError("Already recording robot states.")
+            self._recorder = writer
+        return writer
+
+    def stop_recording(self) -> RobotStateLog:
+        """Stops writing the streamed states and returns the RobotStateLog."""
+        with self._recorder_lock:
+            writer, self._recorder = self._recorder, None
+        if writer is None:
+            raise RuntimeError("Not recording robot states.")
+        return writer.close()
+
+    def wait_for_state(self, count: int = None, timeout: float = None) -> bool:
+        """Blocks until more than `count` states were received (by default, until
+        the next state).  Returns False on timeout or if the stream stopped."""
+        if count is None:
+            count = self.count
+        with self._new_state:
+            return self._new_state.wait_for(
+                lambda: self.count > count or not self._thread.is_alive(),
+                timeout=timeout,
+            ) and (self.count > count)
+
+    def _read(self, read_fn, num_states: int = 1):
+        """Calls read_fn(count) with the count of received states, until none of the
+        latest num_states states it read were overwritten while it ran."""
+        while True:
+            count = self.count
+            if count == 0:
+                raise RuntimeError("No robot state received yet.")
+            result = read_fn(count)
+            # The stream thread may be writing the slot of state number self.count,
+            # so it must not be the slot of the oldest state read
+            if self.count - count + num_states < self.buffer_size:
+                return result
+
+    def get_latest(self, name: str) -> torch.Tensor:
+        """Returns a copy of field `name` of the latest state."""
+        array = self.arrays[name]
+        return torch.as_tensor(
+            self._read(lambda count: array[(count - 1) % self.buffer_size].copy())
+        )
+
+    def get_recent(self, name: str, num_states: int) -> torch.Tensor:
+        """Returns field `name` of the latest `num_states` states (at most
+        buffer_size - 1, and as many as were received), oldest first."""
+        num_states = min(num_states, self.buffer_size - 1)
+        array = self.arrays[name]
+
+        def read_fn(count):
+            idx = np.arange(max(count - num_states, 0), count) % self.buffer_size
+            return array[idx]
+
+        return torch.from_numpy(self._read(read_fn, num_states))
+
+    def get_latest_state(self) -> RobotState:
+        """Returns the latest RobotState."""
+        return self._read(lambda count: self.messages[(count - 1) % self.buffer_size])
+
+    def _fetch_state(self, index: int) -> Optional[RobotState]:
+        """Gets the state at `index` in the server log."""
+        for robot_state in self.grpc_connection.GetRobotStateLog(
+            LogInterval(start=index, end=index)
+        ):
+            return robot_state
+        return None
+
+    def _find(self, robot_state: RobotState) -> Optional[int]:
+        """Returns the number of a received state, found by its timestamp, or None if
+        it is not in the buffer."""
+        count = self.count
+        slots = np.flatnonzero(self.timestamps == timestamp_ns(robot_state))
+        for slot in slots:
+            i = count - 1 - (count - 1 - slot) % self.buffer_size
+            if i >= 0:
+                return int(i)
+        return None
+
+    def get_log(
+        self, log_interval: LogInterval, timeout: float = None
+    ) -> Optional[List[RobotState]]:
+        """Returns the states of a server log interval from the buffer, without
+        downloading them: the first and last states of the interval are fetched to
+        line the server log up with the received states.  Returns None if the
+        buffer does not hold the whole interval, or the stream skipped states of it.
+
+        Args:
+            log_interval: start and end indices of the states in the server log.
+            timeout: Amount of time (in seconds) to wait for the last states to be received.
+        """
+        num_states = log_interval.end - log_interval.start + 1
+        if log_interval.start < 0 or num_states <= 0 or num_states >= self.buffer_size:
+            return None
+        first = self._fetch_state(log_interval.start)
+        last = self._fetch_state(log_interval.end)
+        if first is None or last is None:
+            return None
+        start = self._find(first)
+        if start is None:
+            return None
+
+        end = start + num_states - 1
+        if not self.wait_for_state(end, timeout=timeout):
+            return None
+        if self.count - start >= self.buffer_size:
+            return None
+        states = [self.messages[i % self.buffer_size] for i in range(start, end + 1)]
+        if self.count - start >= self.buffer_size:
+            # Overwritten while it was read
+            return None
+        if timestamp_ns(states[-1]) != timestamp_ns(last):
+            # The stream skipped states
+            return None
+        return states
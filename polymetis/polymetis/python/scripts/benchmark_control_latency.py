@@ -10,18 +10,14 @@ import numpy as np
 from polymetis import RobotInterface
 
 
-def output_episode_stats(episode_name, robot_states):
-    latency_arr = np.array(
-        [robot_state.prev_controller_latency_ms for robot_state in robot_states]
-    )
+def output_episode_stats(episode_name, robot_state_log):
+    latency_arr = robot_state_log.prev_controller_latency_ms
     latency_mean = np.mean(latency_arr)
     latency_std = np.std(latency_arr)
     latency_max = np.max(latency_arr)
     latency_min = np.min(latency_arr)
 
-    success_arr = np.array(
-        [robot_state.prev_command_successful for robot_state in robot_states]
-    )
+    success_arr = robot_state_log.prev_command_successful
     success_rate = np.mean(success_arr)
 
     print(
@@ -37,9 +33,11 @@ if __name__ == "__main__":
     )
 
     # Test joint PD
-    robot_states = robot.move_to_joint_positions(robot.get_joint_positions())
-    output_episode_stats("Joint PD", robot_states)
+    robot_state_log = robot.move_to_joint_positions(
+        robot.get_joint_positions(), as_arrays=True
+    )
+    output_episode_stats("Joint PD", robot_state_log)
 
     # Test cartesian PD
-    robot_states = robot.move_to_ee_pose(robot.get_ee_pose()[0])
-    output_episode_stats("Cartesian PD", robot_states)
+    robot_state_log = robot.move_to_ee_pose(robot.get_ee_pose()[0], as_arrays=True)
+    output_episode_stats("Cartesian PD", robot_state_log)
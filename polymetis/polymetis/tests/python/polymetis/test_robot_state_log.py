@@ -0,0 +1,74 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import pytest
+
+from polymetis.robot_state_log import RobotStateLog, RobotStateLogWriter
+import polymetis_pb2
+
+NUM_DOFS = 7
+
+
+def make_state(i):
+    state = polymetis_pb2.RobotState(
+        joint_positions=[float(i)] * NUM_DOFS,
+        joint_velocities=[-float(i)] * NUM_DOFS,
+        prev_controller_latency_ms=0.5 * i,
+        prev_command_successful=i % 2 == 0,
+        error_code=i,
+    )
+    state.timestamp.seconds = 1000 + i // 1000
+    state.timestamp.nanos = (i % 1000) * 1000000
+    return state
+
+
+def check_log(log, states):
+    assert len(log) == len(states)
+    assert log.joint_positions.shape == (len(states), NUM_DOFS)
+    assert np.array_equal(
+        log.joint_positions[:, 0], [s.joint_positions[0] for s in states]
+    )
+    assert np.array_equal(
+        log["joint_velocities"][:, -1], [s.joint_velocities[-1] for s in states]
+    )
+    assert np.allclose(
+        log.prev_controller_latency_ms, [s.prev_controller_latency_ms for s in states]
+    )
+    assert np.array_equal(
+        log.prev_command_successful, [s.prev_command_successful for s in states]
+    )
+    assert np.array_equal(log.error_code, [s.error_code for s in states])
+    assert np.array_equal(
+        log.timestamp_ns,
+        [s.timestamp.seconds * 10**9 + s.timestamp.nanos for s in states],
+    )
+    # Fields the states don't have are NaN
+    assert np.isnan(log.motor_torques_measured).all()
+
+
+@pytest.mark.parametrize("num_states", [0, 5, 2500])
+def test_from_states(num_states):
+    states = [make_state(i) for i in range(num_states)]
+    check_log(RobotStateLog.from_states(states, NUM_DOFS), states)
+
+
+def test_writer_to_disk(tmp_path):
+    states = [make_state(i) for i in range(2500)]
+    writer = RobotStateLogWriter(NUM_DOFS, path=str(tmp_path), chunk_size=1000)
+    writer.extend(states[:1500])
+
+    # The chunks written so far can be read while the log is being written
+    check_log(RobotStateLog.load(str(tmp_path)), states[:1000])
+
+    writer.extend(states[1500:])
+    log = writer.close()
+    assert isinstance(log.joint_positions, np.memmap)
+    check_log(log, states)
+
+
+def test_save_load(tmp_path):
+    states = [make_state(i) for i in range(10)]
+    RobotStateLog.from_states(states, NUM_DOFS).save(str(tmp_path))
+    check_log(RobotStateLog.load(str(tmp_path)), states)
@@ -0,0 +1,154 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import queue
+import pytest
+from unittest.mock import MagicMock
+
+import torch
+
+from polymetis.robot_state_subscription import RobotStateSubscription
+import polymetis_pb2
+
+NUM_DOFS = 7
+
+
+def make_state(i):
+    state = polymetis_pb2.RobotState(
+        joint_positions=[float(i)] * NUM_DOFS,
+        joint_velocities=[-float(i)] * NUM_DOFS,
+        error_code=i,
+    )
+    state.timestamp.seconds = 1000 + i // 1000
+    state.timestamp.nanos = (i % 1000) * 1000000
+    return state
+
+
+class FakeStream:
+    """An RPC stream yielding the states put in it until cancelled."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def __iter__(self):
+        while True:
+            state = self.queue.get()
+            if state is None:
+                return
+            yield state
+
+    def cancel(self):
+        self.queue.put(None)
+
+
+@pytest.fixture
+def server_log():
+    return [make_state(i) for i in range(50)]
+
+
+@pytest.fixture
+def subscription(server_log):
+    grpc_connection = MagicMock()
+    stream = FakeStream()
+    grpc_connection.GetRobotStateStream.return_value = stream
+    grpc_connection.GetRobotStateLog.side_effect = lambda interval: iter(
+        server_log[interval.start : interval.end + 1]
+    )
+    subscription = RobotStateSubscription(grpc_connection, NUM_DOFS, buffer_size=16)
+    # For the tests to feed it
+    subscription.stream = stream
+    yield subscription
+    subscription.close()
+
+
+def send(subscription, states):
+    # The states the stream gets, which start in the middle of the server log
+    count = subscription.count
+    for state in states:
+        subscription.stream.queue.put(state)
+    assert subscription.wait_for_state(count + len(states) - 1, timeout=10)
+
+
+def test_latest_state(subscription, server_log):
+    assert not subscription.is_active()
+    send(subscription, server_log[10:13])
+    assert subscription.is_active()
+    assert torch.allclose(
+        subscription.get_latest("joint_positions"), torch.full((NUM_DOFS,), 12.0)
+    )
+    assert subscription.get_latest("error_code").item() == 12
+    assert subscription.get_latest_state() == server_log[12]
+    # Fields the states don't have are NaN
+    assert torch.isnan(subscription.get_latest("motor_torques_measured")).all()
+
+
+def test_recent_states(subscription, server_log):
+    # More states than the buffer holds
+    send(subscription, server_log[10:30])
+    recent = subscription.get_recent("joint_velocities", 5)
+    assert recent.shape == (5, NUM_DOFS)
+    assert recent[:, 0].tolist() == [-25.0, -26.0, -27.0, -28.0, -29.0]
+
+
+def test_get_log(subscription, server_log):
+    send(subscription, server_log[10:30])
+    log_interval = polymetis_pb2.LogInterval(start=20, end=27)
+    assert subscription.get_log(log_interval) == server_log[20:28]
+
+    # Overwritten in the buffer
+    log_interval = polymetis_pb2.LogInterval(start=12, end=20)
+    assert subscription.get_log(log_interval) is None
+
+    # Not received yet
+    log_interval = polymetis_pb2.LogInterval(start=28, end=31)
+    assert subscription.get_log(log_interval, timeout=0.1) is None
+    send(subscription, server_log[30:32])
+    assert subscription.get_log(log_interval) == server_log[28:32]
+
+
+def test_get_log_skipped_states(subscription, server_log):
+    send(subscription, server_log[10:15] + server_log[16:20])
+    log_interval = polymetis_pb2.LogInterval(start=12, end=18)
+    assert subscription.get_log(log_interval, timeout=0.1) is None
+
+
+def test_record(subscription, server_log, tmp_path):
+    send(subscription, server_log[10:12])
+    writer = subscription.record(path=str(tmp_path), chunk_size=4)
+    # More states than the buffer holds
+    send(subscription, server_log[12:32])
+    assert len(writer) == 20
+    log = subscription.stop_recording()
+    send(subscription, server_log[32:34])
+    assert log.error_code.tolist() == list(range(12, 32))
+    assert log.joint_positions[-1, 0] == 31.0
+
+
+def test_read_retries_when_writer_reaches_oldest_slot(subscription, server_log):
+    send(subscription, server_log[10:20])
+    num_states = 5
+    reads = []
+
+    def read_fn(count):
+        if not reads:
+            # The writer gets buffer_size - num_states states ahead during the first
+            # read, so it may be writing the slot of the oldest state read
+            send(subscription, server_log[20 : 20 + subscription.buffer_size - num_states])
+        reads.append(count)
+        return count
+
+    assert subscription._read(read_fn, num_states) == 21
+    assert reads == [10, 21]
+
+    # One state fewer and the first read is kept
+    reads.clear()
+
+    def read_fn(count):
+        if not reads:
+            send(subscription, server_log[31 : 31 + subscription.buffer_size - num_states - 1])
+        reads.append(count)
+        return count
+
+    assert subscription._read(read_fn, num_states) == 21
+    assert reads == [21]